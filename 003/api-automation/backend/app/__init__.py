@@ -56,6 +56,15 @@ async def lifespan(app: FastAPI):
         # 不阻止应用启动，但记录错误
 
     yield
+
+    # 结束pytest常驻工作进程
+    from app.services.api_automation.pytest_worker_pool import shutdown_pytest_worker_pool
+    await shutdown_pytest_worker_pool()
+
+    # 写完队列中剩余的智能体日志
+    from app.services.log_sink import close_agent_log_sink
+    await close_agent_log_sink()
+
     await Tortoise.close_connections()
 
 
@@ -4,7 +4,7 @@ API自动化智能体基类
 """
 import json
 import asyncio
-from typing import Dict, List, Any, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from datetime import datetime
 
 from autogen_core import MessageContext
@@ -17,6 +17,7 @@ from tortoise import Tortoise
 from app.core.agents.base import BaseAgent
 from app.core.agents.llms import get_model_client
 from app.core.types import AgentTypes
+from app.utils.json_extraction import IncrementalJsonParser, find_json_objects, select_best_json_object
 
 
 class BaseApiAutomationAgent(BaseAgent):
@@ -132,8 +133,22 @@ class BaseApiAutomationAgent(BaseAgent):
                 if self.assistant_agent is None:
                     self._create_fallback_assistant_agent()
     
-    async def _run_assistant_agent(self, task: str, stream: bool = False) -> Optional[str]:
-        """运行AssistantAgent获取结果"""
+    async def _run_assistant_agent(
+        self,
+        task: str,
+        stream: bool = False,
+        on_json_object: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+        on_json_item: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ) -> Optional[str]:
+        """运行AssistantAgent获取结果
+
+        Args:
+            task: 任务提示
+            stream: 是否流式输出
+            on_json_object: 流式输出时，每解析出一个完整的顶层JSON对象就回调一次
+            on_json_item: 流式输出时，根对象内直接嵌套的对象（如test_cases中的每个用例）
+                一闭合就回调，下游处理可以在输出结束前开始
+        """
         try:
             await self._ensure_assistant_agent()
             
@@ -143,15 +158,33 @@ class BaseApiAutomationAgent(BaseAgent):
             if stream:
                 stream = self.assistant_agent.run_stream(task=task)
                 result_content = ""
+                json_parser = IncrementalJsonParser() if on_json_object or on_json_item else None
                 async for event in stream:
                     if isinstance(event, ModelClientStreamingChunkEvent):
                         await self.send_response(event.content)
+                        if json_parser:
+                            json_objects = json_parser.feed(event.content)
+                            if on_json_item:
+                                for json_item in json_parser.pop_items():
+                                    await on_json_item(json_item)
+                            if on_json_object:
+                                for json_object in json_objects:
+                                    await on_json_object(json_object)
                         continue
                     if isinstance(event, TaskResult):
                         messages = event.messages
                         if messages and hasattr(messages[-1], 'content'):
                             result_content = messages[-1].content
                             break
+                if json_parser:
+                    # 流结束：未闭合或解析失败的外层对象（如说明文字里多出的 { ）中的对象和用例在这里才取出
+                    json_objects = json_parser.finish()
+                    if on_json_item:
+                        for json_item in json_parser.pop_items():
+                            await on_json_item(json_item)
+                    if on_json_object:
+                        for json_object in json_objects:
+                            await on_json_object(json_object)
             else:
                 result = await self.assistant_agent.run(task=task)
                 result_content = result.messages[-1].content if result.messages else ""
@@ -214,95 +247,20 @@ class BaseApiAutomationAgent(BaseAgent):
             return None
 
     def _extract_complete_json_object(self, content: str) -> Optional[Dict[str, Any]]:
-        """智能提取完整的JSON对象，支持复杂嵌套结构"""
+        """智能提取完整的JSON对象，支持复杂嵌套结构（单次扫描所有顶层平衡对象）"""
         try:
-            # 查找所有可能的JSON起始位置
-            start_positions = []
-            for i, char in enumerate(content):
-                if char == '{':
-                    start_positions.append(i)
-
-            # 收集所有有效的JSON对象
-            valid_json_objects = []
-
-            # 按起始位置尝试提取JSON
-            for start_pos in start_positions:
-                json_str = self._extract_balanced_json(content, start_pos)
-                if json_str:
-                    try:
-                        parsed_json = json.loads(json_str)
-                        # 验证这是一个有意义的JSON对象（不是空对象或只有一个简单字段）
-                        if isinstance(parsed_json, dict) and len(parsed_json) > 0:
-                            valid_json_objects.append({
-                                'json': parsed_json,
-                                'size': len(json_str),
-                                'keys': list(parsed_json.keys()),
-                                'start_pos': start_pos
-                            })
-                    except json.JSONDecodeError:
-                        continue
-
-            if not valid_json_objects:
+            best_object = select_best_json_object(find_json_objects(content))
+            if not best_object:
                 return None
 
-            # 优先选择包含 test_cases 键的JSON对象
-            test_cases_objects = [obj for obj in valid_json_objects if 'test_cases' in obj['keys']]
-            if test_cases_objects:
-                # 如果有多个包含test_cases的对象，选择最大的
-                best_object = max(test_cases_objects, key=lambda x: x['size'])
-                logger.info(f"选择包含test_cases的JSON对象，大小: {best_object['size']}, 键: {best_object['keys']}")
-                return best_object['json']
-
-            # 如果没有包含test_cases的对象，选择最大的JSON对象
-            best_object = max(valid_json_objects, key=lambda x: x['size'])
-            logger.info(f"选择最大的JSON对象，大小: {best_object['size']}, 键: {best_object['keys']}")
-            return best_object['json']
+            parsed_json, start_pos, size = best_object
+            logger.info(f"选择JSON对象，位置: {start_pos}, 大小: {size}, 键: {list(parsed_json.keys())}")
+            return parsed_json
 
         except Exception as e:
             logger.error(f"智能JSON提取失败: {str(e)}")
             return None
 
-    def _extract_balanced_json(self, content: str, start_pos: int) -> Optional[str]:
-        """从指定位置提取平衡的JSON字符串"""
-        try:
-            if start_pos >= len(content) or content[start_pos] != '{':
-                return None
-
-            brace_count = 0
-            in_string = False
-            escape_next = False
-
-            for i in range(start_pos, len(content)):
-                char = content[i]
-
-                if escape_next:
-                    escape_next = False
-                    continue
-
-                if char == '\\':
-                    escape_next = True
-                    continue
-
-                if char == '"' and not escape_next:
-                    in_string = not in_string
-                    continue
-
-                if not in_string:
-                    if char == '{':
-                        brace_count += 1
-                    elif char == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            # 找到完整的JSON对象
-                            json_str = content[start_pos:i+1]
-                            return json_str.strip()
-
-            return None
-
-        except Exception as e:
-            logger.error(f"提取平衡JSON失败: {str(e)}")
-            return None
-
     def _clean_json_content(self, content: str) -> Optional[str]:
         """清理和修复JSON内容"""
         try:
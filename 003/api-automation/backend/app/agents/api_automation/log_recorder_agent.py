@@ -5,7 +5,8 @@
 import os
 import json
 import uuid
-from typing import Dict, List, Any, Optional
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Any, Optional
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -19,6 +20,8 @@ from .schemas import (
     LogRecordRequest, LogRecordResponse, LogLevel
 )
 from app.services.log_service import LogService
+from app.services.log_sink import get_agent_log_sink
+from app.settings.config import settings
 
 
 @type_subscription(topic_type=TopicTypes.LOG_RECORDER.value)
@@ -64,8 +67,10 @@ class LogRecorderAgent(BaseApiAutomationAgent):
         self.logs_dir = Path("./logs")
         self.logs_dir.mkdir(exist_ok=True)
 
-        # 会话日志存储
-        self.session_logs = {}
+        # 会话日志内存缓存：每个会话只保留最近的日志，会话数超过上限时淘汰最久未写入的会话
+        self.session_logs: "OrderedDict[str, Deque[Dict[str, Any]]]" = OrderedDict()
+        self.session_log_capacity = settings.AGENT_LOG_SESSION_CACHE_SIZE
+        self.max_cached_sessions = settings.AGENT_LOG_MAX_CACHED_SESSIONS
 
         # 告警规则
         self.alert_rules = {
@@ -109,33 +114,9 @@ class LogRecorderAgent(BaseApiAutomationAgent):
             logger.error(f"日志记录失败: {str(e)}")
 
     async def _record_log(self, message: LogRecordRequest):
-        """记录日志"""
+        """记录日志：写入内存缓存并放入批量写入管道（数据库和文件由管道后台批量写入）"""
         try:
-            # 保存到数据库
-            log_id = await LogService.save_agent_log(
-                session_id=message.session_id,
-                agent_type=message.source,  # 使用source作为agent_type
-                agent_name=message.source,
-                log_level=message.level.value,
-                message=message.message,
-                log_data=message.metadata,
-                request_id=getattr(message, 'request_id', None),
-                user_id=getattr(message, 'user_id', None),
-                operation=getattr(message, 'operation', None),
-                execution_time=getattr(message, 'execution_time', None),
-                memory_usage=getattr(message, 'memory_usage', None),
-                cpu_usage=getattr(message, 'cpu_usage', None),
-                error_code=getattr(message, 'error_code', None),
-                error_type=getattr(message, 'error_type', None),
-                stack_trace=getattr(message, 'stack_trace', None),
-                tags=getattr(message, 'tags', []),
-                category=getattr(message, 'category', None)
-            )
-
-            # 存储到会话日志（内存缓存）
-            if message.session_id not in self.session_logs:
-                self.session_logs[message.session_id] = []
-
+            log_id = str(uuid.uuid4())
             log_entry = {
                 "log_id": log_id,
                 "timestamp": message.timestamp.isoformat(),
@@ -145,25 +126,51 @@ class LogRecorderAgent(BaseApiAutomationAgent):
                 "metadata": message.metadata
             }
 
-            self.session_logs[message.session_id].append(log_entry)
-
-            # 写入文件（备份）
-            log_file = self.logs_dir / f"session_{message.session_id}.log"
-            with open(log_file, 'a', encoding='utf-8') as f:
-                f.write(f"{json.dumps(log_entry, ensure_ascii=False)}\n")
+            queued = get_agent_log_sink(self.logs_dir).put({
+                "log_id": log_id,
+                "session_id": message.session_id,
+                "agent_type": message.source,  # 使用source作为agent_type
+                "agent_name": message.source,
+                "log_level": message.level.value,
+                "message": message.message,
+                "operation_data": message.metadata or {},
+                "request_id": getattr(message, 'request_id', None),
+                "user_id": getattr(message, 'user_id', None),
+                "operation": getattr(message, 'operation', None),
+                "execution_time": getattr(message, 'execution_time', None),
+                "memory_usage": getattr(message, 'memory_usage', None),
+                "cpu_usage": getattr(message, 'cpu_usage', None),
+                "error_code": getattr(message, 'error_code', None),
+                "error_type": getattr(message, 'error_type', None),
+                "stack_trace": getattr(message, 'stack_trace', None),
+                "tags": getattr(message, 'tags', None) or [],
+                "category": getattr(message, 'category', None),
+                "timestamp": datetime.utcnow(),
+                "file_entry": log_entry
+            })
 
-            # 写入全局日志
-            global_log_file = self.logs_dir / f"api_automation_{datetime.now().strftime('%Y-%m-%d')}.log"
-            with open(global_log_file, 'a', encoding='utf-8') as f:
-                f.write(f"{json.dumps(log_entry, ensure_ascii=False)}\n")
+            # 存储到会话日志（内存缓存）
+            self._cache_session_log(message.session_id, log_entry)
 
             self.log_metrics["total_logs_collected"] += 1
+            if not queued:
+                logger.debug(f"日志队列已满，丢弃日志: {log_id}")
 
-            logger.debug(f"日志记录成功: {log_id}")
-            
         except Exception as e:
             logger.error(f"记录日志失败: {str(e)}")
 
+    def _cache_session_log(self, session_id: str, log_entry: Dict[str, Any]) -> None:
+        """把日志放入会话的环形缓存"""
+        session_logs = self.session_logs.get(session_id)
+        if session_logs is None:
+            if len(self.session_logs) >= self.max_cached_sessions:
+                self.session_logs.popitem(last=False)
+            session_logs = deque(maxlen=self.session_log_capacity)
+            self.session_logs[session_id] = session_logs
+        else:
+            self.session_logs.move_to_end(session_id)
+        session_logs.append(log_entry)
+
     def _should_analyze_logs(self, message: LogRecordRequest) -> bool:
         """判断是否需要分析日志"""
         # 错误日志立即分析
@@ -436,8 +443,8 @@ class LogRecorderAgent(BaseApiAutomationAgent):
             self.log_metrics["debug_logs"] += 1
 
     async def get_session_logs(self, session_id: str) -> List[Dict[str, Any]]:
-        """获取会话日志"""
-        return self.session_logs.get(session_id, [])
+        """获取会话日志（内存缓存中最近的日志）"""
+        return list(self.session_logs.get(session_id, []))
 
     async def get_logs_by_level(self, session_id: str, level: LogLevel) -> List[Dict[str, Any]]:
         """按级别获取日志"""
@@ -472,7 +479,7 @@ class LogRecorderAgent(BaseApiAutomationAgent):
     async def export_logs(self, session_id: str, format: str = "json") -> str:
         """导出日志"""
         try:
-            logs = self.session_logs.get(session_id, [])
+            logs = list(self.session_logs.get(session_id, []))
             
             if format == "json":
                 export_file = self.logs_dir / f"export_{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
@@ -512,6 +519,7 @@ class LogRecorderAgent(BaseApiAutomationAgent):
             return {
                 **common_stats,
                 "log_metrics": self.log_metrics,
+                "log_sink": get_agent_log_sink(self.logs_dir).get_stats(),
                 "database_stats": db_stats,
                 "error_rate": round(error_rate, 2),
                 "active_sessions": len(self.session_logs),
@@ -11,7 +11,7 @@ import platform
 import re
 import xml.etree.ElementTree as ET
 from typing import Dict, List, Any, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 
 from autogen_agentchat.base import TaskResult
@@ -243,14 +243,27 @@ class TestExecutorAgent(BaseApiAutomationAgent):
 
             logger.info(f"执行测试命令: {' '.join(test_cmd)}")
 
-            # 3. 执行测试命令 - 参考code_executor.py的execute_command
-            execution_result = await self._execute_command(
-                test_cmd,
-                str(work_dir),
-                message.session_id,
-                "pytest测试执行",
-                timeout=config.get("timeout", 300)
-            )
+            # 3. 执行测试命令 - 启用pytest工作进程池时在常驻进程中执行，否则启动独立进程
+            from app.services.api_automation.pytest_worker_pool import get_pytest_worker_pool
+
+            execution_result = None
+            worker_pool = get_pytest_worker_pool()
+            if worker_pool is not None and test_cmd[1:3] == ["-m", "pytest"]:
+                execution_result = await self._execute_pytest_in_pool(
+                    worker_pool,
+                    test_cmd[3:],
+                    str(work_dir),
+                    message.session_id,
+                    timeout=config.get("timeout", 300)
+                )
+            if execution_result is None:
+                execution_result = await self._execute_command(
+                    test_cmd,
+                    str(work_dir),
+                    message.session_id,
+                    "pytest测试执行",
+                    timeout=config.get("timeout", 300)
+                )
 
             # 4. 解析执行结果
             result = await self._parse_execution_result(
@@ -822,6 +835,43 @@ class TestExecutorAgent(BaseApiAutomationAgent):
             "end_time": end_time.isoformat()
         }
 
+    async def _execute_pytest_in_pool(self, worker_pool, pytest_args: List[str], cwd: str,
+                                      execution_id: str, timeout: int = 300) -> Optional[Dict[str, Any]]:
+        """在pytest常驻工作进程中执行，返回与_execute_command相同结构的结果；工作进程池不可用时返回None"""
+        start_time = datetime.now()
+        try:
+            result = await worker_pool.run(pytest_args, cwd=cwd, timeout=timeout, run_id=execution_id)
+        except RuntimeError as e:
+            logger.warning(f"pytest工作进程池不可用，改用独立进程执行: {e}")
+            return None
+        end_time = datetime.now()
+        # 等待空闲工作进程的时间不计入执行耗时
+        start_time = min(end_time, start_time + timedelta(seconds=result.get("wait_time", 0.0)))
+
+        stdout_lines = [line for line in result.get("stdout", "").splitlines() if line.strip()]
+        for line in stdout_lines:
+            logger.info(f"[pytest测试执行] {line}")
+        logs = [f"[STDOUT] {line}" for line in stdout_lines]
+
+        error_message = None
+        if result.get("timed_out"):
+            error_message = f"pytest测试执行超时（{timeout}秒）"
+        elif result["return_code"] != 0:
+            error_message = result.get("stderr") or f"pytest退出码: {result['return_code']}"
+        if error_message:
+            logs.append(f"[STDERR] {error_message}")
+
+        return {
+            "return_code": result["return_code"],
+            "stdout": '\n'.join(stdout_lines),
+            "stderr": result.get("stderr", ""),
+            "error_message": error_message,
+            "logs": logs,
+            "duration": (end_time - start_time).total_seconds(),
+            "start_time": start_time.isoformat(),
+            "end_time": end_time.isoformat()
+        }
+
     async def _intelligent_analyze_execution_results(
         self,
         execution_result: Dict[str, Any],
@@ -13,7 +13,7 @@
 import json
 import uuid
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 from autogen_core import message_handler, type_subscription, MessageContext, TopicId
 from loguru import logger
@@ -90,16 +90,11 @@ class TestCaseGeneratorAgent(BaseApiAutomationAgent):
         try:
             logger.info(f"开始生成测试用例: document_id={message.document_id}, interface_id={getattr(message, 'interface_id', None)}, 端点数量: {len(message.endpoints)}")
 
-            # 1. 使用大模型智能生成测试用例
-            generation_result = await self._intelligent_generate_test_cases(
+            # 1. 使用大模型智能生成测试用例，流式输出中每个用例闭合时即构建为测试用例对象
+            generation_result, test_cases = await self._intelligent_generate_test_cases(
                 message.api_info, message.endpoints, message.dependencies, message.execution_groups
             )
             
-            # 2. 构建测试用例对象
-            test_cases = self._build_test_case_objects(
-                generation_result.get("test_cases", []), message.endpoints
-            )
-            
             # 3. 生成覆盖度报告
             coverage_report = self._generate_coverage_report(test_cases, message.endpoints)
             
@@ -140,8 +135,8 @@ class TestCaseGeneratorAgent(BaseApiAutomationAgent):
         endpoints: List[ParsedEndpoint],
         dependencies: List[EndpointDependency],
         execution_groups
-    ) -> Dict[str, Any]:
-        """使用大模型智能生成测试用例"""
+    ) -> Tuple[Dict[str, Any], List[GeneratedTestCase]]:
+        """使用大模型智能生成测试用例，返回 (解析出的结果, 测试用例对象)"""
         try:
             # 构建生成任务提示词
             endpoints_info = self._format_endpoints_for_generation(endpoints)
@@ -161,15 +156,35 @@ class TestCaseGeneratorAgent(BaseApiAutomationAgent):
                 execution_groups=groups_info
             )
             
+            streamed_cases: List[GeneratedTestCase] = []
+            streamed_count = 0
+
+            async def on_json_item(item: Dict[str, Any]) -> None:
+                # 用例在输出结束前就构建，不必等完整响应
+                nonlocal streamed_count
+                if "endpoint_id" in item:
+                    streamed_count += 1
+                    streamed_cases.extend(self._build_test_case_objects([item], endpoints))
+
             # 使用AssistantAgent进行智能生成
-            result_content = await self._run_assistant_agent(task_prompt)
+            result_content = await self._run_assistant_agent(task_prompt, stream=True, on_json_item=on_json_item)
 
             # 清理和预处理响应内容
-            cleaned_content = self._clean_json_content(result_content)
+            cleaned_content = self._clean_json_content(result_content or "")
 
             # 解析JSON
-            parsed_data = json.loads(cleaned_content)
-            return parsed_data
+            try:
+                parsed_data = json.loads(cleaned_content)
+            except json.JSONDecodeError:
+                if not streamed_cases:
+                    raise
+                logger.warning(f"完整响应不是有效JSON，使用流式解析出的 {len(streamed_cases)} 个测试用例")
+                return {"test_cases": []}, streamed_cases
+
+            # 流式解析出的用例与完整结果一致时直接使用，否则按完整结果重新构建
+            if streamed_count == len(parsed_data.get("test_cases", [])):
+                return parsed_data, streamed_cases
+            return parsed_data, self._build_test_case_objects(parsed_data.get("test_cases", []), endpoints)
             # if result_content:
             #     # 添加调试日志
             #     logger.info(f"AI返回内容长度: {len(result_content)}")
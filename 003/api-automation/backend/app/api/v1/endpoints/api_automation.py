@@ -19,6 +19,7 @@ from loguru import logger
 from app.services.api_automation import ApiAutomationOrchestrator
 from app.core.agents.collector import StreamResponseCollector
 from app.core.types import AgentPlatform
+from app.services.log_sink import get_agent_log_sink
 
 
 # 请求模型
@@ -835,6 +836,7 @@ async def get_system_metrics() -> JSONResponse:
                 "success": True,
                 "orchestrator_metrics": orchestrator_metrics,
                 "session_stats": session_stats,
+                "log_sink": get_agent_log_sink().get_stats(),
                 "timestamp": datetime.now().isoformat()
             }
         )
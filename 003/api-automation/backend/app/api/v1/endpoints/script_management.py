@@ -9,8 +9,10 @@
 4. 执行历史和日志管理
 """
 
+import json
 from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from loguru import logger
 
@@ -519,6 +521,22 @@ async def get_execution_logs(
         raise HTTPException(status_code=500, detail=f"获取执行日志失败: {str(e)}")
 
 
+@router.get("/executions/{execution_id}/events", summary="订阅执行事件")
+async def stream_execution_events(execution_id: str):
+    """以SSE推送执行进度，每个脚本完成时推送一条结果，整批结束时推送execution_finished"""
+    try:
+        script_service = InterfaceScriptService()
+        events = script_service.stream_execution_events(execution_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    async def event_stream():
+        async for event in events:
+            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @router.post("/executions/{execution_id}/stop", summary="停止执行")
 async def stop_execution(execution_id: str):
     """停止正在执行的脚本"""
@@ -1,252 +1,456 @@
 """
 数据库备份和恢复工具
 支持API自动化系统的数据备份、恢复和迁移
+
+备份格式：backups/<备份名>/ 目录，每个表一个 <表名>.ndjson.gz（每行一条记录），
+以及记录备份类型、各表行数和增量水位的 manifest.json。
+备份按主键分批读取、逐批压缩写入，恢复逐批读取、每批一个事务批量插入，内存占用与表大小无关。
 """
 import asyncio
 import json
 import gzip
 import shutil
-from datetime import datetime
+import uuid
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from enum import Enum
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from loguru import logger
-from tortoise import Tortoise
+from tortoise import Tortoise, connections, fields
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
 
 from app.core.config import settings
 
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = "2.0"
+
+# 增量备份的水位列，按顺序取模型中第一个存在的字段
+WATERMARK_COLUMNS = ("updated_at", "created_at", "timestamp")
+
+# 需要备份的表
+TABLES_TO_BACKUP = [
+    'api_documents', 'api_endpoints', 'test_cases', 'test_results',
+    'test_executions', 'agent_logs', 'system_metrics', 'alerts',
+    'alert_rules', 'test_scripts', 'log_analyses', 'workflow_sessions',
+    'api_analysis_results', 'test_generation_tasks', 'test_execution_sessions',
+    'test_reports', 'agent_metrics', 'user_sessions', 'system_configurations',
+    'operation_logs'
+]
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+class TableWriter:
+    """单个表的压缩NDJSON写入器，写入在线程池中进行，压缩不阻塞事件循环"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        self._file.write("".join(
+            json.dumps(record, ensure_ascii=False, default=_json_default) + "\n" for record in records
+        ))
+
+    async def write(self, records: List[Dict[str, Any]]) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._write, records)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class TableReader:
+    """单个表的压缩NDJSON读取器，按批读取"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = gzip.open(path, 'rt', encoding='utf-8')
+
+    def _read(self, batch_size: int) -> List[Dict[str, Any]]:
+        records = []
+        for line in self._file:
+            if line.strip():
+                records.append(json.loads(line))
+                if len(records) >= batch_size:
+                    break
+        return records
+
+    async def read(self, batch_size: int) -> List[Dict[str, Any]]:
+        return await asyncio.get_running_loop().run_in_executor(None, self._read, batch_size)
+
+    def close(self) -> None:
+        self._file.close()
+
 
 class BackupRestoreManager:
     """数据库备份恢复管理器"""
-    
-    def __init__(self):
+
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        parallel_tables: int = 4,
+        progress_callback: Optional[ProgressCallback] = None
+    ):
+        """
+        Args:
+            batch_size: 每批读取/写入的记录数
+            parallel_tables: 同时备份/恢复的表数
+            progress_callback: 进度回调，参数为 {"phase", "table", "rows", "total"}
+        """
         self.backup_dir = Path("backups")
         self.backup_dir.mkdir(exist_ok=True)
-        
+        self.batch_size = batch_size
+        self.parallel_tables = max(1, parallel_tables)
+        self.progress_callback = progress_callback
+
+    async def _init_db(self) -> None:
+        await Tortoise.init(
+            db_url=settings.DATABASE_URL,
+            modules={'models': ['app.models.api_automation']}
+        )
+
+    def _report_progress(self, phase: str, table_name: str, rows: int, total: Optional[int] = None) -> None:
+        if self.progress_callback:
+            try:
+                self.progress_callback({"phase": phase, "table": table_name, "rows": rows, "total": total})
+            except Exception as e:
+                logger.warning(f"进度回调失败: {str(e)}")
+
+    # ==================== 备份 ====================
+
     async def create_full_backup(self, backup_name: Optional[str] = None) -> str:
-        """创建完整备份"""
+        """创建完整备份，返回备份目录"""
+        if not backup_name:
+            backup_name = f"full_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        return await self._create_backup(backup_name, backup_type='full')
+
+    async def create_incremental_backup(
+        self,
+        since: Optional[datetime] = None,
+        backup_name: Optional[str] = None
+    ) -> str:
+        """创建增量备份，只备份水位列（updated_at/created_at/timestamp）不早于起点的记录
+
+        未指定since时，每个表从最近一次备份记录的水位继续
+        """
+        if not backup_name:
+            backup_name = f"incremental_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        watermarks = {}
+        if since is None:
+            watermarks = self._latest_watermarks()
+            if not watermarks:
+                raise ValueError("没有可继续的备份水位，请指定增量备份起始时间")
+        return await self._create_backup(backup_name, backup_type='incremental', since=since,
+                                         watermarks=watermarks)
+
+    async def _create_backup(
+        self,
+        backup_name: str,
+        backup_type: str,
+        since: Optional[datetime] = None,
+        watermarks: Optional[Dict[str, str]] = None
+    ) -> str:
+        backup_path = self.backup_dir / backup_name
         try:
-            if not backup_name:
-                backup_name = f"full_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            
-            backup_path = self.backup_dir / f"{backup_name}.json.gz"
-            
-            await Tortoise.init(
-                db_url=settings.DATABASE_URL,
-                modules={'models': ['app.models.api_automation', 'app.models.admin']}
-            )
-            
-            logger.info(f"开始创建完整备份: {backup_name}")
-            
-            backup_data = {
-                'metadata': {
-                    'backup_name': backup_name,
-                    'backup_time': datetime.utcnow().isoformat(),
-                    'backup_type': 'full',
-                    'version': '1.0'
-                },
-                'data': {}
-            }
-            
-            # 备份各个表的数据
-            tables_to_backup = [
-                'api_documents', 'api_endpoints', 'test_cases', 'test_results',
-                'test_executions', 'agent_logs', 'system_metrics', 'alerts',
-                'alert_rules', 'test_scripts', 'log_analyses', 'workflow_sessions',
-                'api_analysis_results', 'test_generation_tasks', 'test_execution_sessions',
-                'test_reports', 'agent_metrics', 'user_sessions', 'system_configurations',
-                'operation_logs'
-            ]
-            
-            for table_name in tables_to_backup:
-                try:
+            backup_path.mkdir(parents=True, exist_ok=False)
+            await self._init_db()
+
+            logger.info(f"开始创建{'完整' if backup_type == 'full' else '增量'}备份: {backup_name}")
+
+            semaphore = asyncio.Semaphore(self.parallel_tables)
+
+            async def backup_one(table_name: str) -> Tuple[str, Dict[str, Any]]:
+                async with semaphore:
                     model_class = self._get_model_class(table_name)
-                    if model_class:
-                        records = await model_class.all().values()
-                        backup_data['data'][table_name] = self._serialize_records(records)
-                        logger.info(f"备份表 {table_name}: {len(records)} 条记录")
-                except Exception as e:
-                    logger.warning(f"备份表 {table_name} 失败: {str(e)}")
-                    backup_data['data'][table_name] = []
-            
-            # 压缩并保存备份文件
-            json_data = json.dumps(backup_data, ensure_ascii=False, indent=2)
-            
-            with gzip.open(backup_path, 'wt', encoding='utf-8') as f:
-                f.write(json_data)
-            
-            backup_size = backup_path.stat().st_size
-            logger.info(f"备份完成: {backup_path} ({backup_size / 1024 / 1024:.2f} MB)")
-            
+                    if not model_class:
+                        return table_name, {"rows": 0, "error": "模型不存在"}
+                    table_since = since
+                    if backup_type == 'incremental' and table_since is None and watermarks.get(table_name):
+                        table_since = datetime.fromisoformat(watermarks[table_name])
+                    try:
+                        return table_name, await self._backup_table(
+                            model_class, table_name, backup_path, incremental=backup_type == 'incremental',
+                            since=table_since
+                        )
+                    except Exception as e:
+                        logger.warning(f"备份表 {table_name} 失败: {str(e)}")
+                        return table_name, {"rows": 0, "error": str(e)}
+
+            results = await asyncio.gather(*(backup_one(table_name) for table_name in TABLES_TO_BACKUP))
+
+            manifest = {
+                'backup_name': backup_name,
+                'backup_time': datetime.utcnow().isoformat(),
+                'backup_type': backup_type,
+                'since': since.isoformat() if since else None,
+                'version': FORMAT_VERSION,
+                'batch_size': self.batch_size,
+                'tables': dict(results)
+            }
+            with open(backup_path / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+            backup_size = sum(file.stat().st_size for file in backup_path.iterdir())
+            total_rows = sum(info.get('rows', 0) for info in manifest['tables'].values())
+            logger.info(f"备份完成: {backup_path} ({total_rows} 条记录, {backup_size / 1024 / 1024:.2f} MB)")
+
             return str(backup_path)
-            
+
         except Exception as e:
             logger.error(f"创建备份失败: {str(e)}")
             raise
         finally:
             await Tortoise.close_connections()
-    
-    async def create_incremental_backup(self, since: datetime, backup_name: Optional[str] = None) -> str:
-        """创建增量备份"""
+
+    async def _backup_table(
+        self,
+        model_class,
+        table_name: str,
+        backup_path: Path,
+        incremental: bool = False,
+        since: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """按主键（增量时按 水位列+主键）分页读取整表，逐批写入压缩文件"""
+        pk = model_class._meta.pk_attr
+        watermark = self._get_watermark_column(model_class)
+        if incremental and not watermark:
+            return {"rows": 0, "skipped": "没有水位列"}
+
+        base_query = model_class.all()
+        if incremental and since is not None:
+            base_query = base_query.filter(**{f"{watermark}__gte": since})
+        total = await base_query.count()
+
+        file_name = f"{table_name}.ndjson.gz"
+        writer = TableWriter(backup_path / file_name)
+        rows = 0
+        max_watermark = None
+        last_pk = None
+        last_watermark = None
         try:
-            if not backup_name:
-                backup_name = f"incremental_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            
-            backup_path = self.backup_dir / f"{backup_name}.json.gz"
-            
-            await Tortoise.init(
-                db_url=settings.DATABASE_URL,
-                modules={'models': ['app.models.api_automation']}
-            )
-            
-            logger.info(f"开始创建增量备份: {backup_name} (自 {since})")
-            
-            backup_data = {
-                'metadata': {
-                    'backup_name': backup_name,
-                    'backup_time': datetime.utcnow().isoformat(),
-                    'backup_type': 'incremental',
-                    'since': since.isoformat(),
-                    'version': '1.0'
-                },
-                'data': {}
-            }
-            
-            # 只备份指定时间之后的数据
-            from app.models.api_automation import (
-                ApiDocument, ApiEndpoint, TestCase, TestResult,
-                AgentLog, Alert, OperationLog
-            )
-            
-            incremental_tables = [
-                (ApiDocument, 'api_documents'),
-                (TestResult, 'test_results'),
-                (AgentLog, 'agent_logs'),
-                (Alert, 'alerts'),
-                (OperationLog, 'operation_logs')
-            ]
-            
-            for model_class, table_name in incremental_tables:
-                try:
-                    records = await model_class.filter(created_at__gte=since).values()
-                    backup_data['data'][table_name] = self._serialize_records(records)
-                    logger.info(f"增量备份表 {table_name}: {len(records)} 条记录")
-                except Exception as e:
-                    logger.warning(f"增量备份表 {table_name} 失败: {str(e)}")
-                    backup_data['data'][table_name] = []
-            
-            # 压缩并保存备份文件
-            json_data = json.dumps(backup_data, ensure_ascii=False, indent=2)
-            
-            with gzip.open(backup_path, 'wt', encoding='utf-8') as f:
-                f.write(json_data)
-            
-            backup_size = backup_path.stat().st_size
-            logger.info(f"增量备份完成: {backup_path} ({backup_size / 1024:.2f} KB)")
-            
-            return str(backup_path)
-            
-        except Exception as e:
-            logger.error(f"创建增量备份失败: {str(e)}")
-            raise
+            while True:
+                query = base_query
+                if incremental:
+                    if last_pk is not None:
+                        query = query.filter(
+                            Q(**{f"{watermark}__gt": last_watermark})
+                            | Q(**{watermark: last_watermark, f"{pk}__gt": last_pk})
+                        )
+                    query = query.order_by(watermark, pk)
+                else:
+                    if last_pk is not None:
+                        query = query.filter(**{f"{pk}__gt": last_pk})
+                    query = query.order_by(pk)
+
+                records = await query.limit(self.batch_size).values()
+                if not records:
+                    break
+
+                await writer.write(records)
+                rows += len(records)
+                last_pk = records[-1][pk]
+                if watermark:
+                    last_watermark = records[-1][watermark]
+                    batch_max = max((r[watermark] for r in records if r[watermark] is not None), default=None)
+                    if batch_max is not None and (max_watermark is None or batch_max > max_watermark):
+                        max_watermark = batch_max
+                self._report_progress("backup", table_name, rows, total)
+
+                if len(records) < self.batch_size:
+                    break
         finally:
-            await Tortoise.close_connections()
-    
+            writer.close()
+
+        logger.info(f"备份表 {table_name}: {rows} 条记录")
+        return {
+            "file": file_name,
+            "rows": rows,
+            "watermark_column": watermark,
+            "watermark": max_watermark.isoformat() if max_watermark else None
+        }
+
+    def _get_watermark_column(self, model_class) -> Optional[str]:
+        for column in WATERMARK_COLUMNS:
+            if column in model_class._meta.fields_map:
+                return column
+        return None
+
+    def _read_manifest(self, backup_path: Path) -> Dict[str, Any]:
+        with open(backup_path / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _latest_watermarks(self) -> Dict[str, str]:
+        """从最近的备份清单中取每个表的水位（每个表取所有备份中最大的）"""
+        watermarks: Dict[str, str] = {}
+        for manifest_file in self.backup_dir.glob(f"*/{MANIFEST_FILE}"):
+            try:
+                manifest = self._read_manifest(manifest_file.parent)
+            except Exception as e:
+                logger.warning(f"读取备份清单 {manifest_file} 失败: {str(e)}")
+                continue
+            for table_name, info in manifest.get('tables', {}).items():
+                watermark = info.get('watermark')
+                if watermark and watermark > watermarks.get(table_name, ""):
+                    watermarks[table_name] = watermark
+        return watermarks
+
+    # ==================== 恢复 ====================
+
     async def restore_backup(self, backup_path: str, restore_mode: str = "replace") -> bool:
-        """恢复备份"""
+        """恢复备份
+
+        Args:
+            backup_path: 备份目录（或其中的manifest.json），也支持旧版的单文件 .json.gz 备份
+            restore_mode: replace（清空后写入）、merge（按主键覆盖）、skip_existing（跳过已存在主键）
+        """
         try:
             backup_file = Path(backup_path)
+            if backup_file.name == MANIFEST_FILE:
+                backup_file = backup_file.parent
             if not backup_file.exists():
                 raise FileNotFoundError(f"备份文件不存在: {backup_path}")
-            
+            if restore_mode not in ("replace", "merge", "skip_existing"):
+                raise ValueError(f"不支持的恢复模式: {restore_mode}")
+
             logger.info(f"开始恢复备份: {backup_path} (模式: {restore_mode})")
-            
-            # 读取备份文件
-            with gzip.open(backup_file, 'rt', encoding='utf-8') as f:
-                backup_data = json.load(f)
-            
-            metadata = backup_data.get('metadata', {})
-            logger.info(f"备份信息: {metadata}")
-            
-            await Tortoise.init(
-                db_url=settings.DATABASE_URL,
-                modules={'models': ['app.models.api_automation']}
-            )
-            
-            # 根据恢复模式处理数据
-            if restore_mode == "replace":
-                await self._restore_replace_mode(backup_data['data'])
-            elif restore_mode == "merge":
-                await self._restore_merge_mode(backup_data['data'])
-            elif restore_mode == "skip_existing":
-                await self._restore_skip_mode(backup_data['data'])
+
+            if backup_file.is_dir():
+                manifest = self._read_manifest(backup_file)
+                sources = {
+                    table_name: backup_file / info['file']
+                    for table_name, info in manifest.get('tables', {}).items()
+                    if info.get('file') and (backup_file / info['file']).exists()
+                }
             else:
-                raise ValueError(f"不支持的恢复模式: {restore_mode}")
-            
+                manifest, sources = self._load_legacy_backup(backup_file)
+            logger.info(f"备份信息: { {k: v for k, v in manifest.items() if k != 'tables'} }")
+
+            await self._init_db()
+            # 连接是首次使用时才建立的：先建立连接，否则并行恢复的各表事务会各自建立连接，
+            # SQLite下后建立的连接会替换先前的连接，正在进行的事务报 no active connection 并卡住后续事务
+            await connections.get("default").execute_query("SELECT 1")
+
+            models = {
+                table_name: self._get_model_class(table_name)
+                for table_name in sources
+                if self._get_model_class(table_name)
+            }
+            levels = self._dependency_levels(models)
+
+            # 替换模式：先按依赖倒序清空（子表先于父表）
+            if restore_mode == "replace":
+                for level in reversed(levels):
+                    for table_name in level:
+                        await models[table_name].all().delete()
+                        logger.info(f"清空表 {table_name}")
+
+            # 按依赖层级恢复，同一层级内的表并行
+            semaphore = asyncio.Semaphore(self.parallel_tables)
+
+            async def restore_one(table_name: str) -> None:
+                async with semaphore:
+                    try:
+                        await self._restore_table(models[table_name], table_name, sources[table_name],
+                                                  restore_mode)
+                    except Exception as e:
+                        logger.error(f"恢复表 {table_name} 失败: {str(e)}")
+
+            for level in levels:
+                await asyncio.gather(*(restore_one(table_name) for table_name in level))
+
             logger.info("备份恢复完成")
             return True
-            
+
         except Exception as e:
             logger.error(f"恢复备份失败: {str(e)}")
             return False
         finally:
             await Tortoise.close_connections()
-    
-    async def _restore_replace_mode(self, data: Dict[str, List[Dict]]):
-        """替换模式恢复"""
-        for table_name, records in data.items():
-            try:
-                model_class = self._get_model_class(table_name)
-                if model_class and records:
-                    # 清空表
-                    await model_class.all().delete()
-                    logger.info(f"清空表 {table_name}")
-                    
-                    # 插入备份数据
-                    for record in records:
-                        record = self._deserialize_record(record)
-                        await model_class.create(**record)
-                    
-                    logger.info(f"恢复表 {table_name}: {len(records)} 条记录")
-            except Exception as e:
-                logger.error(f"恢复表 {table_name} 失败: {str(e)}")
-    
-    async def _restore_merge_mode(self, data: Dict[str, List[Dict]]):
-        """合并模式恢复"""
-        for table_name, records in data.items():
-            try:
-                model_class = self._get_model_class(table_name)
-                if model_class and records:
-                    for record in records:
-                        record = self._deserialize_record(record)
-                        # 尝试更新或创建
-                        await model_class.update_or_create(
-                            id=record.get('id'),
-                            defaults=record
-                        )
-                    
-                    logger.info(f"合并表 {table_name}: {len(records)} 条记录")
-            except Exception as e:
-                logger.error(f"合并表 {table_name} 失败: {str(e)}")
-    
-    async def _restore_skip_mode(self, data: Dict[str, List[Dict]]):
-        """跳过已存在记录模式恢复"""
-        for table_name, records in data.items():
-            try:
-                model_class = self._get_model_class(table_name)
-                if model_class and records:
-                    created_count = 0
-                    for record in records:
-                        record = self._deserialize_record(record)
-                        # 检查记录是否已存在
-                        existing = await model_class.filter(id=record.get('id')).first()
-                        if not existing:
-                            await model_class.create(**record)
-                            created_count += 1
-                    
-                    logger.info(f"跳过模式恢复表 {table_name}: 新增 {created_count} 条记录")
-            except Exception as e:
-                logger.error(f"跳过模式恢复表 {table_name} 失败: {str(e)}")
-    
+
+    async def _restore_table(self, model_class, table_name: str, source, restore_mode: str) -> int:
+        """逐批读取并批量写入，每批一个事务"""
+        pk = model_class._meta.pk_attr
+        datetime_fields = self._get_datetime_fields(model_class)
+        update_fields = [name for name in model_class._meta.fields_db_projection if name != pk]
+        reader = TableReader(source) if isinstance(source, Path) else None
+        rows = 0
+        offset = 0
+        try:
+            while True:
+                if reader:
+                    records = await reader.read(self.batch_size)
+                else:
+                    records = source[offset:offset + self.batch_size]
+                    offset += len(records)
+                if not records:
+                    break
+
+                objects = [model_class(**self._deserialize_record(record, datetime_fields)) for record in records]
+                async with in_transaction() as connection:
+                    if restore_mode == "merge":
+                        await model_class.bulk_create(objects, on_conflict=[pk], update_fields=update_fields,
+                                                      using_db=connection)
+                    elif restore_mode == "skip_existing":
+                        await model_class.bulk_create(objects, ignore_conflicts=True, using_db=connection)
+                    else:
+                        await model_class.bulk_create(objects, using_db=connection)
+
+                rows += len(records)
+                self._report_progress("restore", table_name, rows)
+        finally:
+            if reader:
+                reader.close()
+
+        logger.info(f"恢复表 {table_name}: {rows} 条记录")
+        return rows
+
+    def _dependency_levels(self, models: Dict[str, Any]) -> List[List[str]]:
+        """按外键依赖把表分层：每一层只依赖前面层级中的表"""
+        table_of = {model: table_name for table_name, model in models.items()}
+        depends_on = {}
+        for table_name, model in models.items():
+            depends_on[table_name] = {
+                table_of[model._meta.fields_map[field].related_model]
+                for field in model._meta.fk_fields
+                if model._meta.fields_map[field].related_model in table_of
+                and table_of[model._meta.fields_map[field].related_model] != table_name
+            }
+
+        levels = []
+        placed = set()
+        remaining = set(models)
+        while remaining:
+            level = sorted(name for name in remaining if depends_on[name] <= placed)
+            if not level:
+                # 循环依赖，剩余的表放在同一层
+                level = sorted(remaining)
+            levels.append(level)
+            placed.update(level)
+            remaining.difference_update(level)
+        return levels
+
+    def _load_legacy_backup(self, backup_file: Path) -> Tuple[Dict[str, Any], Dict[str, List[Dict]]]:
+        """读取旧版单文件备份（整体加载，仅用于兼容）"""
+        with gzip.open(backup_file, 'rt', encoding='utf-8') as f:
+            backup_data = json.load(f)
+        return backup_data.get('metadata', {}), {
+            table_name: records for table_name, records in backup_data.get('data', {}).items() if records
+        }
+
     def _get_model_class(self, table_name: str):
         """根据表名获取模型类"""
         from app.models.api_automation import (
@@ -256,7 +460,7 @@ class BackupRestoreManager:
             TestExecutionSession, TestReport, AgentMetrics, UserSession,
             SystemConfiguration, OperationLog, DependencyRelation
         )
-        
+
         model_mapping = {
             'api_documents': ApiDocument,
             'api_endpoints': ApiEndpoint,
@@ -280,47 +484,61 @@ class BackupRestoreManager:
             'operation_logs': OperationLog,
             'dependency_relations': DependencyRelation
         }
-        
+
         return model_mapping.get(table_name)
-    
-    def _serialize_records(self, records: List[Dict]) -> List[Dict]:
-        """序列化记录"""
-        serialized = []
-        for record in records:
-            serialized_record = {}
-            for key, value in record.items():
-                if isinstance(value, datetime):
-                    serialized_record[key] = value.isoformat()
-                else:
-                    serialized_record[key] = value
-            serialized.append(serialized_record)
-        return serialized
-    
-    def _deserialize_record(self, record: Dict) -> Dict:
-        """反序列化记录"""
-        deserialized = {}
-        for key, value in record.items():
-            if isinstance(value, str) and 'T' in value and value.endswith('Z'):
+
+    def _get_datetime_fields(self, model_class) -> Dict[str, type]:
+        """模型中需要从ISO字符串还原的日期时间字段"""
+        result = {}
+        for name, field in model_class._meta.fields_map.items():
+            if isinstance(field, fields.DatetimeField):
+                result[name] = datetime
+            elif isinstance(field, fields.DateField):
+                result[name] = date
+        return result
+
+    def _deserialize_record(self, record: Dict, datetime_fields: Optional[Dict[str, type]] = None) -> Dict:
+        """反序列化记录：按模型字段类型还原日期时间"""
+        deserialized = dict(record)
+        for key, field_type in (datetime_fields or {}).items():
+            value = deserialized.get(key)
+            if isinstance(value, str):
                 try:
-                    deserialized[key] = datetime.fromisoformat(value.replace('Z', '+00:00'))
-                except:
-                    deserialized[key] = value
-            else:
-                deserialized[key] = value
+                    deserialized[key] = field_type.fromisoformat(value.replace('Z', '+00:00'))
+                except ValueError:
+                    pass
         return deserialized
-    
+
+    # ==================== 备份管理 ====================
+
     async def list_backups(self) -> List[Dict[str, Any]]:
         """列出所有备份"""
         backups = []
-        
+
+        for manifest_file in self.backup_dir.glob(f"*/{MANIFEST_FILE}"):
+            backup_path = manifest_file.parent
+            try:
+                manifest = self._read_manifest(backup_path)
+                file_size = sum(file.stat().st_size for file in backup_path.iterdir())
+                backups.append({
+                    'file_name': backup_path.name,
+                    'file_path': str(backup_path),
+                    'backup_name': manifest.get('backup_name', 'Unknown'),
+                    'backup_time': manifest.get('backup_time', 'Unknown'),
+                    'backup_type': manifest.get('backup_type', 'Unknown'),
+                    'total_rows': sum(info.get('rows', 0) for info in manifest.get('tables', {}).values()),
+                    'file_size': file_size,
+                    'file_size_mb': round(file_size / 1024 / 1024, 2)
+                })
+            except Exception as e:
+                logger.warning(f"读取备份清单 {manifest_file} 失败: {str(e)}")
+
+        # 旧版单文件备份
         for backup_file in self.backup_dir.glob("*.json.gz"):
             try:
-                with gzip.open(backup_file, 'rt', encoding='utf-8') as f:
-                    backup_data = json.load(f)
-                
-                metadata = backup_data.get('metadata', {})
+                metadata, _ = self._load_legacy_backup(backup_file)
                 file_size = backup_file.stat().st_size
-                
+
                 backups.append({
                     'file_name': backup_file.name,
                     'file_path': str(backup_file),
@@ -332,16 +550,20 @@ class BackupRestoreManager:
                 })
             except Exception as e:
                 logger.warning(f"读取备份文件 {backup_file} 失败: {str(e)}")
-        
+
         # 按时间排序
         backups.sort(key=lambda x: x['backup_time'], reverse=True)
         return backups
-    
+
     async def delete_backup(self, backup_path: str) -> bool:
-        """删除备份文件"""
+        """删除备份（备份目录或旧版备份文件）"""
         try:
             backup_file = Path(backup_path)
-            if backup_file.exists():
+            if backup_file.is_dir():
+                shutil.rmtree(backup_file)
+                logger.info(f"删除备份目录: {backup_path}")
+                return True
+            elif backup_file.exists():
                 backup_file.unlink()
                 logger.info(f"删除备份文件: {backup_path}")
                 return True
@@ -355,37 +577,37 @@ class BackupRestoreManager:
 
 if __name__ == "__main__":
     import sys
-    
-    manager = BackupRestoreManager()
-    
+
+    def print_progress(progress: Dict[str, Any]) -> None:
+        total = f"/{progress['total']}" if progress.get('total') is not None else ""
+        print(f"  [{progress['phase']}] {progress['table']}: {progress['rows']}{total}")
+
+    manager = BackupRestoreManager(progress_callback=print_progress)
+
     if len(sys.argv) < 2:
         print("用法: python backup_restore.py <command> [args]")
         print("命令:")
         print("  backup [name]           - 创建完整备份")
-        print("  incremental <since>     - 创建增量备份")
+        print("  incremental [since]     - 创建增量备份（不指定起始时间时从上次备份的水位继续）")
         print("  restore <path> [mode]   - 恢复备份")
         print("  list                    - 列出所有备份")
         print("  delete <path>           - 删除备份")
         sys.exit(1)
-    
+
     command = sys.argv[1]
-    
+
     async def main():
         try:
             if command == "backup":
                 name = sys.argv[2] if len(sys.argv) > 2 else None
                 result = await manager.create_full_backup(name)
                 print(f"备份创建成功: {result}")
-            
+
             elif command == "incremental":
-                if len(sys.argv) < 3:
-                    print("请提供起始时间 (YYYY-MM-DD HH:MM:SS)")
-                    return
-                since_str = sys.argv[2]
-                since = datetime.fromisoformat(since_str)
+                since = datetime.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else None
                 result = await manager.create_incremental_backup(since)
                 print(f"增量备份创建成功: {result}")
-            
+
             elif command == "restore":
                 if len(sys.argv) < 3:
                     print("请提供备份文件路径")
@@ -394,13 +616,13 @@ if __name__ == "__main__":
                 mode = sys.argv[3] if len(sys.argv) > 3 else "replace"
                 result = await manager.restore_backup(backup_path, mode)
                 print(f"备份恢复{'成功' if result else '失败'}")
-            
+
             elif command == "list":
                 backups = await manager.list_backups()
                 print("备份列表:")
                 for backup in backups:
                     print(f"  {backup['backup_name']} - {backup['backup_time']} ({backup['file_size_mb']} MB)")
-            
+
             elif command == "delete":
                 if len(sys.argv) < 3:
                     print("请提供备份文件路径")
@@ -408,12 +630,12 @@ if __name__ == "__main__":
                 backup_path = sys.argv[2]
                 result = await manager.delete_backup(backup_path)
                 print(f"备份删除{'成功' if result else '失败'}")
-            
+
             else:
                 print(f"未知命令: {command}")
-        
+
         except Exception as e:
             logger.error(f"执行命令失败: {str(e)}")
             sys.exit(1)
-    
+
     asyncio.run(main())
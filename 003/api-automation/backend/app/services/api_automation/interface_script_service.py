@@ -9,7 +9,7 @@
 4. 接口测试覆盖率分析
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Optional
 from datetime import datetime, timedelta
 from loguru import logger
 import uuid
@@ -22,9 +22,23 @@ from tortoise.expressions import Q
 
 from app.models.api_automation import (
     ApiInterface, TestScript, ApiDocument,
-    ScriptGenerationTask, WorkflowSession
+    ScriptGenerationTask, WorkflowSession,
+    TestExecution, ScriptExecutionResult
 )
-from app.core.enums import SessionStatus
+from app.core.enums import SessionStatus, ExecutionStatus
+from app.services.api_automation.script_execution_engine import (
+    ScriptExecutionEngine, load_expected_durations, order_longest_first, running_executions
+)
+from app.services.api_automation.pytest_worker_pool import get_pytest_worker_pool
+
+# 服务内部执行状态到执行记录状态的映射
+EXECUTION_STATUS_MAP = {
+    "CREATED": ExecutionStatus.PENDING,
+    "PROCESSING": ExecutionStatus.RUNNING,
+    "COMPLETED": ExecutionStatus.SUCCESS,
+    "FAILED": ExecutionStatus.FAILED,
+    "STOPPED": ExecutionStatus.FAILED,
+}
 
 
 class InterfaceScriptService:
@@ -798,22 +812,45 @@ class InterfaceScriptService:
             raise
 
     async def stop_execution(self, execution_id: str) -> Dict[str, Any]:
-        """停止执行"""
+        """停止执行：不再启动排队中的脚本，并结束正在运行的脚本进程"""
         try:
-            # TODO: 实现真实的执行停止逻辑
+            engine = running_executions.get(execution_id)
+            if not engine:
+                raise ValueError(f"执行不存在或已结束: {execution_id}")
+
             logger.info(f"停止执行: {execution_id}")
+            stop_info = await engine.stop()
 
             return {
                 "execution_id": execution_id,
                 "status": "STOPPED",
                 "message": "执行已停止",
-                "stopped_at": datetime.now()
+                "stopped_at": datetime.now(),
+                **stop_info
             }
 
         except Exception as e:
             logger.error(f"停止执行失败: {e}")
             raise
 
+    def stream_execution_events(self, execution_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """订阅执行事件：每个脚本完成时产出一条结果，整批结束时产出结束事件"""
+        engine = running_executions.get(execution_id)
+        if not engine:
+            raise ValueError(f"执行不存在或已结束: {execution_id}")
+        return self._iter_execution_events(engine)
+
+    async def _iter_execution_events(self, engine: ScriptExecutionEngine) -> AsyncIterator[Dict[str, Any]]:
+        queue = engine.subscribe()
+        try:
+            while True:
+                event = await queue.get()
+                yield event
+                if event["type"] == "execution_finished":
+                    return
+        finally:
+            engine.unsubscribe(queue)
+
     # ==================== 私有辅助方法 ====================
 
     async def _create_execution_record(
@@ -829,8 +866,17 @@ class InterfaceScriptService:
     ) -> Dict[str, Any]:
         """创建执行记录"""
         try:
-            # TODO: 创建真实的执行记录到数据库
-            # 这里暂时只记录日志
+            await TestExecution.create(
+                execution_id=execution_id,
+                session_id=session_id,
+                document=scripts[0].document,
+                execution_config=execution_config or {},
+                environment=environment,
+                parallel=parallel,
+                max_workers=max_workers,
+                status=ExecutionStatus.PENDING,
+                total_tests=len(scripts)
+            )
             logger.info(f"创建执行记录: execution_id={execution_id}, script_count={len(scripts)}")
 
             return {
@@ -881,8 +927,9 @@ class InterfaceScriptService:
             # 生成报告
             await self._generate_execution_report(execution_id, results, analysis)
 
-            # 更新执行状态为完成
-            await self._update_execution_status(execution_id, "COMPLETED")
+            # 更新执行状态为完成（被停止时记为STOPPED）
+            status = "STOPPED" if analysis["stopped_scripts"] else "COMPLETED"
+            await self._update_execution_status(execution_id, status, analysis=analysis)
 
             logger.info(f"脚本执行完成: execution_id={execution_id}")
 
@@ -894,14 +941,34 @@ class InterfaceScriptService:
         self,
         execution_id: str,
         status: str,
-        error_message: str = None
+        error_message: str = None,
+        analysis: Dict[str, Any] = None
     ):
-        """更新执行状态"""
+        """更新执行状态，结束时同时写入结果统计"""
         try:
-            # TODO: 更新真实的执行记录状态
             logger.info(f"更新执行状态: execution_id={execution_id}, status={status}")
+            updates: Dict[str, Any] = {"status": EXECUTION_STATUS_MAP.get(status, ExecutionStatus.RUNNING)}
+            if status == "PROCESSING":
+                updates["start_time"] = datetime.now()
+            elif status in ("COMPLETED", "FAILED", "STOPPED"):
+                updates["end_time"] = datetime.now()
+            if status == "STOPPED":
+                updates["description"] = "执行已停止"
             if error_message:
                 logger.error(f"执行错误: {error_message}")
+                updates["error_details"] = [error_message]
+            if analysis:
+                updates.update(
+                    execution_time=analysis["total_duration"],
+                    total_tests=analysis["total_scripts"],
+                    passed_tests=analysis["passed_scripts"],
+                    failed_tests=analysis["failed_scripts"] + analysis["timeout_scripts"],
+                    skipped_tests=analysis["stopped_scripts"],
+                    error_tests=analysis["error_scripts"],
+                    success_rate=analysis["success_rate"],
+                    summary={key: value for key, value in analysis.items() if key != "analysis_time"}
+                )
+            await TestExecution.filter(execution_id=execution_id).update(**updates)
 
         except Exception as e:
             logger.error(f"更新执行状态失败: {e}")
@@ -937,101 +1004,9 @@ class InterfaceScriptService:
         execution_dir: Path,
         timeout: int
     ) -> List[Dict[str, Any]]:
-        """顺序执行脚本"""
+        """顺序执行脚本（按给定顺序逐个运行）"""
         try:
-            results = []
-
-            for script in scripts:
-                logger.info(f"执行脚本: {script.script_id}")
-
-                script_file = execution_dir / f"{script.script_id}.py"
-
-                # 构建pytest命令
-                cmd = [
-                    "python", "-m", "pytest",
-                    str(script_file),
-                    "-v",
-                    "--tb=short"
-                ]
-
-                start_time = datetime.now()
-
-                try:
-                    # 执行脚本
-                    process = await asyncio.create_subprocess_exec(
-                        *cmd,
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE,
-                        cwd=execution_dir
-                    )
-
-                    stdout, stderr = await asyncio.wait_for(
-                        process.communicate(),
-                        timeout=timeout
-                    )
-
-                    end_time = datetime.now()
-                    duration = (end_time - start_time).total_seconds()
-
-                    # 解析结果
-                    success = process.returncode == 0
-
-                    result = {
-                        "script_id": script.script_id,
-                        "script_name": script.name,
-                        "status": "PASSED" if success else "FAILED",
-                        "start_time": start_time,
-                        "end_time": end_time,
-                        "duration": duration,
-                        "stdout": stdout.decode('utf-8') if stdout else "",
-                        "stderr": stderr.decode('utf-8') if stderr else "",
-                        "return_code": process.returncode
-                    }
-
-                    results.append(result)
-
-                    # 更新脚本执行统计
-                    await self._update_script_execution_stats(script.script_id, success)
-
-                except asyncio.TimeoutError:
-                    end_time = datetime.now()
-                    duration = (end_time - start_time).total_seconds()
-
-                    result = {
-                        "script_id": script.script_id,
-                        "script_name": script.name,
-                        "status": "TIMEOUT",
-                        "start_time": start_time,
-                        "end_time": end_time,
-                        "duration": duration,
-                        "stdout": "",
-                        "stderr": "执行超时",
-                        "return_code": -1
-                    }
-
-                    results.append(result)
-                    await self._update_script_execution_stats(script.script_id, False)
-
-                except Exception as e:
-                    end_time = datetime.now()
-                    duration = (end_time - start_time).total_seconds()
-
-                    result = {
-                        "script_id": script.script_id,
-                        "script_name": script.name,
-                        "status": "ERROR",
-                        "start_time": start_time,
-                        "end_time": end_time,
-                        "duration": duration,
-                        "stdout": "",
-                        "stderr": str(e),
-                        "return_code": -1
-                    }
-
-                    results.append(result)
-                    await self._update_script_execution_stats(script.script_id, False)
-
-            return results
+            return await self._run_execution_engine(execution_id, scripts, execution_dir, timeout, max_workers=1)
 
         except Exception as e:
             logger.error(f"顺序执行脚本失败: {e}")
@@ -1046,19 +1021,85 @@ class InterfaceScriptService:
         timeout: int,
         max_workers: int
     ) -> List[Dict[str, Any]]:
-        """并行执行脚本"""
+        """并行执行脚本：最多max_workers个脚本同时运行，按历史耗时从长到短调度"""
         try:
-            # TODO: 实现真正的并行执行
-            # 暂时使用顺序执行
-            logger.info(f"并行执行功能开发中，暂时使用顺序执行")
-            return await self._execute_scripts_sequential(
-                execution_id, scripts, execution_config, execution_dir, timeout
+            expected_durations = await load_expected_durations(scripts)
+            ordered = order_longest_first(scripts, expected_durations)
+            logger.info(
+                f"并行执行脚本: execution_id={execution_id}, script_count={len(scripts)}, "
+                f"max_workers={max_workers}, with_history={len(expected_durations)}"
             )
+            return await self._run_execution_engine(execution_id, ordered, execution_dir, timeout, max_workers)
 
         except Exception as e:
             logger.error(f"并行执行脚本失败: {e}")
             raise
 
+    async def _run_execution_engine(
+        self,
+        execution_id: str,
+        scripts: List,
+        execution_dir: Path,
+        timeout: int,
+        max_workers: int
+    ) -> List[Dict[str, Any]]:
+        """用执行引擎运行脚本，每个脚本完成后立即写入结果；执行期间可通过stop_execution停止"""
+        execution = await TestExecution.filter(execution_id=execution_id).first()
+        scripts_by_id = {script.script_id: script for script in scripts}
+
+        async def save_result(result: Dict[str, Any]) -> None:
+            await self._save_script_result(execution, scripts_by_id[result["script_id"]], execution_dir, result)
+
+        engine = ScriptExecutionEngine(
+            execution_id=execution_id,
+            execution_dir=execution_dir,
+            max_workers=max_workers,
+            timeout=timeout,
+            on_result=save_result,
+            worker_pool=get_pytest_worker_pool()
+        )
+        running_executions[execution_id] = engine
+        try:
+            return await engine.run(scripts)
+        finally:
+            running_executions.pop(execution_id, None)
+
+    async def _save_script_result(
+        self,
+        execution: Optional[TestExecution],
+        script,
+        execution_dir: Path,
+        result: Dict[str, Any]
+    ):
+        """保存单个脚本的执行结果并更新脚本执行统计"""
+        # 停止时尚未启动的脚本（STOPPED且没有退出码）不计入脚本执行次数
+        if result["status"] != "STOPPED" or result["return_code"] != -1:
+            await self._update_script_execution_stats(script.script_id, result["status"] == "PASSED")
+        if not execution:
+            return
+
+        tests = result["tests"]
+        await ScriptExecutionResult.create(
+            result_id=str(uuid.uuid4()),
+            execution=execution,
+            script=script,
+            script_name=script.name,
+            script_path=str(execution_dir / f"{script.script_id}.py"),
+            start_time=result["start_time"],
+            end_time=result["end_time"],
+            duration=result["duration"],
+            status=result["status"],
+            exit_code=result["return_code"],
+            total_tests=tests["total"],
+            passed_tests=tests["passed"],
+            failed_tests=tests["failed"],
+            skipped_tests=tests["skipped"],
+            error_tests=tests["error"],
+            stdout=result["stdout"],
+            stderr=result["stderr"],
+            error_message=result["stderr"] if result["status"] != "PASSED" else ""
+        )
+
     async def _update_script_execution_stats(self, script_id: str, success: bool):
         """更新脚本执行统计"""
         try:
@@ -1086,6 +1127,7 @@ class InterfaceScriptService:
             failed_scripts = len([r for r in results if r["status"] == "FAILED"])
             timeout_scripts = len([r for r in results if r["status"] == "TIMEOUT"])
             error_scripts = len([r for r in results if r["status"] == "ERROR"])
+            stopped_scripts = len([r for r in results if r["status"] == "STOPPED"])
 
             success_rate = (passed_scripts / total_scripts * 100) if total_scripts > 0 else 0
 
@@ -1099,6 +1141,7 @@ class InterfaceScriptService:
                 "failed_scripts": failed_scripts,
                 "timeout_scripts": timeout_scripts,
                 "error_scripts": error_scripts,
+                "stopped_scripts": stopped_scripts,
                 "success_rate": round(success_rate, 2),
                 "total_duration": round(total_duration, 2),
                 "average_duration": round(avg_duration, 2),
@@ -0,0 +1,187 @@
+"""
+pytest常驻工作进程
+由PytestWorkerPool以脚本方式启动（不导入app包），启动时预先导入pytest、插件和常用依赖，
+之后循环从stdin读取JSON行请求，在进程内用pytest.main执行脚本，并把结果以JSON行写回
+
+协议：
+- 启动完成: {"ready": true, "pid": ..., "preloaded": [...]}
+- 请求: {"id": "...", "args": [...], "cwd": "..."}
+- 响应: {"id": "...", "return_code": 0, "stdout": "...", "tests": {...}, "details": [...],
+         "duration": 1.2, "rss_mb": 85.3}
+
+进程原有的标准输出只用于协议，fd 1/2 重定向到空设备，避免测试直接写fd时破坏协议
+"""
+import io
+import json
+import os
+import sys
+import sysconfig
+import tempfile
+import time
+import traceback
+
+# 单次结果中保留的输出字符数上限（保留末尾）
+MAX_OUTPUT_CHARS = 2_000_000
+
+# 单个测试失败详情保留的字符数
+MAX_LONGREPR_CHARS = 4000
+
+
+class ResultCollector:
+    """收集各测试结果的pytest插件"""
+
+    def __init__(self):
+        self.counts = {"passed": 0, "failed": 0, "skipped": 0, "error": 0}
+        self.details = []
+
+    def _add(self, report, outcome):
+        self.counts[outcome] += 1
+        detail = {"nodeid": report.nodeid, "outcome": outcome, "duration": getattr(report, "duration", 0.0)}
+        if report.failed and report.longrepr is not None:
+            detail["longrepr"] = str(report.longrepr)[-MAX_LONGREPR_CHARS:]
+        self.details.append(detail)
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == "call":
+            if report.passed:
+                self._add(report, "passed")
+            elif report.failed:
+                self._add(report, "failed")
+            else:
+                self._add(report, "skipped")
+        elif report.skipped and report.when == "setup":
+            self._add(report, "skipped")
+        elif report.failed:
+            # setup/teardown失败记为错误
+            self._add(report, "error")
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self._add(report, "error")
+
+    def summary(self):
+        counts = dict(self.counts)
+        counts["total"] = sum(self.counts.values())
+        return counts
+
+
+def _library_paths():
+    paths = {sysconfig.get_paths()[key] for key in ("stdlib", "platstdlib", "purelib", "platlib")}
+    return tuple(os.path.normcase(os.path.abspath(path)) for path in paths if path)
+
+
+LIBRARY_PATHS = _library_paths()
+
+
+def _is_user_module(module) -> bool:
+    """判断模块是否来自被测脚本目录（而不是标准库或已安装的包）"""
+    path = getattr(module, "__file__", None)
+    if not path:
+        return False
+    path = os.path.normcase(os.path.abspath(path))
+    return not path.startswith(LIBRARY_PATHS)
+
+
+def _rss_mb() -> float:
+    """当前进程的常驻内存（MB），无法获取时返回0"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def run_pytest(args, cwd):
+    """在当前进程中运行一次pytest，结束后恢复工作目录、环境变量、sys.path和被测模块"""
+    import pytest
+
+    saved_cwd = os.getcwd()
+    saved_environ = dict(os.environ)
+    saved_path = list(sys.path)
+    saved_modules = set(sys.modules)
+    saved_stdout, saved_stderr = sys.stdout, sys.stderr
+    output = io.StringIO()
+    collector = ResultCollector()
+    started = time.perf_counter()
+    try:
+        os.chdir(cwd or saved_cwd)
+        sys.stdout = sys.stderr = output
+        try:
+            return_code = int(pytest.main(list(args), plugins=[collector]))
+        except SystemExit as e:
+            return_code = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            output.write(traceback.format_exc())
+            return_code = -1
+    finally:
+        sys.stdout, sys.stderr = saved_stdout, saved_stderr
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_environ)
+        sys.path[:] = saved_path
+        # 卸载本次导入的测试模块和conftest，下一次运行同名脚本时重新导入
+        for name in set(sys.modules) - saved_modules:
+            if _is_user_module(sys.modules[name]):
+                del sys.modules[name]
+
+    text = output.getvalue()
+    return {
+        "return_code": return_code,
+        "stdout": text[-MAX_OUTPUT_CHARS:],
+        "tests": collector.summary(),
+        "details": collector.details,
+        "duration": time.perf_counter() - started,
+    }
+
+
+def preload(modules):
+    """导入pytest、常用依赖，并做一次空收集，让插件全部加载"""
+    loaded = []
+    for name in ["pytest"] + list(modules):
+        try:
+            __import__(name)
+            loaded.append(name)
+        except Exception:
+            pass
+    with tempfile.TemporaryDirectory() as empty_dir:
+        run_pytest(["--collect-only", "-q", "-p", "no:cacheprovider", empty_dir], empty_dir)
+    return loaded
+
+
+def main():
+    # 以脚本方式运行时sys.path[0]是本文件所在目录，移除以免其中的模块遮蔽被测脚本的导入
+    if sys.path and os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
+        sys.path.pop(0)
+
+    protocol = os.fdopen(os.dup(1), "w", encoding="utf-8", buffering=1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    loaded = preload([name for name in sys.argv[1:] if name])
+    protocol.write(json.dumps({"ready": True, "pid": os.getpid(), "preloaded": loaded}) + "\n")
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        try:
+            response = run_pytest(request["args"], request.get("cwd"))
+        except Exception:
+            response = {"return_code": -1, "stdout": traceback.format_exc(), "tests": {}, "details": [],
+                        "duration": 0.0}
+        response["id"] = request.get("id")
+        response["rss_mb"] = _rss_mb()
+        protocol.write(json.dumps(response, default=str) + "\n")
+
+
+if __name__ == "__main__":
+    main()
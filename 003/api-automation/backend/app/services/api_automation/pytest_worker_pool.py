@@ -0,0 +1,338 @@
+"""
+pytest常驻工作进程池
+预先启动若干已导入pytest、插件和常用依赖的工作进程（见pytest_worker.py），
+脚本通过管道发送给空闲进程在进程内执行，省去每次执行时启动解释器和导入依赖的开销
+
+核心功能：
+1. 空闲进程队列，run()取一个空闲进程执行并在完成后归还，等待空闲进程的时间不计入超时
+2. 单次执行超时或被取消时结束该进程并补充新进程，仍在等待空闲进程的执行被取消时直接返回
+3. 进程执行次数达到上限或内存超过上限时回收重建，避免测试残留状态和内存增长
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import signal
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from loguru import logger
+
+WORKER_SCRIPT = Path(__file__).with_name("pytest_worker.py")
+
+# 管道单行（一次执行结果）的读取上限
+PROTOCOL_LINE_LIMIT = 32 * 1024 * 1024
+
+# 等待工作进程完成预加载的时长
+WORKER_START_TIMEOUT = 60
+
+
+class PytestWorker:
+    """一个常驻工作进程"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.runs = 0
+        self.rss_mb = 0.0
+        self.cancelled = False
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def kill(self) -> None:
+        if not self.alive:
+            return
+        try:
+            if os.name != "nt":
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except ProcessLookupError:
+            pass
+        await self.process.wait()
+
+
+class PytestWorkerPool:
+    """pytest常驻工作进程池"""
+
+    def __init__(
+        self,
+        size: int = 4,
+        max_runs_per_worker: int = 50,
+        max_memory_mb: float = 512,
+        preload: Optional[List[str]] = None
+    ):
+        """初始化工作进程池
+
+        Args:
+            size: 工作进程数
+            max_runs_per_worker: 单个进程执行多少次后回收重建
+            max_memory_mb: 进程常驻内存超过该值（MB）后回收重建，0表示不限
+            preload: 启动时预先导入的模块
+        """
+        self.size = max(1, size)
+        self.max_runs_per_worker = max_runs_per_worker
+        self.max_memory_mb = max_memory_mb
+        self.preload = preload or []
+        self._idle: "asyncio.Queue[PytestWorker]" = asyncio.Queue()
+        self._busy: Dict[str, PytestWorker] = {}
+        self._waiting: Dict[str, asyncio.Task] = {}  # 等待空闲进程的执行
+        self._tasks: Set[asyncio.Task] = set()  # 后台替换进程的任务
+        self._workers = 0
+        self._ids = itertools.count(1)
+        self._started = False
+        self._start_lock = asyncio.Lock()
+        self._closed = False
+        self.stats = {"runs": 0, "recycled": 0, "timeouts": 0, "cancelled": 0, "crashed": 0}
+
+    @property
+    def available(self) -> bool:
+        """是否还有存活（或正在启动）的工作进程"""
+        return not self._closed and (not self._started or self._workers > 0)
+
+    # ==================== 进程管理 ====================
+
+    async def _spawn(self) -> PytestWorker:
+        kwargs = {"start_new_session": True} if os.name != "nt" else {}
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-u", str(WORKER_SCRIPT), *self.preload,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            limit=PROTOCOL_LINE_LIMIT,
+            **kwargs
+        )
+        worker = PytestWorker(process)
+        try:
+            line = await asyncio.wait_for(process.stdout.readline(), timeout=WORKER_START_TIMEOUT)
+            ready = json.loads(line) if line else {}
+            if not ready.get("ready"):
+                raise RuntimeError("工作进程启动失败")
+        except BaseException:
+            await worker.kill()
+            raise
+        logger.info(f"pytest工作进程已就绪: pid={worker.pid}, preloaded={ready.get('preloaded')}")
+        return worker
+
+    async def _add_worker(self) -> None:
+        """启动一个工作进程并放入空闲队列，失败时减少进程计数"""
+        try:
+            worker = await self._spawn()
+        except Exception as e:
+            self._workers -= 1
+            logger.error(f"启动pytest工作进程失败: {e}")
+            return
+        if self._closed:
+            await worker.kill()
+            return
+        self._idle.put_nowait(worker)
+
+    def _replace(self, worker: PytestWorker) -> None:
+        """结束并替换一个工作进程（在后台完成）"""
+        async def replace():
+            await worker.kill()
+            if not self._closed:
+                await self._add_worker()
+            else:
+                self._workers -= 1
+
+        task = asyncio.create_task(replace())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def start(self) -> None:
+        """启动全部工作进程（首次执行时自动调用）"""
+        async with self._start_lock:
+            if self._started:
+                return
+            self._workers = self.size
+            await asyncio.gather(*(self._add_worker() for _ in range(self.size)))
+            self._started = True
+            if self._workers == 0:
+                raise RuntimeError("pytest工作进程池启动失败")
+
+    async def shutdown(self) -> None:
+        """结束全部工作进程"""
+        self._closed = True
+        waiting = list(self._waiting.values())
+        self._waiting.clear()
+        for getter in waiting:
+            getter.cancel()
+        workers = list(self._busy.values())
+        while not self._idle.empty():
+            workers.append(self._idle.get_nowait())
+        await asyncio.gather(*(worker.kill() for worker in workers), return_exceptions=True)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._busy.clear()
+        self._workers = 0
+
+    # ==================== 执行 ====================
+
+    async def run(
+        self,
+        args: List[str],
+        cwd: str,
+        timeout: Optional[float] = None,
+        run_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """在空闲工作进程中执行一次pytest
+
+        Args:
+            args: pytest参数（不含 python -m pytest）
+            cwd: 工作目录
+            timeout: 超时时间（秒），从取得空闲进程开始计算
+            run_id: 执行标识，用于cancel()
+
+        Returns:
+            Dict[str, Any]: return_code、stdout、tests（计数）、details、duration，
+            wait_time为等待空闲进程的时间（秒）；超时时timed_out为True，
+            被取消或进程异常退出时cancelled/crashed为True
+        """
+        if not self._started:
+            await self.start()
+        if not self.available:
+            raise RuntimeError("pytest工作进程池不可用")
+
+        run_id = run_id or f"run-{next(self._ids)}"
+        loop = asyncio.get_running_loop()
+        wait_started = loop.time()
+        worker = await self._acquire(run_id)
+        wait_time = loop.time() - wait_started
+        if worker is None:
+            self.stats["cancelled"] += 1
+            return self._failure("执行已停止", cancelled=True, wait_time=wait_time)
+
+        result = await self._execute(worker, args, cwd, timeout, run_id)
+        result["wait_time"] = wait_time
+        return result
+
+    async def _acquire(self, run_id: str) -> Optional[PytestWorker]:
+        """等待一个存活的空闲进程，等待期间被cancel()时返回None"""
+        while True:
+            if self._closed:
+                raise RuntimeError("pytest工作进程池已关闭")
+            getter = asyncio.ensure_future(self._idle.get())
+            self._waiting[run_id] = getter
+            try:
+                worker = await getter
+            except asyncio.CancelledError:
+                # cancel()和shutdown()会先移除等待记录；记录还在说明是调用方自身被取消
+                if self._waiting.pop(run_id, None) is getter:
+                    raise
+                return None
+            if self._waiting.pop(run_id, None) is not getter:
+                # 取得进程的同时被cancel()
+                self._idle.put_nowait(worker)
+                return None
+            if worker.alive:
+                return worker
+            self._replace(worker)
+
+    async def _execute(
+        self,
+        worker: PytestWorker,
+        args: List[str],
+        cwd: str,
+        timeout: Optional[float],
+        run_id: str
+    ) -> Dict[str, Any]:
+        self._busy[run_id] = worker
+        request = json.dumps({"id": run_id, "args": list(args), "cwd": cwd}) + "\n"
+        try:
+            worker.process.stdin.write(request.encode("utf-8"))
+            await worker.process.stdin.drain()
+            line = await asyncio.wait_for(worker.process.stdout.readline(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self._busy.pop(run_id, None)
+            self._replace(worker)
+            return self._failure("执行超时", timed_out=True)
+        except (BrokenPipeError, ConnectionResetError):
+            # 进程在写入请求前已退出
+            line = b""
+        except (asyncio.CancelledError, Exception):
+            self._busy.pop(run_id, None)
+            self._replace(worker)
+            raise
+
+        self._busy.pop(run_id, None)
+        if not line:
+            # 进程被cancel()结束或异常退出
+            cancelled = worker.cancelled
+            self.stats["cancelled" if cancelled else "crashed"] += 1
+            self._replace(worker)
+            return self._failure("执行已停止" if cancelled else "工作进程异常退出",
+                                 cancelled=cancelled, crashed=not cancelled)
+
+        result = json.loads(line)
+        worker.runs += 1
+        worker.rss_mb = result.get("rss_mb", 0.0)
+        self.stats["runs"] += 1
+        if worker.runs >= self.max_runs_per_worker or \
+                (self.max_memory_mb and worker.rss_mb > self.max_memory_mb):
+            self.stats["recycled"] += 1
+            logger.info(f"回收pytest工作进程: pid={worker.pid}, runs={worker.runs}, rss={worker.rss_mb:.1f}MB")
+            self._replace(worker)
+        else:
+            self._idle.put_nowait(worker)
+        return result
+
+    async def cancel(self, run_id: str) -> bool:
+        """取消run_id：仍在等待空闲进程时直接返回，正在执行时结束其工作进程，run()随即返回cancelled结果"""
+        getter = self._waiting.pop(run_id, None)
+        if getter is not None:
+            getter.cancel()
+            return True
+        worker = self._busy.get(run_id)
+        if not worker:
+            return False
+        worker.cancelled = True
+        await worker.kill()
+        return True
+
+    @staticmethod
+    def _failure(message: str, **flags) -> Dict[str, Any]:
+        return {
+            "return_code": -1,
+            "stdout": "",
+            "stderr": message,
+            "tests": {},
+            "details": [],
+            "duration": 0.0,
+            **flags
+        }
+
+
+_pool: Optional[PytestWorkerPool] = None
+
+
+def get_pytest_worker_pool() -> Optional[PytestWorkerPool]:
+    """获取全局pytest工作进程池，未启用或已不可用时返回None（调用方回退为独立子进程执行）"""
+    global _pool
+    from app.settings.config import settings
+
+    if not settings.PYTEST_WORKER_POOL_ENABLED:
+        return None
+    if _pool is None:
+        _pool = PytestWorkerPool(
+            size=settings.PYTEST_WORKER_POOL_SIZE,
+            max_runs_per_worker=settings.PYTEST_WORKER_MAX_RUNS,
+            max_memory_mb=settings.PYTEST_WORKER_MAX_MEMORY_MB,
+            preload=settings.PYTEST_WORKER_PRELOAD
+        )
+    return _pool if _pool.available else None
+
+
+async def shutdown_pytest_worker_pool() -> None:
+    """结束全局pytest工作进程池"""
+    global _pool
+    if _pool is not None:
+        await _pool.shutdown()
+        _pool = None
@@ -0,0 +1,373 @@
+"""
+脚本并行执行引擎
+为InterfaceScriptService提供有界并发的pytest脚本执行
+
+核心功能：
+1. 按max_workers限制同时运行的pytest进程数，使用工作进程池时不超过池的进程数
+2. 按历史平均耗时从长到短调度，缩短整批脚本的总耗时
+3. 每个脚本独立超时，超时或停止时结束整个进程组
+4. 启用pytest工作进程池时在常驻进程中执行，省去每个脚本的解释器启动和导入开销
+5. 每个脚本完成后立即回调（写库），并推送给订阅者（执行事件流）
+"""
+
+import asyncio
+import os
+import re
+import signal
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+from tortoise.functions import Avg
+
+from app.models.api_automation import ScriptExecutionResult
+from app.services.api_automation.pytest_worker_pool import PytestWorkerPool
+
+# pytest结果汇总行中的计数，如 "3 passed, 1 failed, 2 skipped in 0.52s"
+PYTEST_SUMMARY_PATTERN = re.compile(r"(\d+) (passed|failed|skipped|error|errors|xfailed|xpassed)\b")
+
+# 停止进程时先发SIGTERM，等待该时长后仍未退出则SIGKILL
+KILL_GRACE_SECONDS = 3.0
+
+ResultCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def parse_pytest_summary(output: str) -> Dict[str, int]:
+    """从pytest输出的最后一个汇总行解析测试计数"""
+    counts = {"passed": 0, "failed": 0, "skipped": 0, "error": 0}
+    for line in reversed(output.splitlines()):
+        matches = PYTEST_SUMMARY_PATTERN.findall(line)
+        if matches:
+            for number, outcome in matches:
+                key = {"errors": "error", "xfailed": "skipped", "xpassed": "passed"}.get(outcome, outcome)
+                counts[key] += int(number)
+            break
+    counts["total"] = sum(counts.values())
+    return counts
+
+
+async def load_expected_durations(scripts: List) -> Dict[str, float]:
+    """按脚本查询历史平均执行时长（秒），没有历史记录的脚本不出现在结果中"""
+    if not scripts:
+        return {}
+    pk_to_script_id = {script.id: script.script_id for script in scripts}
+    rows = await ScriptExecutionResult.filter(
+        script_id__in=list(pk_to_script_id),
+        status__in=["PASSED", "FAILED"],
+    ).annotate(avg_duration=Avg("duration")).group_by("script_id").values("script_id", "avg_duration")
+    return {
+        pk_to_script_id[row["script_id"]]: float(row["avg_duration"] or 0.0)
+        for row in rows
+        if row["script_id"] in pk_to_script_id
+    }
+
+
+def order_longest_first(scripts: List, expected_durations: Dict[str, float]) -> List:
+    """按预计耗时从长到短排序（LPT调度），没有历史的脚本按已知耗时的平均值估计"""
+    if not expected_durations:
+        return list(scripts)
+    default = sum(expected_durations.values()) / len(expected_durations)
+    return sorted(scripts, key=lambda script: expected_durations.get(script.script_id, default), reverse=True)
+
+
+class ScriptExecutionEngine:
+    """一次批量执行的调度器
+
+    固定数量的工作协程从按预计耗时排好序的队列中取脚本，每个脚本在工作进程池或独立的pytest子进程中运行；
+    stop()会清空队列并结束所有正在运行的进程
+    """
+
+    def __init__(
+        self,
+        execution_id: str,
+        execution_dir: Path,
+        max_workers: int = 1,
+        timeout: int = 300,
+        on_result: Optional[ResultCallback] = None,
+        worker_pool: Optional[PytestWorkerPool] = None
+    ):
+        self.execution_id = execution_id
+        self.execution_dir = execution_dir
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.on_result = on_result
+        self.worker_pool = worker_pool
+        self.results: List[Dict[str, Any]] = []
+        self.total = 0
+        self.stopped = False
+        self._queue: "asyncio.Queue" = asyncio.Queue()
+        self._processes: Dict[str, asyncio.subprocess.Process] = {}
+        self._pool_runs: Dict[str, str] = {}
+        self._subscribers: List[asyncio.Queue] = []
+
+    # ==================== 调度 ====================
+
+    async def run(self, scripts: List) -> List[Dict[str, Any]]:
+        """执行全部脚本，返回按完成顺序排列的结果"""
+        self.total = len(scripts)
+        for script in scripts:
+            self._queue.put_nowait(script)
+
+        workers = [
+            asyncio.create_task(self._worker(index))
+            for index in range(min(self._concurrency(), len(scripts)))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await self._kill_all()
+
+        # 停止时仍在队列中的脚本记为已停止
+        while not self._queue.empty():
+            await self._finish(self._stopped_result(self._queue.get_nowait()))
+
+        self._publish({
+            "type": "execution_finished",
+            "execution_id": self.execution_id,
+            "stopped": self.stopped,
+            "completed": len(self.results),
+            "total": self.total
+        })
+        return self.results
+
+    def _concurrency(self) -> int:
+        """同时执行的脚本数：使用工作进程池时不超过池的进程数，多出的脚本留在本引擎的队列中按LPT顺序等待"""
+        pool = self.worker_pool
+        if pool is not None and pool.available and pool.size < self.max_workers:
+            logger.info(f"并发数受pytest工作进程池限制: max_workers={self.max_workers}, "
+                        f"pool_size={pool.size}")
+            return pool.size
+        return self.max_workers
+
+    async def _worker(self, index: int) -> None:
+        while not self.stopped:
+            try:
+                script = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            result = await self._run_script(script)
+            await self._finish(result)
+
+    async def _finish(self, result: Dict[str, Any]) -> None:
+        self.results.append(result)
+        if self.on_result:
+            try:
+                await self.on_result(result)
+            except Exception as e:
+                logger.error(f"保存脚本执行结果失败: script_id={result['script_id']}, error={e}")
+        self._publish({
+            "type": "script_finished",
+            "execution_id": self.execution_id,
+            "completed": len(self.results),
+            "total": self.total,
+            "result": {key: value for key, value in result.items() if key not in ("stdout", "stderr")}
+        })
+
+    # ==================== 单个脚本 ====================
+
+    def _script_timeout(self, script) -> float:
+        script_timeout = getattr(script, "timeout", None) or self.timeout
+        return min(script_timeout, self.timeout) if self.timeout else script_timeout
+
+    def _build_command(self, script_file: Path) -> List[str]:
+        return [sys.executable, "-m", "pytest", str(script_file), "-v", "--tb=short"]
+
+    async def _run_script(self, script) -> Dict[str, Any]:
+        if self.worker_pool is not None and self.worker_pool.available:
+            try:
+                return await self._run_script_in_pool(script)
+            except RuntimeError as e:
+                logger.warning(f"pytest工作进程池不可用，改用独立进程执行: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 工作进程通信失败只影响当前脚本
+                logger.error(f"工作进程池执行脚本失败: script_id={script.script_id}, error={e}")
+                return self._empty_result(script, "ERROR", str(e))
+        return await self._run_script_in_process(script)
+
+    async def _run_script_in_pool(self, script) -> Dict[str, Any]:
+        script_file = self.execution_dir / f"{script.script_id}.py"
+        run_id = f"{self.execution_id}:{script.script_id}"
+        start_time = datetime.now()
+        logger.info(f"执行脚本（工作进程池）: {script.script_id}")
+
+        self._pool_runs[script.script_id] = run_id
+        try:
+            result = await self.worker_pool.run(
+                [str(script_file), "-v", "--tb=short"],
+                cwd=str(self.execution_dir),
+                timeout=self._script_timeout(script),
+                run_id=run_id
+            )
+        finally:
+            self._pool_runs.pop(script.script_id, None)
+
+        return_code = result.get("return_code", -1)
+        if result.get("timed_out"):
+            status = "TIMEOUT"
+        elif result.get("cancelled") or (self.stopped and return_code != 0):
+            status = "STOPPED"
+        elif result.get("crashed"):
+            status = "ERROR"
+        else:
+            status = "PASSED" if return_code == 0 else "FAILED"
+
+        tests = result.get("tests") or parse_pytest_summary(result.get("stdout", ""))
+        end_time = datetime.now()
+        # 等待空闲工作进程的时间不计入脚本耗时（耗时历史用于LPT调度）
+        start_time = min(end_time, start_time + timedelta(seconds=result.get("wait_time", 0.0)))
+        return {
+            "script_id": script.script_id,
+            "script_name": script.name,
+            "status": status,
+            "start_time": start_time,
+            "end_time": end_time,
+            "duration": (end_time - start_time).total_seconds(),
+            "stdout": result.get("stdout", ""),
+            "stderr": result.get("stderr", ""),
+            "return_code": return_code,
+            "tests": tests
+        }
+
+    async def _run_script_in_process(self, script) -> Dict[str, Any]:
+        script_file = self.execution_dir / f"{script.script_id}.py"
+        start_time = datetime.now()
+        logger.info(f"执行脚本: {script.script_id}")
+
+        status = "ERROR"
+        stdout = stderr = ""
+        return_code = -1
+        try:
+            # 独立进程组，超时或停止时连同pytest派生的子进程一起结束
+            kwargs = {"start_new_session": True} if os.name != "nt" else {}
+            process = await asyncio.create_subprocess_exec(
+                *self._build_command(script_file),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=self.execution_dir,
+                **kwargs
+            )
+            self._processes[script.script_id] = process
+            try:
+                out, err = await asyncio.wait_for(process.communicate(), timeout=self._script_timeout(script))
+                stdout = out.decode("utf-8", errors="replace") if out else ""
+                stderr = err.decode("utf-8", errors="replace") if err else ""
+                return_code = process.returncode
+                if self.stopped and return_code != 0:
+                    status = "STOPPED"
+                else:
+                    status = "PASSED" if return_code == 0 else "FAILED"
+            except asyncio.TimeoutError:
+                await self._kill(process)
+                status, stderr = "TIMEOUT", "执行超时"
+            finally:
+                self._processes.pop(script.script_id, None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stderr = str(e)
+
+        end_time = datetime.now()
+        return {
+            "script_id": script.script_id,
+            "script_name": script.name,
+            "status": status,
+            "start_time": start_time,
+            "end_time": end_time,
+            "duration": (end_time - start_time).total_seconds(),
+            "stdout": stdout,
+            "stderr": stderr,
+            "return_code": return_code,
+            "tests": parse_pytest_summary(stdout)
+        }
+
+    def _stopped_result(self, script) -> Dict[str, Any]:
+        return self._empty_result(script, "STOPPED", "执行已停止")
+
+    def _empty_result(self, script, status: str, message: str) -> Dict[str, Any]:
+        now = datetime.now()
+        return {
+            "script_id": script.script_id,
+            "script_name": script.name,
+            "status": status,
+            "start_time": now,
+            "end_time": now,
+            "duration": 0.0,
+            "stdout": "",
+            "stderr": message,
+            "return_code": -1,
+            "tests": parse_pytest_summary("")
+        }
+
+    # ==================== 停止 ====================
+
+    async def _kill(self, process: asyncio.subprocess.Process) -> None:
+        """结束进程（POSIX下结束整个进程组），等待其退出"""
+        if process.returncode is not None:
+            return
+        try:
+            if os.name != "nt":
+                os.killpg(process.pid, signal.SIGTERM)
+            else:
+                process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=KILL_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                if os.name != "nt":
+                    os.killpg(process.pid, signal.SIGKILL)
+                else:
+                    process.kill()
+                await process.wait()
+        except ProcessLookupError:
+            pass
+
+    async def _kill_all(self) -> None:
+        await asyncio.gather(*(self._kill(process) for process in list(self._processes.values())),
+                             return_exceptions=True)
+
+    async def stop(self) -> Dict[str, Any]:
+        """停止执行：不再启动新脚本，并结束所有正在运行的脚本进程"""
+        self.stopped = True
+        running = list(self._processes) + list(self._pool_runs)
+        await self._kill_all()
+        if self.worker_pool is not None:
+            await asyncio.gather(*(self.worker_pool.cancel(run_id) for run_id in list(self._pool_runs.values())),
+                                 return_exceptions=True)
+        logger.info(f"已停止执行: execution_id={self.execution_id}, killed={running}")
+        return {
+            "killed_scripts": running,
+            "completed": len(self.results),
+            "pending": self._queue.qsize(),
+            "total": self.total
+        }
+
+    # ==================== 事件订阅 ====================
+
+    def subscribe(self) -> asyncio.Queue:
+        """订阅执行事件，已完成脚本的结果会先补发"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for result in self.results:
+            queue.put_nowait({
+                "type": "script_finished",
+                "execution_id": self.execution_id,
+                "result": {key: value for key, value in result.items() if key not in ("stdout", "stderr")}
+            })
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        if queue in self._subscribers:
+            self._subscribers.remove(queue)
+
+    def _publish(self, event: Dict[str, Any]) -> None:
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+
+# 进行中的执行：execution_id -> 执行引擎，用于停止和订阅事件
+running_executions: Dict[str, ScriptExecutionEngine] = {}
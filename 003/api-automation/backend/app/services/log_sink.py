@@ -0,0 +1,247 @@
+"""
+智能体日志批量写入管道
+LogRecorderAgent只把日志放入有界内存队列，由后台协程批量写入数据库和日志文件
+
+核心功能：
+1. 有界队列，写满时丢弃新日志并计数，记录日志永远不会阻塞调用方
+2. 每累计batch_size条或每隔flush_interval_ms毫秒用bulk_create批量写入AgentLog，批量写入失败时逐条重试
+3. 长期打开的带缓冲文件句柄，全局日志按天切换文件，会话日志句柄按最近使用保留
+4. 统计入队、写入、丢弃、写库失败数量和刷新延迟
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TextIO
+
+from loguru import logger
+
+from app.models.api_automation import AgentLog
+
+# 同时保持打开的会话日志文件数，超过后关闭最久未写入的文件
+MAX_OPEN_SESSION_FILES = 64
+
+# 文件写缓冲区大小
+FILE_BUFFER_SIZE = 64 * 1024
+
+
+class AgentLogSink:
+    """智能体日志批量写入管道"""
+
+    def __init__(
+        self,
+        logs_dir: Path,
+        max_queue_size: int = 10000,
+        batch_size: int = 200,
+        flush_interval_ms: int = 500
+    ):
+        """初始化日志管道
+
+        Args:
+            logs_dir: 日志文件目录
+            max_queue_size: 队列容量，写满后丢弃新日志
+            batch_size: 单批写入的最大条数
+            flush_interval_ms: 队列未满一批时的最长等待时间（毫秒）
+        """
+        self.logs_dir = Path(logs_dir)
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(1, flush_interval_ms) / 1000
+        self._queue: "asyncio.Queue" = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._global_file: Optional[TextIO] = None
+        self._global_date: Optional[str] = None
+        self._session_files: "OrderedDict[str, TextIO]" = OrderedDict()
+        self.metrics = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "db_failed": 0,
+            "file_failed": 0,
+            "batches": 0,
+            "last_flush_lag_ms": 0.0,
+            "max_flush_lag_ms": 0.0
+        }
+
+    # ==================== 入队 ====================
+
+    def put(self, record: Dict[str, Any]) -> bool:
+        """放入一条日志，队列已满时丢弃并返回False
+
+        record包含AgentLog的字段（log_id、session_id、agent_type、message、operation_data等），
+        以及写入文件的file_entry
+        """
+        if self._closed:
+            self.metrics["dropped"] += 1
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((time.monotonic(), record))
+        except asyncio.QueueFull:
+            self.metrics["dropped"] += 1
+            return False
+        self.metrics["enqueued"] += 1
+        return True
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    # ==================== 后台刷新 ====================
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: List[tuple]) -> None:
+        records = [record for _, record in batch]
+
+        fields = [{key: value for key, value in record.items() if key != "file_entry"} for record in records]
+        try:
+            await AgentLog.bulk_create([AgentLog(**row) for row in fields])
+            self.metrics["written"] += len(records)
+        except Exception as e:
+            logger.warning(f"批量保存智能体日志失败，改为逐条保存: count={len(records)}, error={e}")
+            await self._save_one_by_one(fields)
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_files, records)
+        except Exception as e:
+            self.metrics["file_failed"] += len(records)
+            logger.error(f"写入日志文件失败: {e}")
+
+        lag_ms = (time.monotonic() - batch[0][0]) * 1000
+        self.metrics["batches"] += 1
+        self.metrics["last_flush_lag_ms"] = round(lag_ms, 2)
+        self.metrics["max_flush_lag_ms"] = round(max(self.metrics["max_flush_lag_ms"], lag_ms), 2)
+
+    async def _save_one_by_one(self, fields: List[Dict[str, Any]]) -> None:
+        """批量写入失败时逐条保存，只丢弃确实无法保存的日志"""
+        for row in fields:
+            try:
+                await AgentLog.create(**row)
+                self.metrics["written"] += 1
+            except Exception as e:
+                self.metrics["db_failed"] += 1
+                logger.error(f"保存智能体日志失败: log_id={row.get('log_id')}, error={e}")
+
+    # ==================== 文件 ====================
+
+    def _write_files(self, records: List[Dict[str, Any]]) -> None:
+        """写入会话日志和当天的全局日志（在线程池中执行，文件句柄只在此处使用）"""
+        global_file = self._get_global_file()
+        touched = set()
+        for record in records:
+            line = json.dumps(record["file_entry"], ensure_ascii=False, default=str) + "\n"
+            global_file.write(line)
+            session_file = self._get_session_file(record["session_id"])
+            session_file.write(line)
+            touched.add(record["session_id"])
+        global_file.flush()
+        for session_id in touched:
+            handle = self._session_files.get(session_id)
+            if handle:
+                handle.flush()
+
+    def _get_global_file(self) -> TextIO:
+        today = datetime.now().strftime('%Y-%m-%d')
+        if self._global_date != today:
+            if self._global_file:
+                self._global_file.close()
+            self._global_file = open(self.logs_dir / f"api_automation_{today}.log", 'a',
+                                     encoding='utf-8', buffering=FILE_BUFFER_SIZE)
+            self._global_date = today
+        return self._global_file
+
+    def _get_session_file(self, session_id: str) -> TextIO:
+        handle = self._session_files.get(session_id)
+        if handle is not None:
+            self._session_files.move_to_end(session_id)
+            return handle
+        if len(self._session_files) >= MAX_OPEN_SESSION_FILES:
+            _, oldest = self._session_files.popitem(last=False)
+            oldest.close()
+        handle = open(self.logs_dir / f"session_{session_id}.log", 'a',
+                      encoding='utf-8', buffering=FILE_BUFFER_SIZE)
+        self._session_files[session_id] = handle
+        return handle
+
+    def _close_files(self) -> None:
+        if self._global_file:
+            self._global_file.close()
+            self._global_file = None
+            self._global_date = None
+        for handle in self._session_files.values():
+            handle.close()
+        self._session_files.clear()
+
+    # ==================== 生命周期与统计 ====================
+
+    async def close(self) -> None:
+        """停止接收日志，等待后台协程写完队列中剩余的日志后关闭文件"""
+        self._closed = True
+        if self._task is not None and not self._task.done():
+            # 结束标记排在已入队日志之后，后台协程写完它们后退出
+            await self._queue.put(None)
+            await self._task
+        self._task = None
+        self._close_files()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """管道统计：入队/写入/丢弃/失败数量、队列长度和刷新延迟"""
+        return {
+            **self.metrics,
+            "queue_size": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "open_session_files": len(self._session_files)
+        }
+
+
+_sink: Optional[AgentLogSink] = None
+
+
+def get_agent_log_sink(logs_dir: Optional[Path] = None) -> AgentLogSink:
+    """获取全局日志管道（首次调用时按配置创建）"""
+    global _sink
+    if _sink is None:
+        from app.settings.config import settings
+
+        _sink = AgentLogSink(
+            logs_dir=logs_dir or Path("./logs"),
+            max_queue_size=settings.AGENT_LOG_QUEUE_SIZE,
+            batch_size=settings.AGENT_LOG_BATCH_SIZE,
+            flush_interval_ms=settings.AGENT_LOG_FLUSH_INTERVAL_MS
+        )
+    return _sink
+
+
+async def close_agent_log_sink() -> None:
+    """关闭全局日志管道，写完剩余日志"""
+    global _sink
+    if _sink is not None:
+        await _sink.close()
+        _sink = None
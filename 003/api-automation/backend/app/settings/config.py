@@ -90,5 +90,23 @@ class Settings(BaseSettings):
     }
     DATETIME_FORMAT: str = "%Y-%m-%d %H:%M:%S"
 
+    # pytest常驻工作进程池：关闭时每个脚本在独立的 python -m pytest 子进程中执行
+    PYTEST_WORKER_POOL_ENABLED: bool = True
+    PYTEST_WORKER_POOL_SIZE: int = 4
+    # 单个工作进程执行多少次后回收重建
+    PYTEST_WORKER_MAX_RUNS: int = 50
+    # 工作进程常驻内存超过该值（MB）后回收重建，0表示不限
+    PYTEST_WORKER_MAX_MEMORY_MB: int = 512
+    # 工作进程启动时预先导入的模块（生成的测试脚本常用的依赖）
+    PYTEST_WORKER_PRELOAD: typing.List[str] = ["requests", "httpx", "json", "allure"]
+
+    # 智能体日志批量写入：队列容量（写满后丢弃新日志）、单批条数和最长等待时间
+    AGENT_LOG_QUEUE_SIZE: int = 10000
+    AGENT_LOG_BATCH_SIZE: int = 200
+    AGENT_LOG_FLUSH_INTERVAL_MS: int = 500
+    # 日志记录智能体内存中每个会话保留的日志条数和缓存的会话数
+    AGENT_LOG_SESSION_CACHE_SIZE: int = 500
+    AGENT_LOG_MAX_CACHED_SESSIONS: int = 200
+
 
 settings = Settings()
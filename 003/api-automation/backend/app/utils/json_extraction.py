@@ -0,0 +1,299 @@
+"""
+大模型响应中的JSON对象提取
+单次扫描找出文本中所有顶层的平衡JSON对象，并支持在流式输出过程中增量解析
+
+扫描只在 { } " \\ 四种字符处停下（用正则跳过其余字符），对象外的文字不参与字符串状态，
+对象内按JSON规则处理字符串和转义。对象都能解析时整段文本只扫描一遍；
+顶层 { 之后的第一个非空白字符不是 " 或 } 时（如说明文字里多出的 { ），立即放弃它，从下一个 { 开始；
+某个对象解析失败或没有闭合时，从它之后的下一个 { 重新扫描
+"""
+import json
+import re
+from bisect import bisect_right
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# 扫描时需要处理的字符
+SPECIAL_CHARS = re.compile(r'[{}"\\]')
+
+# 检查JSON前缀时需要处理的字符
+BRACKET_CHARS = re.compile(r'[{}\[\]"\\]')
+
+# (对象, 起始位置, 长度)
+FoundObject = Tuple[Dict[str, Any], int, int]
+
+
+class JsonObjectScanner:
+    """增量的平衡JSON对象扫描器
+
+    feed()接收文本片段，返回本次新闭合的顶层对象的 (起始位置, 结束位置)，位置相对于全部已输入文本
+    """
+
+    def __init__(self, item_depth: Optional[int] = None):
+        """
+        Args:
+            item_depth: 同时记录在该嵌套深度闭合的对象位置（通过pop_items()取出），1为顶层
+        """
+        self.offset = 0  # 已输入文本的长度
+        self.item_depth = item_depth
+        self._items: List[Tuple[int, int, int]] = []
+        self._stack: List[int] = []  # 未闭合对象的起始位置
+        self._in_string = False
+        self._skip_pos = -1  # 转义符之后被跳过的位置
+        self._opening = False  # 顶层对象刚开始，还没有遇到第一个非空白字符
+
+    @property
+    def pending_start(self) -> Optional[int]:
+        """最外层未闭合对象的起始位置"""
+        return self._stack[0] if self._stack else None
+
+    def feed(self, chunk: str, pos: int = 0, first_only: bool = False) -> List[Tuple[int, int]]:
+        """扫描片段（从pos开始），first_only为True时在第一个顶层对象闭合后立即返回"""
+        completed: List[Tuple[int, int]] = []
+        base = self.offset
+        stack = self._stack
+        gap_start = pos  # 顶层 { 之后待检查是否为空白的文本起点
+        for match in SPECIAL_CHARS.finditer(chunk, pos):
+            position = base + match.start()
+            if position == self._skip_pos:
+                continue
+            char = match.group()
+            if self._opening:
+                # 不可能是JSON的顶层对象不再作为根，之后的 { 重新作为顶层对象，嵌套深度从真正的根开始计算
+                self._opening = False
+                if char not in '"}' or chunk[gap_start:match.start()].strip():
+                    stack.clear()
+            if not stack:
+                # 对象外只关心对象的开始
+                if char == '{':
+                    stack.append(position)
+                    self._opening = True
+                    gap_start = match.end()
+                continue
+            if self._in_string:
+                if char == '\\':
+                    self._skip_pos = position + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                stack.append(position)
+            elif char == '}':
+                start = stack.pop()
+                if len(stack) + 1 == self.item_depth:
+                    self._items.append((stack[0] if stack else start, start, position))
+                if not stack:
+                    completed.append((start, position))
+                    if first_only:
+                        break
+        if self._opening and chunk[gap_start:].strip():
+            self._opening = False
+            stack.clear()
+        self.offset = base + len(chunk)
+        return completed
+
+    def pop_items(self) -> List[Tuple[int, int, int]]:
+        """取出上次调用后在item_depth闭合的对象的 (所在顶层对象的起始位置, 起始位置, 结束位置)"""
+        items, self._items = self._items, []
+        return items
+
+
+def _loads_object(text: str) -> Optional[Dict[str, Any]]:
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) and parsed else None
+
+
+def _is_json_prefix(text: str) -> bool:
+    """text（以 { 开始）是否是某个JSON对象在值的位置之前的前缀"""
+    closers: List[str] = []
+    in_string = False
+    skip_pos = -1
+    for match in BRACKET_CHARS.finditer(text):
+        position = match.start()
+        if position == skip_pos:
+            continue
+        char = match.group()
+        if in_string:
+            if char == '\\':
+                skip_pos = position + 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            closers.append('}' if char == '{' else ']')
+        elif not closers or closers.pop() != char:
+            return False
+    if in_string:
+        return False
+    try:
+        json.loads(text + "null" + "".join(reversed(closers)))
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+def find_json_objects(content: str) -> List[FoundObject]:
+    """找出文本中所有可解析的非空顶层JSON对象，返回 (对象, 起始位置, 长度) 列表"""
+    results: List[FoundObject] = []
+    pos = content.find('{')
+    while pos != -1:
+        completed = JsonObjectScanner().feed(content, pos, first_only=True)
+        if completed:
+            start, end = completed[0]
+            parsed = _loads_object(content[start:end + 1])
+            if parsed is not None:
+                results.append((parsed, start, end - start + 1))
+                pos = content.find('{', end + 1)
+                continue
+        # 解析失败或没有闭合：从下一个 { 重新扫描，对象内部的子对象仍能被找到
+        pos = content.find('{', pos + 1)
+    return results
+
+
+def select_best_json_object(
+    objects: List[FoundObject],
+    preferred_key: str = "test_cases"
+) -> Optional[FoundObject]:
+    """优先选择包含preferred_key的对象（也查找嵌套在对象中的，取最外层的），其次选择最大的对象"""
+    if not objects:
+        return None
+    preferred = [obj for obj in objects if preferred_key in obj[0]]
+    if preferred:
+        return max(preferred, key=lambda obj: obj[2])
+    for parsed, start, size in sorted(objects, key=lambda obj: obj[2], reverse=True):
+        nested = _find_nested_object(parsed, preferred_key)
+        if nested is not None:
+            return nested, start, size
+    return max(objects, key=lambda obj: obj[2])
+
+
+def _find_nested_object(value: Any, key: str) -> Optional[Dict[str, Any]]:
+    """按层次遍历，返回最外层包含key的嵌套对象"""
+    queue = deque([value])
+    while queue:
+        current = queue.popleft()
+        if isinstance(current, dict):
+            if key in current:
+                return current
+            queue.extend(current.values())
+        elif isinstance(current, list):
+            queue.extend(current)
+    return None
+
+
+class IncrementalJsonParser:
+    """流式输出的增量JSON解析
+
+    每收到一个片段调用feed()，返回该片段中新闭合的顶层JSON对象；
+    根对象内直接嵌套的对象（如 {"test_cases": [{...}, {...}]} 中的每个用例）闭合时放入items，
+    可以在根对象结束前开始处理。根对象到第一个嵌套对象之前的部分不是合法JSON时（如说明文字里多出的 { ），
+    它不是真正的根，其中的对象留到根对象结束或finish()时重新确定根后再取出。只保留当前未闭合对象的文本片段
+    """
+
+    def __init__(self):
+        self._scanner = JsonObjectScanner(item_depth=2)
+        self._chunks: List[str] = []
+        self._chunk_starts: List[int] = []  # 每个片段在全部文本中的起始位置
+        self._item_spans: Set[Tuple[int, int]] = set()  # 已取出的嵌套对象位置
+        self._checked_root: Tuple[int, bool] = (-1, False)  # 最近检查的根对象起始位置，及其是否为合法JSON的开头
+        self.objects: List[Dict[str, Any]] = []
+        self.items: List[Dict[str, Any]] = []
+
+    def _get_text(self, start: int, end: Optional[int] = None) -> str:
+        if end is None:
+            end = self._scanner.offset - 1
+        first = bisect_right(self._chunk_starts, start) - 1
+        last = bisect_right(self._chunk_starts, end) - 1
+        text = "".join(self._chunks[first:last + 1])
+        base = self._chunk_starts[first]
+        return text[start - base:end - base + 1]
+
+    def _add_item(self, start: int, end: int, text: str) -> None:
+        if (start, end) in self._item_spans:
+            return
+        item = _loads_object(text)
+        if item is not None:
+            self._item_spans.add((start, end))
+            self.items.append(item)
+
+    def _find_inner_objects(self, text: str, start: int) -> List[Dict[str, Any]]:
+        """外层对象（从start开始的text）解析失败或没有闭合时，查找其中的对象，
+        并以找到的对象为根重新取出直接嵌套的对象"""
+        objects = []
+        is_root = None
+        for parsed, inner_start, size in find_json_objects(text[1:]):
+            objects.append(parsed)
+            item_base = start + 1 + inner_start
+            if (item_base, item_base + size - 1) in self._item_spans:
+                if is_root is None:
+                    # 已经作为嵌套对象取出：外层之前的部分是合法JSON时外层就是真正的根（如输出被截断），
+                    # 否则外层是说明文字里多出的 { ，找到的对象才是根
+                    is_root = _is_json_prefix(text[:1 + inner_start])
+                if is_root:
+                    continue
+            scanner = JsonObjectScanner(item_depth=2)
+            scanner.feed(text[1 + inner_start:1 + inner_start + size])
+            for _, item_start, item_end in scanner.pop_items():
+                self._add_item(item_base + item_start, item_base + item_end,
+                               text[1 + inner_start + item_start:1 + inner_start + item_end + 1])
+        return objects
+
+    def _parse(self, start: int, end: int) -> List[Dict[str, Any]]:
+        text = self._get_text(start, end)
+        parsed = _loads_object(text)
+        if parsed is not None:
+            return [parsed]
+        # 整体解析失败时退回到其中的对象
+        return self._find_inner_objects(text, start)
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        if not chunk:
+            return []
+        self._chunk_starts.append(self._scanner.offset)
+        self._chunks.append(chunk)
+        spans = self._scanner.feed(chunk)
+
+        for root_start, start, end in self._scanner.pop_items():
+            if self._checked_root[0] != root_start:
+                self._checked_root = (root_start, _is_json_prefix(self._get_text(root_start, start - 1)))
+            if self._checked_root[1]:
+                self._add_item(start, end, self._get_text(start, end))
+
+        new_objects = []
+        for start, end in spans:
+            new_objects.extend(self._parse(start, end))
+        self.objects.extend(new_objects)
+
+        # 丢弃未闭合对象之前的片段
+        keep_from = self._scanner.pending_start
+        if keep_from is None:
+            self._chunks, self._chunk_starts = [], []
+            self._item_spans.clear()
+        else:
+            drop = bisect_right(self._chunk_starts, keep_from) - 1
+            if drop > 0:
+                del self._chunks[:drop]
+                del self._chunk_starts[:drop]
+        return new_objects
+
+    def pop_items(self) -> List[Dict[str, Any]]:
+        """取出上次调用后新闭合的根对象内直接嵌套的对象"""
+        items, self.items = self.items, []
+        return items
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """流结束：在未闭合的外层对象（如输出被截断）中查找完整的对象，并取出其中直接嵌套的对象"""
+        new_objects = []
+        pending_start = self._scanner.pending_start
+        if pending_start is not None:
+            new_objects = self._find_inner_objects(self._get_text(pending_start), pending_start)
+        self.objects.extend(new_objects)
+        self._chunks, self._chunk_starts = [], []
+        self._item_spans.clear()
+        self._scanner = JsonObjectScanner(item_depth=2)
+        return new_objects
@@ -0,0 +1,151 @@
+# 大模型响应JSON提取微基准
+#
+# 生成包含N个测试用例的合成响应（前后有说明文字，字符串中含花括号和转义引号），
+# 比较旧的逐个 { 起点扫描的提取实现和单次扫描实现的耗时，
+# 并按固定大小切片模拟流式输出，记录增量解析的总耗时和得到首个用例时已输出的比例
+#
+# 用法: python -m benchmarks.bench_json_extraction --cases 50 500 5000
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, Optional
+
+from app.utils.json_extraction import IncrementalJsonParser, find_json_objects, select_best_json_object
+
+STREAM_CHUNK_SIZE = 24
+# 旧实现为O(n²)，超过该用例数时跳过
+LEGACY_CASES_LIMIT = 500
+
+
+def build_response(case_count: int, seed: int = 42) -> str:
+    """生成合成的测试用例生成响应"""
+    rng = random.Random(seed)
+    test_cases = []
+    for index in range(case_count):
+        test_cases.append({
+            "case_id": f"TC_{index:05d}",
+            "name": f"验证接口 /api/v1/resource/{{id}} 场景 {index}",
+            "description": 'body 中的 "name" 字段为 {"nested": true} 时应返回 400 \\ 并提示错误',
+            "request": {
+                "method": rng.choice(["GET", "POST", "PUT", "DELETE"]),
+                "path": f"/api/v1/resource/{index}",
+                "headers": {"Content-Type": "application/json", "X-Trace": f"{{trace-{index}}}"},
+                "body": {"id": index, "tags": [rng.randint(0, 100) for _ in range(5)], "meta": {"a": {"b": {}}}},
+            },
+            "assertions": [
+                {"type": "status_code", "expected": rng.choice([200, 201, 400, 404])},
+                {"type": "json_path", "path": "$.data.id", "expected": index},
+            ],
+        })
+    payload = json.dumps({"test_cases": test_cases, "summary": {"total": case_count}}, ensure_ascii=False, indent=2)
+    return (
+        "好的，下面是根据接口文档生成的测试用例 {以JSON格式输出}：\n\n"
+        f"{payload}\n\n"
+        "说明：示例对象 {\"example\": 1} 仅用于参考，占位符 {id} 需替换为实际值。"
+    )
+
+
+def legacy_extract(content: str) -> Optional[Dict[str, Any]]:
+    """重构前的提取实现：对每个 { 起点单独扫描到平衡位置并解析"""
+    def balanced(start_pos: int) -> Optional[str]:
+        brace_count = 0
+        in_string = False
+        escape_next = False
+        for i in range(start_pos, len(content)):
+            char = content[i]
+            if escape_next:
+                escape_next = False
+                continue
+            if char == '\\':
+                escape_next = True
+                continue
+            if char == '"':
+                in_string = not in_string
+                continue
+            if not in_string:
+                if char == '{':
+                    brace_count += 1
+                elif char == '}':
+                    brace_count -= 1
+                    if brace_count == 0:
+                        return content[start_pos:i + 1].strip()
+        return None
+
+    candidates = []
+    for start_pos in [i for i, char in enumerate(content) if char == '{']:
+        json_str = balanced(start_pos)
+        if json_str:
+            try:
+                parsed = json.loads(json_str)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(parsed, dict) and parsed:
+                candidates.append((parsed, len(json_str)))
+    if not candidates:
+        return None
+    preferred = [c for c in candidates if 'test_cases' in c[0]]
+    return max(preferred or candidates, key=lambda c: c[1])[0]
+
+
+def run(case_count: int) -> Dict[str, Any]:
+    content = build_response(case_count)
+
+    started = time.perf_counter()
+    best = select_best_json_object(find_json_objects(content))
+    single_pass_ms = (time.perf_counter() - started) * 1000
+    result = best[0] if best else None
+
+    legacy_ms = None
+    if case_count <= LEGACY_CASES_LIMIT:
+        started = time.perf_counter()
+        legacy = legacy_extract(content)
+        legacy_ms = (time.perf_counter() - started) * 1000
+        if legacy != result:
+            raise AssertionError(f"extraction mismatch at {case_count} cases")
+
+    parser = IncrementalJsonParser()
+    first_item_at = None
+    item_count = 0
+    started = time.perf_counter()
+    for offset in range(0, len(content), STREAM_CHUNK_SIZE):
+        parser.feed(content[offset:offset + STREAM_CHUNK_SIZE])
+        items = parser.pop_items()
+        if items and first_item_at is None:
+            first_item_at = offset + STREAM_CHUNK_SIZE
+        item_count += len(items)
+    parser.finish()
+    stream_ms = (time.perf_counter() - started) * 1000
+    streamed = select_best_json_object([(obj, 0, len(json.dumps(obj))) for obj in parser.objects])
+    if not streamed or streamed[0] != result:
+        raise AssertionError(f"streaming mismatch at {case_count} cases")
+    if item_count != case_count + 1:  # 每个用例和summary
+        raise AssertionError(f"streamed item count mismatch at {case_count} cases: {item_count}")
+
+    return {
+        "cases": case_count,
+        "kb": len(content.encode("utf-8")) / 1024,
+        "single_pass_ms": single_pass_ms,
+        "legacy_ms": legacy_ms,
+        "stream_ms": stream_ms,
+        "first_item_pct": 100 * first_item_at / len(content) if first_item_at else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="大模型响应JSON提取微基准")
+    parser.add_argument("--cases", type=int, nargs="+", default=[50, 500, 5000])
+    args = parser.parse_args()
+
+    print(f"{'cases':>6} {'KB':>8} {'single ms':>10} {'legacy ms':>10} {'stream ms':>10} {'first item %':>13}")
+    for case_count in args.cases:
+        row = run(case_count)
+        legacy_ms = f"{row['legacy_ms']:10.1f}" if row["legacy_ms"] is not None else f"{'skipped':>10}"
+        first = f"{row['first_item_pct']:13.2f}" if row["first_item_pct"] is not None else f"{'-':>13}"
+        print(f"{row['cases']:6d} {row['kb']:8.1f} {row['single_pass_ms']:10.1f} {legacy_ms} "
+              f"{row['stream_ms']:10.1f} {first}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import asyncio
+import gzip
+import json
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from tortoise import Tortoise
+
+from app.database.backup_restore import MANIFEST_FILE, BackupRestoreManager
+from app.models.api_automation import AgentLog, ApiDocument, ApiEndpoint
+
+BASE_TIME = datetime(2025, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+class TestBackupRestore(unittest.TestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.workdir = Path(workdir.name)
+        self.db_url = f"sqlite://{self.workdir / 'db.sqlite3'}"
+        self.progress = []
+
+    def make_manager(self, batch_size=2):
+        manager = BackupRestoreManager(batch_size=batch_size, progress_callback=self.progress.append)
+        manager.backup_dir = self.workdir / "backups"
+        manager.backup_dir.mkdir(exist_ok=True)
+
+        async def init_db():
+            await Tortoise.init(db_url=self.db_url, modules={"models": ["app.models.api_automation"]})
+
+        manager._init_db = init_db
+        return manager
+
+    def run_db(self, coroutine_function):
+        async def run():
+            await Tortoise.init(db_url=self.db_url, modules={"models": ["app.models.api_automation"]})
+            try:
+                return await coroutine_function()
+            finally:
+                await Tortoise.close_connections()
+
+        return asyncio.run(run())
+
+    async def seed(self):
+        await Tortoise.generate_schemas()
+        for index in range(3):
+            document = await ApiDocument.create(
+                doc_id=f"doc-{index}", session_id="s", file_name=f"{index}.json", file_path="/tmp",
+                doc_format="openapi", api_info={"title": f"api {index}"}, tags=["a", "b"],
+            )
+            for number in range(2):
+                await ApiEndpoint.create(endpoint_id=f"ep-{index}-{number}", document=document,
+                                         path=f"/items/{number}", method="GET")
+        for index in range(5):
+            await self.add_log(index)
+
+    @staticmethod
+    async def add_log(index):
+        log = await AgentLog.create(
+            log_id=f"log-{index}", session_id="s", agent_type="test_executor", agent_name="executor",
+            log_level="INFO", message=f"message {index}", operation_data={"index": index},
+            timestamp=BASE_TIME + timedelta(minutes=index),
+        )
+        # created_at是增量备份的水位列，固定为可预期的时间（update不做时区转换，需传入带时区的时间）
+        await AgentLog.filter(id=log.id).update(created_at=BASE_TIME + timedelta(minutes=index))
+
+    @staticmethod
+    async def snapshot():
+        return {
+            "documents": await ApiDocument.all().order_by("id").values("id", "doc_id", "api_info", "tags"),
+            "endpoints": await ApiEndpoint.all().order_by("id").values("id", "endpoint_id", "document_id"),
+            "logs": await AgentLog.all().order_by("id").values("id", "log_id", "operation_data", "timestamp"),
+        }
+
+    def test_full_backup_round_trip(self):
+        before = self.run_db(lambda: self._seed_and_snapshot())
+        manager = self.make_manager()
+
+        backup_path = Path(asyncio.run(manager.create_full_backup("full")))
+
+        with open(backup_path / MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest["tables"]["api_endpoints"]["rows"], 6)
+        with gzip.open(backup_path / "agent_logs.ndjson.gz", "rt", encoding="utf-8") as f:
+            self.assertEqual(len(f.read().splitlines()), 5)
+
+        async def wipe():
+            await ApiEndpoint.all().delete()
+            await ApiDocument.all().delete()
+            await AgentLog.all().delete()
+
+        self.run_db(wipe)
+        self.assertTrue(asyncio.run(manager.restore_backup(str(backup_path))))
+        self.assertEqual(self.run_db(self.snapshot), before)
+
+        # merge覆盖已有主键，skip_existing保留现有数据
+        self.run_db(lambda: AgentLog.filter(log_id="log-0").update(message="changed"))
+        self.assertTrue(asyncio.run(manager.restore_backup(str(backup_path), restore_mode="skip_existing")))
+        self.assertEqual(self.run_db(lambda: AgentLog.get(log_id="log-0").values_list("message", flat=True)),
+                         "changed")
+        self.assertTrue(asyncio.run(manager.restore_backup(str(backup_path), restore_mode="merge")))
+        self.assertEqual(self.run_db(self.snapshot), before)
+        self.assertIn({"phase": "restore", "table": "api_endpoints", "rows": 6, "total": None}, self.progress)
+
+    async def _seed_and_snapshot(self):
+        await self.seed()
+        return await self.snapshot()
+
+    def test_incremental_backup_resumes_from_manifest_watermark(self):
+        self.run_db(self.seed)
+        manager = self.make_manager()
+        full_path = Path(asyncio.run(manager.create_full_backup("full")))
+        with open(full_path / MANIFEST_FILE, encoding="utf-8") as f:
+            watermark = json.load(f)["tables"]["agent_logs"]["watermark"]
+        self.assertEqual(datetime.fromisoformat(watermark), BASE_TIME + timedelta(minutes=4))
+
+        async def add_logs():
+            for index in range(5, 8):
+                await self.add_log(index)
+
+        self.run_db(add_logs)
+        incremental_path = Path(asyncio.run(manager.create_incremental_backup(backup_name="incremental")))
+
+        with open(incremental_path / MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+        with gzip.open(incremental_path / "agent_logs.ndjson.gz", "rt", encoding="utf-8") as f:
+            log_ids = [json.loads(line)["log_id"] for line in f]
+        # 水位是包含边界的（>=），上次备份的最后一条会再出现一次
+        self.assertEqual(log_ids, ["log-4", "log-5", "log-6", "log-7"])
+        self.assertEqual(manifest["backup_type"], "incremental")
+        self.assertEqual(datetime.fromisoformat(manifest["tables"]["agent_logs"]["watermark"]),
+                         BASE_TIME + timedelta(minutes=7))
+        # 没有新数据的表只有水位上的那一条
+        self.assertEqual(manifest["tables"]["api_documents"]["rows"], 1)
+
+    def test_incremental_backup_without_watermark_requires_since(self):
+        manager = self.make_manager()
+        with self.assertRaises(ValueError):
+            asyncio.run(manager.create_incremental_backup())
+
+
+if __name__ == "__main__":
+    unittest.main()
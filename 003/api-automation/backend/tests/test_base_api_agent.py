@@ -0,0 +1,101 @@
+import asyncio
+import json
+import unittest
+
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import ModelClientStreamingChunkEvent, TextMessage
+
+from app.agents.api_automation.base_api_agent import BaseApiAutomationAgent
+from app.agents.api_automation.schemas import ParsedApiInfo, ParsedEndpoint
+from app.agents.api_automation import test_case_generator_agent
+
+
+class FakeAssistant:
+    def __init__(self, text, chunk_size=7):
+        self.text = text
+        self.chunk_size = chunk_size
+
+    async def run_stream(self, task):
+        for index in range(0, len(self.text), self.chunk_size):
+            yield ModelClientStreamingChunkEvent(content=self.text[index:index + self.chunk_size], source="assistant")
+        yield TaskResult(messages=[TextMessage(content=self.text, source="assistant")])
+
+
+def make_agent(agent_class, text):
+    agent = agent_class.__new__(agent_class)
+    agent.assistant_agent = FakeAssistant(text)
+    agent._assistant_creation_pending = False
+    agent.responses = []
+
+    async def send_response(content, *args, **kwargs):
+        agent.responses.append(content)
+
+    agent.send_response = send_response
+    return agent
+
+
+def case_data(endpoint_id, name):
+    return {"endpoint_id": endpoint_id, "test_name": name, "test_type": "positive", "description": name}
+
+
+class TestRunAssistantAgentStream(unittest.TestCase):
+    def test_items_behind_stray_brace_are_delivered_after_stream_ends(self):
+        cases = [{"id": 1}, {"id": 2}]
+        text = 'Result: {"summary": "ok", then ' + json.dumps({"test_cases": cases})
+        agent = make_agent(BaseApiAutomationAgent, text)
+        items, objects = [], []
+
+        async def on_json_item(item):
+            items.append(item)
+
+        async def on_json_object(obj):
+            objects.append(obj)
+
+        result = asyncio.run(agent._run_assistant_agent(
+            "task", stream=True, on_json_object=on_json_object, on_json_item=on_json_item
+        ))
+
+        self.assertEqual(result, text)
+        self.assertEqual("".join(agent.responses), text)
+        self.assertEqual(items, cases)
+        self.assertEqual(objects, [{"test_cases": cases}])
+
+    def test_item_callback_alone_still_drains_finish(self):
+        text = 'Result: {"summary": "ok", then {"test_cases": [{"id": 1}]}'
+        agent = make_agent(BaseApiAutomationAgent, text)
+        items = []
+
+        async def on_json_item(item):
+            items.append(item)
+
+        asyncio.run(agent._run_assistant_agent("task", stream=True, on_json_item=on_json_item))
+
+        self.assertEqual(items, [{"id": 1}])
+
+
+class TestTestCaseGeneratorStreaming(unittest.TestCase):
+    def setUp(self):
+        self.api_info = ParsedApiInfo(title="demo", version="1.0", base_url="http://localhost")
+        self.endpoints = [ParsedEndpoint(endpoint_id="ep-1", path="/users", method="GET")]
+
+    def generate(self, text):
+        agent = make_agent(test_case_generator_agent.TestCaseGeneratorAgent, text)
+        return asyncio.run(agent._intelligent_generate_test_cases(self.api_info, self.endpoints, [], []))
+
+    def test_cases_are_built_from_streamed_items(self):
+        cases = [case_data("ep-1", "查询用户"), case_data("ep-unknown", "未知端点"), case_data("ep-1", "分页")]
+        parsed, test_cases = self.generate(json.dumps({"test_cases": cases}, ensure_ascii=False))
+
+        self.assertEqual(len(parsed["test_cases"]), 3)
+        self.assertEqual([case.test_name for case in test_cases], ["查询用户", "分页"])
+
+    def test_streamed_cases_survive_invalid_full_response(self):
+        cases = [case_data("ep-1", "查询用户")]
+        text = 'Result: {"summary": "ok", then ' + json.dumps({"test_cases": cases}, ensure_ascii=False)
+        _, test_cases = self.generate(text)
+
+        self.assertEqual([case.test_name for case in test_cases], ["查询用户"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import unittest
+
+from app.utils.json_extraction import IncrementalJsonParser, find_json_objects
+
+TEST_CASES = [
+    {
+        "case_id": "TC_001",
+        "name": "路径 /users/{id} 中的 } 和 {",
+        "description": 'body 为 {"name": "a\\"b"} 时返回 400 \\ 并提示 "错误"',
+        "request": {"headers": {"X-Trace": "{trace}"}, "body": {"tags": [{"k": "}"}]}},
+    },
+    {
+        "case_id": "TC_002",
+        "name": "转义的反斜杠结尾 \\",
+        "steps": [{"step": 1, "expect": {"status": 200}}],
+    },
+]
+ROOT = {"test_cases": TEST_CASES, "summary": {"total": 2}}
+DOCUMENT = json.dumps(ROOT, ensure_ascii=False, indent=2)
+
+
+def stream(text, chunk_size):
+    parser = IncrementalJsonParser()
+    objects = []
+    for index in range(0, len(text), chunk_size):
+        objects.extend(parser.feed(text[index:index + chunk_size]))
+    return parser, objects
+
+
+class TestIncrementalJsonParser(unittest.TestCase):
+    def test_nested_and_escaped_json_split_across_chunks(self):
+        text = f"以下是生成的测试用例：\n```json\n{DOCUMENT}\n```\n以上用例覆盖了 {{id}} 参数。"
+        for chunk_size in (1, 2, 3, 5, 8, 24, len(text)):
+            with self.subTest(chunk_size=chunk_size):
+                parser, objects = stream(text, chunk_size)
+                self.assertEqual(objects, [ROOT])
+                self.assertEqual(parser.pop_items(), TEST_CASES + [ROOT["summary"]])
+                self.assertEqual(parser.finish(), [])
+
+    def test_items_are_available_before_root_closes(self):
+        parser = IncrementalJsonParser()
+        first_case_end = DOCUMENT.index('"case_id": "TC_002"')
+        parser.feed(DOCUMENT[:first_case_end])
+        self.assertEqual(parser.pop_items(), TEST_CASES[:1])
+        self.assertEqual(parser.objects, [])
+
+    def test_stray_brace_in_prose_before_json(self):
+        text = f"注意：参数格式为 {{ 这里少了右括号\n{DOCUMENT}\n"
+        for chunk_size in (1, 7, 24):
+            with self.subTest(chunk_size=chunk_size):
+                parser, objects = stream(text, chunk_size)
+                # 用例在根对象闭合前就以真正的根对象计算深度取出
+                self.assertEqual(parser.pop_items(), TEST_CASES + [ROOT["summary"]])
+                self.assertEqual(objects, [ROOT])
+                self.assertEqual(parser.finish(), [])
+        self.assertEqual([obj for obj, _, _ in find_json_objects(text)], [ROOT])
+
+    def test_enclosing_candidate_fails_to_parse(self):
+        text = '{"说明": 见下方 ' + DOCUMENT + " }"
+        parser, objects = stream(text, 16)
+        self.assertEqual(objects, [ROOT])
+        self.assertEqual(parser.pop_items()[-3:], TEST_CASES + [ROOT["summary"]])
+
+    def test_enclosing_candidate_never_closes(self):
+        text = '{"说明": 见下方\n' + DOCUMENT
+        parser, objects = stream(text, 16)
+        self.assertEqual(objects, [])
+        self.assertEqual(parser.finish(), [ROOT])
+        self.assertEqual(parser.pop_items()[-3:], TEST_CASES + [ROOT["summary"]])
+        self.assertEqual(parser.objects, [ROOT])
+
+    def test_truncated_root_keeps_items_at_root_depth(self):
+        truncated = DOCUMENT[:DOCUMENT.index('"summary"')]
+        parser, objects = stream(truncated, 16)
+        self.assertEqual(objects, [])
+        self.assertEqual(parser.pop_items(), TEST_CASES)
+        self.assertEqual(parser.finish(), TEST_CASES)
+        self.assertEqual(parser.pop_items(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
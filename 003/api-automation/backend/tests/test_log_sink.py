@@ -0,0 +1,107 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import uuid
+from datetime import datetime
+
+from tortoise import Tortoise
+
+from app.models.api_automation import AgentLog
+from app.services.log_sink import AgentLogSink
+
+
+def make_record(session_id="s1", message="hello", log_id=None):
+    log_id = log_id or str(uuid.uuid4())
+    return {
+        "log_id": log_id,
+        "session_id": session_id,
+        "agent_type": "test_executor",
+        "agent_name": "test_executor",
+        "log_level": "INFO",
+        "message": message,
+        "operation_data": {},
+        "tags": [],
+        "timestamp": datetime.utcnow(),
+        "file_entry": {"log_id": log_id, "message": message},
+    }
+
+
+class TestAgentLogSink(unittest.TestCase):
+    def setUp(self):
+        self.logs_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.logs_dir.cleanup)
+
+    def run_with_db(self, scenario):
+        async def run():
+            await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+            await Tortoise.generate_schemas()
+            try:
+                return await scenario()
+            finally:
+                await Tortoise.close_connections()
+
+        return asyncio.run(run())
+
+    def test_records_are_flushed_in_batches(self):
+        async def scenario():
+            sink = AgentLogSink(self.logs_dir.name, batch_size=3, flush_interval_ms=60000)
+            for index in range(7):
+                sink.put(make_record(session_id=f"s{index % 2}", message=f"m{index}"))
+            await sink.close()
+            return sink.get_stats(), await AgentLog.all().count()
+
+        stats, saved = self.run_with_db(scenario)
+
+        self.assertEqual(saved, 7)
+        self.assertEqual(stats["written"], 7)
+        self.assertEqual(stats["batches"], 3)  # 3 + 3 + 1
+        self.assertEqual(stats["queue_size"], 0)
+        with open(os.path.join(self.logs_dir.name, "session_s0.log"), encoding="utf-8") as f:
+            self.assertEqual(len(f.read().splitlines()), 4)
+
+    def test_partial_interval_batch_is_flushed(self):
+        async def scenario():
+            sink = AgentLogSink(self.logs_dir.name, batch_size=100, flush_interval_ms=50)
+            sink.put(make_record())
+            await asyncio.sleep(0.5)
+            count = await AgentLog.all().count()
+            await sink.close()
+            return count
+
+        self.assertEqual(self.run_with_db(scenario), 1)
+
+    def test_full_queue_and_closed_sink_drop_records(self):
+        async def scenario():
+            sink = AgentLogSink(self.logs_dir.name, max_queue_size=2, batch_size=10, flush_interval_ms=10)
+            accepted = [sink.put(make_record()) for _ in range(5)]
+            await sink.close()
+            accepted.append(sink.put(make_record()))
+            return accepted, sink.get_stats()
+
+        accepted, stats = self.run_with_db(scenario)
+
+        self.assertEqual(accepted, [True, True, False, False, False, False])
+        self.assertEqual(stats["enqueued"], 2)
+        self.assertEqual(stats["dropped"], 4)
+        self.assertEqual(stats["written"], 2)
+
+    def test_only_the_failing_row_is_lost_when_the_batch_insert_fails(self):
+        async def scenario():
+            sink = AgentLogSink(self.logs_dir.name, batch_size=10, flush_interval_ms=60000)
+            duplicate = str(uuid.uuid4())
+            for log_id in (None, duplicate, None, duplicate, None):
+                sink.put(make_record(log_id=log_id))
+            await sink.close()
+            return sink.get_stats(), await AgentLog.all().count()
+
+        stats, saved = self.run_with_db(scenario)
+
+        self.assertEqual(saved, 4)
+        self.assertEqual(stats["written"], 4)
+        self.assertEqual(stats["db_failed"], 1)
+        self.assertEqual(stats["file_failed"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
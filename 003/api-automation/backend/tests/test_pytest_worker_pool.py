@@ -0,0 +1,114 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from app.services.api_automation.pytest_worker_pool import PytestWorkerPool
+
+
+def write_script(directory, name, body):
+    path = os.path.join(directory, f"{name}.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(body)
+    return path
+
+
+SLEEP_TEST = "import time\n\ndef test_sleep():\n    time.sleep({seconds})\n"
+CRASH_TEST = "import os\n\ndef test_crash():\n    os._exit(3)\n"
+PID_TEST = "import os\n\ndef test_pid():\n    with open('pids.txt', 'a') as f:\n        f.write(f'{os.getpid()}\\n')\n"
+
+
+class TestPytestWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+
+    def run_with_pool(self, scenario, **kwargs):
+        async def run():
+            pool = PytestWorkerPool(**kwargs)
+            try:
+                return pool, await scenario(pool)
+            finally:
+                await pool.shutdown()
+
+        return asyncio.run(run())
+
+    def test_worker_is_recycled_after_max_runs(self):
+        script = write_script(self.workdir.name, "test_pid", PID_TEST)
+
+        async def scenario(pool):
+            return [await pool.run([script], cwd=self.workdir.name, timeout=30) for _ in range(3)]
+
+        pool, results = self.run_with_pool(scenario, size=1, max_runs_per_worker=2)
+
+        self.assertEqual([result["return_code"] for result in results], [0, 0, 0])
+        with open(os.path.join(self.workdir.name, "pids.txt"), encoding="utf-8") as f:
+            pids = f.read().split()
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertEqual(pool.stats["recycled"], 1)
+
+    def test_crashed_worker_is_reported_and_replaced(self):
+        crash = write_script(self.workdir.name, "test_crash", CRASH_TEST)
+        ok = write_script(self.workdir.name, "test_ok", SLEEP_TEST.format(seconds=0))
+
+        async def scenario(pool):
+            return await pool.run([crash], cwd=self.workdir.name, timeout=30), \
+                await pool.run([ok], cwd=self.workdir.name, timeout=30)
+
+        pool, (crashed, after) = self.run_with_pool(scenario, size=1)
+
+        self.assertTrue(crashed["crashed"])
+        self.assertEqual(crashed["return_code"], -1)
+        self.assertEqual(after["return_code"], 0)
+        self.assertEqual(pool.stats["crashed"], 1)
+
+    def test_waiting_for_a_worker_does_not_count_against_the_timeout(self):
+        script = write_script(self.workdir.name, "test_sleep", SLEEP_TEST.format(seconds=0.5))
+
+        async def scenario(pool):
+            await pool.start()
+            return await asyncio.gather(*(pool.run([script], cwd=self.workdir.name, timeout=2) for _ in range(4)))
+
+        pool, results = self.run_with_pool(scenario, size=1)
+
+        self.assertEqual([result["return_code"] for result in results], [0, 0, 0, 0])
+        self.assertFalse(any(result.get("timed_out") for result in results))
+        self.assertGreater(max(result["wait_time"] for result in results), 1.0)
+
+    def test_running_script_times_out(self):
+        script = write_script(self.workdir.name, "test_slow", SLEEP_TEST.format(seconds=30))
+
+        async def scenario(pool):
+            started = time.monotonic()
+            result = await pool.run([script], cwd=self.workdir.name, timeout=0.5)
+            return result, time.monotonic() - started
+
+        pool, (result, elapsed) = self.run_with_pool(scenario, size=1)
+
+        self.assertTrue(result["timed_out"])
+        self.assertLess(elapsed, 10)
+        self.assertEqual(pool.stats["timeouts"], 1)
+
+    def test_cancel_stops_running_and_queued_runs(self):
+        slow = write_script(self.workdir.name, "test_slow", SLEEP_TEST.format(seconds=30))
+
+        async def scenario(pool):
+            await pool.start()
+            running = asyncio.ensure_future(pool.run([slow], cwd=self.workdir.name, timeout=60, run_id="a"))
+            queued = asyncio.ensure_future(pool.run([slow], cwd=self.workdir.name, timeout=60, run_id="b"))
+            await asyncio.sleep(0.5)
+            self.assertTrue(await pool.cancel("b"))
+            self.assertTrue(await pool.cancel("a"))
+            return await asyncio.wait_for(asyncio.gather(running, queued), timeout=10)
+
+        pool, (running, queued) = self.run_with_pool(scenario, size=1)
+
+        self.assertTrue(running["cancelled"])
+        self.assertTrue(queued["cancelled"])
+        self.assertEqual(pool.stats["runs"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from app.services.api_automation.pytest_worker_pool import PytestWorkerPool
+from app.services.api_automation.script_execution_engine import (
+    ScriptExecutionEngine, order_longest_first, parse_pytest_summary,
+)
+
+SLEEP_TEST = "import time\n\ndef test_sleep():\n    time.sleep({seconds})\n"
+
+
+def make_scripts(directory, durations, timeout=None):
+    scripts = []
+    for index, seconds in enumerate(durations):
+        script_id = f"test_script_{index}"
+        with open(os.path.join(directory, f"{script_id}.py"), "w", encoding="utf-8") as f:
+            f.write(SLEEP_TEST.format(seconds=seconds))
+        scripts.append(SimpleNamespace(script_id=script_id, name=script_id, timeout=timeout))
+    return scripts
+
+
+async def run_and_stop(engine, scripts, delay):
+    """启动执行，delay秒后停止，返回执行结果和停止后到执行结束的耗时"""
+    task = asyncio.ensure_future(engine.run(scripts))
+    await asyncio.sleep(delay)
+    stopped_at = time.monotonic()
+    await engine.stop()
+    results = await asyncio.wait_for(task, timeout=15)
+    return results, time.monotonic() - stopped_at
+
+
+class TestScheduling(unittest.TestCase):
+    def test_longest_expected_duration_first(self):
+        scripts = [SimpleNamespace(script_id=script_id) for script_id in ("a", "b", "c", "new")]
+        durations = {"a": 1.0, "b": 5.0, "c": 3.0}
+
+        ordered = order_longest_first(scripts, durations)
+
+        # 没有历史的脚本按平均值3.0估计，排在同为3.0的c之后（排序稳定）
+        self.assertEqual([script.script_id for script in ordered], ["b", "c", "new", "a"])
+        self.assertEqual(order_longest_first(scripts, {}), scripts)
+
+    def test_parse_last_pytest_summary_line(self):
+        output = "1 passed in 0.1s\n== 3 passed, 1 failed, 2 errors, 1 xfailed in 0.52s =="
+
+        self.assertEqual(parse_pytest_summary(output),
+                         {"passed": 3, "failed": 1, "skipped": 1, "error": 2, "total": 7})
+
+
+class TestEngineWithProcesses(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+
+    def test_single_worker_runs_scripts_in_given_order(self):
+        scripts = make_scripts(self.workdir.name, [0, 0, 0])
+        finished = []
+
+        async def on_result(result):
+            finished.append(result["script_id"])
+
+        engine = ScriptExecutionEngine("exec", Path(self.workdir.name), max_workers=1, on_result=on_result)
+        results = asyncio.run(engine.run(list(reversed(scripts))))
+
+        self.assertEqual(finished, ["test_script_2", "test_script_1", "test_script_0"])
+        self.assertEqual([result["status"] for result in results], ["PASSED"] * 3)
+
+    def test_each_script_has_its_own_timeout(self):
+        scripts = make_scripts(self.workdir.name, [30, 0], timeout=2)
+        # 快速脚本给足超时，避免机器繁忙时pytest启动慢于2秒导致误判
+        scripts[1].timeout = 30
+
+        engine = ScriptExecutionEngine("exec", Path(self.workdir.name), max_workers=2, timeout=300)
+        results = {result["script_id"]: result for result in asyncio.run(engine.run(scripts))}
+
+        self.assertEqual(results["test_script_0"]["status"], "TIMEOUT")
+        self.assertLess(results["test_script_0"]["duration"], 10)
+        self.assertEqual(results["test_script_1"]["status"], "PASSED")
+
+    def test_stop_kills_running_and_skips_queued_scripts(self):
+        scripts = make_scripts(self.workdir.name, [30, 30, 30])
+        engine = ScriptExecutionEngine("exec", Path(self.workdir.name), max_workers=1)
+
+        results, elapsed = asyncio.run(run_and_stop(engine, scripts, delay=1))
+
+        self.assertEqual([result["status"] for result in results], ["STOPPED"] * 3)
+        self.assertEqual(len([result for result in results if result["return_code"] == -1]), 2)
+        self.assertLess(elapsed, 10)
+
+
+class TestEngineWithWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+
+    def test_scripts_beyond_pool_size_wait_without_timing_out(self):
+        scripts = make_scripts(self.workdir.name, [1] * 6)
+
+        async def run():
+            pool = PytestWorkerPool(size=2)
+            try:
+                await pool.start()
+                engine = ScriptExecutionEngine("exec", Path(self.workdir.name), max_workers=6,
+                                               timeout=2, worker_pool=pool)
+                return await engine.run(scripts)
+            finally:
+                await pool.shutdown()
+
+        results = asyncio.run(run())
+
+        self.assertEqual([result["status"] for result in results], ["PASSED"] * 6)
+        self.assertTrue(all(result["duration"] < 1.9 for result in results))
+
+    def test_stop_cancels_scripts_running_and_waiting_in_the_pool(self):
+        scripts = make_scripts(self.workdir.name, [30, 30, 30, 30])
+
+        async def run():
+            pool = PytestWorkerPool(size=2)
+            try:
+                await pool.start()
+                # 另一个执行占用一个工作进程，本次执行中有脚本在池中等待
+                engine = ScriptExecutionEngine("exec", Path(self.workdir.name), max_workers=2, worker_pool=pool)
+                other = ScriptExecutionEngine("other", Path(self.workdir.name), max_workers=1, worker_pool=pool)
+                other_task = asyncio.ensure_future(other.run(scripts[3:]))
+                await asyncio.sleep(0.2)
+                stopped = await run_and_stop(engine, scripts[:3], delay=1)
+                await other.stop()
+                await other_task
+                return stopped, pool.stats
+            finally:
+                await pool.shutdown()
+
+        (results, elapsed), stats = asyncio.run(run())
+
+        self.assertEqual([result["status"] for result in results], ["STOPPED"] * 3)
+        self.assertLess(elapsed, 10)
+        self.assertEqual(stats["runs"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
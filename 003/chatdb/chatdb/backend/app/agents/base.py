@@ -9,6 +9,7 @@ from autogen_core import RoutedAgent, TopicId, MessageContext, ClosureContext
 from autogen_core.memory import ListMemory, MemoryContent, MemoryMimeType
 
 from app.core.llms import model_client
+from app.core.tracing import SPAN_AGENT, TracedChatCompletionClient, pipeline_tracer
 from app.schemas.text2sql import ResponseMessage
 from .types import DEFAULT_DB_TYPE, TopicTypes
 
@@ -27,10 +28,15 @@ class BaseAgent(RoutedAgent, ABC):
         """
         super().__init__(agent_id)
         self.agent_name = agent_name
-        self.model_client = model_client_instance or model_client
+        self.model_client = TracedChatCompletionClient.wrap(model_client_instance or model_client)
         self.db_type = db_type or DEFAULT_DB_TYPE
         self.db_schema = ""
 
+    async def on_message_impl(self, message: Any, ctx: MessageContext) -> Any:
+        """处理消息，并以智能体类型作为阶段名记录处理耗时"""
+        with pipeline_tracer.span(SPAN_AGENT, self.id.type):
+            return await super().on_message_impl(message, ctx)
+
     async def send_response(self, content: str, is_final: bool = False, result: Dict[str, Any] = None) -> None:
         """发送响应消息到流输出主题
 
@@ -89,9 +89,8 @@ class HybridSqlGeneratorAgent(BaseAgent):
         if not self._initialized and settings.HYBRID_RETRIEVAL_ENABLED:
             try:
                 # 延迟导入避免循环依赖
-                from app.services.hybrid_retrieval_service import HybridRetrievalEngine
-                self.hybrid_engine = HybridRetrievalEngine()
-                await self.hybrid_engine.initialize()
+                from app.services.hybrid_retrieval_service import get_hybrid_retrieval_engine
+                self.hybrid_engine = await get_hybrid_retrieval_engine()
                 self._initialized = True
                 await self.send_response("混合检索引擎初始化成功\n\n")
             except Exception as e:
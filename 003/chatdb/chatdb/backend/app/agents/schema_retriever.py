@@ -9,6 +9,7 @@ from autogen_core import message_handler, MessageContext, TopicId, type_subscrip
 from app.db.session import SessionLocal
 from app.services.text2sql_service import retrieve_relevant_schema, get_value_mappings
 from app.schemas.text2sql import QueryMessage, SchemaContextMessage
+from app.services.query_executor import query_executor
 from .base import BaseAgent
 from .types import AgentTypes, AGENT_NAMES, TopicTypes
 
@@ -44,7 +45,7 @@ class SchemaRetrieverAgent(BaseAgent):
             try:
                 # 调用 retrieve_relevant_schema 方法获取相关表结构
                 schema_context = await retrieve_relevant_schema(db=db, connection_id=connection_id, query=query)
-                value_mappings = get_value_mappings(db, schema_context)
+                value_mappings = await query_executor.run_blocking(get_value_mappings, db, schema_context, connection_id)
                 if value_mappings:
                     mappings_str = "-- Value Mappings:\n"
                     for column, mappings in value_mappings.items():
@@ -2,16 +2,55 @@
 SQL执行智能体
 负责执行SQL并返回结果
 """
+import asyncio
+import threading
 from typing import Optional
 
 from autogen_core import message_handler, MessageContext, TopicId, type_subscription
 
+from app.core.config import settings
+from app.core.tracing import pipeline_tracer
 from app.db.dbaccess import DBAccess
+from app.db.result_stream import ResultStream
 from app.schemas.text2sql import SqlExplanationMessage, SqlResultMessage
+from app.services.query_executor import query_executor
+from app.services.result_cache import query_result_cache
 from .base import BaseAgent
 from .types import AgentTypes, AGENT_NAMES, TopicTypes
 
 
+class _StreamHandle:
+    """在线程池中打开、分页读取和关闭结果流
+
+    三个操作共用一把锁：超时或取消后，执行器线程中的读取可能仍在进行，
+    close()会等它返回后再关闭结果流和服务端游标
+    """
+
+    def __init__(self, db_access: DBAccess, sql: str):
+        self._db_access = db_access
+        self._sql = sql
+        self._lock = threading.Lock()
+        self.stream: Optional[ResultStream] = None
+        self._pages = None
+
+    def open(self) -> ResultStream:
+        with self._lock:
+            self.stream = self._db_access.stream_sql(self._sql)
+            self._pages = iter(self.stream)
+            return self.stream
+
+    def next_page(self) -> Optional[list]:
+        with self._lock:
+            return next(self._pages, None)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pages is not None:
+                self._pages.close()
+            if self.stream is not None:
+                self.stream.close()
+
+
 @type_subscription(topic_type=TopicTypes.SQL_EXECUTOR.value)
 class SqlExecutorAgent(BaseAgent):
     """SQL执行智能体，负责执行SQL并返回结果"""
@@ -43,33 +82,84 @@ class SqlExecutorAgent(BaseAgent):
         """
         return sql.replace("```sql", "").replace("```", "").strip()
 
-    async def _execute_sql(self, sql: str, connection_id: Optional[int] = None) -> tuple[list, Optional[str]]:
+    async def _execute_sql(self, sql: str, connection_id: Optional[int] = None) -> tuple[list, Optional[str], Optional[dict]]:
         """执行SQL查询
 
+        通过服务端游标分块读取结果，超过行数/字节上限时截断；结果超过一页时按页推送给前端
+
         Args:
             sql: SQL语句
             connection_id: 连接ID
 
         Returns:
-            tuple[list, Optional[str]]: (结果列表, 错误信息)
+            tuple[list, Optional[str], Optional[dict]]: (结果列表, 错误信息, 结果元数据)
         """
         try:
             # 清理SQL语句
             cleaned_sql = self._clean_sql(sql)
 
-            # 执行SQL查询
-            results = self.db_access.run_sql(cleaned_sql)
-
-            # 检查结果
-            if results is None or len(results) == 0:
-                return [], None
-            else:
-                # 转换为字典列表
-                return results.to_dict("records"), None
+            # 相同连接上重复执行的只读查询直接使用缓存结果。没有连接ID时实际连接的库未知，
+            # 不同会话的默认DBAccess可能指向不同的库，也无法按连接失效，因此不缓存
+            cached = query_result_cache.get(connection_id, cleaned_sql) if connection_id else None
+            if cached is not None:
+                rows, result_meta = cached
+                await self._send_cached_pages(rows, result_meta.get("columns", []))
+                return rows, None, result_meta
+
+            # 同步驱动在线程池中执行，同一目标连接的并发语句数受限；
+            # 超时或会话被取消时中断数据库中正在执行的语句
+            timeout = settings.QUERY_STATEMENT_TIMEOUT or None
+            cancel = self.db_access.cancel
+            # 没有连接ID时使用所有会话共享的默认DBAccess：它的MySQL连接不能同时执行多条语句，
+            # cancel()也按该连接的线程ID执行KILL QUERY，并发时会中断其他会话的语句，因此同一时间只执行一条
+            slot_key, slot_limit = (connection_id, None) if connection_id else ("default", 1)
+            async with query_executor.connection_slot(slot_key, limit=slot_limit):
+                # 执行SQL查询，分块读取
+                handle = _StreamHandle(self.db_access, cleaned_sql)
+                try:
+                    stream = await query_executor.run_blocking(handle.open, timeout=timeout, on_cancel=cancel)
+                    held_page = None
+                    page_index = 0
+                    while True:
+                        page = await query_executor.run_blocking(handle.next_page, timeout=timeout, on_cancel=cancel)
+                        if page is None:
+                            break
+                        # 先缓存第一页，只有出现第二页时才开始分页推送
+                        if held_page is not None:
+                            await self._send_result_page(held_page, page_index, stream.columns)
+                            page_index += 1
+                        held_page = page
+                    if held_page is not None and page_index > 0:
+                        await self._send_result_page(held_page, page_index, stream.columns)
+                finally:
+                    # 超时、取消或出错时也要关闭服务端游标：MySQL的无缓冲游标不关闭会破坏
+                    # 同一连接上的下一条语句。关闭完成前不释放连接名额
+                    await asyncio.shield(query_executor.run_blocking(handle.close))
+
+            result_meta = {**stream.meta,
+                           "cache": query_result_cache.cache_status(cleaned_sql) if connection_id else "bypass"}
+            if connection_id:
+                query_result_cache.set(connection_id, cleaned_sql, stream.rows, result_meta)
+            return stream.rows, None, result_meta
 
         except Exception as e:
             error_msg = f"SQL执行错误: {str(e)}"
-            return [], error_msg
+            return [], error_msg, None
+
+    async def _send_cached_pages(self, rows: list, columns: list) -> None:
+        """按页推送缓存的查询结果，只有一页时不单独推送"""
+        page_size = settings.QUERY_FETCH_SIZE
+        if len(rows) <= page_size:
+            return
+        for page_index, start in enumerate(range(0, len(rows), page_size)):
+            await self._send_result_page(rows[start:start + page_size], page_index, columns)
+
+    async def _send_result_page(self, rows: list, page_index: int, columns: list) -> None:
+        """推送一页查询结果"""
+        await self.send_response(
+            f"已获取第{page_index + 1}页数据，{len(rows)}条",
+            result={"result_page": {"page": page_index, "columns": columns, "rows": rows}}
+        )
 
     @message_handler
     async def handle_message(self, message: SqlExplanationMessage, ctx: MessageContext) -> None:
@@ -85,7 +175,7 @@ class SqlExecutorAgent(BaseAgent):
             #     await self.send_response("未提供连接ID，使用默认连接")
 
             # 执行SQL查询
-            results, error_msg = await self._execute_sql(message.sql, connection_id)
+            results, error_msg, result_meta = await self._execute_sql(message.sql, connection_id)
 
             if error_msg:
                 # 处理数据库查询错误
@@ -104,16 +194,21 @@ class SqlExecutorAgent(BaseAgent):
                 )
             else:
                 # 成功执行
+                pipeline_tracer.annotate(rows=len(results))
                 if len(results) == 0:
                     await self.send_response("查询执行成功，但没有返回任何结果\n\n")
                 else:
                     await self.send_response(f"SQL执行完成，获取到{len(results)}条结果\n\n")
+                if result_meta and result_meta["truncated"]:
+                    await self.send_response(f"结果超过上限，已截断为前{len(results)}条\n\n")
+                if result_meta and result_meta.get("cache") == "hit":
+                    await self.send_response("结果来自查询缓存\n\n")
 
                 # 发送结果数据到data区域
                 await self.send_response(
                     f"查询执行完成，返回{len(results)}条数据",
                     is_final=True,
-                    result={"results": results}
+                    result={"results": results, "result_meta": result_meta}
                 )
 
                 # 构造SqlResultMessage并传递给下一个智能体
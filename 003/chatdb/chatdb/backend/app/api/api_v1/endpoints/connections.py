@@ -44,7 +44,7 @@ def discover_and_save_schema(
     """
     Discover schema from a database connection and save it to the database.
     """
-    from app.services.schema_service import discover_schema, save_discovered_schema
+    from app.services.schema_service import discover_schema, reflect_catalog, save_discovered_schema
 
     connection = crud.db_connection.get(db=db, id=connection_id)
     if not connection:
@@ -55,11 +55,12 @@ def discover_and_save_schema(
         from app.services.db_service import test_db_connection
         test_db_connection(connection)
 
-        # Discover schema
-        schema_info = discover_schema(connection)
+        # Discover schema, reflecting the catalog only once
+        catalog = reflect_catalog(connection)
+        schema_info = discover_schema(connection, inspector=catalog)
 
         # Save discovered schema
-        tables_data, relationships_data = save_discovered_schema(db, connection_id, schema_info)
+        tables_data, relationships_data = save_discovered_schema(db, connection_id, schema_info, inspector=catalog)
 
         return {
             "status": "success",
@@ -100,6 +101,12 @@ def update_connection(
     if not connection:
         raise HTTPException(status_code=404, detail="Connection not found")
     connection = crud.db_connection.update(db=db, db_obj=connection, obj_in=connection_in)
+
+    # Credentials or host may have changed, drop the pooled engine and cached results
+    from app.services.db_service import invalidate_db_engine
+    from app.services.result_cache import query_result_cache
+    invalidate_db_engine(connection_id)
+    query_result_cache.invalidate(connection_id)
     return connection
 
 
@@ -116,6 +123,17 @@ def delete_connection(
     if not connection:
         raise HTTPException(status_code=404, detail="Connection not found")
     connection = crud.db_connection.remove(db=db, id=connection_id)
+
+    from app.services.db_service import invalidate_db_engine
+    from app.services.schema_cache import schema_cache
+    from app.services.table_index import table_index
+    from app.services.result_cache import query_result_cache
+    from app.services.value_mapping_engine import value_mapping_engine
+    invalidate_db_engine(connection_id)
+    query_result_cache.invalidate(connection_id)
+    schema_cache.invalidate(connection_id)
+    table_index.invalidate(connection_id)
+    value_mapping_engine.invalidate(connection_id)
     return connection
 
 
@@ -1,12 +1,14 @@
-from typing import Any, Dict, List
+import gzip
+import json
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from neo4j import GraphDatabase
 
 from app import crud
 from app.api import deps
 from app.core.config import settings
+from app.db.neo4j_session import get_neo4j_driver
 
 router = APIRouter()
 
@@ -27,12 +29,7 @@ def get_graph_data(
         raise HTTPException(status_code=404, detail="Connection not found")
 
     try:
-        # Connect to Neo4j
-        print(f"Connecting to Neo4j at {settings.NEO4J_URI} with user {settings.NEO4J_USER}")
-        driver = GraphDatabase.driver(
-            settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
-        )
+        driver = get_neo4j_driver()
 
         # Prepare result structure
         result = {
@@ -140,7 +137,6 @@ def get_graph_data(
                 })
             print(f"Found {relationship_count} relationships")
 
-        driver.close()
         print(f"Returning result with {len(result['nodes'])} nodes and {len(result['edges'])} edges")
         return result
 
@@ -149,3 +145,168 @@ def get_graph_data(
         error_trace = traceback.format_exc()
         print(f"Error retrieving graph data: {str(e)}\n{error_trace}")
         raise HTTPException(status_code=500, detail=f"Error retrieving graph data: {str(e)}")
+
+
+def _graph_response(request: Request, payload: Dict[str, Any]) -> Response:
+    """序列化图数据，客户端支持gzip且数据较大时压缩返回"""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= settings.GRAPH_GZIP_MIN_SIZE and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _get_schema_graph(db: Session, connection_id: int):
+    from app.services.schema_graph import schema_graph_cache
+
+    connection = crud.db_connection.get(db=db, id=connection_id)
+    if not connection:
+        raise HTTPException(status_code=404, detail="Connection not found")
+    return schema_graph_cache.get(db, connection_id)
+
+
+@router.get("/{connection_id}/overview")
+def get_graph_overview(
+    *,
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    connection_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(None, ge=1),
+    cluster_id: Optional[int] = Query(None, ge=0),
+) -> Any:
+    """
+    Table-level overview of the schema graph (no columns), paginated by cursor.
+    Nodes carry precomputed layout positions and cluster ids; an edge is returned
+    on the page where both of its tables have been delivered.
+    """
+    from app.services.schema_graph import InvalidCursor, StaleCursor, decode_cursor, encode_cursor
+
+    graph = _get_schema_graph(db, connection_id)
+    if cluster_id is not None and cluster_id >= len(graph.clusters):
+        raise HTTPException(status_code=404, detail="Cluster not found")
+
+    try:
+        offset = decode_cursor(cursor, graph.version) if cursor else 0
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except StaleCursor as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    limit = min(limit or settings.GRAPH_PAGE_SIZE, settings.GRAPH_MAX_PAGE_SIZE)
+    page = graph.overview_page(offset, limit, cluster_id=cluster_id)
+    next_offset = page.pop("next_offset")
+    return _graph_response(request, {
+        "mode": "overview",
+        "version": graph.version,
+        **page,
+        "next_cursor": encode_cursor(graph.version, next_offset) if next_offset is not None else None,
+    })
+
+
+@router.get("/{connection_id}/ego/{table_id}")
+def get_graph_ego_network(
+    *,
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    connection_id: int,
+    table_id: int,
+    hops: int = Query(1, ge=1),
+    max_nodes: int = Query(None, ge=1),
+    include_columns: bool = True,
+) -> Any:
+    """
+    Ego network around a focus table: tables within `hops` foreign-key hops,
+    optionally with their columns and column-level references.
+    """
+    graph = _get_schema_graph(db, connection_id)
+    if table_id not in graph.tables_by_id:
+        raise HTTPException(status_code=404, detail="Table not found")
+
+    hops = min(hops, settings.GRAPH_EGO_MAX_HOPS)
+    max_nodes = min(max_nodes or settings.GRAPH_EGO_MAX_NODES, settings.GRAPH_EGO_MAX_NODES)
+    table_ids, truncated = graph.ego_network(table_id, hops, max_nodes)
+
+    nodes = [graph.table_node(tid) for tid in table_ids]
+    edges = [graph.table_edge(*edge) for edge in graph.edges_within(table_ids)]
+
+    if include_columns:
+        from app.services.schema_cache import schema_cache
+
+        catalog = schema_cache.get_catalog(db, connection_id)
+        selected = set(table_ids)
+        for tid, columns in catalog.get_columns_for_tables(db, table_ids).items():
+            table_name = graph.tables_by_id[tid]["name"]
+            for column in columns:
+                nodes.append({
+                    "id": f"column-{column['id']}",
+                    "type": "column",
+                    "data": {
+                        "id": column["id"],
+                        "label": column["name"],
+                        "dataType": column["type"],
+                        "description": column["description"] or "",
+                        "isPrimaryKey": column["is_primary_key"],
+                        "isForeignKey": column["is_foreign_key"],
+                        "tableId": tid,
+                        "tableName": table_name,
+                        "nodeType": "column"
+                    }
+                })
+                edges.append({
+                    "id": f"table-{tid}-column-{column['id']}",
+                    "source": f"table-{tid}",
+                    "target": f"column-{column['id']}",
+                    "type": "hasColumn",
+                    "data": {"relationshipType": "HAS_COLUMN"}
+                })
+
+        seen_relationship_ids = set()
+        for relationships in catalog.get_relationships_for_tables(db, table_ids).values():
+            for rel in relationships:
+                if rel["id"] in seen_relationship_ids:
+                    continue
+                seen_relationship_ids.add(rel["id"])
+                if rel["source_table_id"] not in selected or rel["target_table_id"] not in selected:
+                    continue
+                edges.append({
+                    "id": f"rel-{rel['source_column_id']}-{rel['target_column_id']}",
+                    "source": f"column-{rel['source_column_id']}",
+                    "target": f"column-{rel['target_column_id']}",
+                    "type": "references",
+                    "data": {"relationshipType": rel["relationship_type"] or "unknown"}
+                })
+
+    return _graph_response(request, {
+        "mode": "ego",
+        "version": graph.version,
+        "focus": f"table-{table_id}",
+        "hops": hops,
+        "truncated": truncated,
+        "nodes": nodes,
+        "edges": edges,
+    })
+
+
+@router.get("/{connection_id}/clusters")
+def get_graph_clusters(
+    *,
+    request: Request,
+    db: Session = Depends(deps.get_db),
+    connection_id: int,
+) -> Any:
+    """
+    Cluster summaries from community detection over the table graph,
+    with aggregated inter-cluster edges. Use the overview endpoint with
+    `cluster_id` to drill into a cluster.
+    """
+    graph = _get_schema_graph(db, connection_id)
+    summaries = graph.cluster_summaries()
+    return _graph_response(request, {
+        "mode": "clusters",
+        "version": graph.version,
+        "total_tables": len(graph.tables_by_id),
+        "nodes": summaries["clusters"],
+        "edges": summaries["edges"],
+    })
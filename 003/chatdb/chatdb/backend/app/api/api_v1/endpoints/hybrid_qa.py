@@ -8,7 +8,7 @@ from datetime import datetime
 
 from app.api import deps
 from app.services.hybrid_retrieval_service import (
-    HybridRetrievalEngine, QAPairWithContext, RetrievalResult,
+    QAPairWithContext, RetrievalResult, get_hybrid_retrieval_engine,
     extract_tables_from_sql, extract_entities_from_question, clean_sql, generate_qa_id
 )
 from app.core.config import settings
@@ -68,16 +68,9 @@ class FeedbackRequest(BaseModel):
     user_satisfaction: float  # 0.0 - 1.0
     feedback_text: Optional[str] = None
 
-# ===== 全局变量 =====
-hybrid_engine = None
-
 async def get_hybrid_engine():
-    """获取混合检索引擎实例"""
-    global hybrid_engine
-    if hybrid_engine is None:
-        hybrid_engine = HybridRetrievalEngine()
-        await hybrid_engine.initialize()
-    return hybrid_engine
+    """获取混合检索引擎实例（与SQL生成和答案缓存共享）"""
+    return await get_hybrid_retrieval_engine()
 
 # ===== API端点 =====
 
@@ -269,19 +262,19 @@ async def batch_create_qa_pairs(
     """批量创建问答对"""
     try:
         engine = await get_hybrid_engine()
-        
-        created_count = 0
-        failed_count = 0
+
         errors = []
-        
+        prepared = []
+        positions = []
+
         for i, qa_create in enumerate(qa_pairs):
             try:
                 # 自动提取表名和实体
                 used_tables = qa_create.used_tables or extract_tables_from_sql(qa_create.sql)
                 mentioned_entities = qa_create.mentioned_entities or extract_entities_from_question(qa_create.question)
-                
+
                 # 创建问答对对象
-                qa_pair = QAPairWithContext(
+                prepared.append(QAPairWithContext(
                     id=generate_qa_id(),
                     question=qa_create.question,
                     sql=clean_sql(qa_create.sql),
@@ -295,24 +288,23 @@ async def batch_create_qa_pairs(
                     used_columns=[],
                     query_pattern=qa_create.query_type,
                     mentioned_entities=mentioned_entities
-                )
-                
-                # 存储问答对
-                schema_context = {"tables": [{"name": table} for table in used_tables]}
-                await engine.store_qa_pair(qa_pair, schema_context)
-                created_count += 1
-                
+                ))
+                positions.append(i)
             except Exception as e:
-                failed_count += 1
-                errors.append(f"第{i+1}个问答对创建失败: {str(e)}")
-        
+                errors.append((i, str(e)))
+
+        # 批量向量化并写入Neo4j/Milvus，单行失败不影响其他行
+        result = await engine.bulk_store_qa_pairs(prepared)
+        errors.extend((positions[item["index"]], item["error"]) for item in result["errors"])
+        errors.sort()
+
         return {
             "status": "completed",
-            "created_count": created_count,
-            "failed_count": failed_count,
-            "errors": errors
+            "created_count": len(result["stored"]),
+            "failed_count": len(errors),
+            "errors": [f"第{i+1}个问答对创建失败: {message}" for i, message in errors]
         }
-        
+
     except Exception as e:
         logger.error(f"批量创建问答对失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"批量创建失败: {str(e)}")
@@ -1,6 +1,6 @@
-from typing import Any
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from app import crud, schemas
@@ -38,3 +38,44 @@ def execute_query(
             error=f"Error processing query: {str(e)}",
             context=None
         )
+
+
+@router.get("/cache/stats", response_model=dict)
+def get_cache_stats() -> Any:
+    """
+    Hit/miss statistics of the query-result, schema-context, schema-graph, value-mapping and semantic answer caches.
+    """
+    from app.services.answer_cache import answer_cache
+    from app.services.query_executor import query_executor
+    from app.services.result_cache import query_result_cache
+    from app.services.schema_cache import schema_cache
+    from app.services.schema_graph import schema_graph_cache
+    from app.services.value_mapping_engine import value_mapping_engine
+    return {
+        "query_results": query_result_cache.get_stats(),
+        "schema_contexts": schema_cache.get_stats(),
+        "schema_graphs": schema_graph_cache.get_stats(),
+        "value_mappings": value_mapping_engine.get_stats(),
+        "answers": answer_cache.get_stats(),
+        "executor": query_executor.get_stats(),
+    }
+
+
+@router.post("/cache/invalidate", response_model=dict)
+def invalidate_result_cache(
+    *,
+    connection_id: Optional[int] = None,
+    tables: Optional[List[str]] = Body(None, embed=True),
+) -> Any:
+    """
+    Drop cached query results, e.g. after the data of a connection changed.
+    With `tables`, only results that read one of those tables are dropped.
+    """
+    from app.services.result_cache import query_result_cache
+    if tables:
+        if connection_id is None:
+            raise HTTPException(status_code=400, detail="connection_id is required with tables")
+        removed = query_result_cache.invalidate_tables(connection_id, tables)
+    else:
+        removed = query_result_cache.invalidate(connection_id)
+    return {"removed": removed}
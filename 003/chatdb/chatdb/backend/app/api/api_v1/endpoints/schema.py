@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.api import deps
-from app.services.schema_service import discover_schema, sync_schema_to_graph_db, save_discovered_schema
+from app.services.schema_service import discover_schema, reflect_catalog, sync_schema_to_graph_db, save_discovered_schema
 
 router = APIRouter()
 
@@ -445,11 +445,12 @@ def discover_and_sync(
         raise HTTPException(status_code=404, detail="Connection not found")
 
     try:
-        # Discover schema
-        schema_info = discover_schema(connection)
+        # Discover schema, reflecting the catalog only once
+        catalog = reflect_catalog(connection)
+        schema_info = discover_schema(connection, inspector=catalog)
 
         # Save discovered schema
-        tables_data, relationships_data = save_discovered_schema(db, connection_id, schema_info)
+        tables_data, relationships_data = save_discovered_schema(db, connection_id, schema_info, inspector=catalog)
 
         return {
             "status": "success",
@@ -480,6 +481,11 @@ def update_table(
 
     try:
         table = crud.schema_table.update(db=db, db_obj=table, obj_in=table_in)
+
+        from app.services.schema_cache import schema_cache
+        from app.services.value_mapping_engine import value_mapping_engine
+        schema_cache.invalidate(table.connection_id)
+        value_mapping_engine.invalidate(table.connection_id)
         return table
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating table: {str(e)}")
@@ -501,6 +507,12 @@ def update_column(
 
     try:
         column = crud.schema_column.update(db=db, db_obj=column, obj_in=column_in)
+
+        from app.services.schema_cache import schema_cache
+        from app.services.value_mapping_engine import value_mapping_engine
+        schema_cache.invalidate(column.table.connection_id)
+        # Mappings are keyed by column name, which may have changed
+        value_mapping_engine.invalidate(column.table.connection_id)
         return column
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating column: {str(e)}")
@@ -1,9 +1,10 @@
 from autogen_core import CancellationToken, MessageContext, ClosureContext
-from fastapi import APIRouter, Request, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request, Depends, HTTPException
+from fastapi.responses import FileResponse, JSONResponse
 from sse_starlette.sse import EventSourceResponse
 import asyncio
 import logging
+import os
 import uuid
 import json
 from typing import Dict, List, Optional, Any
@@ -17,6 +18,10 @@ from sqlalchemy.orm import Session
 from app.api import deps
 from app import crud
 from app.schemas.chat_history import SaveChatHistoryRequest
+from app.core.config import settings
+from app.core.tracing import pipeline_tracer
+from app.services.sse_session_store import sse_session_store, SessionLimitExceeded
+from app.services.answer_cache import answer_cache, SKIPPED_STAGES
 
 router = APIRouter()
 
@@ -28,40 +33,41 @@ async def health_check():
     """SSE健康检查端点"""
     return {"status": "ok", "service": "text2sql-sse", "timestamp": datetime.now().isoformat()}
 
-# 会话存储
-active_sessions: Dict[str, Dict[str, Any]] = {}
-
-# 消息队列存储
-message_queues: Dict[str, asyncio.Queue] = {}
-
-# 反馈队列存储
-feedback_queues: Dict[str, asyncio.Queue] = {}
-
-# 会话超时（秒）
-SESSION_TIMEOUT = 3600  # 1小时
+def cancel_query_task(session_id: str) -> bool:
+    """
+    取消会话仍在运行的查询处理任务，正在执行的SQL会被中断
+    """
+    cancelled = sse_session_store.cancel_task(session_id)
+    if cancelled:
+        logger.info(f"取消查询处理任务: {session_id}")
+    return cancelled
 
 
-async def cleanup_session(session_id: str, delay: int = SESSION_TIMEOUT):
+async def cancel_abandoned_query(session_id: str, grace: float = None):
     """
-    在指定延迟后清理会话资源
+    客户端断开后等待一段时间，期间没有重新连接则取消查询处理任务；
+    客户端在其他worker上恢复了会话时（记录在共享会话后端中），等这些连接也断开后再取消
     """
-    await asyncio.sleep(delay)
-    if session_id in active_sessions:
-        logger.info(f"清理过期会话: {session_id}")
-        active_sessions.pop(session_id, None)
-        message_queues.pop(session_id, None)
-        feedback_queues.pop(session_id, None)
+    grace = settings.QUERY_DISCONNECT_GRACE_SECONDS if grace is None else grace
+    while True:
+        await asyncio.sleep(grace)
+        session = sse_session_store.get(session_id)
+        if session is None or session.task is None or session.task.done() or session.listeners > 0:
+            return
+        if not await sse_session_store.remote_listeners(session_id):
+            cancel_query_task(session_id)
+            return
 
 
 @router.get("/stream")
 async def stream_response(
     request: Request,
-    background_tasks: BackgroundTasks,
     query: Optional[str] = None,
     connection_id: Optional[int] = None,
     session_id: Optional[str] = None,
     direct_process: bool = False,
     user_feedback_enabled: bool = False,
+    bypass_cache: bool = False,
     db: Session = Depends(deps.get_db)
 ):
     """
@@ -70,6 +76,8 @@ async def stream_response(
     - 如果提供了query参数，则开始新的处理流程
     - 如果提供了session_id参数，则继续现有会话的流
     - 如果两者都提供，则使用session_id并忽略query
+    - 重新连接时浏览器携带的Last-Event-ID用于从断点继续（使用SQLite会话后端时可跨worker恢复）
+    - 同一连接上高度相似的已验证问题直接复用其SQL并跳过LLM阶段，bypass_cache=true时强制走完整流程
     """
     # 记录请求参数
     logger.info(f"SSE请求参数: query={query}, connection_id={connection_id}, session_id={session_id}, user_feedback_enabled={user_feedback_enabled}")
@@ -88,7 +96,7 @@ async def stream_response(
         logger.info(f"未提供session_id，创建新会话: {session_id}")
     else:
         # 提供了session_id，检查是否存在
-        if session_id not in active_sessions:
+        if not await sse_session_store.exists(session_id):
             # 会话不存在，如果有query就创建新会话，否则报错
             if query:
                 create_new_session = True
@@ -99,40 +107,30 @@ async def stream_response(
         else:
             logger.info(f"继续现有会话: {session_id}")
             # 更新最后活动时间
-            active_sessions[session_id]["last_activity"] = datetime.now().isoformat()
+            sse_session_store.touch(session_id)
 
     # 如果需要创建新会话
     if create_new_session:
         logger.info(f"创建新会话: {session_id}, 查询: {query}")
 
-        # 创建消息队列
-        message_queue = asyncio.Queue()
-        message_queues[session_id] = message_queue
-        logger.info(f"创建消息队列: {session_id}")
-
-        # 创建反馈队列
-        feedback_queue = asyncio.Queue()
-        feedback_queues[session_id] = feedback_queue
-        logger.info(f"创建反馈队列: {session_id}")
-
-        # 存储会话信息
-        active_sessions[session_id] = {
-            "query": query,
-            "connection_id": connection_id,
-            "user_feedback_enabled": user_feedback_enabled,
-            "created_at": datetime.now().isoformat(),
-            "last_activity": datetime.now().isoformat(),
-            "status": "initializing"
-        }
+        # 创建会话（有界消息队列和反馈队列），过期由会话存储统一清理
+        try:
+            await sse_session_store.create(session_id, {
+                "query": query,
+                "connection_id": connection_id,
+                "user_feedback_enabled": user_feedback_enabled,
+                "bypass_cache": bypass_cache,
+                "created_at": datetime.now().isoformat(),
+                "last_activity": datetime.now().isoformat(),
+                "status": "initializing"
+            })
+        except SessionLimitExceeded as e:
+            raise HTTPException(status_code=503, detail=str(e))
         logger.info(f"存储会话信息: {session_id}")
 
-        # 设置会话超时清理
-        background_tasks.add_task(cleanup_session, session_id)
-        logger.info(f"添加会话清理任务: {session_id}")
-
         # 先尝试发送一条初始消息到队列
         try:
-            await message_queue.put({
+            await sse_session_store.publish(session_id, {
                 "type": "message",
                 "source": "系统",
                 "content": "正在启动查询处理...",
@@ -147,7 +145,7 @@ async def stream_response(
                 logger.info(f"将直接处理查询(非后台任务): {session_id}, 查询: {query}")
 
                 # 发送消息通知前端
-                await message_queue.put({
+                await sse_session_store.publish(session_id, {
                     "type": "message",
                     "source": "系统",
                     "content": "直接处理查询中...",
@@ -158,22 +156,22 @@ async def stream_response(
 
                 # 直接启动异步任务，而不是使用background_tasks
                 # 创建一个异步任务来处理查询
-                asyncio.create_task(
-                    process_query_task(query, session_id, connection_id, user_feedback_enabled, db)
-                )
+                sse_session_store.set_task(session_id, asyncio.create_task(
+                    process_query_task(query, session_id, connection_id, user_feedback_enabled, db, bypass_cache)
+                ))
 
                 logger.info(f"直接异步任务已启动: {session_id}")
             else:
                 # 启动处理任务
                 logger.info(f"正在启动异步查询处理任务: {session_id}, 查询: {query}, 连接ID: {connection_id}")
                 # 使用asyncio.create_task而不是background_tasks
-                asyncio.create_task(
-                    process_query_task(query, session_id, connection_id, user_feedback_enabled, db)
-                )
+                sse_session_store.set_task(session_id, asyncio.create_task(
+                    process_query_task(query, session_id, connection_id, user_feedback_enabled, db, bypass_cache)
+                ))
                 logger.info(f"异步查询处理任务已启动: {session_id}")
 
                 # 发送任务启动消息
-                await message_queue.put({
+                await sse_session_store.publish(session_id, {
                     "type": "message",
                     "source": "系统",
                     "content": "查询处理任务已启动，请等待结果...",
@@ -188,8 +186,9 @@ async def stream_response(
             logger.error(traceback.format_exc())
 
     # 返回SSE响应
+    last_event_id = request.headers.get("last-event-id", "")
     response = EventSourceResponse(
-        event_generator(session_id, request),
+        event_generator(session_id, request, int(last_event_id) if last_event_id.isdigit() else 0),
         media_type="text/event-stream"
     )
 
@@ -201,12 +200,11 @@ async def stream_response(
     return response
 
 
-async def event_generator(session_id: str, request: Request):
+async def event_generator(session_id: str, request: Request, last_event_id: int = 0):
     """
     生成SSE事件流
     """
     # 记录开始生成事件流
-    print(f"\n\n开始生成事件流: 会话ID={session_id}\n\n")
     logger.info(f"开始生成事件流: 会话ID={session_id}")
 
     # 发送会话初始化事件
@@ -215,11 +213,10 @@ async def event_generator(session_id: str, request: Request):
         "status": "connected"
     })
     logger.info(f"发送初始化事件: {init_data}")
-    yield f"event: session\nid: 0\ndata: {init_data}\n\n"
+    yield f"event: session\nid: {last_event_id}\ndata: {init_data}\n\n"
 
-    # 获取消息队列
-    message_queue = message_queues.get(session_id)
-    if not message_queue:
+    # 检查会话是否存在（当前worker或共享会话后端中）
+    if not await sse_session_store.exists(session_id):
         error_data = json.dumps({
             "error": "会话队列不存在"
         })
@@ -227,65 +224,36 @@ async def event_generator(session_id: str, request: Request):
         yield f"event: error\nid: error-1\ndata: {error_data}\n\n"
         return
 
-    # 消息ID计数器
-    message_id = 1
+    # ping计数器（消息使用会话存储分配的序号作为事件ID，便于断线后按Last-Event-ID恢复）
+    ping_id = 1
+
+    # 记录当前连接的客户端数，全部断开时取消查询处理
+    await sse_session_store.attach(session_id)
+    disconnected = False
 
     try:
-        # 持续从队列获取消息并发送
-        while True:
+        # 持续从会话队列获取消息并发送，超时未收到消息时发送ping
+        async for event in sse_session_store.events(session_id, last_event_id, timeout=0.5):
             # 检查客户端是否断开连接
             if await request.is_disconnected():
                 logger.info(f"客户端断开连接: {session_id}")
+                disconnected = True
                 break
 
-            # 尝试从队列获取消息（非阻塞）
-            try:
-                # 使用较短的超时时间，确保更频繁地检查连接状态
-                message = await asyncio.wait_for(message_queue.get(), timeout=0.5)
-
-                # 更新会话最后活动时间
-                active_sessions[session_id]["last_activity"] = datetime.now().isoformat()
-
-                # 确定事件类型
-                event_type = message.get("type", "message")
-
-                # 将消息转换为JSON字符串
-                message_json = json.dumps(message)
-
-                # 记录发送的消息（截断长消息以避免日志过大）
-                content_preview = message.get("content", "")
-                if content_preview and len(content_preview) > 100:
-                    content_preview = content_preview[:100] + "..."
-
-                print(f"\n\n发送事件: id={message_id}, type={event_type}, region={message.get('region', 'unknown')}, content={content_preview}\n\n")
-                logger.info(f"发送事件: id={message_id}, type={event_type}, region={message.get('region', 'unknown')}, content={content_preview}")
-
-                # 使用正确的SSE格式发送消息
-                yield f"event: {event_type}\nid: {message_id}\ndata: {message_json}\n\n"
-
-                message_id += 1
-
-                # 如果是最终消息，结束流
-                # if message.get("is_final", False):
-                #     logger.info(f"会话 {session_id} 处理完成，发送最终消息")
-                #     active_sessions[session_id]["status"] = "completed"
-                #
-                #     # 发送一个额外的关闭事件
-                #     close_data = json.dumps({
-                #         "message": "流已关闭",
-                #         "is_final": True
-                #     })
-                #     yield f"event: close\nid: close-{message_id}\ndata: {close_data}\n\n"
-                #     break
-
-            except asyncio.TimeoutError:
+            if event is None:
                 # 发送保持连接的消息
                 ping_data = json.dumps({"timestamp": datetime.now().isoformat()})
-                logger.debug(f"发送ping事件: id=ping-{message_id}")
-                yield f"event: ping\nid: ping-{message_id}\ndata: {ping_data}\n\n"
-                message_id += 1
+                logger.debug(f"发送ping事件: id=ping-{ping_id}")
+                yield f"event: ping\nid: ping-{ping_id}\ndata: {ping_data}\n\n"
+                ping_id += 1
                 continue
 
+            message_id, event_type, message_json = event
+            logger.debug(f"发送事件: id={message_id}, type={event_type}, 长度={len(message_json)}")
+
+            # 使用正确的SSE格式发送消息
+            yield f"event: {event_type}\nid: {message_id}\ndata: {message_json}\n\n"
+
     except Exception as e:
         logger.error(f"生成事件流时出错: {str(e)}")
         import traceback
@@ -294,14 +262,52 @@ async def event_generator(session_id: str, request: Request):
         error_data = json.dumps({
             "error": f"生成事件流时出错: {str(e)}"
         })
-        yield f"event: error\nid: error-{message_id}\ndata: {error_data}\n\n"
+        yield f"event: error\nid: error-{ping_id}\ndata: {error_data}\n\n"
+
+    finally:
+        if await sse_session_store.detach(session_id) == 0 and disconnected:
+            asyncio.create_task(cancel_abandoned_query(session_id))
 
     # 发送关闭事件
     close_data = json.dumps({
         "message": "流已关闭"
     })
     logger.info(f"事件流结束: 会话ID={session_id}")
-    yield f"event: close\nid: close-{message_id}\ndata: {close_data}\n\n"
+    yield f"event: close\nid: close-{ping_id}\ndata: {close_data}\n\n"
+
+
+async def publish_cache_hit(session_id: str, cached_answer: Dict[str, Any]) -> None:
+    """通知前端命中语义答案缓存：发送复用的SQL，并在被跳过的各区域标注跳过原因"""
+    await sse_session_store.publish(session_id, {
+        "type": "cache_hit",
+        "source": "系统",
+        "content": f"命中已验证的相似问题（相似度 {cached_answer['similarity']:.3f}）：{cached_answer['question']}",
+        "qa_id": cached_answer["qa_id"],
+        "similarity": cached_answer["similarity"],
+        "skipped_stages": [region for region, _ in SKIPPED_STAGES],
+        "region": "process",
+        "is_final": False,
+        "timestamp": datetime.now().isoformat()
+    })
+    for region, stage in SKIPPED_STAGES:
+        await sse_session_store.publish(session_id, {
+            "type": "stage_skipped",
+            "source": "系统",
+            "content": f"{stage}已跳过（命中语义答案缓存）",
+            "region": region,
+            "is_final": False,
+            "timestamp": datetime.now().isoformat()
+        })
+    await sse_session_store.publish(session_id, {
+        "type": "result",
+        "source": "系统",
+        "content": cached_answer["sql"],
+        "cache": "semantic_hit",
+        "region": "sql",
+        "is_final": True,
+        "timestamp": datetime.now().isoformat(),
+        "message_id": f"{session_id}-sql-cached-{uuid.uuid4()}"
+    })
 
 
 async def process_query_task(
@@ -309,7 +315,8 @@ async def process_query_task(
     session_id: str,
     connection_id: Optional[int] = None,
     user_feedback_enabled: bool = False,
-    db: Session = None
+    db: Session = None,
+    bypass_cache: bool = False
 ):
     """
     处理查询的后台任务
@@ -318,18 +325,13 @@ async def process_query_task(
     logger.info(f"===== 开始执行 process_query_task: 会话ID={session_id}, 查询={query}, 连接ID={connection_id}, 用户反馈={user_feedback_enabled} =====")
 
     try:
-        # 获取消息队列
-        message_queue = message_queues.get(session_id)
-        if not message_queue:
+        # 检查会话是否存在
+        if sse_session_store.get(session_id) is None:
             logger.error(f"会话 {session_id} 的消息队列不存在")
             return
 
-        # 获取反馈队列
-        feedback_queue = feedback_queues.get(session_id)
-        logger.info(f"process_query_task: 成功获取反馈队列: {session_id}")
-
         # 更新会话状态
-        active_sessions[session_id]["status"] = "processing"
+        await sse_session_store.update(session_id, status="processing")
 
 
         # 创建智能体编排器
@@ -376,6 +378,22 @@ async def process_query_task(
                 # 添加时间戳
                 msg_dict["timestamp"] = datetime.now().isoformat()
 
+                # 分页推送的查询结果，只发送数据页本身
+                if message.result and "result_page" in message.result:
+                    page = message.result["result_page"]
+                    await sse_session_store.publish(session_id, {
+                        "type": "result_page",
+                        "source": message.source,
+                        "content": json.dumps(page["rows"], ensure_ascii=False, default=str),
+                        "columns": page["columns"],
+                        "page": page["page"],
+                        "region": "data",
+                        "is_final": False,
+                        "timestamp": datetime.now().isoformat(),
+                        "message_id": f"{session_id}-data-page-{page['page']}-{uuid.uuid4()}"
+                    })
+                    return
+
                 # 处理包含结果数据的消息
                 if message.result and message.is_final:
                     logger.info(f"处理包含结果数据的最终消息: {list(message.result.keys())}")
@@ -385,7 +403,7 @@ async def process_query_task(
                     # 根据结果数据类型发送到对应区域
                     if "sql" in result_data:
                         # SQL结果
-                        await message_queue.put({
+                        await sse_session_store.publish(session_id, {
                             "type": "result",
                             "source": message.source,
                             "content": result_data["sql"],
@@ -398,10 +416,12 @@ async def process_query_task(
 
                     if "results" in result_data:
                         # 数据结果
-                        await message_queue.put({
+                        await sse_session_store.publish(session_id, {
                             "type": "result",
                             "source": message.source,
-                            "content": json.dumps(result_data["results"], ensure_ascii=False),
+                            "content": json.dumps(result_data["results"], ensure_ascii=False, default=str),
+                            "meta": result_data.get("result_meta"),
+                            "cache": (result_data.get("result_meta") or {}).get("cache"),
                             "region": "data",
                             "is_final": True,
                             "timestamp": datetime.now().isoformat(),
@@ -411,7 +431,7 @@ async def process_query_task(
 
                     if "explanation" in result_data:
                         # 解释结果
-                        await message_queue.put({
+                        await sse_session_store.publish(session_id, {
                             "type": "result",
                             "source": message.source,
                             "content": result_data["explanation"],
@@ -428,7 +448,7 @@ async def process_query_task(
                             "type": result_data.get("visualization_type", "bar"),
                             "config": result_data.get("visualization_config", {})
                         }
-                        await message_queue.put({
+                        await sse_session_store.publish(session_id, {
                             "type": "result",
                             "source": message.source,
                             "content": json.dumps(viz_data, ensure_ascii=False),
@@ -440,7 +460,7 @@ async def process_query_task(
                         logger.info(f"发送可视化结果到队列: {viz_data['type']}")
 
                 # 发送原始消息到队列
-                await message_queue.put(msg_dict)
+                await sse_session_store.publish(session_id, msg_dict)
 
             except Exception as e:
                 logger.error(f"消息回调处理错误: {str(e)}")
@@ -451,7 +471,7 @@ async def process_query_task(
         async def user_input_callback(prompt: str, cancellation_token: CancellationToken | None) -> str:
             try:
                 # 发送反馈请求消息
-                await message_queue.put({
+                await sse_session_store.publish(session_id, {
                     "type": "feedback_request",
                     "source": "系统",
                     "content": prompt,
@@ -462,7 +482,7 @@ async def process_query_task(
 
                 # 等待用户反馈
                 logger.info(f"等待用户反馈: {session_id}")
-                feedback = await feedback_queue.get()
+                feedback = await sse_session_store.wait_feedback(session_id)
                 logger.info(f"收到用户反馈: {feedback}")
 
                 # 返回用户反馈内容
@@ -498,12 +518,23 @@ async def process_query_task(
             "timestamp": datetime.now().isoformat()
         }
 
-        await message_queue.put(callback_message)
+        await sse_session_store.publish(session_id, callback_message)
+
+        # 语义答案缓存：命中时跳过上游LLM阶段，直接执行已验证的SQL
+        # （启用用户反馈时查询分析阶段需要与用户交互，不使用缓存）
+        cached_answer = None
+        if not user_feedback_enabled:
+            cached_answer = await answer_cache.lookup(query, connection_id, bypass=bypass_cache)
+        if cached_answer:
+            await publish_cache_hit(session_id, cached_answer)
 
         # 处理查询
         logger.info(f"process_query_task: 开始处理查询: {query}, 会话ID: {session_id}, 连接ID: {connection_id}")
         try:
-            result = await orchestrator.process_query(query, collector, connection_id, user_feedback_enabled)
+            # 在会话追踪上下文中运行，各阶段和LLM调用的span归属到该会话的时间线
+            with pipeline_tracer.session(session_id, connection_id):
+                result = await orchestrator.process_query(query, collector, connection_id, user_feedback_enabled,
+                                                          cached_answer=cached_answer)
             logger.info(f"process_query_task: 查询处理完成: {session_id}")
 
             # 发送最终结果
@@ -516,7 +547,7 @@ async def process_query_task(
                 try:
                     # 发送SQL结果
                     if "sql" in result_dict and result_dict["sql"]:
-                        await message_queue.put({
+                        await sse_session_store.publish(session_id, {
                             "type": "result",
                             "source": "系统",
                             "content": result_dict["sql"],
@@ -529,7 +560,7 @@ async def process_query_task(
 
                     # 发送解释结果
                     if "explanation" in result_dict and result_dict["explanation"]:
-                        await message_queue.put({
+                        await sse_session_store.publish(session_id, {
                             "type": "result",
                             "source": "系统",
                             "content": result_dict["explanation"],
@@ -542,7 +573,7 @@ async def process_query_task(
 
                     # 发送数据结果
                     if "results" in result_dict and result_dict["results"]:
-                        await message_queue.put({
+                        await sse_session_store.publish(session_id, {
                             "type": "result",
                             "source": "系统",
                             "content": json.dumps(result_dict["results"], ensure_ascii=False),
@@ -560,7 +591,7 @@ async def process_query_task(
                             "type": result_dict.get("visualization_type", "bar"),
                             "config": result_dict.get("visualization_config", {})
                         }
-                        await message_queue.put({
+                        await sse_session_store.publish(session_id, {
                             "type": "result",
                             "source": "系统",
                             "content": json.dumps(viz_data, ensure_ascii=False),
@@ -585,27 +616,28 @@ async def process_query_task(
                 }
 
                 logger.info(f"process_query_task: 发送完整最终结果消息: {session_id}")
-                await message_queue.put(final_result_message)
+                await sse_session_store.publish(session_id, final_result_message)
                 logger.info(f"process_query_task: 完整最终结果消息已发送: {session_id}")
             else:
                 logger.warning(f"process_query_task: 未获取到最终结果: {session_id}")
 
-            # 发送处理完成消息
+            # 发送处理完成消息（附带本次查询各阶段的耗时时间线）
             complete_message = {
                 "type": "message",
                 "source": "系统",
                 "content": "查询处理完成",
                 "region": "process",
                 "is_final": True,
+                "timeline": pipeline_tracer.timeline(session_id, pop=True),
                 "timestamp": datetime.now().isoformat()
             }
 
             logger.info(f"process_query_task: 发送处理完成消息: {session_id}")
-            await message_queue.put(complete_message)
+            await sse_session_store.publish(session_id, complete_message)
             logger.info(f"process_query_task: 处理完成消息已发送: {session_id}")
 
             # 更新会话状态
-            active_sessions[session_id]["status"] = "completed"
+            await sse_session_store.update(session_id, status="completed")
             logger.info(f"process_query_task: 会话状态已更新为'completed': {session_id}")
 
             logger.info(f"===== process_query_task 执行完成: 会话ID={session_id} =====")
@@ -621,15 +653,22 @@ async def process_query_task(
                 "content": f"处理查询时出错: {str(query_error)}",
                 "region": "process",
                 "is_final": True,
+                "timeline": pipeline_tracer.timeline(session_id, pop=True),
                 "timestamp": datetime.now().isoformat()
             }
 
             try:
-                await message_queue.put(error_message)
+                await sse_session_store.publish(session_id, error_message)
                 logger.info(f"process_query_task: 错误消息已发送: {session_id}")
             except Exception as e:
                 logger.error(f"process_query_task: 发送错误消息失败: {str(e)}")
 
+    except asyncio.CancelledError:
+        logger.info(f"process_query_task: 查询处理已取消: {session_id}")
+        if session_id in sse_session_store.sessions:
+            sse_session_store.sessions[session_id].info["status"] = "cancelled"
+        raise
+
     except Exception as e:
         logger.error(f"process_query_task: 处理查询任务出错: {str(e)}")
         import traceback
@@ -647,14 +686,14 @@ async def process_query_task(
             }
 
             logger.info(f"process_query_task: 尝试发送全局错误消息: {session_id}")
-            await message_queue.put(error_message)
+            await sse_session_store.publish(session_id, error_message)
             logger.info(f"process_query_task: 全局错误消息已发送: {session_id}")
         except Exception as send_error:
             logger.error(f"process_query_task: 发送错误消息失败: {str(send_error)}")
 
         # 更新会话状态
         try:
-            active_sessions[session_id]["status"] = "error"
+            await sse_session_store.update(session_id, status="error")
             logger.info(f"process_query_task: 会话状态已更新为'error': {session_id}")
         except Exception as status_error:
             logger.error(f"process_query_task: 更新会话状态失败: {str(status_error)}")
@@ -670,23 +709,12 @@ async def send_feedback(
     """
     发送用户反馈到指定会话
     """
-    # 验证会话是否存在
-    if session_id not in active_sessions:
-        raise HTTPException(status_code=404, detail=f"会话 {session_id} 不存在或已过期")
-
-    # 获取反馈队列
-    feedback_queue = feedback_queues.get(session_id)
-    if not feedback_queue:
-        raise HTTPException(status_code=500, detail=f"会话 {session_id} 的反馈队列不存在")
-
     # 添加时间戳
     feedback["timestamp"] = datetime.now().isoformat()
 
-    # 放入反馈队列
-    await feedback_queue.put(feedback)
-
-    # 更新会话最后活动时间
-    active_sessions[session_id]["last_activity"] = datetime.now().isoformat()
+    # 放入会话的反馈队列（会话属于其他worker时写入共享会话后端）
+    if not await sse_session_store.put_feedback(session_id, feedback):
+        raise HTTPException(status_code=404, detail=f"会话 {session_id} 不存在、已过期或反馈队列已满")
 
     return JSONResponse({
         "status": "success",
@@ -701,19 +729,28 @@ async def list_sessions():
     列出所有活动会话
     """
     return JSONResponse({
-        "sessions": active_sessions
+        "sessions": sse_session_store.list_sessions()
     })
 
 
+@router.get("/stats")
+async def get_session_stats():
+    """
+    会话存储统计：会话数、积压消息数和字节数、合并/丢弃的进度消息数
+    """
+    return JSONResponse(sse_session_store.get_stats())
+
+
 @router.get("/sessions/{session_id}")
 async def get_session(session_id: str):
     """
     获取指定会话的信息
     """
-    if session_id not in active_sessions:
+    info = await sse_session_store.get_info(session_id)
+    if info is None:
         raise HTTPException(status_code=404, detail=f"会话 {session_id} 不存在或已过期")
 
-    return JSONResponse(active_sessions[session_id])
+    return JSONResponse(info)
 
 
 @router.delete("/sessions/{session_id}")
@@ -721,13 +758,11 @@ async def delete_session(session_id: str):
     """
     删除指定会话
     """
-    if session_id not in active_sessions:
+    if not await sse_session_store.exists(session_id):
         raise HTTPException(status_code=404, detail=f"会话 {session_id} 不存在或已过期")
 
-    # 删除会话资源
-    active_sessions.pop(session_id, None)
-    message_queues.pop(session_id, None)
-    feedback_queues.pop(session_id, None)
+    # 删除会话资源（同时取消查询处理任务）
+    await sse_session_store.remove(session_id)
 
     return JSONResponse({
         "status": "success",
@@ -735,6 +770,20 @@ async def delete_session(session_id: str):
     })
 
 
+@router.get("/results/{spill_id}")
+async def download_result(spill_id: str):
+    """
+    下载被截断查询的完整结果文件（Parquet或gzip压缩的JSON Lines）
+    """
+    from app.db.result_stream import result_spill_store
+    entry = result_spill_store.get(spill_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"结果文件 {spill_id} 不存在或已过期")
+
+    path, media_type = entry
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
+
 @router.post("/save-history")
 async def save_session_history(
     history_request: SaveChatHistoryRequest,
@@ -745,7 +794,7 @@ async def save_session_history(
     """
     try:
         # 检查会话是否存在
-        if history_request.session_id not in active_sessions:
+        if not await sse_session_store.exists(history_request.session_id):
             logger.warning(f"尝试保存不存在的会话历史: {history_request.session_id}")
 
         # 调用聊天历史API保存数据
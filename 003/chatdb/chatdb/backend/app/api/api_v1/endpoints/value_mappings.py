@@ -50,6 +50,9 @@ def create_value_mapping(
         raise HTTPException(status_code=400, detail="Mapping already exists for this term")
     
     mapping = crud.value_mapping.create(db=db, obj_in=mapping_in)
+
+    from app.services.value_mapping_engine import value_mapping_engine
+    value_mapping_engine.invalidate(column.table.connection_id)
     return mapping
 
 
@@ -93,6 +96,9 @@ def update_value_mapping(
             raise HTTPException(status_code=400, detail="Mapping already exists for this term")
     
     mapping = crud.value_mapping.update(db=db, db_obj=mapping, obj_in=mapping_in)
+
+    from app.services.value_mapping_engine import value_mapping_engine
+    value_mapping_engine.invalidate(mapping.column.table.connection_id)
     return mapping
 
 
@@ -108,5 +114,9 @@ def delete_value_mapping(
     mapping = crud.value_mapping.get(db=db, id=mapping_id)
     if not mapping:
         raise HTTPException(status_code=404, detail="Value mapping not found")
+    connection_id = mapping.column.table.connection_id
     mapping = crud.value_mapping.remove(db=db, id=mapping_id)
+
+    from app.services.value_mapping_engine import value_mapping_engine
+    value_mapping_engine.invalidate(connection_id)
     return mapping
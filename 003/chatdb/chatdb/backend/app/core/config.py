@@ -27,10 +27,60 @@ class Settings(BaseSettings):
     MYSQL_DB: str = os.getenv("MYSQL_DB", "chatdb")
     MYSQL_PORT: str = os.getenv("MYSQL_PORT", "3306")
 
+    # 目标数据库连接池配置
+    TARGET_DB_POOL_SIZE: int = int(os.getenv("TARGET_DB_POOL_SIZE", "5"))
+    TARGET_DB_MAX_OVERFLOW: int = int(os.getenv("TARGET_DB_MAX_OVERFLOW", "10"))
+    TARGET_DB_POOL_PRE_PING: bool = os.getenv("TARGET_DB_POOL_PRE_PING", "true").lower() == "true"
+    TARGET_DB_POOL_RECYCLE: int = int(os.getenv("TARGET_DB_POOL_RECYCLE", "1800"))
+
+    # 查询结果获取配置（服务端游标分块读取，超过行数/字节上限时截断）
+    QUERY_FETCH_SIZE: int = int(os.getenv("QUERY_FETCH_SIZE", "1000"))
+    QUERY_MAX_ROWS: int = int(os.getenv("QUERY_MAX_ROWS", "10000"))
+    QUERY_MAX_BYTES: int = int(os.getenv("QUERY_MAX_BYTES", str(50 * 1024 * 1024)))
+    QUERY_RESULT_SPILL_ENABLED: bool = os.getenv("QUERY_RESULT_SPILL_ENABLED", "false").lower() == "true"
+    QUERY_RESULT_SPILL_DIR: str = os.getenv("QUERY_RESULT_SPILL_DIR", "")
+    QUERY_RESULT_SPILL_MAX_ROWS: int = int(os.getenv("QUERY_RESULT_SPILL_MAX_ROWS", "1000000"))
+    QUERY_RESULT_SPILL_TTL: int = int(os.getenv("QUERY_RESULT_SPILL_TTL", "3600"))
+
+    # 查询执行层配置（同步驱动在有界线程池中运行，按目标连接限制并发）
+    QUERY_EXECUTOR_MAX_WORKERS: int = int(os.getenv("QUERY_EXECUTOR_MAX_WORKERS", "16"))
+    QUERY_MAX_CONCURRENCY_PER_CONNECTION: int = int(os.getenv("QUERY_MAX_CONCURRENCY_PER_CONNECTION", "4"))
+    QUERY_STATEMENT_TIMEOUT: int = int(os.getenv("QUERY_STATEMENT_TIMEOUT", "60"))
+    QUERY_DISCONNECT_GRACE_SECONDS: float = float(os.getenv("QUERY_DISCONNECT_GRACE_SECONDS", "10"))
+
+    # SSE会话存储配置（有界队列、空闲超时、可选SQLite持久化以便多个worker间恢复会话）
+    SSE_SESSION_TTL: int = int(os.getenv("SSE_SESSION_TTL", "3600"))
+    SSE_MAX_SESSIONS: int = int(os.getenv("SSE_MAX_SESSIONS", "10000"))
+    SSE_SESSION_QUEUE_SIZE: int = int(os.getenv("SSE_SESSION_QUEUE_SIZE", "1000"))
+    SSE_SESSION_QUEUE_MAX_BYTES: int = int(os.getenv("SSE_SESSION_QUEUE_MAX_BYTES", str(16 * 1024 * 1024)))
+    SSE_STORE_MAX_BYTES: int = int(os.getenv("SSE_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+    SSE_QUEUE_PUT_TIMEOUT: float = float(os.getenv("SSE_QUEUE_PUT_TIMEOUT", "30"))
+    SSE_FEEDBACK_QUEUE_SIZE: int = int(os.getenv("SSE_FEEDBACK_QUEUE_SIZE", "16"))
+    SSE_SWEEP_INTERVAL: float = float(os.getenv("SSE_SWEEP_INTERVAL", "30"))
+    SSE_SESSION_BACKEND: str = os.getenv("SSE_SESSION_BACKEND", "memory")  # memory 或 sqlite
+    SSE_SESSION_DB_PATH: str = os.getenv("SSE_SESSION_DB_PATH", "")
+
+    # WebSocket广播配置（每个连接的有界出站队列，溢出时断开慢客户端；共享心跳）
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+    WS_HEARTBEAT_INTERVAL: float = float(os.getenv("WS_HEARTBEAT_INTERVAL", "60"))
+    WS_SESSION_TIMEOUT: float = float(os.getenv("WS_SESSION_TIMEOUT", "7200"))
+    WS_CLOSE_TIMEOUT: float = float(os.getenv("WS_CLOSE_TIMEOUT", "5"))
+
+    # 查询结果缓存配置（只读SELECT，按连接和规范化SQL指纹缓存）
+    QUERY_RESULT_CACHE_ENABLED: bool = os.getenv("QUERY_RESULT_CACHE_ENABLED", "true").lower() == "true"
+    QUERY_RESULT_CACHE_TTL: int = int(os.getenv("QUERY_RESULT_CACHE_TTL", "300"))
+    QUERY_RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("QUERY_RESULT_CACHE_MAX_ENTRIES", "1024"))
+    QUERY_RESULT_CACHE_MAX_BYTES: int = int(os.getenv("QUERY_RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    QUERY_RESULT_CACHE_MAX_ENTRY_BYTES: int = int(os.getenv("QUERY_RESULT_CACHE_MAX_ENTRY_BYTES", str(16 * 1024 * 1024)))
+
     # Neo4j settings
     NEO4J_URI: str = os.getenv("NEO4J_URI", "bolt://155.138.220.75:7687")
     NEO4J_USER: str = os.getenv("NEO4J_USER", "neo4j")
     NEO4J_PASSWORD: str = os.getenv("NEO4J_PASSWORD", "65132090")
+    NEO4J_MAX_CONNECTION_POOL_SIZE: int = int(os.getenv("NEO4J_MAX_CONNECTION_POOL_SIZE", "50"))
+    NEO4J_SYNC_BATCH_SIZE: int = int(os.getenv("NEO4J_SYNC_BATCH_SIZE", "500"))
+    # 检索路径上单次Cypher查询的超时（秒），同时作为服务端事务超时
+    NEO4J_QUERY_TIMEOUT: float = float(os.getenv("NEO4J_QUERY_TIMEOUT", "5"))
 
     # LLM settings
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
@@ -40,9 +90,22 @@ class Settings(BaseSettings):
     # Milvus配置
     MILVUS_HOST: str = os.getenv("MILVUS_HOST", "localhost")
     MILVUS_PORT: str = os.getenv("MILVUS_PORT", "19530")
+    MILVUS_COLLECTION: str = os.getenv("MILVUS_COLLECTION", "qa_pairs")
+    # connection_id作为分区键，按连接检索时只扫描对应分区
+    MILVUS_PARTITION_KEY_ENABLED: bool = os.getenv("MILVUS_PARTITION_KEY_ENABLED", "true").lower() == "true"
+    MILVUS_NUM_PARTITIONS: int = int(os.getenv("MILVUS_NUM_PARTITIONS", "64"))
+    # 索引和检索参数（JSON），可由 python -m benchmarks.tune_milvus_index 调优后写入
+    MILVUS_INDEX_TYPE: str = os.getenv("MILVUS_INDEX_TYPE", "IVF_FLAT")
+    MILVUS_INDEX_PARAMS: str = os.getenv("MILVUS_INDEX_PARAMS", '{"nlist": 128}')
+    MILVUS_SEARCH_PARAMS: str = os.getenv("MILVUS_SEARCH_PARAMS", '{"nprobe": 10}')
 
     # 向量模型配置
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    EMBEDDING_BATCH_WINDOW_MS: float = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    EMBEDDING_MAX_BATCH_SIZE: int = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+    EMBEDDING_CACHE_TTL: int = int(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+    QA_BULK_BATCH_SIZE: int = int(os.getenv("QA_BULK_BATCH_SIZE", "500"))
     VECTOR_DIMENSION: int = int(os.getenv("VECTOR_DIMENSION", "384"))
 
     # 混合检索配置
@@ -52,6 +115,12 @@ class Settings(BaseSettings):
     PATTERN_WEIGHT: float = float(os.getenv("PATTERN_WEIGHT", "0.20"))
     QUALITY_WEIGHT: float = float(os.getenv("QUALITY_WEIGHT", "0.10"))
 
+    # 语义答案缓存配置（同一连接上高度相似的已验证问答对直接复用SQL，跳过LLM阶段）
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+    ANSWER_CACHE_MIN_SUCCESS_RATE: float = float(os.getenv("ANSWER_CACHE_MIN_SUCCESS_RATE", "0"))
+    ANSWER_CACHE_LOOKUP_TIMEOUT: float = float(os.getenv("ANSWER_CACHE_LOOKUP_TIMEOUT", "2"))
+
     # 学习配置
     AUTO_LEARNING_ENABLED: bool = os.getenv("AUTO_LEARNING_ENABLED", "true").lower() == "true"
     FEEDBACK_LEARNING_ENABLED: bool = os.getenv("FEEDBACK_LEARNING_ENABLED", "true").lower() == "true"
@@ -61,6 +130,29 @@ class Settings(BaseSettings):
     RETRIEVAL_CACHE_TTL: int = int(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
     MAX_EXAMPLES_PER_QUERY: int = int(os.getenv("MAX_EXAMPLES_PER_QUERY", "5"))
     PARALLEL_RETRIEVAL: bool = os.getenv("PARALLEL_RETRIEVAL", "true").lower() == "true"
+    SCHEMA_CACHE_MAX_CONNECTIONS: int = int(os.getenv("SCHEMA_CACHE_MAX_CONNECTIONS", "64"))
+    SCHEMA_CONTEXT_CACHE_SIZE: int = int(os.getenv("SCHEMA_CONTEXT_CACHE_SIZE", "1024"))
+    VALUE_MAPPING_CACHE_TTL: int = int(os.getenv("VALUE_MAPPING_CACHE_TTL", "3600"))
+
+    # 流水线追踪配置（各阶段耗时直方图的滚动窗口，以及为SSE最终消息保留的会话时间线）
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_WINDOW_SECONDS: int = int(os.getenv("TRACE_WINDOW_SECONDS", "300"))
+    TRACE_WINDOW_SLOTS: int = int(os.getenv("TRACE_WINDOW_SLOTS", "10"))
+    TRACE_MAX_SESSIONS: int = int(os.getenv("TRACE_MAX_SESSIONS", "1000"))
+    TRACE_MAX_SPANS_PER_SESSION: int = int(os.getenv("TRACE_MAX_SPANS_PER_SESSION", "200"))
+
+    # 图可视化配置（分级细节、分页、预计算布局）
+    GRAPH_PAGE_SIZE: int = int(os.getenv("GRAPH_PAGE_SIZE", "500"))
+    GRAPH_MAX_PAGE_SIZE: int = int(os.getenv("GRAPH_MAX_PAGE_SIZE", "5000"))
+    GRAPH_EGO_MAX_HOPS: int = int(os.getenv("GRAPH_EGO_MAX_HOPS", "3"))
+    GRAPH_EGO_MAX_NODES: int = int(os.getenv("GRAPH_EGO_MAX_NODES", "300"))
+    GRAPH_GZIP_MIN_SIZE: int = int(os.getenv("GRAPH_GZIP_MIN_SIZE", "1024"))
+
+    # 表向量索引配置（本地预排序，替代每次查询的LLM表排序）
+    TABLE_INDEX_ENABLED: bool = os.getenv("TABLE_INDEX_ENABLED", "true").lower() == "true"
+    TABLE_INDEX_TOP_K: int = int(os.getenv("TABLE_INDEX_TOP_K", "8"))
+    TABLE_INDEX_MIN_SCORE: float = float(os.getenv("TABLE_INDEX_MIN_SCORE", "0.3"))
+    TABLE_INDEX_AMBIGUITY_MARGIN: float = float(os.getenv("TABLE_INDEX_AMBIGUITY_MARGIN", "0.03"))
 
     class Config:
         case_sensitive = True
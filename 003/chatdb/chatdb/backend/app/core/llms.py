@@ -1,4 +1,5 @@
 from app.core.config import settings
+from app.core.tracing import TracedChatCompletionClient
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 
 
@@ -22,4 +23,5 @@ def _setup_model_client():
 
     return OpenAIChatCompletionClient(**model_config)
 
-model_client = _setup_model_client()
\ No newline at end of file
+# 包装为记录LLM调用耗时和token数的客户端
+model_client = TracedChatCompletionClient.wrap(_setup_model_client())
\ No newline at end of file
@@ -0,0 +1,423 @@
+"""
+流水线追踪模块
+记录智能体消息处理和LLM调用的耗时span（阶段、连接ID、会话ID、耗时、token数、返回行数），
+按(类型, 阶段)聚合为滚动直方图并以Prometheus文本格式导出，同时为每个会话保留时间线
+
+会话信息和当前阶段通过contextvars传递：编排器在会话上下文中启动智能体运行时，
+运行时创建的处理任务会继承该上下文，因此各阶段和其中的LLM调用都能归属到正确的会话
+"""
+import contextvars
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from autogen_core.models import ChatCompletionClient, CreateResult
+
+from app.core.config import settings
+
+# 阶段耗时直方图的桶上界（秒）
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 滚动窗口内导出的分位数
+WINDOW_QUANTILES = (0.5, 0.95, 0.99)
+
+# span类型：智能体处理一条消息 / 一次LLM调用
+SPAN_AGENT = "agent"
+SPAN_LLM = "llm"
+
+_session_var: contextvars.ContextVar[Optional[Tuple[str, Optional[int]]]] = \
+    contextvars.ContextVar("trace_session", default=None)
+_stage_span_var: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("trace_stage_span", default=None)
+
+
+@dataclass
+class Span:
+    """一次计时操作"""
+    kind: str
+    stage: str
+    session_id: Optional[str]
+    connection_id: Optional[int]
+    started_at: float
+    duration: float = 0.0
+    first_token: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    rows: Optional[int] = None
+    error: Optional[str] = None
+
+    def to_timeline_entry(self, origin: float) -> Dict[str, Any]:
+        entry = {
+            "kind": self.kind,
+            "stage": self.stage,
+            "start_ms": round((self.started_at - origin) * 1000, 1),
+            "duration_ms": round(self.duration * 1000, 1),
+        }
+        if self.first_token is not None:
+            entry["first_token_ms"] = round(self.first_token * 1000, 1)
+        if self.prompt_tokens or self.completion_tokens:
+            entry["prompt_tokens"] = self.prompt_tokens
+            entry["completion_tokens"] = self.completion_tokens
+        if self.rows is not None:
+            entry["rows"] = self.rows
+        if self.error:
+            entry["error"] = self.error
+        return entry
+
+
+class RollingHistogram:
+    """按时间分片的滚动直方图
+
+    最近window秒的观测分布在slots个时间片中，过期的时间片整体丢弃，用于计算窗口内的分位数；
+    另外累计进程启动以来的桶计数，作为Prometheus的histogram导出
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, window: float = 300, slots: int = 10):
+        self.buckets = tuple(buckets)
+        self.slot_seconds = window / max(slots, 1)
+        self.slots = max(slots, 1)
+        self._window: "deque[Tuple[int, List[int], float]]" = deque()
+        self.total_counts = [0] * (len(self.buckets) + 1)
+        self.total_sum = 0.0
+        self.total_count = 0
+
+    def _bucket_index(self, value: float) -> int:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                return index
+        return len(self.buckets)
+
+    def _expire(self, now: float) -> int:
+        current = int(now // self.slot_seconds)
+        while self._window and self._window[0][0] <= current - self.slots:
+            self._window.popleft()
+        return current
+
+    def observe(self, value: float, now: Optional[float] = None) -> None:
+        index = self._bucket_index(value)
+        current = self._expire(time.time() if now is None else now)
+        if not self._window or self._window[-1][0] != current:
+            self._window.append((current, [0] * (len(self.buckets) + 1), 0.0))
+        slot, counts, total = self._window[-1]
+        counts[index] += 1
+        self._window[-1] = (slot, counts, total + value)
+        self.total_counts[index] += 1
+        self.total_sum += value
+        self.total_count += 1
+
+    def window_counts(self, now: Optional[float] = None) -> Tuple[List[int], float, int]:
+        """返回窗口内各桶计数（非累计）、总和与观测数"""
+        self._expire(time.time() if now is None else now)
+        counts = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for _, slot_counts, slot_sum in self._window:
+            for index, count in enumerate(slot_counts):
+                counts[index] += count
+            total += slot_sum
+        return counts, total, sum(counts)
+
+    def quantile(self, q: float, now: Optional[float] = None) -> Optional[float]:
+        """估算窗口内的分位数（在命中的桶内线性插值），窗口为空时返回None"""
+        counts, _, count = self.window_counts(now)
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    # 超过最大桶上界，无法插值
+                    return self.buckets[-1]
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+def _label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_float(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value))
+
+
+class PipelineTracer:
+    """收集span，维护各阶段的滚动直方图、计数器和会话时间线（线程安全）"""
+
+    def __init__(self, enabled: bool = True, buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 window: float = 300, slots: int = 10, max_sessions: int = 1000,
+                 max_spans_per_session: int = 200):
+        """初始化追踪器
+
+        Args:
+            enabled: 是否记录span，关闭时span上下文只做透传
+            buckets: 耗时直方图桶上界（秒）
+            window: 滚动窗口长度（秒）
+            slots: 滚动窗口的时间片数
+            max_sessions: 最多保留时间线的会话数，超出时淘汰最早的会话
+            max_spans_per_session: 每个会话时间线最多保留的span数
+        """
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.window = window
+        self.slots = slots
+        self.max_sessions = max_sessions
+        self.max_spans_per_session = max_spans_per_session
+        self._histograms: Dict[Tuple[str, str], RollingHistogram] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self._tokens: Dict[Tuple[str, str], int] = {}
+        self._rows: Dict[str, int] = {}
+        self._timelines: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self, session_id: str, connection_id: Optional[int] = None) -> Iterator[None]:
+        """在该上下文中创建的span归属到指定会话"""
+        token = _session_var.set((session_id, connection_id))
+        try:
+            yield
+        finally:
+            _session_var.reset(token)
+
+    @contextmanager
+    def span(self, kind: str, stage: Optional[str] = None) -> Iterator[Optional[Span]]:
+        """对一段操作计时
+
+        stage为None时使用当前所在阶段；智能体span会成为其中LLM调用的所属阶段，
+        LLM span的token数同时累加到所属阶段的span上
+
+        Yields:
+            Optional[Span]: 可在操作过程中补充token数、行数等信息，未启用时为None
+        """
+        if not self.enabled:
+            yield None
+            return
+
+        parent = _stage_span_var.get()
+        session = _session_var.get() or (None, None)
+        span = Span(
+            kind=kind,
+            stage=stage or (parent.stage if parent else "other"),
+            session_id=session[0],
+            connection_id=session[1],
+            started_at=time.time(),
+        )
+        token = _stage_span_var.set(span) if kind == SPAN_AGENT else None
+        started = time.perf_counter()
+        try:
+            yield span
+        except GeneratorExit:
+            # 流式调用的消费方提前结束，不算错误
+            raise
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - started
+            if token is not None:
+                _stage_span_var.reset(token)
+            if kind == SPAN_LLM and parent is not None:
+                parent.prompt_tokens += span.prompt_tokens
+                parent.completion_tokens += span.completion_tokens
+            self.record(span)
+
+    def annotate(self, rows: Optional[int] = None) -> None:
+        """为当前阶段的span补充信息（如SQL执行返回的行数）"""
+        span = _stage_span_var.get()
+        if span is not None and rows is not None:
+            span.rows = (span.rows or 0) + rows
+
+    def record(self, span: Span) -> None:
+        """把已结束的span计入直方图、计数器和会话时间线"""
+        key = (span.kind, span.stage)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = RollingHistogram(self.buckets, self.window, self.slots)
+            histogram.observe(span.duration)
+            if span.error:
+                self._errors[key] = self._errors.get(key, 0) + 1
+            if span.kind == SPAN_LLM:
+                for token_type, count in (("prompt", span.prompt_tokens), ("completion", span.completion_tokens)):
+                    self._tokens[(span.stage, token_type)] = self._tokens.get((span.stage, token_type), 0) + count
+            if span.rows is not None:
+                self._rows[span.stage] = self._rows.get(span.stage, 0) + span.rows
+
+            if span.session_id is None:
+                return
+            timeline = self._timelines.get(span.session_id)
+            if timeline is None:
+                timeline = self._timelines[span.session_id] = []
+                while len(self._timelines) > self.max_sessions:
+                    self._timelines.popitem(last=False)
+            if len(timeline) < self.max_spans_per_session:
+                timeline.append(span)
+
+    def timeline(self, session_id: str, pop: bool = False) -> List[Dict[str, Any]]:
+        """返回会话的时间线（按开始时间排序，时间相对第一个span的开始）
+
+        Args:
+            session_id: 会话ID
+            pop: 是否同时丢弃该会话的记录
+        """
+        with self._lock:
+            spans = self._timelines.pop(session_id, []) if pop else list(self._timelines.get(session_id, []))
+        if not spans:
+            return []
+        spans.sort(key=lambda span: span.started_at)
+        origin = spans[0].started_at
+        return [span.to_timeline_entry(origin) for span in spans]
+
+    def stage_quantiles(self, now: Optional[float] = None) -> Dict[str, Dict[str, Optional[float]]]:
+        """各(类型, 阶段)在滚动窗口内的耗时分位数（秒），键为"类型/阶段" """
+        with self._lock:
+            return {
+                f"{kind}/{stage}": {f"p{int(q * 100)}": histogram.quantile(q, now) for q in WINDOW_QUANTILES}
+                for (kind, stage), histogram in self._histograms.items()
+            }
+
+    def render_prometheus(self, now: Optional[float] = None) -> str:
+        """以Prometheus文本格式导出指标"""
+        lines = [
+            "# HELP chatdb_stage_duration_seconds Duration of agent message handling and LLM calls.",
+            "# TYPE chatdb_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            window_lines = []
+            for (kind, stage), histogram in histograms:
+                labels = f'kind="{_label_value(kind)}",stage="{_label_value(stage)}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), histogram.total_counts):
+                    cumulative += count
+                    lines.append(f'chatdb_stage_duration_seconds_bucket{{{labels},le="{_format_float(bound)}"}} '
+                                 f'{cumulative}')
+                lines.append(f"chatdb_stage_duration_seconds_sum{{{labels}}} {_format_float(histogram.total_sum)}")
+                lines.append(f"chatdb_stage_duration_seconds_count{{{labels}}} {histogram.total_count}")
+
+                _, window_sum, window_count = histogram.window_counts(now)
+                for q in WINDOW_QUANTILES:
+                    value = histogram.quantile(q, now)
+                    window_lines.append(
+                        f'chatdb_stage_duration_window_seconds{{{labels},quantile="{q}"}} '
+                        f'{_format_float(value) if value is not None else "NaN"}'
+                    )
+                window_lines.append(f"chatdb_stage_duration_window_seconds_sum{{{labels}}} "
+                                    f"{_format_float(window_sum)}")
+                window_lines.append(f"chatdb_stage_duration_window_seconds_count{{{labels}}} {window_count}")
+
+            lines.append(f"# HELP chatdb_stage_duration_window_seconds Duration quantiles over the last "
+                         f"{int(self.window)} seconds.")
+            lines.append("# TYPE chatdb_stage_duration_window_seconds summary")
+            lines.extend(window_lines)
+
+            lines.append("# HELP chatdb_stage_errors_total Spans that ended with an exception.")
+            lines.append("# TYPE chatdb_stage_errors_total counter")
+            for (kind, stage), count in sorted(self._errors.items()):
+                lines.append(f'chatdb_stage_errors_total{{kind="{_label_value(kind)}",'
+                             f'stage="{_label_value(stage)}"}} {count}')
+
+            lines.append("# HELP chatdb_llm_tokens_total LLM tokens by stage.")
+            lines.append("# TYPE chatdb_llm_tokens_total counter")
+            for (stage, token_type), count in sorted(self._tokens.items()):
+                lines.append(f'chatdb_llm_tokens_total{{stage="{_label_value(stage)}",'
+                             f'type="{token_type}"}} {count}')
+
+            lines.append("# HELP chatdb_db_rows_total Rows returned by database queries by stage.")
+            lines.append("# TYPE chatdb_db_rows_total counter")
+            for stage, count in sorted(self._rows.items()):
+                lines.append(f'chatdb_db_rows_total{{stage="{_label_value(stage)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """清空全部指标和时间线"""
+        with self._lock:
+            self._histograms.clear()
+            self._errors.clear()
+            self._tokens.clear()
+            self._rows.clear()
+            self._timelines.clear()
+
+
+class TracedChatCompletionClient(ChatCompletionClient):
+    """为create/create_stream调用记录LLM span的模型客户端包装，其余接口直接转发"""
+
+    def __init__(self, client: ChatCompletionClient, tracer: "PipelineTracer" = None):
+        self.client = client
+        self.tracer = tracer or pipeline_tracer
+
+    @classmethod
+    def wrap(cls, client: ChatCompletionClient, tracer: "PipelineTracer" = None) -> ChatCompletionClient:
+        """包装模型客户端，已经包装过的直接返回"""
+        if client is None or isinstance(client, cls):
+            return client
+        return cls(client, tracer)
+
+    @staticmethod
+    def _record_usage(span: Optional[Span], result: CreateResult) -> None:
+        if span is not None and result.usage is not None:
+            span.prompt_tokens = result.usage.prompt_tokens
+            span.completion_tokens = result.usage.completion_tokens
+
+    async def create(self, messages, **kwargs) -> CreateResult:
+        with self.tracer.span(SPAN_LLM) as span:
+            result = await self.client.create(messages, **kwargs)
+            self._record_usage(span, result)
+            return result
+
+    def create_stream(self, messages, **kwargs):
+        return self._stream(messages, **kwargs)
+
+    async def _stream(self, messages, **kwargs):
+        with self.tracer.span(SPAN_LLM) as span:
+            started = time.perf_counter()
+            async for chunk in self.client.create_stream(messages, **kwargs):
+                if isinstance(chunk, CreateResult):
+                    self._record_usage(span, chunk)
+                elif span is not None and span.first_token is None:
+                    span.first_token = time.perf_counter() - started
+                yield chunk
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    def actual_usage(self):
+        return self.client.actual_usage()
+
+    def total_usage(self):
+        return self.client.total_usage()
+
+    def count_tokens(self, messages, **kwargs) -> int:
+        return self.client.count_tokens(messages, **kwargs)
+
+    def remaining_tokens(self, messages, **kwargs) -> int:
+        return self.client.remaining_tokens(messages, **kwargs)
+
+    @property
+    def model_info(self):
+        return self.client.model_info
+
+    @property
+    def capabilities(self):
+        return self.client.capabilities
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "client":
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+
+# 全局追踪器实例
+pipeline_tracer = PipelineTracer(
+    enabled=settings.TRACING_ENABLED,
+    window=settings.TRACE_WINDOW_SECONDS,
+    slots=settings.TRACE_WINDOW_SLOTS,
+    max_sessions=settings.TRACE_MAX_SESSIONS,
+    max_spans_per_session=settings.TRACE_MAX_SPANS_PER_SESSION,
+)
@@ -3,26 +3,37 @@
 """
 import json
 import re
+import threading
 import time
-from typing import Dict, Any, List, Optional, Set, Tuple
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Hashable, List, Optional, Set, Tuple
 
 
 class CacheManager:
-    """缓存管理器，提供缓存功能"""
+    """缓存管理器，提供带TTL的LRU缓存功能（线程安全）"""
     
-    def __init__(self, max_size: int = 100, ttl: int = 3600):
+    def __init__(self, max_size: int = 100, ttl: int = 3600,
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
         """初始化缓存管理器
         
         Args:
             max_size: 最大缓存条目数
-            ttl: 缓存生存时间（秒）
+            ttl: 缓存生存时间（秒），从写入时开始计算
+            max_bytes: 缓存总字节数上限，需同时提供sizeof，None表示不限
+            sizeof: 计算缓存值字节数的函数
         """
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.cache: "OrderedDict[Hashable, Any]" = OrderedDict()
         self.max_size = max_size
         self.ttl = ttl
-        self.access_times: Dict[str, float] = {}
-    
-    def get(self, key: str) -> Optional[Any]:
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.access_times: Dict[Hashable, float] = {}
+        self.sizes: Dict[Hashable, int] = {}
+        self.total_bytes = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
         """获取缓存值
         
         Args:
@@ -31,48 +42,93 @@ class CacheManager:
         Returns:
             Optional[Any]: 缓存值，如果不存在或已过期则返回None
         """
-        if key not in self.cache:
-            return None
-        
-        # 检查是否过期
-        if time.time() - self.access_times[key] > self.ttl:
-            self.remove(key)
-            return None
-        
-        # 更新访问时间
-        self.access_times[key] = time.time()
-        return self.cache[key]
+        with self._lock:
+            if key not in self.cache:
+                return None
+            
+            # 检查是否过期
+            if time.time() - self.access_times[key] > self.ttl:
+                self.remove(key)
+                return None
+            
+            # 标记为最近使用
+            self.cache.move_to_end(key)
+            return self.cache[key]
     
-    def set(self, key: str, value: Any) -> None:
+    def set(self, key: Hashable, value: Any) -> bool:
         """设置缓存值
         
         Args:
             key: 缓存键
             value: 缓存值
+            
+        Returns:
+            bool: 是否已缓存（单个值超过字节上限时不缓存）
         """
-        # 如果缓存已满，移除最久未访问的条目
-        if len(self.cache) >= self.max_size and key not in self.cache:
-            oldest_key = min(self.access_times.items(), key=lambda x: x[1])[0]
-            self.remove(oldest_key)
-        
-        self.cache[key] = value
-        self.access_times[key] = time.time()
-    
-    def remove(self, key: str) -> None:
+        size = self.sizeof(value) if self.sizeof else 0
+        with self._lock:
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.remove(key)
+                return False
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.total_bytes -= self.sizes.get(key, 0)
+            self.cache[key] = value
+            self.access_times[key] = time.time()
+            self.sizes[key] = size
+            self.total_bytes += size
+            
+            # 如果缓存已满（条目数或字节数），移除最久未使用的条目
+            while len(self.cache) > self.max_size or (
+                self.max_bytes is not None and self.total_bytes > self.max_bytes
+            ):
+                oldest_key, _ = self.cache.popitem(last=False)
+                self.access_times.pop(oldest_key, None)
+                self.total_bytes -= self.sizes.pop(oldest_key, 0)
+                self.evictions += 1
+            return True
+    
+    def remove(self, key: Hashable) -> None:
         """移除缓存条目
         
         Args:
             key: 缓存键
         """
-        if key in self.cache:
-            del self.cache[key]
-        if key in self.access_times:
-            del self.access_times[key]
+        with self._lock:
+            self.cache.pop(key, None)
+            self.access_times.pop(key, None)
+            self.total_bytes -= self.sizes.pop(key, 0)
+    
+    def remove_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """移除所有键满足条件的缓存条目
+        
+        Args:
+            predicate: 键过滤函数
+            
+        Returns:
+            int: 移除的条目数
+        """
+        with self._lock:
+            keys = [key for key in self.cache if predicate(key)]
+            for key in keys:
+                self.remove(key)
+            return len(keys)
+    
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """获取当前所有缓存条目的快照"""
+        with self._lock:
+            return list(self.cache.items())
     
     def clear(self) -> None:
         """清空缓存"""
-        self.cache.clear()
-        self.access_times.clear()
+        with self._lock:
+            self.cache.clear()
+            self.access_times.clear()
+            self.sizes.clear()
+            self.total_bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self.cache)
 
 
 def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
@@ -2,9 +2,8 @@ from typing import Any, Dict, Optional, Union, List
 
 from sqlalchemy.orm import Session
 from sqlalchemy import delete
-from neo4j import GraphDatabase
 
-from app.core.config import settings
+from app.db.neo4j_session import get_neo4j_driver
 from app.core.security import get_password_hash, verify_password
 from app.crud.base import CRUDBase
 from app.models.db_connection import DBConnection
@@ -101,11 +100,8 @@ class CRUDDBConnection(CRUDBase[DBConnection, DBConnectionCreate, DBConnectionUp
         """清理Neo4j图数据库中与指定连接相关的所有数据"""
         try:
             print(f"开始清理Neo4j中连接ID为{connection_id}的数据")
-            # 连接到Neo4j
-            driver = GraphDatabase.driver(
-                settings.NEO4J_URI,
-                auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
-            )
+            # 使用共享的Neo4j驱动
+            driver = get_neo4j_driver()
 
             with driver.session() as session:
                 # 删除与此连接相关的所有节点和关系
@@ -115,8 +111,6 @@ class CRUDDBConnection(CRUDBase[DBConnection, DBConnectionCreate, DBConnectionUp
                     connection_id=connection_id
                 )
                 print(f"成功清理Neo4j中连接ID为{connection_id}的数据")
-
-            driver.close()
         except Exception as e:
             print(f"清理Neo4j数据失败: {str(e)}")
             # 这里我们只记录错误，但不抛出异常，因为即使Neo4j清理失败，我们仍然希望继续删除MySQL中的数据
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
 from sqlalchemy.orm import Session
 
@@ -31,5 +31,16 @@ class CRUDSchemaColumn(CRUDBase[SchemaColumn, SchemaColumnCreate, SchemaColumnUp
             .first()
         )
 
+    def get_by_tables(
+        self, db: Session, *, table_ids: Sequence[int]
+    ) -> List[SchemaColumn]:
+        if not table_ids:
+            return []
+        return (
+            db.query(SchemaColumn)
+            .filter(SchemaColumn.table_id.in_(list(table_ids)))
+            .all()
+        )
+
 
 schema_column = CRUDSchemaColumn(SchemaColumn)
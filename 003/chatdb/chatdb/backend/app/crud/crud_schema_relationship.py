@@ -1,5 +1,6 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence
 
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
 
 from app.crud.base import CRUDBase
@@ -37,6 +38,22 @@ class CRUDSchemaRelationship(CRUDBase[SchemaRelationship, SchemaRelationshipCrea
             .all()
         )
 
+    def get_by_tables(
+        self, db: Session, *, table_ids: Sequence[int]
+    ) -> List[SchemaRelationship]:
+        # Relationships with either end in the given tables
+        if not table_ids:
+            return []
+        table_ids = list(table_ids)
+        return (
+            db.query(SchemaRelationship)
+            .filter(or_(
+                SchemaRelationship.source_table_id.in_(table_ids),
+                SchemaRelationship.target_table_id.in_(table_ids)
+            ))
+            .all()
+        )
+
     def get_by_columns(
         self, db: Session, *, source_column_id: int, target_column_id: int
     ) -> Optional[SchemaRelationship]:
@@ -1,8 +1,10 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
 
 from sqlalchemy.orm import Session
 
 from app.crud.base import CRUDBase
+from app.models.schema_column import SchemaColumn
+from app.models.schema_table import SchemaTable
 from app.models.value_mapping import ValueMapping
 from app.schemas.value_mapping import ValueMappingCreate, ValueMappingUpdate
 
@@ -31,5 +33,34 @@ class CRUDValueMapping(CRUDBase[ValueMapping, ValueMappingCreate, ValueMappingUp
             .first()
         )
 
+    def get_by_columns(
+        self, db: Session, *, column_ids: Sequence[int]
+    ) -> List[ValueMapping]:
+        if not column_ids:
+            return []
+        return (
+            db.query(ValueMapping)
+            .filter(ValueMapping.column_id.in_(list(column_ids)))
+            .all()
+        )
+
+    def get_by_connection(
+        self, db: Session, *, connection_id: int
+    ) -> List[Tuple[int, str, str, str, str]]:
+        # (column_id, table_name, column_name, nl_term, db_value) rows
+        return (
+            db.query(
+                ValueMapping.column_id,
+                SchemaTable.table_name,
+                SchemaColumn.column_name,
+                ValueMapping.nl_term,
+                ValueMapping.db_value,
+            )
+            .join(SchemaColumn, ValueMapping.column_id == SchemaColumn.id)
+            .join(SchemaTable, SchemaColumn.table_id == SchemaTable.id)
+            .filter(SchemaTable.connection_id == connection_id)
+            .all()
+        )
+
 
 value_mapping = CRUDValueMapping(ValueMapping)
@@ -1,19 +1,31 @@
 import json
 import os
 import sqlite3
+import time
+import uuid
 from abc import ABC
+from itertools import islice
 from typing import Union
 from urllib.parse import urlparse
 
 import pandas as pd
 import requests
 
+from app.core.config import settings
+from app.db.result_stream import ResultStream
+
 
 class DBAccess(ABC):
     def __init__(self, dialect="MySQL"):
         self.run_sql_is_set = False
         self.dialect = dialect
         self.run_sql = None
+        # Set by connectors that support server-side cursors, see stream_sql()
+        self.open_cursor = None
+        # Set by connectors that can interrupt a running statement, see cancel()
+        self.cancel_running = None
+        # Seconds; passed to the driver by the connectors that support it
+        self.statement_timeout = settings.QUERY_STATEMENT_TIMEOUT
     def connect_to_snowflake(
         self,
         account: str,
@@ -127,11 +139,41 @@ class DBAccess(ABC):
             **kwargs
         )
 
+        # SQLite has no statement timeout; a progress handler aborts the
+        # running statement once its deadline has passed.
+        deadline = [None]
+
+        def check_deadline():
+            return 1 if deadline[0] is not None and time.monotonic() > deadline[0] else 0
+
+        def start_statement():
+            if self.statement_timeout:
+                deadline[0] = time.monotonic() + self.statement_timeout
+
+        conn.set_progress_handler(check_deadline, 10000)
+
         def run_sql_sqlite(sql: str):
+            start_statement()
             return pd.read_sql_query(sql, conn)
 
+        def open_cursor_sqlite(sql: str):
+            start_statement()
+            cs = conn.cursor()
+            cs.execute(sql)
+            columns = [desc[0] for desc in cs.description] if cs.description else []
+
+            def fetchmany(size: int):
+                # Each page gets the full timeout, so a slow consumer is not
+                # cut off by the time spent since the statement started.
+                start_statement()
+                return cs.fetchmany(size)
+
+            return columns, fetchmany, cs.close
+
         self.dialect = "SQLite"
         self.run_sql = run_sql_sqlite
+        self.open_cursor = open_cursor_sqlite
+        self.cancel_running = conn.interrupt
         self.run_sql_is_set = True
 
     def connect_to_postgres(
@@ -203,6 +245,9 @@ class DBAccess(ABC):
         if not port:
             raise Exception("Please set your postgres port")
 
+        if self.statement_timeout:
+            kwargs.setdefault("options", f"-c statement_timeout={int(self.statement_timeout * 1000)}")
+
         conn = None
 
         try:
@@ -256,9 +301,49 @@ class DBAccess(ABC):
                         conn.rollback()
                         raise e
 
+        # Connections with a statement in flight, for cancel()
+        streaming_conns = set()
+
+        def open_cursor_postgres(sql: str):
+            stream_conn = connect_to_db()
+            streaming_conns.add(stream_conn)
+            # A named cursor is a server-side cursor: rows stay on the server
+            # until fetched, instead of being buffered by the client.
+            cs = stream_conn.cursor(name=f"chatdb_{uuid.uuid4().hex}")
+            try:
+                cs.execute(sql)
+                # description is only populated after the first fetch
+                first = cs.fetchmany(cs.itersize)
+            except Exception:
+                streaming_conns.discard(stream_conn)
+                stream_conn.close()
+                raise
+            columns = [desc[0] for desc in cs.description] if cs.description else []
+            pending = [first]
+
+            def fetchmany(size: int):
+                if pending:
+                    return pending.pop()
+                return cs.fetchmany(size)
+
+            def close():
+                streaming_conns.discard(stream_conn)
+                try:
+                    cs.close()
+                finally:
+                    stream_conn.close()
+
+            return columns, fetchmany, close
+
+        def cancel_postgres():
+            for stream_conn in list(streaming_conns):
+                stream_conn.cancel()
+
         self.dialect = "PostgreSQL"
+        self.cancel_running = cancel_postgres
         self.run_sql_is_set = True
         self.run_sql = run_sql_postgres
+        self.open_cursor = open_cursor_postgres
 
 
     def connect_to_mysql(
@@ -309,6 +394,9 @@ class DBAccess(ABC):
         if not port:
             raise Exception("Please set your MySQL port")
 
+        if self.statement_timeout:
+            kwargs.setdefault("read_timeout", self.statement_timeout)
+
         conn = None
 
         try:
@@ -346,8 +434,55 @@ class DBAccess(ABC):
                     conn.rollback()
                     raise e
 
+        def open_cursor_mysql(sql: str):
+            conn.ping(reconnect=True)
+            # Unbuffered cursor: rows are read from the socket as they are fetched
+            cs = conn.cursor(pymysql.cursors.SSDictCursor)
+            try:
+                cs.execute(sql)
+            except Exception:
+                cs.close()
+                conn.rollback()
+                raise
+            columns = [desc[0] for desc in cs.description] if cs.description else []
+            exhausted = False
+
+            def fetchmany(size: int):
+                nonlocal exhausted
+                rows = cs.fetchmany(size)
+                # A short page means the end of the result set has been read
+                exhausted = len(rows) < size
+                return rows
+
+            def close():
+                if exhausted:
+                    cs.close()
+                    return
+                # Closing an unbuffered cursor early reads and discards every
+                # remaining row; stop the statement and drop the connection instead.
+                # ping(reconnect=True) opens a new one for the next statement.
+                try:
+                    cancel_mysql()
+                except Exception as e:
+                    print(e)
+                finally:
+                    conn.close()
+
+            return columns, fetchmany, close
+
+        def cancel_mysql():
+            # KILL QUERY has to be sent over a second connection
+            killer = pymysql.connect(host=host, user=user, password=password, database=dbname, port=port)
+            try:
+                with killer.cursor() as cs:
+                    cs.execute(f"KILL QUERY {conn.thread_id()}")
+            finally:
+                killer.close()
+
         self.run_sql_is_set = True
         self.run_sql = run_sql_mysql
+        self.open_cursor = open_cursor_mysql
+        self.cancel_running = cancel_mysql
 
     def connect_to_clickhouse(
         self,
@@ -919,6 +1054,39 @@ class DBAccess(ABC):
       self.run_sql_is_set = True
       self.run_sql = run_sql_hive
 
+    def cancel(self) -> None:
+        """
+        Interrupt the statement currently running on this connection, if the
+        connector supports it. Safe to call from another thread.
+        """
+        if self.cancel_running is not None:
+            self.cancel_running()
+
+    def stream_sql(self, sql: str, **kwargs) -> ResultStream:
+        """
+        Run a SQL query and page through its results instead of fetching them all.
+
+        Connectors that support server-side cursors (MySQL, PostgreSQL, SQLite)
+        stream rows with fetchmany(); the others fall back to run_sql() and the
+        resulting DataFrame is paged. Row/byte caps and spilling are configured
+        through the keyword arguments of ResultStream.
+
+        Args:
+            sql (str): The SQL query to run.
+
+        Returns:
+            ResultStream: Iterable of result pages, see ResultStream.meta for truncation info.
+        """
+        if self.open_cursor is not None:
+            columns, fetchmany, close = self.open_cursor(sql)
+            return ResultStream(columns, fetchmany, close, **kwargs)
+
+        df = self.run_sql(sql)
+        if df is None:
+            return ResultStream([], lambda size: [], **kwargs)
+        records = iter(df.to_dict("records"))
+        return ResultStream(list(df.columns), lambda size: list(islice(records, size)), **kwargs)
+
     def run_sql(self, sql: str, **kwargs) -> pd.DataFrame:
         """
         Example:
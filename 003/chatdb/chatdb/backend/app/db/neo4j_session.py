@@ -0,0 +1,111 @@
+import threading
+from typing import Optional
+
+from neo4j import AsyncDriver, AsyncGraphDatabase, Driver, GraphDatabase
+
+from app.core.config import settings
+
+_driver: Optional[Driver] = None
+_async_driver: Optional[AsyncDriver] = None
+_driver_lock = threading.Lock()
+_schema_ready = False
+
+# Uniqueness constraints also back the id lookups with an index, so
+# MATCH (t:Table {id: ...}) no longer scans every Table node.
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT table_id_unique IF NOT EXISTS FOR (t:Table) REQUIRE t.id IS UNIQUE",
+    "CREATE CONSTRAINT column_id_unique IF NOT EXISTS FOR (c:Column) REQUIRE c.id IS UNIQUE",
+    "CREATE INDEX table_connection_id IF NOT EXISTS FOR (t:Table) ON (t.connection_id)",
+    "CREATE INDEX column_connection_id IF NOT EXISTS FOR (c:Column) ON (c.connection_id)",
+    "CREATE INDEX qa_pair_id IF NOT EXISTS FOR (q:QAPair) ON (q.id)",
+    "CREATE INDEX query_pattern_id IF NOT EXISTS FOR (p:QueryPattern) ON (p.id)",
+    "CREATE INDEX entity_id IF NOT EXISTS FOR (e:Entity) ON (e.id)",
+]
+
+
+def get_neo4j_driver() -> Driver:
+    """
+    Return the process-wide Neo4j driver, creating it on first use.
+    The driver keeps its own connection pool and is safe to share between threads.
+    """
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                _driver = GraphDatabase.driver(
+                    settings.NEO4J_URI,
+                    auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD),
+                    max_connection_pool_size=settings.NEO4J_MAX_CONNECTION_POOL_SIZE,
+                )
+    return _driver
+
+
+def get_async_neo4j_driver() -> AsyncDriver:
+    """
+    Return the process-wide async Neo4j driver, creating it on first use.
+    Used by the retrieval path so graph queries run on the event loop instead of blocking it.
+    """
+    global _async_driver
+    if _async_driver is None:
+        with _driver_lock:
+            if _async_driver is None:
+                _async_driver = AsyncGraphDatabase.driver(
+                    settings.NEO4J_URI,
+                    auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD),
+                    max_connection_pool_size=settings.NEO4J_MAX_CONNECTION_POOL_SIZE,
+                    connection_acquisition_timeout=settings.NEO4J_QUERY_TIMEOUT,
+                )
+    return _async_driver
+
+
+def ensure_neo4j_schema(driver: Optional[Driver] = None) -> None:
+    """
+    Create the constraints and indexes used by the schema graph (once per process).
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    driver = driver or get_neo4j_driver()
+    with driver.session() as session:
+        for statement in SCHEMA_STATEMENTS:
+            session.run(statement).consume()
+    _schema_ready = True
+
+
+async def ensure_neo4j_schema_async(driver: Optional[AsyncDriver] = None) -> None:
+    """
+    Async counterpart of ensure_neo4j_schema for the async driver.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    driver = driver or get_async_neo4j_driver()
+    async with driver.session() as session:
+        for statement in SCHEMA_STATEMENTS:
+            await (await session.run(statement)).consume()
+    _schema_ready = True
+
+
+def close_neo4j_driver() -> None:
+    """
+    Close the shared driver, e.g. on application shutdown.
+    """
+    global _driver, _schema_ready
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+            _schema_ready = False
+
+
+async def close_async_neo4j_driver() -> None:
+    """
+    Close the shared async driver, e.g. on application shutdown.
+    """
+    global _async_driver, _schema_ready
+    with _driver_lock:
+        driver = _async_driver
+        _async_driver = None
+    if driver is not None:
+        _schema_ready = False
+        await driver.close()
@@ -0,0 +1,267 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# Rough per-row overhead (dict + keys) added to the value sizes when
+# accounting for the byte cap.
+ROW_OVERHEAD_BYTES = 64
+
+
+def estimate_row_bytes(row: Dict[str, Any]) -> int:
+    """
+    Cheap estimate of the serialized size of a result row.
+    """
+    size = ROW_OVERHEAD_BYTES
+    for key, value in row.items():
+        size += len(key)
+        if value is None:
+            size += 4
+        elif isinstance(value, (bytes, bytearray, str)):
+            size += len(value)
+        else:
+            size += len(str(value))
+    return size
+
+
+class ResultSpillStore:
+    """
+    Registry of spilled result files that can be downloaded later.
+    Files expire after `ttl` seconds and are removed on the next lookup.
+    """
+
+    def __init__(self, directory: str = None, ttl: int = None):
+        self.directory = directory or settings.QUERY_RESULT_SPILL_DIR or os.path.join(
+            tempfile.gettempdir(), "chatdb_results"
+        )
+        self.ttl = ttl if ttl is not None else settings.QUERY_RESULT_SPILL_TTL
+        self._files: Dict[str, Tuple[str, str, float]] = {}
+        self._lock = threading.Lock()
+
+    def new_path(self, suffix: str) -> Tuple[str, str]:
+        os.makedirs(self.directory, exist_ok=True)
+        spill_id = uuid.uuid4().hex
+        return spill_id, os.path.join(self.directory, f"{spill_id}{suffix}")
+
+    def register(self, spill_id: str, path: str, media_type: str) -> None:
+        with self._lock:
+            self._files[spill_id] = (path, media_type, time.time())
+        self.cleanup()
+
+    def get(self, spill_id: str) -> Optional[Tuple[str, str]]:
+        """
+        Return (path, media_type) of a spilled result, or None if unknown or expired.
+        """
+        self.cleanup()
+        with self._lock:
+            entry = self._files.get(spill_id)
+        if entry is None or not os.path.exists(entry[0]):
+            return None
+        return entry[0], entry[1]
+
+    def cleanup(self) -> None:
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, _, created) in self._files.items() if now - created > self.ttl]
+            paths = [self._files.pop(key)[0] for key in expired]
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class ResultSpillWriter:
+    """
+    Writes the full result to a compressed temp file: Parquet when pyarrow is
+    installed, gzip-compressed JSON lines otherwise.
+    """
+
+    def __init__(self, columns: Sequence[str], store: ResultSpillStore):
+        self.columns = list(columns)
+        self.store = store
+        self.row_count = 0
+        self._schema = None
+        self._writer = None
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            self._pa = pyarrow
+            self.spill_id, self.path = store.new_path(".parquet")
+            self.media_type = "application/vnd.apache.parquet"
+        except ImportError:
+            self._pa = None
+            self.spill_id, self.path = store.new_path(".jsonl.gz")
+            self.media_type = "application/gzip"
+            self._file = gzip.open(self.path, "wt", encoding="utf-8")
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        if self._pa is not None:
+            table = self._pa.Table.from_pylist(rows, schema=self._schema)
+            if self._writer is None:
+                self._schema = table.schema
+                self._writer = self._pa.parquet.ParquetWriter(self.path, self._schema, compression="zstd")
+            self._writer.write_table(table)
+        else:
+            for row in rows:
+                self._file.write(json.dumps(row, ensure_ascii=False, default=str))
+                self._file.write("\n")
+        self.row_count += len(rows)
+
+    def close(self) -> str:
+        """
+        Finish the file, register it for download and return its spill id.
+        """
+        if self._pa is not None:
+            if self._writer is None:
+                schema = self._pa.schema([(name, self._pa.string()) for name in self.columns])
+                self._writer = self._pa.parquet.ParquetWriter(self.path, schema, compression="zstd")
+            self._writer.close()
+        else:
+            self._file.close()
+        self.store.register(self.spill_id, self.path, self.media_type)
+        return self.spill_id
+
+    def discard(self) -> None:
+        try:
+            if self._pa is not None:
+                if self._writer is not None:
+                    self._writer.close()
+            else:
+                self._file.close()
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class ResultStream:
+    """
+    Pages through a cursor with fetchmany() instead of fetchall().
+
+    Iterating yields pages (lists of dict rows) until the row or byte cap is
+    reached. Rows that were yielded are also kept in `rows`, so the capped
+    result is available once iteration finishes. When spilling is enabled the
+    remaining rows are written to a compressed temp file after the cap is hit,
+    and `meta` reports the spill id for a later download.
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        fetchmany: Callable[[int], Sequence[Any]],
+        close: Optional[Callable[[], None]] = None,
+        fetch_size: int = None,
+        max_rows: int = None,
+        max_bytes: int = None,
+        spill: bool = None,
+        spill_store: ResultSpillStore = None,
+    ):
+        self.columns = list(columns)
+        self._fetchmany = fetchmany
+        self._close = close
+        self.fetch_size = fetch_size or settings.QUERY_FETCH_SIZE
+        self.max_rows = max_rows or settings.QUERY_MAX_ROWS
+        self.max_bytes = max_bytes or settings.QUERY_MAX_BYTES
+        self.spill = settings.QUERY_RESULT_SPILL_ENABLED if spill is None else spill
+        self.spill_store = spill_store or result_spill_store
+        self.rows: List[Dict[str, Any]] = []
+        self.byte_count = 0
+        self.truncated = False
+        self.truncated_reason: Optional[str] = None
+        self.spill_id: Optional[str] = None
+        self.spilled_rows = 0
+        self.exhausted = False
+        self._closed = False
+
+    def _to_dicts(self, batch: Sequence[Any]) -> List[Dict[str, Any]]:
+        if batch and isinstance(batch[0], dict):
+            return list(batch)
+        return [dict(zip(self.columns, row)) for row in batch]
+
+    def __iter__(self) -> Iterator[List[Dict[str, Any]]]:
+        try:
+            while True:
+                batch = self._fetchmany(self.fetch_size)
+                if not batch:
+                    self.exhausted = True
+                    break
+                page = []
+                for row in self._to_dicts(batch):
+                    if len(self.rows) >= self.max_rows:
+                        self.truncated, self.truncated_reason = True, "max_rows"
+                        break
+                    size = estimate_row_bytes(row)
+                    if self.byte_count + size > self.max_bytes:
+                        self.truncated, self.truncated_reason = True, "max_bytes"
+                        break
+                    self.byte_count += size
+                    self.rows.append(row)
+                    page.append(row)
+                if page:
+                    yield page
+                if self.truncated:
+                    self._spill_remaining(self._to_dicts(batch)[len(page):])
+                    break
+        finally:
+            self.close()
+
+    def _spill_remaining(self, pending: List[Dict[str, Any]]) -> None:
+        if not self.spill:
+            return
+        writer = ResultSpillWriter(self.columns, self.spill_store)
+        try:
+            total = len(self.rows) + len(pending)
+            writer.write(self.rows)
+            writer.write(pending)
+            while total < settings.QUERY_RESULT_SPILL_MAX_ROWS:
+                batch = self._fetchmany(self.fetch_size)
+                if not batch:
+                    self.exhausted = True
+                    break
+                batch = self._to_dicts(batch)[:settings.QUERY_RESULT_SPILL_MAX_ROWS - total]
+                writer.write(batch)
+                total += len(batch)
+            self.spilled_rows = writer.row_count
+            self.spill_id = writer.close()
+        except Exception:
+            writer.discard()
+            raise
+
+    def read_all(self) -> List[Dict[str, Any]]:
+        for _ in self:
+            pass
+        return self.rows
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "columns": self.columns,
+            "row_count": len(self.rows),
+            "byte_count": self.byte_count,
+            "truncated": self.truncated,
+            "truncated_reason": self.truncated_reason,
+            "max_rows": self.max_rows,
+            "max_bytes": self.max_bytes,
+            "spill_id": self.spill_id,
+            "spilled_rows": self.spilled_rows,
+            "spill_complete": self.exhausted if self.spill_id else None,
+        }
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._close is not None:
+            self._close()
+
+
+# Process-wide registry of spilled result files
+result_spill_store = ResultSpillStore()
@@ -2,14 +2,15 @@
 智能体编排服务
 负责协调和管理所有智能体的执行流程
 """
-from typing import Optional
+import asyncio
+from typing import Any, Dict, Optional
 
 from autogen_core import SingleThreadedAgentRuntime, DefaultTopicId
 
 from app.core.config import settings
 from app.db.dbaccess import DBAccess
 from app.db.session import SessionLocal
-from app.schemas.text2sql import QueryMessage, ResponseMessage
+from app.schemas.text2sql import QueryMessage, ResponseMessage, SqlExplanationMessage
 from app.agents.base import StreamResponseCollector
 from app.agents.factory import AgentFactory
 from app.agents.types import TopicTypes, DEFAULT_DB_TYPE
@@ -97,7 +98,8 @@ class AgentOrchestrator:
         return db_access
 
     async def process_query(self, query: str, collector: StreamResponseCollector = None,
-                          connection_id: Optional[int] = None, user_feedback_enabled: bool = False):
+                          connection_id: Optional[int] = None, user_feedback_enabled: bool = False,
+                          cached_answer: Optional[Dict[str, Any]] = None):
         """处理自然语言查询，返回SQL和结果
 
         Args:
@@ -105,6 +107,7 @@ class AgentOrchestrator:
             collector: 流式响应收集器
             connection_id: 数据库连接ID，可选
             user_feedback_enabled: 是否启用用户反馈功能
+            cached_answer: 语义答案缓存命中的问答对，提供时直接把其SQL交给SQL执行智能体
         """
         # 如果没有提供收集器，创建一个默认的
         if not collector:
@@ -125,20 +128,38 @@ class AgentOrchestrator:
             # 启动运行时
             runtime.start()
 
-            # 发送初始消息
-            message = QueryMessage(
-                query=query,
-                connection_id=connection_id
-            )
-
-            # 发送到表结构检索智能体
-            await runtime.publish_message(
-                message,
-                topic_id=DefaultTopicId(type=TopicTypes.SCHEMA_RETRIEVER.value)
-            )
-
-            # 等待处理完成
-            await runtime.stop_when_idle()
+            if cached_answer:
+                # 命中语义答案缓存：跳过分析、检索、生成和解释阶段，直接执行已验证的SQL
+                await runtime.publish_message(
+                    SqlExplanationMessage(
+                        query=query,
+                        sql=cached_answer["sql"],
+                        explanation=f"复用已验证问答对的SQL（相似问题: {cached_answer['question']}）",
+                        connection_id=connection_id
+                    ),
+                    topic_id=DefaultTopicId(type=TopicTypes.SQL_EXECUTOR.value)
+                )
+            else:
+                # 发送初始消息
+                message = QueryMessage(
+                    query=query,
+                    connection_id=connection_id
+                )
+
+                # 发送到表结构检索智能体
+                await runtime.publish_message(
+                    message,
+                    topic_id=DefaultTopicId(type=TopicTypes.SCHEMA_RETRIEVER.value)
+                )
+
+            # 等待处理完成；处理任务被取消（如SSE客户端断开）时中断正在执行的SQL并停止运行时
+            try:
+                await runtime.stop_when_idle()
+            except asyncio.CancelledError:
+                if self.db_access:
+                    self.db_access.cancel()
+                await runtime.stop()
+                raise
 
             # 关闭运行时
             await runtime.close()
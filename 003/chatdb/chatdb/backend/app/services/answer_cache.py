@@ -0,0 +1,104 @@
+"""
+语义答案缓存模块
+在智能体流水线之前，用混合检索引擎查找同一连接上高度相似的已验证问答对，
+命中时直接复用其SQL，跳过查询分析、表结构检索、SQL生成和解释等LLM阶段
+"""
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 命中缓存时跳过的阶段（区域, 说明）
+SKIPPED_STAGES = [
+    ("analysis", "查询分析和表结构检索"),
+    ("sql", "SQL生成"),
+    ("explanation", "SQL解释"),
+]
+
+
+class SemanticAnswerCache:
+    """语义答案缓存，查找失败或超时时按未命中处理，不影响正常流程"""
+
+    def __init__(self, engine_getter=None, timeout: float = None):
+        """初始化语义答案缓存
+
+        Args:
+            engine_getter: 返回已初始化混合检索引擎的协程函数，默认使用共享引擎
+            timeout: 单次查找超时（秒）
+        """
+        self._engine_getter = engine_getter
+        self._engine = None
+        self._warmup: Optional[asyncio.Task] = None
+        self.timeout = settings.ANSWER_CACHE_LOOKUP_TIMEOUT if timeout is None else timeout
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "warming": 0, "errors": 0}
+
+    def _ready_engine(self):
+        """返回已初始化的混合检索引擎；未就绪时在后台初始化并返回None，避免首个请求等待模型加载"""
+        if self._engine is not None:
+            return self._engine
+        if self._warmup is not None and self._warmup.done():
+            if not self._warmup.cancelled() and self._warmup.exception() is None:
+                self._engine = self._warmup.result()
+                return self._engine
+            logger.warning(f"混合检索引擎初始化失败，将重试: {self._warmup.exception()}")
+            self._warmup = None
+        if self._warmup is None:
+            if self._engine_getter is None:
+                from app.services.hybrid_retrieval_service import get_hybrid_retrieval_engine
+                self._engine_getter = get_hybrid_retrieval_engine
+            self._warmup = asyncio.create_task(self._engine_getter())
+        return None
+
+    async def lookup(self, query: str, connection_id: Optional[int],
+                     bypass: bool = False) -> Optional[Dict[str, Any]]:
+        """查找可直接复用的已验证问答对
+
+        Args:
+            query: 自然语言问题
+            connection_id: 数据库连接ID，为空时不查找
+            bypass: 是否跳过缓存
+
+        Returns:
+            Optional[Dict[str, Any]]: 命中时返回qa_id、question、sql、similarity，否则返回None
+        """
+        if bypass or not settings.ANSWER_CACHE_ENABLED or not connection_id:
+            self.stats["bypassed"] += 1
+            return None
+
+        engine = self._ready_engine()
+        if engine is None:
+            self.stats["warming"] += 1
+            return None
+
+        try:
+            candidate = await asyncio.wait_for(engine.find_verified_answer(query, connection_id), self.timeout)
+        except Exception as e:
+            logger.warning(f"语义答案缓存查找失败，按未命中处理: {str(e)}")
+            self.stats["errors"] += 1
+            return None
+
+        if candidate is None:
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        return {
+            "qa_id": candidate["id"],
+            "question": candidate["question"],
+            "sql": candidate["sql"],
+            "similarity": float(candidate["similarity_score"]),
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": settings.ANSWER_CACHE_ENABLED,
+            "threshold": settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        }
+
+
+# 全局语义答案缓存实例
+answer_cache = SemanticAnswerCache()
@@ -1,59 +1,199 @@
+import hashlib
+import threading
+from contextlib import contextmanager
 import pymysql
 import sqlalchemy
 from sqlalchemy import create_engine, inspect
-from typing import Dict, Any, List
+from sqlalchemy.engine import Engine
+from typing import Dict, Any, Iterator, List, Tuple
 import urllib.parse
 
+from app.core.config import settings
 from app.core.security import verify_password
+from app.db.result_stream import ResultStream
 from app.models.db_connection import DBConnection
 
 
-def get_db_engine(connection: DBConnection, password: str = None):
+def _resolve_password(connection: DBConnection, password: str = None) -> str:
     """
-    Create a SQLAlchemy engine for the given database connection.
+    Resolve the plain password for a connection.
+    """
+    # 直接使用明文密码，不进行加密/解密处理
+    # 在实际应用中，应该对密码进行适当的加密和解密
+
+    # 如果是从配置文件读取的连接信息
+    if hasattr(connection, 'password') and connection.password:
+        return connection.password
+    # 如果是从数据库读取的连接信息
+    elif password:
+        return password
+    # 如果是使用已加密的密码
+    else:
+        # 这里我们假设password_encrypted存储的是明文密码
+        # 在实际应用中，应该进行解密
+        return connection.password_encrypted
+
+
+def _credentials_fingerprint(connection: DBConnection, password: str) -> str:
+    """
+    Build a fingerprint of everything that affects the engine URL, so that an
+    edited connection never reuses an engine built for the old credentials.
+    """
+    parts = [
+        str(connection.db_type).lower(),
+        str(connection.host),
+        str(connection.port),
+        str(connection.username),
+        str(password),
+        str(connection.database_name),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class EngineRegistry:
+    """
+    Process-wide registry of pooled SQLAlchemy engines for target databases.
+
+    Engines are keyed by ``DBConnection.id`` plus a credentials fingerprint and
+    are reused across requests, so the connection pool survives between
+    queries instead of being rebuilt (and leaked) on every call.
+
+    Connections without an id (e.g. the transient object of a connection test)
+    are not cached: they get a one-off engine that the caller disposes, see
+    ``db_engine``.
+    """
+
+    def __init__(self):
+        self._engines: Dict[Any, Tuple[str, Engine]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, connection: DBConnection, password: str = None) -> Engine:
+        actual_password = _resolve_password(connection, password)
+        if not is_pooled(connection):
+            return _create_db_engine(connection, actual_password)
+        fingerprint = _credentials_fingerprint(connection, actual_password)
+        key = connection.id
+
+        with self._lock:
+            cached = self._engines.get(key)
+            if cached and cached[0] == fingerprint:
+                return cached[1]
+
+            engine = _create_db_engine(connection, actual_password)
+            self._engines[key] = (fingerprint, engine)
+            if cached:
+                # 凭据发生变化，释放旧连接池
+                cached[1].dispose()
+            return engine
+
+    def invalidate(self, connection_id: int) -> bool:
+        """
+        Dispose and forget the engine of a connection. Returns True if one existed.
+        """
+        with self._lock:
+            cached = self._engines.pop(connection_id, None)
+        if cached:
+            cached[1].dispose()
+            print(f"Disposed pooled engine for connection {connection_id}")
+            return True
+        return False
+
+    def dispose_all(self) -> None:
+        with self._lock:
+            engines = list(self._engines.values())
+            self._engines.clear()
+        for _, engine in engines:
+            engine.dispose()
+
+    def __len__(self) -> int:
+        return len(self._engines)
+
+
+engine_registry = EngineRegistry()
+
+
+def is_pooled(connection: DBConnection) -> bool:
+    """
+    Whether the engine of a connection is kept in the registry.
+    """
+    # 未持久化的连接（如测试连接时的临时对象）没有ID，每次使用一次性的引擎
+    return getattr(connection, "id", None) is not None
+
+
+def _pool_options(db_type: str) -> Dict[str, Any]:
+    """
+    Connection pool options for the target database engines.
+    """
+    options: Dict[str, Any] = {"pool_pre_ping": settings.TARGET_DB_POOL_PRE_PING}
+    if db_type in ("mysql", "postgresql"):
+        options.update(
+            pool_size=settings.TARGET_DB_POOL_SIZE,
+            max_overflow=settings.TARGET_DB_MAX_OVERFLOW,
+            pool_recycle=settings.TARGET_DB_POOL_RECYCLE,
+        )
+    return options
+
+
+def get_db_engine(connection: DBConnection, password: str = None) -> Engine:
+    """
+    Get the pooled SQLAlchemy engine for the given database connection.
+    """
+    return engine_registry.get(connection, password)
+
+
+@contextmanager
+def db_engine(connection: DBConnection, password: str = None) -> Iterator[Engine]:
+    """
+    Engine for a single piece of work: the pooled engine of a saved connection,
+    or a one-off engine for an unsaved one that is disposed on exit.
     """
+    engine = get_db_engine(connection, password)
     try:
-        # 直接使用明文密码，不进行加密/解密处理
-        # 在实际应用中，应该对密码进行适当的加密和解密
-
-        # 如果是从配置文件读取的连接信息
-        if hasattr(connection, 'password') and connection.password:
-            actual_password = connection.password
-        # 如果是从数据库读取的连接信息
-        elif password:
-            actual_password = password
-        # 如果是使用已加密的密码
-        else:
-            # 这里我们假设password_encrypted存储的是明文密码
-            # 在实际应用中，应该进行解密
-            actual_password = connection.password_encrypted
+        yield engine
+    finally:
+        if not is_pooled(connection):
+            engine.dispose()
+
+
+def invalidate_db_engine(connection_id: int) -> bool:
+    """
+    Drop the pooled engine of a connection after it was updated or deleted.
+    """
+    return engine_registry.invalidate(connection_id)
+
 
+def _create_db_engine(connection: DBConnection, actual_password: str) -> Engine:
+    """
+    Create a SQLAlchemy engine for the given database connection.
+    """
+    try:
         # Encode password for URL safety
         encoded_password = urllib.parse.quote_plus(actual_password)
+        db_type = connection.db_type.lower()
 
-        if connection.db_type.lower() == "mysql":
+        if db_type == "mysql":
             conn_str = (
                 f"mysql+pymysql://{connection.username}:"
                 f"{encoded_password}@"
                 f"{connection.host}:{connection.port}/{connection.database_name}"
             )
             print(f"Connecting to MySQL database: {connection.host}:{connection.port}/{connection.database_name}")
-            return create_engine(conn_str)
+            return create_engine(conn_str, **_pool_options(db_type))
 
-        elif connection.db_type.lower() == "postgresql":
+        elif db_type == "postgresql":
             conn_str = (
                 f"postgresql://{connection.username}:"
                 f"{encoded_password}@"
                 f"{connection.host}:{connection.port}/{connection.database_name}"
             )
             print(f"Connecting to PostgreSQL database: {connection.host}:{connection.port}/{connection.database_name}")
-            return create_engine(conn_str)
+            return create_engine(conn_str, **_pool_options(db_type))
 
-        elif connection.db_type.lower() == "sqlite":
+        elif db_type == "sqlite":
             # For SQLite, the database_name is treated as the file path
             conn_str = f"sqlite:///{connection.database_name}"
             print(f"Connecting to SQLite database: {connection.database_name}")
-            return create_engine(conn_str)
+            return create_engine(conn_str, **_pool_options(db_type))
 
         else:
             raise ValueError(f"Unsupported database type: {connection.db_type}")
@@ -68,8 +208,7 @@ def test_db_connection(connection: DBConnection) -> bool:
     """
     try:
         print(f"Testing connection to {connection.db_type} database at {connection.host}:{connection.port}/{connection.database_name}")
-        engine = get_db_engine(connection)
-        with engine.connect() as conn:
+        with db_engine(connection) as engine, engine.connect() as conn:
             result = conn.execute(sqlalchemy.text("SELECT 1"))
             print(f"Connection test successful: {result.fetchone()}")
         return True
@@ -79,15 +218,68 @@ def test_db_connection(connection: DBConnection) -> bool:
         raise Exception(error_msg)
 
 
-def execute_query(connection: DBConnection, query: str) -> List[Dict[str, Any]]:
+def stream_query(connection: DBConnection, query: str, **kwargs) -> ResultStream:
     """
-    Execute a SQL query on the target database and return the results.
+    Execute a SQL query with a server-side cursor and return a ResultStream
+    that pages through the rows within the configured row/byte caps.
+    """
+    engine = get_db_engine(connection)
+
+    def release():
+        # 一次性引擎随结果流一起释放
+        if not is_pooled(connection):
+            engine.dispose()
+
+    try:
+        conn = engine.connect()
+    except Exception:
+        release()
+        raise
+    try:
+        result = conn.execution_options(
+            stream_results=True, max_row_buffer=settings.QUERY_FETCH_SIZE
+        ).execute(sqlalchemy.text(query))
+    except Exception:
+        conn.close()
+        release()
+        raise
+
+    def close():
+        try:
+            result.close()
+        finally:
+            conn.close()
+            release()
+
+    return ResultStream(list(result.keys()), result.fetchmany, close, **kwargs)
+
+
+def execute_query_bounded(connection: DBConnection, query: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     """
+    Execute a SQL query and return the (possibly truncated) rows with the truncation metadata.
+    """
+    from app.services.result_cache import query_result_cache
+
+    # Connections that are not persisted yet have no id to key the cache on
+    use_cache = connection.id is not None
+    if use_cache:
+        cached = query_result_cache.get(connection.id, query)
+        if cached is not None:
+            return cached
     try:
-        engine = get_db_engine(connection)
-        with engine.connect() as conn:
-            result = conn.execute(sqlalchemy.text(query))
-            columns = result.keys()
-            return [dict(zip(columns, row)) for row in result.fetchall()]
+        stream = stream_query(connection, query)
+        rows = stream.read_all()
     except Exception as e:
         raise Exception(f"Query execution failed: {str(e)}")
+    meta = {**stream.meta, "cache": query_result_cache.cache_status(query) if use_cache else "bypass"}
+    if use_cache:
+        query_result_cache.set(connection.id, query, rows, meta)
+    return rows, meta
+
+
+def execute_query(connection: DBConnection, query: str) -> List[Dict[str, Any]]:
+    """
+    Execute a SQL query on the target database and return the results.
+    Results are capped at QUERY_MAX_ROWS / QUERY_MAX_BYTES.
+    """
+    return execute_query_bounded(connection, query)[0]
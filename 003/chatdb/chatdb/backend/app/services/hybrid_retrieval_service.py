@@ -1,6 +1,6 @@
 # 混合检索服务 - 核心实现
 
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Set, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime
 import asyncio
@@ -8,12 +8,16 @@ import json
 import uuid
 import re
 import logging
-from neo4j import GraphDatabase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from neo4j import AsyncGraphDatabase, unit_of_work
 from pymilvus import Collection, connections, FieldSchema, CollectionSchema, DataType, utility
 from sentence_transformers import SentenceTransformer
 import numpy as np
 
 from app.core.config import settings
+from app.core.utils import CacheManager
+from app.db.neo4j_session import ensure_neo4j_schema_async, get_async_neo4j_driver
 
 logger = logging.getLogger(__name__)
 
@@ -55,17 +59,48 @@ class RetrievalResult:
 # ===== 向量化服务 =====
 
 class VectorService:
-    """向量化服务"""
+    """向量化服务
 
-    def __init__(self, model_name: str = None):
+    encode在专用线程中执行，不阻塞事件循环；批处理窗口内并发到达的embed_question请求
+    合并为一次批量encode，规范化问题的向量保存在LRU缓存中。同步的encode_texts（表向量索引）
+    也提交到这个线程，所有推理串行进行
+    """
+
+    def __init__(self, model_name: str = None, batch_window_ms: float = None,
+                 max_batch_size: int = None, cache_size: int = None):
         self.model_name = model_name or settings.EMBEDDING_MODEL
         self.model = None
         self.dimension = None
         self._initialized = False
+        self.batch_window = (settings.EMBEDDING_BATCH_WINDOW_MS if batch_window_ms is None else batch_window_ms) / 1000
+        self.max_batch_size = max_batch_size or settings.EMBEDDING_MAX_BATCH_SIZE
+        self._cache = CacheManager(max_size=cache_size or settings.EMBEDDING_CACHE_SIZE,
+                                   ttl=settings.EMBEDDING_CACHE_TTL)
+        # 单线程执行器：模型推理串行进行，同时不占用事件循环
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding",
+                                            initializer=self._mark_executor_thread)
+        self._executor_thread: Optional[int] = None
+        self._load_lock = threading.Lock()
+        # 等待合并的请求：规范化问题 -> Future
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # 正在执行的批量encode任务，事件循环只保留任务的弱引用
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self.stats = {"requests": 0, "cache_hits": 0, "batches": 0, "encoded": 0}
 
     async def initialize(self):
-        """初始化模型"""
+        """初始化模型（在线程中加载，不阻塞事件循环）"""
         if not self._initialized:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, self.load_model)
+
+    def load_model(self):
+        """同步加载模型（供非异步调用方使用）"""
+        if self._initialized:
+            return
+        with self._load_lock:
+            if self._initialized:
+                return
             try:
                 logger.info(f"Loading embedding model: {self.model_name}")
                 self.model = SentenceTransformer(self.model_name, cache_folder=r"C:\Users\86134\.cache\huggingface\hub")
@@ -76,14 +111,46 @@ class VectorService:
                 logger.error(f"Failed to load embedding model: {str(e)}")
                 raise
 
+    def _mark_executor_thread(self):
+        self._executor_thread = threading.get_ident()
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """同步批量编码文本，返回L2归一化后的向量矩阵
+
+        在编码线程中执行并等待结果，不与embed_question的批量encode并发推理
+        """
+        if threading.get_ident() == self._executor_thread:
+            return self._encode_normalized(texts)
+        return self._executor.submit(self._encode_normalized, texts).result()
+
+    def _encode_normalized(self, texts: List[str]) -> np.ndarray:
+        self.load_model()
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
     async def embed_question(self, question: str) -> List[float]:
         """将问题转换为向量"""
+        self.stats["requests"] += 1
+        processed_question = self._preprocess_question(question)
+        cached = self._cache.get(processed_question)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return list(cached)
+
         if not self._initialized:
             await self.initialize()
 
-        processed_question = self._preprocess_question(question)
-        embedding = self.model.encode(processed_question)
-        return embedding.tolist()
+        future = self._pending.get(processed_question)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[processed_question] = future
+            if len(self._pending) >= self.max_batch_size:
+                self._flush_pending()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.batch_window, self._flush_pending)
+
+        # shield：单个调用方被取消时不影响同批次的其他请求
+        return list(await asyncio.shield(future))
 
     async def batch_embed(self, questions: List[str]) -> List[List[float]]:
         """批量向量化"""
@@ -91,25 +158,134 @@ class VectorService:
             await self.initialize()
 
         processed_questions = [self._preprocess_question(q) for q in questions]
-        embeddings = self.model.encode(processed_questions)
-        return embeddings.tolist()
+        embeddings: Dict[str, List[float]] = {}
+        missing = []
+        for processed_question in dict.fromkeys(processed_questions):
+            cached = self._cache.get(processed_question)
+            if cached is not None:
+                embeddings[processed_question] = cached
+            else:
+                missing.append(processed_question)
+
+        # 批量导入的问题一般不会被重复查询，不写入缓存以免挤掉热点问题
+        loop = asyncio.get_running_loop()
+        for start in range(0, len(missing), self.max_batch_size):
+            chunk = missing[start:start + self.max_batch_size]
+            vectors = await loop.run_in_executor(self._executor, self._encode_batch, chunk)
+            embeddings.update(zip(chunk, vectors))
+
+        return [list(embeddings[q]) for q in processed_questions]
+
+    def _flush_pending(self):
+        """取出等待中的请求并提交一次批量encode"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._encode_pending(batch))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _encode_pending(self, batch: Dict[str, asyncio.Future]):
+        texts = list(batch)
+        try:
+            loop = asyncio.get_running_loop()
+            vectors = await loop.run_in_executor(self._executor, self._encode_batch, texts)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for text, vector in zip(texts, vectors):
+            self._cache.set(text, vector)
+            future = batch[text]
+            if not future.done():
+                future.set_result(vector)
+
+    def _encode_batch(self, texts: List[str]) -> List[List[float]]:
+        """在执行器线程中运行的批量encode"""
+        self.stats["batches"] += 1
+        self.stats["encoded"] += len(texts)
+        return self.model.encode(texts).tolist()
 
     def _preprocess_question(self, question: str) -> str:
         """预处理问题文本"""
         return question.strip().lower()
 
+    def close(self):
+        """关闭编码线程"""
+        self._executor.shutdown(wait=False)
+
+
+_vector_service: Optional[VectorService] = None
+
+
+def get_vector_service() -> VectorService:
+    """获取进程内共享的向量化服务"""
+    global _vector_service
+    if _vector_service is None:
+        _vector_service = VectorService()
+    return _vector_service
+
 # ===== Milvus服务 =====
 
 class MilvusService:
-    """Milvus向量数据库服务"""
+    """Milvus向量数据库服务
+
+    connection_id作为分区键（partition key），按连接检索时Milvus只扫描该连接所在的分区；
+    索引类型和检索参数来自配置，可用 benchmarks/tune_milvus_index.py 调优
+    """
 
     def __init__(self, host: str = None, port: str = None):
         self.host = host or settings.MILVUS_HOST
         self.port = port or settings.MILVUS_PORT
-        self.collection_name = "qa_pairs"
+        self.collection_name = settings.MILVUS_COLLECTION
         self.collection = None
+        self.partition_key_enabled = False
+        self.search_params = {
+            "metric_type": "COSINE",
+            "params": json.loads(settings.MILVUS_SEARCH_PARAMS),
+        }
         self._initialized = False
 
+    @staticmethod
+    def build_schema(dimension: int, partition_key: bool = None) -> CollectionSchema:
+        """构建问答对集合的schema
+
+        Args:
+            dimension: 向量维度
+            partition_key: 是否以connection_id作为分区键，为None时使用配置
+
+        Returns:
+            CollectionSchema: 集合schema
+        """
+        if partition_key is None:
+            partition_key = settings.MILVUS_PARTITION_KEY_ENABLED
+        fields = [
+            FieldSchema(name="id", dtype=DataType.VARCHAR, max_length=100, is_primary=True),
+            FieldSchema(name="question", dtype=DataType.VARCHAR, max_length=2000),
+            FieldSchema(name="sql", dtype=DataType.VARCHAR, max_length=5000),
+            FieldSchema(name="connection_id", dtype=DataType.INT64, is_partition_key=partition_key),
+            FieldSchema(name="difficulty_level", dtype=DataType.INT64),
+            FieldSchema(name="query_type", dtype=DataType.VARCHAR, max_length=50),
+            FieldSchema(name="success_rate", dtype=DataType.FLOAT),
+            FieldSchema(name="verified", dtype=DataType.BOOL),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dimension)
+        ]
+        return CollectionSchema(fields, "QA pairs for Text2SQL optimization")
+
+    @staticmethod
+    def index_params() -> Dict[str, Any]:
+        """根据配置生成向量索引参数"""
+        return {
+            "metric_type": "COSINE",
+            "index_type": settings.MILVUS_INDEX_TYPE,
+            "params": json.loads(settings.MILVUS_INDEX_PARAMS),
+        }
+
     async def initialize(self, dimension: int):
         """初始化Milvus连接和集合"""
         try:
@@ -117,37 +293,30 @@ class MilvusService:
             connections.connect("default", host=self.host, port=self.port)
             logger.info(f"Connected to Milvus at {self.host}:{self.port}")
 
-            # 定义集合schema
-            fields = [
-                FieldSchema(name="id", dtype=DataType.VARCHAR, max_length=100, is_primary=True),
-                FieldSchema(name="question", dtype=DataType.VARCHAR, max_length=2000),
-                FieldSchema(name="sql", dtype=DataType.VARCHAR, max_length=5000),
-                FieldSchema(name="connection_id", dtype=DataType.INT64),
-                FieldSchema(name="difficulty_level", dtype=DataType.INT64),
-                FieldSchema(name="query_type", dtype=DataType.VARCHAR, max_length=50),
-                FieldSchema(name="success_rate", dtype=DataType.FLOAT),
-                FieldSchema(name="verified", dtype=DataType.BOOL),
-                FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dimension)
-            ]
-
-            schema = CollectionSchema(fields, "QA pairs for Text2SQL optimization")
-
             # 创建或获取集合
             if utility.has_collection(self.collection_name):
                 self.collection = Collection(self.collection_name)
                 logger.info(f"Using existing collection: {self.collection_name}")
             else:
-                self.collection = Collection(self.collection_name, schema)
+                schema = self.build_schema(dimension)
+                if schema.partition_key_field is not None:
+                    self.collection = Collection(self.collection_name, schema,
+                                                 num_partitions=settings.MILVUS_NUM_PARTITIONS)
+                else:
+                    self.collection = Collection(self.collection_name, schema)
                 logger.info(f"Created new collection: {self.collection_name}")
 
                 # 创建索引
-                index_params = {
-                    "metric_type": "COSINE",
-                    "index_type": "IVF_FLAT",
-                    "params": {"nlist": 128}
-                }
-                self.collection.create_index("embedding", index_params)
-                logger.info("Created index for embedding field")
+                self.collection.create_index("embedding", self.index_params())
+                logger.info(f"Created {settings.MILVUS_INDEX_TYPE} index for embedding field")
+
+            self.partition_key_enabled = any(
+                getattr(field, "is_partition_key", False) for field in self.collection.schema.fields
+            )
+            if not self.partition_key_enabled and settings.MILVUS_PARTITION_KEY_ENABLED:
+                # 旧集合没有分区键，仍按connection_id过滤；迁移需要用新的MILVUS_COLLECTION重建
+                logger.warning(f"Collection {self.collection_name} has no partition key, "
+                               f"searches filter by connection_id across all segments")
 
             # 加载集合到内存
             self.collection.load()
@@ -158,6 +327,28 @@ class MilvusService:
             logger.error(f"Failed to initialize Milvus service: {str(e)}")
             raise
 
+    async def insert_qa_pairs(self, qa_pairs: List[QAPairWithContext], flush: bool = True) -> List[str]:
+        """按列批量插入问答对，整批只flush一次"""
+        if not self._initialized:
+            raise RuntimeError("Milvus service not initialized")
+
+        data = [
+            [qa.id for qa in qa_pairs],
+            [qa.question for qa in qa_pairs],
+            [qa.sql for qa in qa_pairs],
+            [qa.connection_id for qa in qa_pairs],
+            [qa.difficulty_level for qa in qa_pairs],
+            [qa.query_type for qa in qa_pairs],
+            [qa.success_rate for qa in qa_pairs],
+            [qa.verified for qa in qa_pairs],
+            [qa.embedding_vector for qa in qa_pairs]
+        ]
+        self.collection.insert(data)
+        if flush:
+            self.collection.flush()
+        logger.info(f"Inserted {len(qa_pairs)} QA pairs")
+        return [qa.id for qa in qa_pairs]
+
     async def insert_qa_pair(self, qa_pair: QAPairWithContext) -> str:
         """插入问答对"""
         if not self._initialized:
@@ -188,23 +379,27 @@ class MilvusService:
     async def search_similar(self,
                            query_vector: List[float],
                            top_k: int = 5,
-                           connection_id: Optional[int] = None) -> List[Dict]:
+                           connection_id: Optional[int] = None,
+                           verified_only: bool = False) -> List[Dict]:
         """搜索相似的问答对"""
         if not self._initialized:
             raise RuntimeError("Milvus service not initialized")
 
         try:
-            search_params = {"metric_type": "COSINE", "params": {"nprobe": 10}}
-
-            # 构建过滤表达式
-            expr = None
+            # 构建过滤表达式；connection_id为分区键时Milvus据此只检索对应分区
+            conditions = []
             if connection_id:
-                expr = f"connection_id == {connection_id}"
-
-            results = self.collection.search(
+                conditions.append(f"connection_id == {int(connection_id)}")
+            if verified_only:
+                conditions.append("verified == true")
+            expr = " and ".join(conditions) or None
+
+            # pymilvus的检索是同步gRPC调用，放到线程中执行，与图检索并行时不阻塞事件循环
+            results = await asyncio.to_thread(
+                self.collection.search,
                 data=[query_vector],
                 anns_field="embedding",
-                param=search_params,
+                param=self.search_params,
                 limit=top_k,
                 expr=expr,
                 output_fields=["id", "question", "sql", "connection_id",
@@ -236,213 +431,335 @@ class MilvusService:
 
 # ===== 扩展的Neo4j服务 =====
 
+# 批量写入问答对的Cypher，每条语句消费一批 $rows
+BULK_CREATE_QA_PAIRS = """
+UNWIND $rows AS row
+CREATE (qa:QAPair {
+    id: row.id,
+    question: row.question,
+    sql: row.sql,
+    connection_id: row.connection_id,
+    difficulty_level: row.difficulty_level,
+    query_type: row.query_type,
+    success_rate: row.success_rate,
+    verified: row.verified,
+    created_at: datetime(row.created_at)
+})
+MERGE (p:QueryPattern {id: row.pattern_id})
+ON CREATE SET p.name = row.query_type, p.difficulty_level = row.difficulty_level,
+              p.usage_count = 0, p.created_at = datetime()
+SET p.usage_count = p.usage_count + 1
+CREATE (qa)-[:FOLLOWS_PATTERN]->(p)
+"""
+
+BULK_LINK_QA_TABLES = """
+UNWIND $rows AS row
+MATCH (qa:QAPair {id: row.qa_id})
+MATCH (t:Table {name: row.table_name, connection_id: row.connection_id})
+CREATE (qa)-[:USES_TABLES]->(t)
+"""
+
+BULK_LINK_QA_ENTITIES = """
+UNWIND $rows AS row
+MERGE (e:Entity {id: row.entity_id})
+ON CREATE SET e.name = row.entity_name, e.created_at = datetime()
+WITH e, row
+MATCH (qa:QAPair {id: row.qa_id})
+CREATE (qa)-[:MENTIONS_ENTITY]->(e)
+"""
+
+# 删除问答对并撤销其对查询模式usage_count的计数；MERGE得到的实体节点可能被其他问答对共用，保留
+BULK_DELETE_QA_PAIRS = """
+UNWIND $rows AS row
+MATCH (qa:QAPair {id: row.id})
+OPTIONAL MATCH (qa)-[:FOLLOWS_PATTERN]->(p:QueryPattern)
+SET p.usage_count = p.usage_count - 1
+DETACH DELETE qa
+"""
+
+# 检索用Cypher保持为固定文本、只通过参数变化，服务端可复用已缓存的执行计划
+STRUCTURAL_SEARCH_QUERY = """
+MATCH (qa:QAPair)-[:USES_TABLES]->(t:Table)
+WHERE t.name IN $table_names AND qa.connection_id = $connection_id
+WITH qa, count(t) AS table_overlap, collect(t.name) AS used_tables
+ORDER BY table_overlap DESC, qa.success_rate DESC
+LIMIT $top_k
+RETURN qa, table_overlap, used_tables
+"""
+
+PATTERN_SEARCH_QUERY = """
+MATCH (qa:QAPair)-[:FOLLOWS_PATTERN]->(p:QueryPattern)
+WHERE p.name = $query_type
+AND p.difficulty_level <= $difficulty_level + 1
+AND qa.connection_id = $connection_id
+RETURN qa, p.usage_count AS usage_count
+ORDER BY qa.success_rate DESC, p.usage_count DESC
+LIMIT $top_k
+"""
+
+CREATE_QA_PAIR = """
+CREATE (qa:QAPair {
+    id: $id,
+    question: $question,
+    sql: $sql,
+    connection_id: $connection_id,
+    difficulty_level: $difficulty_level,
+    query_type: $query_type,
+    success_rate: $success_rate,
+    verified: $verified,
+    created_at: datetime($created_at)
+})
+"""
+
+LINK_QA_TABLE = """
+MATCH (qa:QAPair {id: $qa_id})
+MATCH (t:Table {name: $table_name, connection_id: $connection_id})
+CREATE (qa)-[:USES_TABLES]->(t)
+"""
+
+MERGE_QA_PATTERN = """
+MERGE (p:QueryPattern {id: $pattern_id})
+ON CREATE SET p.name = $query_type, p.difficulty_level = $difficulty_level,
+              p.usage_count = 1, p.created_at = datetime()
+ON MATCH SET p.usage_count = p.usage_count + 1
+WITH p
+MATCH (qa:QAPair {id: $qa_id})
+CREATE (qa)-[:FOLLOWS_PATTERN]->(p)
+"""
+
+LINK_QA_ENTITY = """
+MERGE (e:Entity {id: $entity_id})
+ON CREATE SET e.name = $entity_name, e.created_at = datetime()
+WITH e
+MATCH (qa:QAPair {id: $qa_id})
+CREATE (qa)-[:MENTIONS_ENTITY]->(e)
+"""
+
 class EnhancedNeo4jService:
-    """扩展的Neo4j服务"""
+    """扩展的Neo4j服务
+
+    基于异步驱动，查询在事件循环上等待网络而不占用线程，混合检索中的结构检索和模式检索
+    可以与语义检索真正并行；每次读查询带客户端和服务端双重超时
+    """
 
-    def __init__(self, uri: str = None, user: str = None, password: str = None):
+    def __init__(self, uri: str = None, user: str = None, password: str = None,
+                 query_timeout: float = None):
+        # 未指定连接参数时复用进程内共享的异步驱动及其连接池
+        self._owns_driver = any([uri, user, password])
         self.uri = uri or settings.NEO4J_URI
         self.user = user or settings.NEO4J_USER
         self.password = password or settings.NEO4J_PASSWORD
+        self.query_timeout = settings.NEO4J_QUERY_TIMEOUT if query_timeout is None else query_timeout
         self.driver = None
         self._initialized = False
 
     async def initialize(self):
         """初始化Neo4j连接"""
         try:
-            self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
+            if self._owns_driver:
+                self.driver = AsyncGraphDatabase.driver(
+                    self.uri, auth=(self.user, self.password),
+                    max_connection_pool_size=settings.NEO4J_MAX_CONNECTION_POOL_SIZE,
+                )
+            else:
+                self.driver = get_async_neo4j_driver()
             # 测试连接
-            with self.driver.session() as session:
-                session.run("RETURN 1")
+            await self.driver.verify_connectivity()
+            await ensure_neo4j_schema_async(self.driver)
             self._initialized = True
             logger.info("Neo4j service initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Neo4j service: {str(e)}")
             raise
 
+    async def _read(self, query: str, timeout: float = None, **params) -> List[Dict[str, Any]]:
+        """在读事务中执行查询并返回记录
+
+        超时同时作为服务端事务超时和客户端等待上限，慢查询既不会长期占用连接也不会拖住调用方
+        """
+        timeout = self.query_timeout if timeout is None else timeout
+
+        @unit_of_work(timeout=timeout)
+        async def work(tx):
+            result = await tx.run(query, **params)
+            return await result.data()
+
+        async with self.driver.session() as session:
+            return await asyncio.wait_for(session.execute_read(work), timeout)
+
     async def store_qa_pair_with_context(self, qa_pair: QAPairWithContext,
                                        schema_context: Dict[str, Any]):
         """存储问答对及其完整上下文信息"""
         if not self._initialized:
             await self.initialize()
 
-        with self.driver.session() as session:
-            try:
-                # 1. 创建QAPair节点
-                session.run("""
-                    CREATE (qa:QAPair {
-                        id: $id,
-                        question: $question,
-                        sql: $sql,
-                        connection_id: $connection_id,
-                        difficulty_level: $difficulty_level,
-                        query_type: $query_type,
-                        success_rate: $success_rate,
-                        verified: $verified,
-                        created_at: datetime($created_at)
-                    })
-                """,
-                    id=qa_pair.id,
-                    question=qa_pair.question,
-                    sql=qa_pair.sql,
-                    connection_id=qa_pair.connection_id,
-                    difficulty_level=qa_pair.difficulty_level,
-                    query_type=qa_pair.query_type,
-                    success_rate=qa_pair.success_rate,
-                    verified=qa_pair.verified,
-                    created_at=qa_pair.created_at.isoformat()
-                )
+        async def write(tx):
+            # 1. 创建QAPair节点
+            await (await tx.run(
+                CREATE_QA_PAIR,
+                id=qa_pair.id,
+                question=qa_pair.question,
+                sql=qa_pair.sql,
+                connection_id=qa_pair.connection_id,
+                difficulty_level=qa_pair.difficulty_level,
+                query_type=qa_pair.query_type,
+                success_rate=qa_pair.success_rate,
+                verified=qa_pair.verified,
+                created_at=qa_pair.created_at.isoformat()
+            )).consume()
 
-                # 2. 建立与Table的USES_TABLES关系
-                for table_name in qa_pair.used_tables:
-                    session.run("""
-                        MATCH (qa:QAPair {id: $qa_id})
-                        MATCH (t:Table {name: $table_name, connection_id: $connection_id})
-                        CREATE (qa)-[:USES_TABLES]->(t)
-                    """, qa_id=qa_pair.id, table_name=table_name,
-                        connection_id=qa_pair.connection_id)
+            # 2. 建立与Table的USES_TABLES关系
+            for table_name in qa_pair.used_tables:
+                await (await tx.run(LINK_QA_TABLE, qa_id=qa_pair.id, table_name=table_name,
+                                    connection_id=qa_pair.connection_id)).consume()
 
-                # 3. 创建或更新QueryPattern
-                await self._create_or_update_pattern(session, qa_pair)
+            # 3. 创建或更新QueryPattern
+            await self._create_or_update_pattern(tx, qa_pair)
 
-                # 4. 创建Entity节点和关系
-                await self._create_entity_relationships(session, qa_pair)
+            # 4. 创建Entity节点和关系
+            await self._create_entity_relationships(tx, qa_pair)
 
-                logger.info(f"Stored QA pair with context: {qa_pair.id}")
+        try:
+            async with self.driver.session() as session:
+                await session.execute_write(write)
+            logger.info(f"Stored QA pair with context: {qa_pair.id}")
+        except Exception as e:
+            logger.error(f"Failed to store QA pair with context: {str(e)}")
+            raise
 
-            except Exception as e:
-                logger.error(f"Failed to store QA pair with context: {str(e)}")
-                raise
+    async def bulk_store_qa_pairs(self, qa_pairs: List[QAPairWithContext]):
+        """通过UNWIND在一个事务中批量存储问答对及其表、模式、实体关系"""
+        if not self._initialized:
+            await self.initialize()
 
-    async def _create_or_update_pattern(self, session, qa_pair: QAPairWithContext):
-        """创建或更新查询模式"""
-        pattern_id = f"pattern_{qa_pair.query_type}_{qa_pair.difficulty_level}"
-
-        # 检查模式是否存在
-        result = session.run("""
-            MATCH (p:QueryPattern {id: $pattern_id})
-            RETURN p
-        """, pattern_id=pattern_id)
-
-        if result.single():
-            # 更新使用计数
-            session.run("""
-                MATCH (p:QueryPattern {id: $pattern_id})
-                SET p.usage_count = p.usage_count + 1
-            """, pattern_id=pattern_id)
-        else:
-            # 创建新模式
-            session.run("""
-                CREATE (p:QueryPattern {
-                    id: $pattern_id,
-                    name: $query_type,
-                    difficulty_level: $difficulty_level,
-                    usage_count: 1,
-                    created_at: datetime()
-                })
-            """,
-                pattern_id=pattern_id,
-                query_type=qa_pair.query_type,
-                difficulty_level=qa_pair.difficulty_level
-            )
+        qa_rows = [{
+            "id": qa.id,
+            "question": qa.question,
+            "sql": qa.sql,
+            "connection_id": qa.connection_id,
+            "difficulty_level": qa.difficulty_level,
+            "query_type": qa.query_type,
+            "success_rate": qa.success_rate,
+            "verified": qa.verified,
+            "created_at": qa.created_at.isoformat(),
+            "pattern_id": f"pattern_{qa.query_type}_{qa.difficulty_level}"
+        } for qa in qa_pairs]
+        table_rows = [
+            {"qa_id": qa.id, "table_name": table_name, "connection_id": qa.connection_id}
+            for qa in qa_pairs for table_name in qa.used_tables
+        ]
+        entity_rows = [
+            {"qa_id": qa.id, "entity_id": f"entity_{entity.lower().replace(' ', '_')}", "entity_name": entity}
+            for qa in qa_pairs for entity in qa.mentioned_entities
+        ]
+
+        async def write(tx):
+            await (await tx.run(BULK_CREATE_QA_PAIRS, rows=qa_rows)).consume()
+            if table_rows:
+                await (await tx.run(BULK_LINK_QA_TABLES, rows=table_rows)).consume()
+            if entity_rows:
+                await (await tx.run(BULK_LINK_QA_ENTITIES, rows=entity_rows)).consume()
+
+        async with self.driver.session() as session:
+            await session.execute_write(write)
+        logger.info(f"Stored {len(qa_pairs)} QA pairs with context")
+
+    async def bulk_delete_qa_pairs(self, qa_ids: List[str]):
+        """在一个事务中删除问答对及其关系，并撤销bulk_store_qa_pairs对查询模式的计数"""
+        if not self._initialized:
+            await self.initialize()
+
+        rows = [{"id": qa_id} for qa_id in qa_ids]
 
-        # 建立QAPair与Pattern的关系
-        session.run("""
-            MATCH (qa:QAPair {id: $qa_id})
-            MATCH (p:QueryPattern {id: $pattern_id})
-            CREATE (qa)-[:FOLLOWS_PATTERN]->(p)
-        """, qa_id=qa_pair.id, pattern_id=pattern_id)
+        async def write(tx):
+            await (await tx.run(BULK_DELETE_QA_PAIRS, rows=rows)).consume()
 
-    async def _create_entity_relationships(self, session, qa_pair: QAPairWithContext):
+        async with self.driver.session() as session:
+            await session.execute_write(write)
+        logger.info(f"Deleted {len(qa_ids)} QA pairs")
+
+    async def _create_or_update_pattern(self, tx, qa_pair: QAPairWithContext):
+        """创建或更新查询模式，并建立QAPair与Pattern的关系"""
+        await (await tx.run(
+            MERGE_QA_PATTERN,
+            pattern_id=f"pattern_{qa_pair.query_type}_{qa_pair.difficulty_level}",
+            query_type=qa_pair.query_type,
+            difficulty_level=qa_pair.difficulty_level,
+            qa_id=qa_pair.id
+        )).consume()
+
+    async def _create_entity_relationships(self, tx, qa_pair: QAPairWithContext):
         """创建实体关系"""
         for entity in qa_pair.mentioned_entities:
             entity_id = f"entity_{entity.lower().replace(' ', '_')}"
-
-            # 创建或获取Entity节点
-            session.run("""
-                MERGE (e:Entity {id: $entity_id})
-                ON CREATE SET e.name = $entity_name, e.created_at = datetime()
-            """, entity_id=entity_id, entity_name=entity)
-
-            # 建立关系
-            session.run("""
-                MATCH (qa:QAPair {id: $qa_id})
-                MATCH (e:Entity {id: $entity_id})
-                CREATE (qa)-[:MENTIONS_ENTITY]->(e)
-            """, qa_id=qa_pair.id, entity_id=entity_id)
+            await (await tx.run(LINK_QA_ENTITY, entity_id=entity_id, entity_name=entity,
+                                qa_id=qa_pair.id)).consume()
 
     async def structural_search(self, schema_context: Dict[str, Any],
-                              connection_id: int, top_k: int = 20) -> List[RetrievalResult]:
+                              connection_id: int, top_k: int = 20,
+                              timeout: float = None) -> List[RetrievalResult]:
         """基于schema结构的检索"""
         if not self._initialized:
             await self.initialize()
 
         table_names = [table.get('name') for table in schema_context.get('tables', [])]
+        if not table_names:
+            return []
 
-        with self.driver.session() as session:
-            result = session.run("""
-                MATCH (qa:QAPair)-[:USES_TABLES]->(t:Table)
-                WHERE t.name IN $table_names AND qa.connection_id = $connection_id
-                WITH qa, count(t) as table_overlap, collect(t.name) as used_tables
-                ORDER BY table_overlap DESC, qa.success_rate DESC
-                LIMIT $top_k
-                RETURN qa, table_overlap, used_tables
-            """, table_names=table_names, connection_id=connection_id, top_k=top_k)
+        records = await self._read(STRUCTURAL_SEARCH_QUERY, timeout=timeout,
+                                   table_names=table_names, connection_id=connection_id, top_k=top_k)
 
-            results = []
-            for record in result:
-                qa_data = record['qa']
-                table_overlap = record['table_overlap']
-                used_tables = record['used_tables']
+        results = []
+        for record in records:
+            table_overlap = record['table_overlap']
 
-                # 计算结构相似性分数
-                structural_score = table_overlap / max(len(table_names), 1)
+            # 计算结构相似性分数
+            structural_score = table_overlap / max(len(table_names), 1)
 
-                qa_pair = self._build_qa_pair_from_record(qa_data, used_tables)
-                results.append(RetrievalResult(
-                    qa_pair=qa_pair,
-                    structural_score=structural_score,
-                    explanation=f"使用了{table_overlap}个相同的表"
-                ))
+            qa_pair = self._build_qa_pair_from_record(record['qa'], record['used_tables'])
+            results.append(RetrievalResult(
+                qa_pair=qa_pair,
+                structural_score=structural_score,
+                explanation=f"使用了{table_overlap}个相同的表"
+            ))
 
-            return results
+        return results
 
     async def pattern_search(self, query_type: str, difficulty_level: int,
-                           connection_id: int, top_k: int = 20) -> List[RetrievalResult]:
+                           connection_id: int, top_k: int = 20,
+                           timeout: float = None) -> List[RetrievalResult]:
         """基于查询模式的检索"""
         if not self._initialized:
             await self.initialize()
 
-        with self.driver.session() as session:
-            result = session.run("""
-                MATCH (qa:QAPair)-[:FOLLOWS_PATTERN]->(p:QueryPattern)
-                WHERE p.name = $query_type
-                AND p.difficulty_level <= $difficulty_level + 1
-                AND qa.connection_id = $connection_id
-                RETURN qa, p.usage_count
-                ORDER BY qa.success_rate DESC, p.usage_count DESC
-                LIMIT $top_k
-            """, query_type=query_type, difficulty_level=difficulty_level,
-                connection_id=connection_id, top_k=top_k)
+        records = await self._read(PATTERN_SEARCH_QUERY, timeout=timeout,
+                                   query_type=query_type, difficulty_level=difficulty_level,
+                                   connection_id=connection_id, top_k=top_k)
 
-            results = []
-            for record in result:
-                qa_data = record['qa']
-                usage_count = record['usage_count']
+        results = []
+        for record in records:
+            usage_count = record['usage_count'] or 0
 
-                # 计算模式匹配分数
-                pattern_score = min(1.0, usage_count / 100.0)  # 归一化使用次数
+            # 计算模式匹配分数
+            pattern_score = min(1.0, usage_count / 100.0)  # 归一化使用次数
 
-                qa_pair = self._build_qa_pair_from_record(qa_data)
-                results.append(RetrievalResult(
-                    qa_pair=qa_pair,
-                    pattern_score=pattern_score,
-                    explanation=f"匹配查询模式，使用次数: {usage_count}"
-                ))
+            qa_pair = self._build_qa_pair_from_record(record['qa'])
+            results.append(RetrievalResult(
+                qa_pair=qa_pair,
+                pattern_score=pattern_score,
+                explanation=f"匹配查询模式，使用次数: {usage_count}"
+            ))
 
-            return results
+        return results
 
     def _build_qa_pair_from_record(self, qa_data, used_tables=None) -> QAPairWithContext:
         """从Neo4j记录构建QAPair对象"""
+        created_at = qa_data['created_at']
+        # 驱动返回neo4j.time.DateTime，旧数据可能是ISO字符串
+        if hasattr(created_at, 'to_native'):
+            created_at = created_at.to_native()
+        elif isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
         return QAPairWithContext(
             id=qa_data['id'],
             question=qa_data['question'],
@@ -452,17 +769,19 @@ class EnhancedNeo4jService:
             query_type=qa_data['query_type'],
             success_rate=qa_data['success_rate'],
             verified=qa_data['verified'],
-            created_at=datetime.fromisoformat(qa_data['created_at']),
+            created_at=created_at,
             used_tables=used_tables or [],
             used_columns=[],
             query_pattern=qa_data['query_type'],
             mentioned_entities=[]
         )
 
-    def close(self):
-        """关闭连接"""
-        if self.driver:
-            self.driver.close()
+    async def close(self):
+        """关闭连接（共享驱动由应用统一关闭）"""
+        if self.driver and self._owns_driver:
+            await self.driver.close()
+        self.driver = None
+        self._initialized = False
 
 # ===== 融合排序器 =====
 
@@ -584,7 +903,8 @@ class HybridRetrievalEngine:
     """混合检索引擎，结合向量检索和图检索"""
 
     def __init__(self):
-        self.vector_service = VectorService()
+        # 共享进程内唯一的向量化服务，避免每个引擎各自加载一份模型
+        self.vector_service = get_vector_service()
         self.milvus_service = MilvusService()
         self.neo4j_service = EnhancedNeo4jService()
         self.fusion_ranker = FusionRanker()
@@ -677,6 +997,40 @@ class HybridRetrievalEngine:
             logger.error(f"Error in semantic search: {str(e)}")
             return []
 
+    async def find_verified_answer(self, query: str, connection_id: int,
+                                   threshold: float = None,
+                                   min_success_rate: float = None) -> Optional[Dict]:
+        """查找同一连接上与问题高度相似的已验证问答对
+
+        Args:
+            query: 自然语言问题
+            connection_id: 数据库连接ID
+            threshold: 最低相似度，默认取配置
+            min_success_rate: 最低成功率，默认取配置
+
+        Returns:
+            Optional[Dict]: 相似度最高的问答对（含similarity_score），没有满足条件的返回None
+        """
+        if not self._initialized:
+            await self.initialize()
+
+        threshold = settings.ANSWER_CACHE_SIMILARITY_THRESHOLD if threshold is None else threshold
+        if min_success_rate is None:
+            min_success_rate = settings.ANSWER_CACHE_MIN_SUCCESS_RATE
+
+        query_vector = await self.vector_service.embed_question(query)
+        candidates = await self.milvus_service.search_similar(
+            query_vector, top_k=3, connection_id=connection_id, verified_only=True
+        )
+        for candidate in candidates:
+            # 结果按相似度降序排列
+            if candidate["similarity_score"] < threshold:
+                break
+            if candidate["verified"] and (candidate["success_rate"] or 0.0) >= min_success_rate \
+                    and candidate["sql"]:
+                return candidate
+        return None
+
     def _build_qa_pair_from_milvus_result(self, result: Dict) -> QAPairWithContext:
         """从Milvus结果构建QAPair对象"""
         return QAPairWithContext(
@@ -773,10 +1127,112 @@ class HybridRetrievalEngine:
             logger.error(f"Failed to store QA pair: {str(e)}")
             raise
 
-    def close(self):
+    async def bulk_store_qa_pairs(self, qa_pairs: List[QAPairWithContext],
+                                  batch_size: int = None) -> Dict[str, Any]:
+        """批量存储问答对
+
+        一次batch_embed完成全部向量化，然后按批写入Neo4j（UNWIND）和Milvus（每批flush一次）。
+        某批写入失败时逐条重试该批，只记录失败的行，不中断整个导入；Milvus写入失败的行会从Neo4j中删除。
+
+        Args:
+            qa_pairs: 问答对列表
+            batch_size: 每批写入的问答对数量
+
+        Returns:
+            Dict[str, Any]: {"stored": 成功的问答对ID列表, "errors": [{"index": 序号, "error": 错误信息}]}
+        """
+        if not self._initialized:
+            await self.initialize()
+
+        batch_size = batch_size or settings.QA_BULK_BATCH_SIZE
+        stored: List[str] = []
+        errors: List[Dict[str, Any]] = []
+
+        rows = []
+        for index, qa_pair in enumerate(qa_pairs):
+            error = validate_qa_pair(qa_pair)
+            if error:
+                errors.append({"index": index, "error": error})
+            else:
+                rows.append((index, qa_pair))
+
+        # 一次性向量化所有缺少向量的问题
+        to_embed = [qa_pair for _, qa_pair in rows if not qa_pair.embedding_vector]
+        if to_embed:
+            vectors = await self.vector_service.batch_embed([qa.question for qa in to_embed])
+            for qa_pair, vector in zip(to_embed, vectors):
+                qa_pair.embedding_vector = vector
+
+        for start in range(0, len(rows), batch_size):
+            await self._store_qa_chunk(rows[start:start + batch_size], stored, errors)
+            logger.info(f"Bulk QA ingestion progress: {min(start + batch_size, len(rows))}/{len(rows)}")
+
+        errors.sort(key=lambda item: item["index"])
+        return {"stored": stored, "errors": errors}
+
+    async def _store_qa_chunk(self, chunk: List[Tuple[int, QAPairWithContext]],
+                              stored: List[str], errors: List[Dict[str, Any]]):
+        """写入一批问答对，失败时逐条重试以定位出错的行"""
+        qa_pairs = [qa_pair for _, qa_pair in chunk]
+        try:
+            await self.neo4j_service.bulk_store_qa_pairs(qa_pairs)
+        except Exception as e:
+            # Neo4j事务已回滚，整批逐条重试
+            if len(chunk) == 1:
+                errors.append({"index": chunk[0][0], "error": f"Neo4j写入失败: {str(e)}"})
+            else:
+                for row in chunk:
+                    await self._store_qa_chunk([row], stored, errors)
+            return
+
+        try:
+            await self.milvus_service.insert_qa_pairs(qa_pairs)
+            stored.extend(qa_pair.id for qa_pair in qa_pairs)
+            return
+        except Exception as e:
+            failed = [(chunk[0], e)] if len(chunk) == 1 else []
+
+        # Neo4j已写入，只对Milvus逐条重试
+        if len(chunk) > 1:
+            for index, qa_pair in chunk:
+                try:
+                    await self.milvus_service.insert_qa_pairs([qa_pair])
+                    stored.append(qa_pair.id)
+                except Exception as row_error:
+                    failed.append(((index, qa_pair), row_error))
+        if not failed:
+            return
+
+        # Milvus写入失败的行从Neo4j中删除，避免只存在于图中的问答对和多计的模式使用次数
+        cleanup_error = ""
+        try:
+            await self.neo4j_service.bulk_delete_qa_pairs([qa_pair.id for (_, qa_pair), _ in failed])
+        except Exception as e:
+            logger.error(f"Failed to remove QA pairs rejected by Milvus from Neo4j: {str(e)}")
+            cleanup_error = f"；清理Neo4j中的记录失败: {str(e)}"
+        for (index, _), error in failed:
+            errors.append({"index": index, "error": f"Milvus写入失败: {str(error)}{cleanup_error}"})
+
+    async def close(self):
         """关闭所有连接"""
         if self.neo4j_service:
-            self.neo4j_service.close()
+            await self.neo4j_service.close()
+
+# 进程内共享的混合检索引擎，避免每个请求各自初始化Milvus和Neo4j连接
+_hybrid_engine: Optional[HybridRetrievalEngine] = None
+_hybrid_engine_lock = asyncio.Lock()
+
+
+async def get_hybrid_retrieval_engine() -> HybridRetrievalEngine:
+    """获取进程内共享并已初始化的混合检索引擎"""
+    global _hybrid_engine
+    if _hybrid_engine is None:
+        async with _hybrid_engine_lock:
+            if _hybrid_engine is None:
+                engine = HybridRetrievalEngine()
+                await engine.initialize()
+                _hybrid_engine = engine
+    return _hybrid_engine
 
 # ===== 工具函数 =====
 
@@ -832,6 +1288,18 @@ def clean_sql(sql: str) -> str:
 
     return sql
 
+def validate_qa_pair(qa_pair: QAPairWithContext) -> Optional[str]:
+    """检查问答对是否满足Milvus字段长度限制，返回错误信息或None"""
+    limits = {"question": 2000, "sql": 5000, "query_type": 50}
+    for field, limit in limits.items():
+        value = getattr(qa_pair, field) or ""
+        if not value.strip():
+            return f"{field}不能为空"
+        if len(value.encode("utf-8")) > limit:
+            return f"{field}超过最大长度{limit}"
+    return None
+
+
 def generate_qa_id() -> str:
     """生成问答对ID"""
     return f"qa_{uuid.uuid4().hex[:12]}"
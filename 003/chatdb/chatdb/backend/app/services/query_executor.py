@@ -0,0 +1,120 @@
+"""
+查询执行层
+在有界线程池中运行同步驱动（DBAccess、SQLAlchemy、Neo4j）的调用，按目标连接限制并发，
+支持超时和取消，避免一个慢查询阻塞事件循环上的所有会话
+"""
+import asyncio
+import functools
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryExecutor:
+    """同步驱动调用的执行器"""
+
+    def __init__(self, max_workers: int = None, per_connection_limit: int = None):
+        """初始化执行器
+
+        Args:
+            max_workers: 线程池大小
+            per_connection_limit: 每个目标连接允许同时执行的语句数
+        """
+        self.max_workers = max_workers or settings.QUERY_EXECUTOR_MAX_WORKERS
+        self.per_connection_limit = per_connection_limit or settings.QUERY_MAX_CONCURRENCY_PER_CONNECTION
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="query")
+        # asyncio.Semaphore绑定事件循环，因此按循环分别维护
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, asyncio.Semaphore]]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.stats = {"completed": 0, "failed": 0, "cancelled": 0, "timed_out": 0, "running": 0}
+
+    def _semaphore(self, key: Hashable, limit: Optional[int] = None) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphores = self._semaphores.setdefault(loop, {})
+            if key not in semaphores:
+                semaphores[key] = asyncio.Semaphore(limit or self.per_connection_limit)
+            return semaphores[key]
+
+    @asynccontextmanager
+    async def connection_slot(self, key: Hashable, limit: Optional[int] = None):
+        """占用目标连接的一个并发名额，名额用尽时等待
+
+        Args:
+            key: 目标连接
+            limit: 该连接的并发名额数，默认为per_connection_limit（只在第一次使用该连接时生效）
+        """
+        async with self._semaphore(key, limit):
+            yield
+
+    async def run_blocking(self, func: Callable[..., Any], *args,
+                           timeout: Optional[float] = None,
+                           on_cancel: Optional[Callable[[], None]] = None, **kwargs) -> Any:
+        """在线程池中运行同步调用
+
+        Args:
+            func: 同步函数
+            timeout: 超时时间（秒），None表示不限
+            on_cancel: 超时或调用方被取消时执行的回调，用于中断驱动中正在执行的语句
+
+        Returns:
+            Any: 函数返回值
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        self.stats["running"] += 1
+        try:
+            result = await asyncio.wait_for(future, timeout)
+            self.stats["completed"] += 1
+            return result
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            self._interrupt(on_cancel)
+            raise TimeoutError(f"语句执行超过{timeout}秒")
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            self._interrupt(on_cancel)
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self.stats["running"] -= 1
+
+    async def run(self, key: Hashable, func: Callable[..., Any], *args,
+                  timeout: Optional[float] = None,
+                  on_cancel: Optional[Callable[[], None]] = None, **kwargs) -> Any:
+        """占用目标连接的并发名额后在线程池中运行同步调用"""
+        async with self.connection_slot(key):
+            return await self.run_blocking(func, *args, timeout=timeout, on_cancel=on_cancel, **kwargs)
+
+    @staticmethod
+    def _interrupt(on_cancel: Optional[Callable[[], None]]) -> None:
+        if on_cancel is None:
+            return
+        try:
+            on_cancel()
+        except Exception as e:
+            logger.warning(f"中断正在执行的语句失败: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "max_workers": self.max_workers,
+            "per_connection_limit": self.per_connection_limit,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全局查询执行器
+query_executor = QueryExecutor()
@@ -0,0 +1,284 @@
+"""
+查询结果缓存模块
+按(连接ID, 规范化SQL指纹)缓存只读SELECT的执行结果，基于TTL和按字节计量的LRU淘汰，
+并支持按表失效
+"""
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Hashable, Iterable, List, Optional, Set, Tuple
+
+import sqlparse
+from sqlparse import tokens as T
+
+from app.core.config import settings
+from app.core.utils import CacheManager
+from app.db.result_stream import estimate_row_bytes
+
+# 结果随调用时间或随机数变化的函数，包含它们的查询不缓存
+NON_DETERMINISTIC_NAMES = {
+    "NOW", "SYSDATE", "CURDATE", "CURTIME", "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP",
+    "LOCALTIME", "LOCALTIMESTAMP", "UTC_DATE", "UTC_TIME", "UTC_TIMESTAMP", "GETDATE", "GETUTCDATE",
+    "RAND", "RANDOM", "UUID", "UUID_SHORT", "NEWID", "GEN_RANDOM_UUID", "LAST_INSERT_ID", "CONNECTION_ID",
+}
+
+# 结束FROM子句的关键字（之后的逗号不再分隔表名）
+FROM_CLAUSE_END = {
+    "WHERE", "GROUP BY", "ORDER BY", "HAVING", "LIMIT", "OFFSET", "FETCH", "WINDOW",
+    "UNION", "UNION ALL", "EXCEPT", "INTERSECT", "SELECT",
+}
+
+# 带这些关键字的SELECT会写入或加锁，不缓存
+WRITE_KEYWORDS = {"INTO", "LOCK", "SHARE"}
+
+
+@dataclass(frozen=True)
+class SqlFingerprint:
+    """SQL指纹：去掉字面量后的模板、字面量列表和涉及的表"""
+    template: str
+    literals: Tuple[str, ...]
+    tables: frozenset
+
+    @property
+    def template_id(self) -> str:
+        return hashlib.sha1(self.template.encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def key(self) -> str:
+        payload = "\x00".join((self.template,) + self.literals)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _unquote(name: str) -> str:
+    return name.strip('`"[]').lower()
+
+
+def fingerprint_sql(sql: str) -> Optional[SqlFingerprint]:
+    """计算只读SELECT的规范化指纹
+
+    合并空白、去掉注释和结尾分号、关键字统一大写，字面量从模板中提取出来单独参与缓存键，
+    因此只是写法不同的同一查询会命中同一条缓存，而字面量不同的查询不会互相命中
+
+    Args:
+        sql: SQL语句
+
+    Returns:
+        Optional[SqlFingerprint]: 指纹，不是可缓存的单条只读SELECT时返回None
+    """
+    statements = [stmt for stmt in sqlparse.parse(sql) if stmt.token_first(skip_cm=True, skip_ws=True)]
+    if len(statements) != 1 or statements[0].get_type() != "SELECT":
+        return None
+
+    parts: List[str] = []
+    literals: List[str] = []
+    tables: Set[str] = set()
+    in_from = False
+    expect_table = False
+    after_dot = False
+    table_parts: List[str] = []
+
+    for token in statements[0].flatten():
+        if token.is_whitespace or token.ttype in T.Comment:
+            continue
+        ttype = token.ttype
+        is_name = ttype in T.Name or ttype in T.Literal.String.Symbol
+
+        # 收集FROM/JOIN及其后逗号分隔的表名（可能带库名前缀），遇到别名或其他记号时结束
+        if expect_table:
+            if is_name and (not table_parts or after_dot):
+                table_parts.append(token.value)
+                after_dot = False
+            elif ttype in T.Punctuation and token.value == "." and table_parts:
+                after_dot = True
+            else:
+                if table_parts:
+                    tables.add(_unquote(table_parts[-1]))
+                table_parts = []
+                expect_table = False
+
+        if is_name and token.value.upper() in NON_DETERMINISTIC_NAMES:
+            return None
+
+        if ttype in T.Keyword:
+            keyword = token.normalized.upper()
+            if keyword in NON_DETERMINISTIC_NAMES or keyword in WRITE_KEYWORDS:
+                return None
+            if ttype in T.Keyword.DML and keyword != "SELECT":
+                # SELECT ... FOR UPDATE 等加锁读取
+                return None
+            if keyword == "FROM" or keyword.endswith("JOIN"):
+                in_from = True
+                expect_table = True
+            elif keyword in FROM_CLAUSE_END:
+                in_from = False
+            parts.append(keyword)
+        elif ttype in T.Literal.String.Single or ttype in T.Literal.Number:
+            literals.append(token.value)
+            parts.append("?")
+        elif ttype in T.Punctuation and token.value == ",":
+            expect_table = in_from
+            parts.append(",")
+        elif ttype in T.Punctuation and token.value == ";":
+            continue
+        else:
+            parts.append(token.value)
+
+    if table_parts:
+        tables.add(_unquote(table_parts[-1]))
+
+    return SqlFingerprint(" ".join(parts), tuple(literals), frozenset(tables))
+
+
+@dataclass
+class CachedResult:
+    """缓存的查询结果"""
+    rows: List[Dict[str, Any]]
+    meta: Dict[str, Any]
+    tables: frozenset
+    template_id: str
+    size: int
+
+
+class QueryResultCache:
+    """查询结果缓存，基于TTL和字节数上限的LRU淘汰"""
+
+    def __init__(self, ttl: int = None, max_bytes: int = None, max_entries: int = None,
+                 max_entry_bytes: int = None, enabled: bool = None):
+        """初始化查询结果缓存
+
+        Args:
+            ttl: 缓存生存时间（秒）
+            max_bytes: 缓存结果总字节数上限
+            max_entries: 最多缓存的结果数
+            max_entry_bytes: 单个结果的字节数上限，超过时不缓存
+            enabled: 是否启用缓存
+        """
+        self.enabled = settings.QUERY_RESULT_CACHE_ENABLED if enabled is None else enabled
+        self.ttl = settings.QUERY_RESULT_CACHE_TTL if ttl is None else ttl
+        self.max_entry_bytes = max_entry_bytes or settings.QUERY_RESULT_CACHE_MAX_ENTRY_BYTES
+        self.results = CacheManager(
+            max_size=max_entries or settings.QUERY_RESULT_CACHE_MAX_ENTRIES,
+            ttl=self.ttl,
+            max_bytes=max_bytes or settings.QUERY_RESULT_CACHE_MAX_BYTES,
+            sizeof=lambda entry: entry.size,
+        )
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "invalidations": 0}
+
+    @staticmethod
+    def _key(connection_id: Hashable, fingerprint: SqlFingerprint) -> Tuple[Hashable, str]:
+        return connection_id, fingerprint.key
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, connection_id: Hashable, sql: str) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+        """获取缓存的查询结果
+
+        Args:
+            connection_id: 数据库连接ID
+            sql: SQL语句
+
+        Returns:
+            Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]: (结果行, 结果元数据)，未命中时返回None
+        """
+        fingerprint = fingerprint_sql(sql) if self.enabled and self.ttl > 0 else None
+        if fingerprint is None:
+            self._count("bypassed")
+            return None
+        entry = self.results.get(self._key(connection_id, fingerprint))
+        if entry is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return [dict(row) for row in entry.rows], {**entry.meta, "cache": "hit"}
+
+    def set(self, connection_id: Hashable, sql: str, rows: List[Dict[str, Any]],
+            meta: Optional[Dict[str, Any]] = None) -> bool:
+        """缓存查询结果
+
+        Args:
+            connection_id: 数据库连接ID
+            sql: SQL语句
+            rows: 结果行
+            meta: 结果元数据
+
+        Returns:
+            bool: 是否已缓存
+        """
+        fingerprint = fingerprint_sql(sql) if self.enabled and self.ttl > 0 else None
+        if fingerprint is None:
+            return False
+        meta = dict(meta or {})
+        size = meta.get("byte_count") or sum(estimate_row_bytes(row) for row in rows)
+        if size > self.max_entry_bytes:
+            return False
+        meta.pop("cache", None)
+        entry = CachedResult(
+            rows=[dict(row) for row in rows], meta=meta, tables=fingerprint.tables,
+            template_id=fingerprint.template_id, size=size,
+        )
+        stored = self.results.set(self._key(connection_id, fingerprint), entry)
+        if stored:
+            self._count("stores")
+        return stored
+
+    def cache_status(self, sql: str) -> str:
+        """未命中时结果元数据中的缓存状态：miss表示可缓存，bypass表示不可缓存"""
+        return "miss" if self.enabled and fingerprint_sql(sql) is not None else "bypass"
+
+    def invalidate(self, connection_id: Optional[Hashable] = None) -> int:
+        """使连接的所有缓存结果失效
+
+        Args:
+            connection_id: 数据库连接ID，为None时清空所有缓存
+
+        Returns:
+            int: 移除的条目数
+        """
+        if connection_id is None:
+            removed = len(self.results)
+            self.results.clear()
+        else:
+            removed = self.results.remove_where(lambda key: key[0] == connection_id)
+        self._count("invalidations")
+        return removed
+
+    def invalidate_tables(self, connection_id: Hashable, tables: Iterable[str]) -> int:
+        """使读取了指定表的缓存结果失效，用于数据变更后的按表失效
+
+        Args:
+            connection_id: 数据库连接ID
+            tables: 表名列表
+
+        Returns:
+            int: 移除的条目数
+        """
+        names = {_unquote(table.split(".")[-1]) for table in tables}
+        keys = [
+            key for key, entry in self.results.items()
+            if key[0] == connection_id and entry.tables & names
+        ]
+        for key in keys:
+            self.results.remove(key)
+        self._count("invalidations")
+        return len(keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(self.results),
+            "bytes": self.results.total_bytes,
+            "max_bytes": self.results.max_bytes,
+            "evictions": self.results.evictions,
+            "ttl": self.ttl,
+            "enabled": self.enabled,
+        }
+
+
+# 全局查询结果缓存实例
+query_result_cache = QueryResultCache()
@@ -0,0 +1,296 @@
+"""
+表结构上下文缓存模块
+缓存每个连接的表/列/关系目录，以及按(连接ID, 规范化查询)缓存的表结构上下文，
+使重复问题可以完全跳过Neo4j和MySQL
+"""
+import copy
+import re
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.core.config import settings
+from app.core.utils import CacheManager
+
+# 单条IN查询的最大ID数，避免超出数据库的参数个数限制
+IN_QUERY_CHUNK_SIZE = 1000
+
+
+def _chunks(ids: List[int], size: int = IN_QUERY_CHUNK_SIZE):
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+class SchemaCatalog:
+    """单个连接的表结构目录，列和关系按表懒加载后常驻内存"""
+
+    def __init__(self, connection_id: int, tables: List[Dict[str, Any]]):
+        """初始化表结构目录
+
+        Args:
+            connection_id: 数据库连接ID
+            tables: 表信息列表，每项包含id、name、description
+        """
+        self.connection_id = connection_id
+        self.tables = tables
+        self.tables_by_id: Dict[int, Dict[str, Any]] = {t["id"]: t for t in tables}
+        self._columns: Dict[int, List[Dict[str, Any]]] = {}
+        self._relationships: Dict[int, List[Dict[str, Any]]] = {}
+        self._all_relationships: Optional[List[Dict[str, Any]]] = None
+
+    @classmethod
+    def load(cls, db: Session, connection_id: int) -> "SchemaCatalog":
+        """从MySQL加载连接的表目录
+
+        Args:
+            db: 数据库会话
+            connection_id: 数据库连接ID
+
+        Returns:
+            SchemaCatalog: 表结构目录
+        """
+        tables = crud.schema_table.get_by_connection(db=db, connection_id=connection_id, limit=None)
+        return cls(connection_id, [
+            {"id": table.id, "name": table.table_name, "description": table.description or ""}
+            for table in tables
+        ])
+
+    def get_columns(self, db: Session, table_id: int) -> List[Dict[str, Any]]:
+        """获取表的所有列
+
+        Args:
+            db: 数据库会话，仅在未缓存时使用
+            table_id: 表ID
+
+        Returns:
+            List[Dict[str, Any]]: 列信息列表
+        """
+        return self.get_columns_for_tables(db, [table_id])[table_id]
+
+    def get_columns_for_tables(self, db: Session, table_ids: Iterable[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """批量获取多个表的列，未缓存的表用IN查询一次加载
+
+        Args:
+            db: 数据库会话，仅在未缓存时使用
+            table_ids: 表ID列表
+
+        Returns:
+            Dict[int, List[Dict[str, Any]]]: 表ID到列信息列表的映射
+        """
+        table_ids = list(dict.fromkeys(table_ids))
+        missing = [table_id for table_id in table_ids if table_id not in self._columns]
+        for chunk in _chunks(missing):
+            loaded: Dict[int, List[Dict[str, Any]]] = {table_id: [] for table_id in chunk}
+            for column in crud.schema_column.get_by_tables(db=db, table_ids=chunk):
+                loaded[column.table_id].append(self._column_to_dict(column))
+            self._columns.update(loaded)
+        return {table_id: self._columns[table_id] for table_id in table_ids}
+
+    def get_table_relationships(self, db: Session, table_id: int) -> List[Dict[str, Any]]:
+        """获取以该表为源或目标的所有关系
+
+        Args:
+            db: 数据库会话，仅在未缓存时使用
+            table_id: 表ID
+
+        Returns:
+            List[Dict[str, Any]]: 关系信息列表
+        """
+        return self.get_relationships_for_tables(db, [table_id])[table_id]
+
+    def get_relationships_for_tables(self, db: Session,
+                                     table_ids: Iterable[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """批量获取以多个表为源或目标的关系，未缓存的表用IN查询一次加载
+
+        已加载连接的全部关系时直接从内存中分组，不再访问数据库
+
+        Args:
+            db: 数据库会话，仅在未缓存时使用
+            table_ids: 表ID列表
+
+        Returns:
+            Dict[int, List[Dict[str, Any]]]: 表ID到关系信息列表的映射
+        """
+        table_ids = list(dict.fromkeys(table_ids))
+        missing = [table_id for table_id in table_ids if table_id not in self._relationships]
+        if missing and self._all_relationships is not None:
+            self._group_relationships(missing, self._all_relationships)
+        else:
+            for chunk in _chunks(missing):
+                relationships = crud.schema_relationship.get_by_tables(db=db, table_ids=chunk)
+                self._group_relationships(chunk, [self._relationship_to_dict(rel) for rel in relationships])
+        return {table_id: self._relationships[table_id] for table_id in table_ids}
+
+    def _group_relationships(self, table_ids: List[int], relationships: List[Dict[str, Any]]) -> None:
+        grouped: Dict[int, List[Dict[str, Any]]] = {table_id: [] for table_id in table_ids}
+        for rel in relationships:
+            if rel["source_table_id"] in grouped:
+                grouped[rel["source_table_id"]].append(rel)
+            if rel["target_table_id"] in grouped and rel["target_table_id"] != rel["source_table_id"]:
+                grouped[rel["target_table_id"]].append(rel)
+        self._relationships.update(grouped)
+
+    def get_all_relationships(self, db: Session) -> List[Dict[str, Any]]:
+        """获取连接的所有关系
+
+        Args:
+            db: 数据库会话，仅在未缓存时使用
+
+        Returns:
+            List[Dict[str, Any]]: 关系信息列表
+        """
+        if self._all_relationships is None:
+            relationships = crud.schema_relationship.get_by_connection(
+                db=db, connection_id=self.connection_id, limit=None
+            )
+            self._all_relationships = [self._relationship_to_dict(rel) for rel in relationships]
+        return self._all_relationships
+
+    @staticmethod
+    def _column_to_dict(column) -> Dict[str, Any]:
+        return {
+            "id": column.id,
+            "name": column.column_name,
+            "type": column.data_type,
+            "description": column.description,
+            "is_primary_key": column.is_primary_key,
+            "is_foreign_key": column.is_foreign_key,
+            "table_id": column.table_id,
+        }
+
+    @staticmethod
+    def _relationship_to_dict(rel) -> Dict[str, Any]:
+        return {
+            "id": rel.id,
+            "source_table_id": rel.source_table_id,
+            "source_column_id": rel.source_column_id,
+            "target_table_id": rel.target_table_id,
+            "target_column_id": rel.target_column_id,
+            "relationship_type": rel.relationship_type,
+        }
+
+
+class SchemaContextCache:
+    """表结构上下文缓存，基于TTL和LRU淘汰"""
+
+    def __init__(self, ttl: int = None, max_catalogs: int = None, max_contexts: int = None):
+        """初始化表结构上下文缓存
+
+        Args:
+            ttl: 缓存生存时间（秒），小于等于0表示禁用缓存
+            max_catalogs: 最多缓存的连接目录数
+            max_contexts: 最多缓存的查询上下文数
+        """
+        self.ttl = settings.RETRIEVAL_CACHE_TTL if ttl is None else ttl
+        self.catalogs = CacheManager(
+            max_size=max_catalogs or settings.SCHEMA_CACHE_MAX_CONNECTIONS, ttl=self.ttl
+        )
+        self.contexts = CacheManager(
+            max_size=max_contexts or settings.SCHEMA_CONTEXT_CACHE_SIZE, ttl=self.ttl
+        )
+        # 每个连接的版本号，失效时递增，防止进行中的检索写回过期结果
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """规范化查询文本（去除首尾空白、合并空白、转小写）"""
+        return re.sub(r"\s+", " ", query.strip()).lower()
+
+    def generation(self, connection_id: int) -> int:
+        """获取连接当前的缓存版本号"""
+        return self._generations.get(connection_id, 0)
+
+    def get_catalog(self, db: Session, connection_id: int) -> SchemaCatalog:
+        """获取连接的表结构目录，未缓存时从MySQL加载
+
+        Args:
+            db: 数据库会话
+            connection_id: 数据库连接ID
+
+        Returns:
+            SchemaCatalog: 表结构目录
+        """
+        catalog = self.catalogs.get(connection_id) if self.enabled else None
+        if catalog is None:
+            generation = self.generation(connection_id)
+            catalog = SchemaCatalog.load(db, connection_id)
+            if self.enabled and generation == self.generation(connection_id):
+                self.catalogs.set(connection_id, catalog)
+        return catalog
+
+    def get_context(self, connection_id: int, query: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的表结构上下文
+
+        Args:
+            connection_id: 数据库连接ID
+            query: 自然语言查询
+
+        Returns:
+            Optional[Dict[str, Any]]: 表结构上下文副本，未命中时返回None
+        """
+        if not self.enabled:
+            return None
+        context = self.contexts.get(self._context_key(connection_id, query))
+        if context is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return copy.deepcopy(context)
+
+    def set_context(self, connection_id: int, query: str, context: Dict[str, Any],
+                    generation: Optional[int] = None) -> None:
+        """缓存表结构上下文
+
+        Args:
+            connection_id: 数据库连接ID
+            query: 自然语言查询
+            context: 表结构上下文
+            generation: 开始检索时的版本号，若期间缓存已失效则不写入
+        """
+        if not self.enabled:
+            return
+        if generation is not None and generation != self.generation(connection_id):
+            return
+        self.contexts.set(self._context_key(connection_id, query), copy.deepcopy(context))
+
+    def invalidate(self, connection_id: Optional[int] = None) -> None:
+        """使连接的目录和上下文缓存失效
+
+        Args:
+            connection_id: 数据库连接ID，为None时清空所有连接的缓存
+        """
+        with self._lock:
+            if connection_id is None:
+                for key in list(self._generations):
+                    self._generations[key] += 1
+                self.catalogs.clear()
+                self.contexts.clear()
+            else:
+                self._generations[connection_id] = self.generation(connection_id) + 1
+                self.catalogs.remove(connection_id)
+                self.contexts.remove_where(lambda key: key[0] == connection_id)
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        return {
+            **self.stats,
+            "catalogs": len(self.catalogs),
+            "contexts": len(self.contexts),
+            "ttl": self.ttl,
+        }
+
+    def _context_key(self, connection_id: int, query: str) -> Tuple[int, str]:
+        return connection_id, self.normalize_query(query)
+
+
+# 全局表结构缓存实例
+schema_cache = SchemaContextCache()
@@ -0,0 +1,399 @@
+"""
+表结构图模块
+基于缓存的表结构目录构建表级关系图，预先计算社区划分和布局坐标，
+按表结构版本缓存，为图可视化提供分级细节（总览/邻域/社区摘要）和分页数据
+"""
+import base64
+import hashlib
+import logging
+import math
+import threading
+from bisect import bisect_left
+from collections import deque
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import networkx as nx
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.utils import CacheManager
+from app.services.schema_cache import schema_cache
+
+logger = logging.getLogger(__name__)
+
+# 布局中相邻节点的间距
+NODE_SPACING = 40.0
+
+# 单个社区内使用力导向布局的最大表数，超过时使用网格布局
+SPRING_LAYOUT_MAX_NODES = 1500
+
+
+class InvalidCursor(ValueError):
+    """分页游标无效"""
+
+
+class StaleCursor(ValueError):
+    """分页游标对应的表结构版本已过期"""
+
+
+def schema_version(tables: List[Dict[str, Any]], relationships: List[Dict[str, Any]]) -> str:
+    """计算表结构版本（表和关系内容的摘要），多个worker之间保持一致
+
+    Args:
+        tables: 表信息列表
+        relationships: 关系信息列表
+
+    Returns:
+        str: 版本字符串
+    """
+    digest = hashlib.sha1()
+    for table in sorted(tables, key=lambda t: t["id"]):
+        digest.update(f"t{table['id']}:{table['name']};".encode("utf-8"))
+    for rel in sorted(relationships, key=lambda r: r["id"]):
+        digest.update(f"r{rel['id']}:{rel['source_table_id']}>{rel['target_table_id']};".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def encode_cursor(version: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{version}:{offset}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, version: str) -> int:
+    """解析分页游标
+
+    Args:
+        cursor: 游标字符串
+        version: 当前表结构版本
+
+    Returns:
+        int: 起始偏移
+
+    Raises:
+        InvalidCursor: 游标格式错误
+        StaleCursor: 游标签发后表结构已变化
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        cursor_version, offset = raw.rsplit(":", 1)
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor("无效的分页游标")
+    if offset < 0:
+        raise InvalidCursor("无效的分页游标")
+    if cursor_version != version:
+        raise StaleCursor("表结构已变化，请重新开始分页")
+    return offset
+
+
+class SchemaGraph:
+    """单个连接的表级关系图，包含社区划分和布局坐标"""
+
+    def __init__(self, connection_id: int, tables: List[Dict[str, Any]],
+                 relationships: List[Dict[str, Any]], version: Optional[str] = None):
+        """构建表级关系图
+
+        Args:
+            connection_id: 数据库连接ID
+            tables: 表信息列表，每项包含id、name、description
+            relationships: 关系信息列表，每项包含source_table_id、target_table_id
+            version: 表结构版本，为None时根据内容计算
+        """
+        self.connection_id = connection_id
+        self.version = version or schema_version(tables, relationships)
+        self.tables_by_id: Dict[int, Dict[str, Any]] = {t["id"]: t for t in tables}
+
+        # 同一对表之间的多个外键合并为一条带权重的边
+        weights: Dict[Tuple[int, int], int] = {}
+        for rel in relationships:
+            pair = (rel["source_table_id"], rel["target_table_id"])
+            if pair[0] in self.tables_by_id and pair[1] in self.tables_by_id:
+                weights[pair] = weights.get(pair, 0) + 1
+
+        self.graph = nx.Graph()
+        self.graph.add_nodes_from(self.tables_by_id)
+        for (source, target), weight in weights.items():
+            if source == target:
+                continue
+            if self.graph.has_edge(source, target):
+                self.graph[source][target]["weight"] += weight
+            else:
+                self.graph.add_edge(source, target, weight=weight)
+        self.degree: Dict[int, int] = dict(self.graph.degree())
+
+        self.clusters: List[Dict[str, Any]] = []
+        self.cluster_of: Dict[int, int] = {}
+        self._detect_clusters()
+
+        self.positions: Dict[int, Tuple[float, float]] = {}
+        self._compute_layout()
+
+        # 分页顺序：按社区、表名排列，同一社区的表连续返回
+        self.order: List[int] = sorted(
+            self.tables_by_id,
+            key=lambda table_id: (self.cluster_of[table_id], self.tables_by_id[table_id]["name"], table_id),
+        )
+        self.index: Dict[int, int] = {table_id: i for i, table_id in enumerate(self.order)}
+
+        # 边归属于两个端点都已返回的那一页，按该位置排序以便二分查找
+        self.edges: List[Tuple[int, int, int]] = sorted(
+            ((source, target, weight) for (source, target), weight in weights.items()),
+            key=lambda edge: (max(self.index[edge[0]], self.index[edge[1]]), edge[0], edge[1]),
+        )
+        self._edge_keys = [max(self.index[s], self.index[t]) for s, t, _ in self.edges]
+
+    def _detect_clusters(self) -> None:
+        """用Louvain算法划分社区，没有关系的孤立表合并为一个社区"""
+        connected = self.graph.subgraph([n for n, d in self.degree.items() if d > 0])
+        communities = nx.community.louvain_communities(connected, weight="weight", seed=42) \
+            if connected.number_of_nodes() else []
+        groups = sorted((sorted(c) for c in communities), key=lambda c: (-len(c), c[0]))
+        isolated = sorted(n for n, d in self.degree.items() if d == 0)
+        if isolated:
+            groups.append(isolated)
+
+        for cluster_id, members in enumerate(groups):
+            hub = max(members, key=lambda n: (self.degree[n], -n))
+            self.clusters.append({
+                "id": cluster_id,
+                "size": len(members),
+                "label": self.tables_by_id[hub]["name"] if self.degree[hub] else "未关联的表",
+                "hub_table_id": hub if self.degree[hub] else None,
+                "table_ids": members,
+                "isolated": not self.degree[hub],
+            })
+            for table_id in members:
+                self.cluster_of[table_id] = cluster_id
+
+    def _compute_layout(self) -> None:
+        """分层布局：社区内部单独布局，再把社区按大小依次排列，避免对全图做O(n²)的力导向计算"""
+        boxes = []
+        for cluster in self.clusters:
+            members = cluster["table_ids"]
+            local = self._layout_cluster(members, cluster["isolated"])
+            radius = max((math.hypot(x, y) for x, y in local.values()), default=0.0) + NODE_SPACING
+            boxes.append((cluster, local, radius))
+
+        # 行式排列：按半径从大到小逐行放置，行宽约为总面积的平方根
+        boxes.sort(key=lambda box: -box[2])
+        row_width = math.sqrt(sum((2 * r) ** 2 for _, _, r in boxes)) if boxes else 0.0
+        x = y = row_height = 0.0
+        for cluster, local, radius in boxes:
+            if x > 0 and x + 2 * radius > row_width:
+                x = 0.0
+                y += row_height
+                row_height = 0.0
+            cx, cy = x + radius, y + radius
+            for table_id, (lx, ly) in local.items():
+                self.positions[table_id] = (round(cx + lx, 1), round(cy + ly, 1))
+            cluster["x"], cluster["y"], cluster["radius"] = round(cx, 1), round(cy, 1), round(radius, 1)
+            x += 2 * radius
+            row_height = max(row_height, 2 * radius)
+
+    def _layout_cluster(self, members: List[int], isolated: bool) -> Dict[int, Tuple[float, float]]:
+        size = len(members)
+        scale = NODE_SPACING * math.sqrt(size)
+        if size == 1:
+            return {members[0]: (0.0, 0.0)}
+        if isolated or size > SPRING_LAYOUT_MAX_NODES:
+            side = math.ceil(math.sqrt(size))
+            offset = (side - 1) * NODE_SPACING / 2
+            return {
+                table_id: ((i % side) * NODE_SPACING - offset, (i // side) * NODE_SPACING - offset)
+                for i, table_id in enumerate(members)
+            }
+        layout = nx.spring_layout(self.graph.subgraph(members), weight="weight", seed=42,
+                                  iterations=50, scale=scale)
+        return {table_id: (float(x), float(y)) for table_id, (x, y) in layout.items()}
+
+    def table_node(self, table_id: int) -> Dict[str, Any]:
+        table = self.tables_by_id[table_id]
+        x, y = self.positions[table_id]
+        return {
+            "id": f"table-{table_id}",
+            "type": "table",
+            "position": {"x": x, "y": y},
+            "data": {
+                "id": table_id,
+                "label": table["name"],
+                "description": table.get("description") or "",
+                "nodeType": "table",
+                "clusterId": self.cluster_of[table_id],
+                "degree": self.degree[table_id],
+            },
+        }
+
+    @staticmethod
+    def table_edge(source: int, target: int, weight: int) -> Dict[str, Any]:
+        return {
+            "id": f"table-{source}-table-{target}",
+            "source": f"table-{source}",
+            "target": f"table-{target}",
+            "type": "references",
+            "data": {"relationshipType": "REFERENCES", "weight": weight},
+        }
+
+    def overview_page(self, offset: int, limit: int, cluster_id: Optional[int] = None) -> Dict[str, Any]:
+        """获取表级总览的一页
+
+        边在两个端点都已返回的那一页中给出，客户端逐页累积即可得到完整的图
+
+        Args:
+            offset: 起始偏移
+            limit: 每页表数
+            cluster_id: 只返回指定社区的表
+
+        Returns:
+            Dict[str, Any]: 包含nodes、edges、total和下一页偏移next_offset
+        """
+        # 同一社区的表在分页顺序中连续，社区内分页即在全局顺序上截取一段
+        first, total = 0, len(self.order)
+        if cluster_id is not None:
+            cluster = self.clusters[cluster_id]
+            first, total = self.index[min(cluster["table_ids"], key=self.index.__getitem__)], cluster["size"]
+        start, end = first + offset, first + min(offset + limit, total)
+
+        page = self.order[start:end]
+        edges = self.edges[bisect_left(self._edge_keys, start):bisect_left(self._edge_keys, end)]
+        if cluster_id is not None:
+            edges = [edge for edge in edges if self.index[edge[0]] >= first and self.index[edge[1]] >= first]
+
+        next_offset = offset + limit if offset + limit < total else None
+        return {
+            "nodes": [self.table_node(table_id) for table_id in page],
+            "edges": [self.table_edge(*edge) for edge in edges],
+            "total": total,
+            "next_offset": next_offset,
+        }
+
+    def ego_network(self, table_id: int, hops: int, max_nodes: int) -> Tuple[List[int], bool]:
+        """获取以指定表为中心、指定跳数内的邻域（广度优先，按边权重优先扩展）
+
+        Args:
+            table_id: 中心表ID
+            hops: 跳数
+            max_nodes: 最多返回的表数
+
+        Returns:
+            Tuple[List[int], bool]: (表ID列表, 是否因数量上限被截断)
+        """
+        visited = {table_id: 0}
+        frontier = deque([table_id])
+        truncated = False
+        while frontier:
+            current = frontier.popleft()
+            depth = visited[current]
+            if depth >= hops:
+                continue
+            neighbors = sorted(self.graph[current].items(), key=lambda item: (-item[1]["weight"], item[0]))
+            for neighbor, _ in neighbors:
+                if neighbor in visited:
+                    continue
+                if len(visited) >= max_nodes:
+                    truncated = True
+                    break
+                visited[neighbor] = depth + 1
+                frontier.append(neighbor)
+            if truncated:
+                break
+        return list(visited), truncated
+
+    def edges_within(self, table_ids: Iterable[int]) -> List[Tuple[int, int, int]]:
+        table_ids = set(table_ids)
+        return [(s, t, w) for s, t, w in self.edges if s in table_ids and t in table_ids]
+
+    def cluster_summaries(self, sample_size: int = 5) -> Dict[str, Any]:
+        """获取社区摘要及社区之间的边
+
+        Args:
+            sample_size: 每个社区返回的示例表数
+
+        Returns:
+            Dict[str, Any]: 包含clusters和edges
+        """
+        clusters = []
+        for cluster in self.clusters:
+            members = sorted(cluster["table_ids"], key=lambda n: (-self.degree[n], n))
+            clusters.append({
+                "id": f"cluster-{cluster['id']}",
+                "type": "cluster",
+                "position": {"x": cluster["x"], "y": cluster["y"]},
+                "data": {
+                    "id": cluster["id"],
+                    "label": cluster["label"],
+                    "size": cluster["size"],
+                    "radius": cluster["radius"],
+                    "hubTableId": cluster["hub_table_id"],
+                    "sampleTables": [self.tables_by_id[n]["name"] for n in members[:sample_size]],
+                    "nodeType": "cluster",
+                },
+            })
+
+        weights: Dict[Tuple[int, int], int] = {}
+        for source, target, weight in self.edges:
+            pair = (self.cluster_of[source], self.cluster_of[target])
+            if pair[0] != pair[1]:
+                pair = tuple(sorted(pair))
+                weights[pair] = weights.get(pair, 0) + weight
+        edges = [{
+            "id": f"cluster-{a}-cluster-{b}",
+            "source": f"cluster-{a}",
+            "target": f"cluster-{b}",
+            "type": "clusterLink",
+            "data": {"weight": weight},
+        } for (a, b), weight in sorted(weights.items())]
+        return {"clusters": clusters, "edges": edges}
+
+
+class SchemaGraphCache:
+    """按连接缓存表级关系图，表结构缓存失效或过期后重新加载，版本未变时复用已计算的布局"""
+
+    def __init__(self, ttl: int = None, max_connections: int = None):
+        self.graphs = CacheManager(
+            max_size=max_connections or settings.SCHEMA_CACHE_MAX_CONNECTIONS,
+            ttl=settings.RETRIEVAL_CACHE_TTL if ttl is None else ttl,
+        )
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "builds": 0, "reused_layouts": 0}
+
+    def get(self, db: Session, connection_id: int) -> SchemaGraph:
+        """获取连接的表级关系图
+
+        Args:
+            db: 数据库会话，仅在未缓存时使用
+            connection_id: 数据库连接ID
+
+        Returns:
+            SchemaGraph: 表级关系图
+        """
+        generation = schema_cache.generation(connection_id)
+        entry = self.graphs.get(connection_id)
+        if entry is not None and entry[0] == generation:
+            self.stats["hits"] += 1
+            return entry[1]
+
+        with self._lock:
+            entry = self.graphs.get(connection_id)
+            if entry is not None and entry[0] == generation:
+                self.stats["hits"] += 1
+                return entry[1]
+
+            catalog = schema_cache.get_catalog(db, connection_id)
+            relationships = catalog.get_all_relationships(db)
+            version = schema_version(catalog.tables, relationships)
+            if entry is not None and entry[1].version == version:
+                graph = entry[1]
+                self.stats["reused_layouts"] += 1
+            else:
+                graph = SchemaGraph(connection_id, catalog.tables, relationships, version=version)
+                self.stats["builds"] += 1
+                logger.info(f"已构建连接 {connection_id} 的表结构图: {len(graph.tables_by_id)} 张表, "
+                            f"{len(graph.edges)} 条边, {len(graph.clusters)} 个社区")
+            self.graphs.set(connection_id, (generation, graph))
+            return graph
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "connections": len(self.graphs)}
+
+
+# 全局表结构图缓存实例
+schema_graph_cache = SchemaGraphCache()
@@ -1,23 +1,35 @@
-from typing import List, Dict, Any, Optional, Tuple
-from sqlalchemy import create_engine, inspect
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from sqlalchemy import create_engine, inspect, or_
 from sqlalchemy.orm import Session
-from neo4j import GraphDatabase
 
 from app.core.config import settings
 from app.models.db_connection import DBConnection
-from app.services.db_service import get_db_engine
+from app.models.schema_table import SchemaTable
+from app.models.schema_column import SchemaColumn
+from app.models.schema_relationship import SchemaRelationship
+from app.services.db_service import db_engine
 from app import crud, schemas
-from app.services.schema_utils import is_column_unique_in_table, has_composite_primary_key, is_junction_table, determine_relationship_type
+from app.models.value_mapping import ValueMapping
+from app.services.schema_utils import ReflectedCatalog, is_column_unique_in_table, has_composite_primary_key, is_junction_table, determine_relationship_type
 
 
-def discover_schema(connection: DBConnection) -> List[Dict[str, Any]]:
+def reflect_catalog(connection: DBConnection) -> ReflectedCatalog:
+    """
+    Reflect the whole catalog of a connection once.
+    The result can be passed to discover_schema and save_discovered_schema.
+    """
+    with db_engine(connection) as engine:
+        return ReflectedCatalog(inspect(engine))
+
+
+def discover_schema(connection: DBConnection, inspector: Optional[ReflectedCatalog] = None) -> List[Dict[str, Any]]:
     """
     Discover schema from a database connection.
     """
     try:
         print(f"Discovering schema for {connection.name} ({connection.db_type} at {connection.host}:{connection.port}/{connection.database_name})")
-        engine = get_db_engine(connection)
-        inspector = inspect(engine)
+        if inspector is None:
+            inspector = reflect_catalog(connection)
 
         # Choose the appropriate discovery method based on database type
         if connection.db_type.lower() == "mysql":
@@ -488,10 +500,102 @@ def discover_sqlite_schema(inspector) -> List[Dict[str, Any]]:
     return schema_info
 
 
-def save_discovered_schema(db: Session, connection_id: int, schema_info: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+def detect_relationships(inspector, schema_info: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Derive relationships (with their type) from the foreign keys in the discovered schema.
+    Only uses the reflected catalog, so it runs before any metadata write.
+    """
+    relationships = []
+    for table_info in schema_info:
+        for column_info in table_info["columns"]:
+            if not (column_info.get("is_foreign_key") and column_info.get("references")):
+                continue
+
+            source_table_name = table_info["table_name"]
+            source_column_name = column_info["column_name"]
+            target_table_name = column_info["references"]["table"]
+            target_column_name = column_info["references"]["column"]
+
+            # 使用 schema_utils 中的函数确定关系类型
+            try:
+                relationship_type = determine_relationship_type(
+                    inspector=inspector,
+                    source_table=source_table_name,
+                    source_column=source_column_name,
+                    target_table=target_table_name,
+                    target_column=target_column_name,
+                    schema_info=schema_info
+                )
+            except Exception as e:
+                print(f"[WARNING] 确定关系类型时出错: {str(e)}")
+                # 回退到基本逻辑
+                relationship_type = "1-to-N"  # 默认为一对多
+
+            relationships.append({
+                "source_table": source_table_name,
+                "source_column": source_column_name,
+                "target_table": target_table_name,
+                "target_column": target_column_name,
+                "relationship_type": relationship_type,
+                "description": f"Auto-discovered relationship: {source_table_name}.{source_column_name} -> {target_table_name}.{target_column_name}"
+            })
+    return relationships
+
+
+def _load_tables_by_name(db: Session, connection_id: int) -> Dict[str, SchemaTable]:
+    tables = db.query(SchemaTable).filter(SchemaTable.connection_id == connection_id).all()
+    return {table.table_name: table for table in tables}
+
+
+def _load_columns_by_key(db: Session, connection_id: int) -> Dict[Tuple[int, str], SchemaColumn]:
+    columns = (
+        db.query(SchemaColumn)
+        .join(SchemaTable, SchemaColumn.table_id == SchemaTable.id)
+        .filter(SchemaTable.connection_id == connection_id)
+        .all()
+    )
+    return {(column.table_id, column.column_name): column for column in columns}
+
+
+def _load_relationships_by_columns(db: Session, connection_id: int) -> Dict[Tuple[int, int], SchemaRelationship]:
+    # populate_existing refreshes rows already in the session after bulk updates
+    relationships = (
+        db.query(SchemaRelationship)
+        .filter(SchemaRelationship.connection_id == connection_id)
+        .populate_existing()
+        .all()
+    )
+    return {(rel.source_column_id, rel.target_column_id): rel for rel in relationships}
+
+
+def _delete_stale_metadata(db: Session, table_ids: List[int], column_ids: List[int]) -> None:
+    """
+    Delete columns and tables that were not discovered any more, with everything that references them.
+    """
+    if column_ids:
+        db.query(SchemaRelationship).filter(
+            or_(SchemaRelationship.source_column_id.in_(column_ids),
+                SchemaRelationship.target_column_id.in_(column_ids))
+        ).delete(synchronize_session=False)
+        db.query(ValueMapping).filter(ValueMapping.column_id.in_(column_ids)).delete(synchronize_session=False)
+        db.query(SchemaColumn).filter(SchemaColumn.id.in_(column_ids)).delete(synchronize_session=False)
+    if table_ids:
+        db.query(SchemaRelationship).filter(
+            or_(SchemaRelationship.source_table_id.in_(table_ids),
+                SchemaRelationship.target_table_id.in_(table_ids))
+        ).delete(synchronize_session=False)
+        db.query(SchemaTable).filter(SchemaTable.id.in_(table_ids)).delete(synchronize_session=False)
+
+
+def save_discovered_schema(db: Session, connection_id: int, schema_info: List[Dict[str, Any]],
+                           inspector: Optional[ReflectedCatalog] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
     """
     Save discovered schema to the database and detect relationships.
     Returns a tuple of (tables_data, relationships_data) for frontend display.
+
+    Existing metadata is prefetched in bulk and only the differences are written,
+    with bulk insert/update mappings in a single transaction. Tables and columns that
+    were not discovered any more are removed along with their relationships and value mappings.
     """
     print(f"Saving discovered schema for connection {connection_id}")
 
@@ -500,179 +604,156 @@ def save_discovered_schema(db: Session, connection_id: int, schema_info: List[Di
     if not connection:
         raise ValueError(f"Connection with ID {connection_id} not found")
 
-    # 创建数据库检查器，用于获取更详细的表结构信息
-    engine = get_db_engine(connection)
-    inspector = inspect(engine)
-
-    # Track created tables and relationships
-    tables_data = []
-    relationships_data = []
-
-    # Process each table
-    for table_info in schema_info:
-        table_name = table_info["table_name"]
-        print(f"Processing table: {table_name}")
-
-        # Create or update the table
-        existing_table = crud.schema_table.get_by_name_and_connection(
-            db=db, table_name=table_name, connection_id=connection_id
-        )
-
-        if existing_table:
-            print(f"Table {table_name} already exists, updating...")
-            table_obj = existing_table
-        else:
-            print(f"Creating new table: {table_name}")
-            table_create = schemas.SchemaTableCreate(
-                connection_id=connection_id,
-                table_name=table_name,
-                description=f"Auto-discovered table: {table_name}",
-                ui_metadata={"position": {"x": 0, "y": 0}}  # Default position
-            )
-            table_obj = crud.schema_table.create(db=db, obj_in=table_create)
-
-        # Add to tables_data for frontend
-        tables_data.append({
-            "id": table_obj.id,
-            "table_name": table_obj.table_name,
-            "description": table_obj.description,
-            "ui_metadata": table_obj.ui_metadata
-        })
-
-        # Process columns for this table
-        for column_info in table_info["columns"]:
-            column_name = column_info["column_name"]
-
-            # Check if column already exists
-            existing_column = crud.schema_column.get_by_name_and_table(
-                db=db, column_name=column_name, table_id=table_obj.id
-            )
-
-            if existing_column:
-                print(f"Column {column_name} already exists, updating...")
-                column_update = schemas.SchemaColumnUpdate(
-                    data_type=column_info["data_type"],
-                    is_primary_key=column_info["is_primary_key"],
-                    is_foreign_key=column_info["is_foreign_key"],
-                    is_unique=column_info.get("is_unique", False)  # 添加唯一标记
-                )
-                column_obj = crud.schema_column.update(
-                    db=db, db_obj=existing_column, obj_in=column_update
-                )
-            else:
-                print(f"Creating new column: {column_name}")
-                column_create = schemas.SchemaColumnCreate(
-                    table_id=table_obj.id,
-                    column_name=column_name,
-                    data_type=column_info["data_type"],
-                    description=f"Auto-discovered column: {column_name}",
-                    is_primary_key=column_info["is_primary_key"],
-                    is_foreign_key=column_info["is_foreign_key"],
-                    is_unique=column_info.get("is_unique", False)  # 添加唯一标记
-                )
-                column_obj = crud.schema_column.create(db=db, obj_in=column_create)
-
-    # Process relationships after all tables and columns are created
-    for table_info in schema_info:
-        for column_info in table_info["columns"]:
-            if column_info.get("is_foreign_key") and column_info.get("references"):
-                source_table_name = table_info["table_name"]
-                source_column_name = column_info["column_name"]
-                target_table_name = column_info["references"]["table"]
-                target_column_name = column_info["references"]["column"]
-
-                print(f"Processing relationship: {source_table_name}.{source_column_name} -> {target_table_name}.{target_column_name}")
-
-                # Get source and target tables
-                source_table = crud.schema_table.get_by_name_and_connection(
-                    db=db, table_name=source_table_name, connection_id=connection_id
-                )
-                target_table = crud.schema_table.get_by_name_and_connection(
-                    db=db, table_name=target_table_name, connection_id=connection_id
-                )
-
-                if not source_table or not target_table:
-                    print(f"Warning: Could not find tables for relationship")
-                    continue
-
-                # Get source and target columns
-                source_column = crud.schema_column.get_by_name_and_table(
-                    db=db, column_name=source_column_name, table_id=source_table.id
-                )
-                target_column = crud.schema_column.get_by_name_and_table(
-                    db=db, column_name=target_column_name, table_id=target_table.id
-                )
+    # Reflect and classify relationships before any write, so no transaction is held meanwhile
+    if inspector is None:
+        inspector = reflect_catalog(connection)
+    discovered_relationships = detect_relationships(inspector, schema_info)
 
-                if not source_column or not target_column:
-                    print(f"Warning: Could not find columns for relationship")
+    try:
+        # Tables
+        tables_by_name = _load_tables_by_name(db, connection_id)
+        discovered_table_names = {table_info["table_name"] for table_info in schema_info}
+        new_tables = [
+            {
+                "connection_id": connection_id,
+                "table_name": table_name,
+                "description": f"Auto-discovered table: {table_name}",
+                "ui_metadata": {"position": {"x": 0, "y": 0}}  # Default position
+            }
+            for table_name in dict.fromkeys(table_info["table_name"] for table_info in schema_info)
+            if table_name not in tables_by_name
+        ]
+        stale_table_ids = [
+            table.id for table_name, table in tables_by_name.items() if table_name not in discovered_table_names
+        ]
+        if new_tables:
+            db.bulk_insert_mappings(SchemaTable, new_tables)
+            tables_by_name = _load_tables_by_name(db, connection_id)
+
+        # Columns
+        columns_by_key = _load_columns_by_key(db, connection_id)
+        discovered_column_keys = set()
+        new_columns = []
+        changed_columns = []
+        for table_info in schema_info:
+            table_id = tables_by_name[table_info["table_name"]].id
+            for column_info in table_info["columns"]:
+                column_name = column_info["column_name"]
+                key = (table_id, column_name)
+                if key in discovered_column_keys:
                     continue
+                discovered_column_keys.add(key)
 
-                # Check if relationship already exists
-                existing_rel = crud.schema_relationship.get_by_columns(
-                    db=db, source_column_id=source_column.id, target_column_id=target_column.id
-                )
-
-                # 使用优化后的关系类型判断逻辑
-                print(f"\n[DEBUG] 分析关系: {source_table_name}.{source_column_name} -> {target_table_name}.{target_column_name}")
-                print(f"[DEBUG] 源列是主键: {source_column.is_primary_key}")
-                print(f"[DEBUG] 目标列是主键: {target_column.is_primary_key}")
-
-                # 使用 schema_utils 中的函数确定关系类型
-                try:
-                    relationship_type = determine_relationship_type(
-                        inspector=inspector,
-                        source_table=source_table_name,
-                        source_column=source_column_name,
-                        target_table=target_table_name,
-                        target_column=target_column_name,
-                        schema_info=schema_info
-                    )
-                    print(f"[DEBUG] 确定的关系类型: {relationship_type}")
-                except Exception as e:
-                    print(f"[WARNING] 确定关系类型时出错: {str(e)}")
-                    # 回退到基本逻辑
-                    relationship_type = "1-to-N"  # 默认为一对多
-
-
-
-                print(f"[DEBUG] 最终确定的关系类型: {relationship_type}")
-
-                if existing_rel:
-                    print(f"Relationship already exists, updating...")
-                    rel_update = schemas.SchemaRelationshipUpdate(
-                        relationship_type=relationship_type,
-                        description=f"Auto-discovered relationship: {source_table_name}.{source_column_name} -> {target_table_name}.{target_column_name}"
-                    )
-                    rel_obj = crud.schema_relationship.update(
-                        db=db, db_obj=existing_rel, obj_in=rel_update
-                    )
-                else:
-                    print(f"Creating new relationship")
-                    rel_create = schemas.SchemaRelationshipCreate(
-                        connection_id=connection_id,
-                        source_table_id=source_table.id,
-                        source_column_id=source_column.id,
-                        target_table_id=target_table.id,
-                        target_column_id=target_column.id,
-                        relationship_type=relationship_type,
-                        description=f"Auto-discovered relationship: {source_table_name}.{source_column_name} -> {target_table_name}.{target_column_name}"
-                    )
-                    rel_obj = crud.schema_relationship.create(db=db, obj_in=rel_create)
-
-                # Add to relationships_data for frontend
-                relationships_data.append({
-                    "id": rel_obj.id,
-                    "source_table": source_table.table_name,
+                values = {
+                    "data_type": column_info["data_type"],
+                    "is_primary_key": column_info["is_primary_key"],
+                    "is_foreign_key": column_info["is_foreign_key"],
+                    "is_unique": column_info.get("is_unique", False)  # 添加唯一标记
+                }
+                existing_column = columns_by_key.get(key)
+                if existing_column is None:
+                    new_columns.append({
+                        "table_id": table_id,
+                        "column_name": column_name,
+                        "description": f"Auto-discovered column: {column_name}",
+                        **values
+                    })
+                elif any(getattr(existing_column, field) != value for field, value in values.items()):
+                    changed_columns.append({"id": existing_column.id, **values})
+        stale_column_ids = [
+            column.id for key, column in columns_by_key.items() if key not in discovered_column_keys
+        ]
+
+        _delete_stale_metadata(db, stale_table_ids, stale_column_ids)
+        if new_columns:
+            db.bulk_insert_mappings(SchemaColumn, new_columns)
+        if changed_columns:
+            db.bulk_update_mappings(SchemaColumn, changed_columns)
+        if new_columns or stale_column_ids:
+            columns_by_key = _load_columns_by_key(db, connection_id)
+        print(f"Tables: {len(new_tables)} new, {len(stale_table_ids)} removed; "
+              f"columns: {len(new_columns)} new, {len(changed_columns)} updated, {len(stale_column_ids)} removed")
+
+        # Relationships, after all tables and columns exist
+        relationships_by_columns = _load_relationships_by_columns(db, connection_id)
+        new_relationships = {}
+        changed_relationships = []
+        resolved_relationships = []
+        for rel_data in discovered_relationships:
+            source_table = tables_by_name.get(rel_data["source_table"])
+            target_table = tables_by_name.get(rel_data["target_table"])
+            if not source_table or not target_table:
+                print(f"Warning: Could not find tables for relationship {rel_data['description']}")
+                continue
+
+            source_column = columns_by_key.get((source_table.id, rel_data["source_column"]))
+            target_column = columns_by_key.get((target_table.id, rel_data["target_column"]))
+            if not source_column or not target_column:
+                print(f"Warning: Could not find columns for relationship {rel_data['description']}")
+                continue
+
+            key = (source_column.id, target_column.id)
+            existing_rel = relationships_by_columns.get(key)
+            if existing_rel is None:
+                new_relationships[key] = {
+                    "connection_id": connection_id,
                     "source_table_id": source_table.id,
-                    "source_column": source_column.column_name,
                     "source_column_id": source_column.id,
-                    "target_table": target_table.table_name,
                     "target_table_id": target_table.id,
-                    "target_column": target_column.column_name,
                     "target_column_id": target_column.id,
-                    "relationship_type": rel_obj.relationship_type,
-                    "description": rel_obj.description
+                    "relationship_type": rel_data["relationship_type"],
+                    "description": rel_data["description"]
+                }
+            elif (existing_rel.relationship_type, existing_rel.description) != (
+                rel_data["relationship_type"], rel_data["description"]
+            ):
+                changed_relationships.append({
+                    "id": existing_rel.id,
+                    "relationship_type": rel_data["relationship_type"],
+                    "description": rel_data["description"]
                 })
+            resolved_relationships.append((key, source_table, source_column, target_table, target_column))
+
+        if new_relationships:
+            db.bulk_insert_mappings(SchemaRelationship, list(new_relationships.values()))
+        if changed_relationships:
+            db.bulk_update_mappings(SchemaRelationship, changed_relationships)
+        if new_relationships or changed_relationships:
+            relationships_by_columns = _load_relationships_by_columns(db, connection_id)
+        print(f"Relationships: {len(new_relationships)} new, {len(changed_relationships)} updated")
+
+        # Track created tables and relationships for frontend display
+        tables_data = []
+        for table_name in dict.fromkeys(table_info["table_name"] for table_info in schema_info):
+            table_obj = tables_by_name[table_name]
+            tables_data.append({
+                "id": table_obj.id,
+                "table_name": table_obj.table_name,
+                "description": table_obj.description,
+                "ui_metadata": table_obj.ui_metadata
+            })
+
+        relationships_data = []
+        for key, source_table, source_column, target_table, target_column in resolved_relationships:
+            rel_obj = relationships_by_columns[key]
+            relationships_data.append({
+                "id": rel_obj.id,
+                "source_table": source_table.table_name,
+                "source_table_id": source_table.id,
+                "source_column": source_column.column_name,
+                "source_column_id": source_column.id,
+                "target_table": target_table.table_name,
+                "target_table_id": target_table.id,
+                "target_column": target_column.column_name,
+                "target_column_id": target_column.id,
+                "relationship_type": rel_obj.relationship_type,
+                "description": rel_obj.description
+            })
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
     # Sync to graph database
     try:
@@ -683,119 +764,243 @@ def save_discovered_schema(db: Session, connection_id: int, schema_info: List[Di
     return tables_data, relationships_data
 
 
-def sync_schema_to_graph_db(connection_id: int):
+# Cypher used by the batched graph sync. Every statement consumes a `$rows` batch.
+SYNC_DELETE_REFERENCES = """
+UNWIND $rows AS row
+MATCH (:Column {id: row.source_column_id})-[r:REFERENCES]->(:Column {id: row.target_column_id})
+DELETE r
+"""
+
+SYNC_DELETE_COLUMNS = """
+UNWIND $rows AS row
+MATCH (c:Column {id: row.id})
+DETACH DELETE c
+"""
+
+SYNC_DELETE_TABLES = """
+UNWIND $rows AS row
+MATCH (t:Table {id: row.id})
+DETACH DELETE t
+"""
+
+SYNC_UPSERT_TABLES = """
+UNWIND $rows AS row
+MERGE (t:Table {id: row.id})
+SET t.connection_id = row.connection_id, t.name = row.name, t.description = row.description
+"""
+
+SYNC_UPSERT_COLUMNS = """
+UNWIND $rows AS row
+MATCH (t:Table {id: row.table_id})
+MERGE (c:Column {id: row.id})
+SET c.name = row.name, c.type = row.type, c.description = row.description,
+    c.is_pk = row.is_pk, c.is_fk = row.is_fk, c.connection_id = row.connection_id
+WITH t, c
+OPTIONAL MATCH (other:Table)-[old:HAS_COLUMN]->(c)
+WHERE other <> t
+DELETE old
+MERGE (t)-[:HAS_COLUMN]->(c)
+"""
+
+SYNC_UPSERT_REFERENCES = """
+UNWIND $rows AS row
+MATCH (source:Column {id: row.source_column_id})
+MATCH (target:Column {id: row.target_column_id})
+MERGE (source)-[r:REFERENCES]->(target)
+SET r.type = row.type, r.description = row.description, r.connection_id = row.connection_id
+"""
+
+GRAPH_TABLES_QUERY = """
+MATCH (t:Table {connection_id: $connection_id})
+RETURN t.id AS id, t.connection_id AS connection_id, t.name AS name, t.description AS description
+"""
+
+GRAPH_COLUMNS_QUERY = """
+MATCH (c:Column {connection_id: $connection_id})
+OPTIONAL MATCH (t:Table)-[:HAS_COLUMN]->(c)
+RETURN c.id AS id, t.id AS table_id, c.connection_id AS connection_id, c.name AS name,
+       c.type AS type, c.description AS description, c.is_pk AS is_pk, c.is_fk AS is_fk
+"""
+
+GRAPH_REFERENCES_QUERY = """
+MATCH (source:Column {connection_id: $connection_id})-[r:REFERENCES]->(target:Column)
+RETURN source.id AS source_column_id, target.id AS target_column_id,
+       r.connection_id AS connection_id, r.type AS type, r.description AS description
+"""
+
+
+def load_schema_graph_rows(db: Session, connection_id: int) -> Tuple[Dict[Any, Dict[str, Any]], ...]:
+    """
+    Load the schema metadata of a connection from MySQL as graph rows keyed like the graph.
+    Returns (tables, columns, references).
+    """
+    tables = db.query(SchemaTable).filter(SchemaTable.connection_id == connection_id).all()
+    columns = (
+        db.query(SchemaColumn)
+        .join(SchemaTable, SchemaColumn.table_id == SchemaTable.id)
+        .filter(SchemaTable.connection_id == connection_id)
+        .all()
+    )
+    relationships = (
+        db.query(SchemaRelationship)
+        .filter(SchemaRelationship.connection_id == connection_id)
+        .all()
+    )
+
+    table_rows = {
+        table.id: {
+            "id": table.id,
+            "connection_id": connection_id,
+            "name": table.table_name,
+            "description": table.description or "",
+        }
+        for table in tables
+    }
+    column_rows = {
+        column.id: {
+            "id": column.id,
+            "table_id": column.table_id,
+            "connection_id": connection_id,
+            "name": column.column_name,
+            "type": column.data_type,
+            "description": column.description or "",
+            "is_pk": bool(column.is_primary_key),
+            "is_fk": bool(column.is_foreign_key),
+        }
+        for column in columns
+    }
+    reference_rows = {
+        (rel.source_column_id, rel.target_column_id): {
+            "source_column_id": rel.source_column_id,
+            "target_column_id": rel.target_column_id,
+            "connection_id": connection_id,
+            "type": rel.relationship_type or "unknown",
+            "description": rel.description or "",
+        }
+        for rel in relationships
+    }
+    return table_rows, column_rows, reference_rows
+
+
+def read_schema_graph_rows(session, connection_id: int) -> Tuple[Dict[Any, Dict[str, Any]], ...]:
+    """
+    Read the schema graph of a connection from Neo4j in the same shape as load_schema_graph_rows.
+    """
+    tables = {row["id"]: row for row in session.run(GRAPH_TABLES_QUERY, connection_id=connection_id).data()}
+    columns = {row["id"]: row for row in session.run(GRAPH_COLUMNS_QUERY, connection_id=connection_id).data()}
+    references = {
+        (row["source_column_id"], row["target_column_id"]): row
+        for row in session.run(GRAPH_REFERENCES_QUERY, connection_id=connection_id).data()
+    }
+    return tables, columns, references
+
+
+def diff_graph_rows(desired: Dict[Any, Dict[str, Any]],
+                    current: Dict[Any, Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Any]]:
+    """
+    Compare desired rows with the rows currently in the graph.
+    Returns (rows to create or update, keys to delete).
+    """
+    upserts = [row for key, row in desired.items() if current.get(key) != row]
+    deletes = [key for key in current if key not in desired]
+    return upserts, deletes
+
+
+def _write_batch(tx, statement: str, rows: List[Dict[str, Any]]) -> None:
+    tx.run(statement, rows=rows).consume()
+
+
+def run_batched_write(session, statement: str, rows: List[Dict[str, Any]], batch_size: int,
+                      stage: str, progress_callback: Optional[Callable[[str, int, int], None]] = None) -> None:
+    """
+    Send rows to Neo4j in UNWIND batches, one write transaction per batch.
+    """
+    total = len(rows)
+    for start in range(0, total, batch_size):
+        batch = rows[start:start + batch_size]
+        session.execute_write(_write_batch, statement, batch)
+        if progress_callback:
+            progress_callback(stage, start + len(batch), total)
+
+
+def sync_schema_to_graph_db(connection_id: int, batch_size: Optional[int] = None,
+                            progress_callback: Optional[Callable[[str, int, int], None]] = None):
     """
     Sync schema metadata to Neo4j graph database.
+
+    The MySQL metadata is diffed against the graph and only the changed tables,
+    columns and references are written, in UNWIND batches of `batch_size` rows.
+    `progress_callback(stage, done, total)` is called after every batch.
     """
+    from app.db.neo4j_session import get_neo4j_driver, ensure_neo4j_schema
+    from app.db.session import SessionLocal
+    from app.services.schema_cache import schema_cache
+    from app.services.result_cache import query_result_cache
+    from app.services.value_mapping_engine import value_mapping_engine
+
+    batch_size = batch_size or settings.NEO4J_SYNC_BATCH_SIZE
     try:
         print(f"Starting sync to Neo4j for connection_id: {connection_id}")
-        # Connect to Neo4j
-        print(f"Connecting to Neo4j at {settings.NEO4J_URI} with user {settings.NEO4J_USER}")
-        driver = GraphDatabase.driver(
-            settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
-        )
+        # Cached schema contexts are stale as soon as the graph is rewritten,
+        # and cached query results may no longer match the new schema
+        schema_cache.invalidate(connection_id)
+        query_result_cache.invalidate(connection_id)
+        value_mapping_engine.invalidate(connection_id)
+
+        db = SessionLocal()
+        try:
+            desired_tables, desired_columns, desired_references = load_schema_graph_rows(db, connection_id)
+        finally:
+            db.close()
+        print(f"Loaded {len(desired_tables)} tables, {len(desired_columns)} columns and "
+              f"{len(desired_references)} relationships for connection_id: {connection_id}")
+
+        driver = get_neo4j_driver()
+        try:
+            ensure_neo4j_schema(driver)
+        except Exception as e:
+            # Existing duplicate nodes prevent the constraints; the sync still works without them
+            print(f"Warning: Failed to create Neo4j constraints: {str(e)}")
 
         with driver.session() as session:
-            # Clear existing schema for this connection
-            print(f"Clearing existing schema for connection_id: {connection_id}")
-            session.run(
-                "MATCH (n {connection_id: $connection_id}) DETACH DELETE n",
-                connection_id=connection_id
-            )
-
-            # Get all tables for this connection from MySQL
-            from sqlalchemy.orm import Session
-            from app.db.session import SessionLocal
-
-            db = SessionLocal()
+            current_tables, current_columns, current_references = read_schema_graph_rows(session, connection_id)
+
+            table_upserts, table_deletes = diff_graph_rows(desired_tables, current_tables)
+            column_upserts, column_deletes = diff_graph_rows(desired_columns, current_columns)
+            reference_upserts, reference_deletes = diff_graph_rows(desired_references, current_references)
+
+            stages = [
+                ("delete_references", SYNC_DELETE_REFERENCES, [
+                    {"source_column_id": source_id, "target_column_id": target_id}
+                    for source_id, target_id in reference_deletes
+                ]),
+                ("delete_columns", SYNC_DELETE_COLUMNS, [{"id": column_id} for column_id in column_deletes]),
+                ("delete_tables", SYNC_DELETE_TABLES, [{"id": table_id} for table_id in table_deletes]),
+                ("upsert_tables", SYNC_UPSERT_TABLES, table_upserts),
+                ("upsert_columns", SYNC_UPSERT_COLUMNS, column_upserts),
+                ("upsert_references", SYNC_UPSERT_REFERENCES, reference_upserts),
+            ]
+            for stage, statement, rows in stages:
+                if rows:
+                    print(f"Neo4j sync {stage}: {len(rows)} rows")
+                    run_batched_write(session, statement, rows, batch_size, stage, progress_callback)
+
+        # Re-embed only the table/column documents that changed
+        if settings.TABLE_INDEX_ENABLED:
             try:
-                print(f"Fetching tables for connection_id: {connection_id}")
-                tables = crud.schema_table.get_by_connection(db=db, connection_id=connection_id)
-                print(f"Found {len(tables)} tables for connection_id: {connection_id}")
-
-                if len(tables) == 0:
-                    print(f"Warning: No tables found for connection_id: {connection_id}")
-                    return False
-
-                # Create Table nodes
-                for table in tables:
-                    print(f"Creating Table node for table: {table.table_name} (id: {table.id})")
-                    session.run(
-                        """
-                        CREATE (t:Table {
-                            id: $id,
-                            connection_id: $connection_id,
-                            name: $name,
-                            description: $description
-                        })
-                        """,
-                        id=table.id,
-                        connection_id=connection_id,
-                        name=table.table_name,
-                        description=table.description or ""
-                    )
-
-                    # Get columns for this table
-                    columns = crud.schema_column.get_by_table(db=db, table_id=table.id)
-                    print(f"Found {len(columns)} columns for table: {table.table_name}")
-
-                    # Create Column nodes and HAS_COLUMN relationships
-                    for column in columns:
-                        print(f"Creating Column node for column: {column.column_name} (id: {column.id})")
-                        session.run(
-                            """
-                            CREATE (c:Column {
-                                id: $id,
-                                name: $name,
-                                type: $type,
-                                description: $description,
-                                is_pk: $is_pk,
-                                is_fk: $is_fk,
-                                connection_id: $connection_id
-                            })
-                            WITH c
-                            MATCH (t:Table {id: $table_id})
-                            CREATE (t)-[:HAS_COLUMN]->(c)
-                            """,
-                            id=column.id,
-                            name=column.column_name,
-                            type=column.data_type,
-                            description=column.description or "",
-                            is_pk=column.is_primary_key,
-                            is_fk=column.is_foreign_key,
-                            connection_id=connection_id,
-                            table_id=table.id
-                        )
-
-                # Create FOREIGN_KEY relationships
-                relationships = crud.schema_relationship.get_by_connection(db=db, connection_id=connection_id)
-                print(f"Found {len(relationships)} relationships for connection_id: {connection_id}")
-
-                for rel in relationships:
-                    print(f"Creating REFERENCES relationship from column id: {rel.source_column_id} to column id: {rel.target_column_id}")
-                    session.run(
-                        """
-                        MATCH (source:Column {id: $source_column_id})
-                        MATCH (target:Column {id: $target_column_id})
-                        CREATE (source)-[:REFERENCES {
-                            type: $relationship_type,
-                            description: $description,
-                            connection_id: $connection_id
-                        }]->(target)
-                        """,
-                        source_column_id=rel.source_column_id,
-                        target_column_id=rel.target_column_id,
-                        relationship_type=rel.relationship_type or "unknown",
-                        description=rel.description or "",
-                        connection_id=connection_id
-                    )
-
-                print(f"Successfully synced schema to Neo4j for connection_id: {connection_id}")
-            finally:
-                db.close()
-
-        driver.close()
+                from app.services.table_index import table_index
+                table_index.refresh(connection_id, desired_tables, desired_columns)
+            except Exception as e:
+                print(f"Warning: Failed to refresh table vector index: {str(e)}")
+
+        # Drop anything cached by retrievals that ran while the sync was in progress
+        schema_cache.invalidate(connection_id)
+
+        if not desired_tables:
+            print(f"Warning: No tables found for connection_id: {connection_id}")
+            return False
+
+        print(f"Successfully synced schema to Neo4j for connection_id: {connection_id}")
         return True
     except Exception as e:
         import traceback
@@ -3,6 +3,81 @@ Schema utilities for database schema analysis.
 """
 from typing import List, Dict, Any, Optional, Set, Tuple
 from sqlalchemy import inspect
+from sqlalchemy.engine.reflection import ObjectKind
+
+
+class ReflectedCatalog:
+    """
+    一次性反射的数据库目录，接口与SQLAlchemy Inspector兼容
+
+    通过 get_multi_* 在一次调用中取回所有表的列、主键、外键、唯一约束和索引，
+    之后本模块中的判断函数可直接使用它而不必逐表查询系统目录。
+    某个 get_multi_* 调用失败时，回退为按表调用原始 inspector 并缓存结果。
+    """
+
+    _EMPTY_PK = {"constrained_columns": [], "name": None}
+
+    def __init__(self, inspector):
+        """
+        Args:
+            inspector: SQLAlchemy inspector object
+        """
+        self.inspector = inspector
+        self._table_names = inspector.get_table_names()
+        try:
+            self._view_names = inspector.get_view_names()
+        except Exception as e:
+            print(f"Warning: Could not get views: {str(e)}")
+            self._view_names = []
+
+        self._columns = self._reflect_multi("get_multi_columns", kind=ObjectKind.ANY)
+        self._pk_constraints = self._reflect_multi("get_multi_pk_constraint")
+        self._foreign_keys = self._reflect_multi("get_multi_foreign_keys")
+        self._unique_constraints = self._reflect_multi("get_multi_unique_constraints")
+        self._indexes = self._reflect_multi("get_multi_indexes")
+        self._fallback: Dict[Tuple[str, str], Any] = {}
+
+    def _reflect_multi(self, method: str, **kwargs) -> Optional[Dict[str, Any]]:
+        try:
+            result = getattr(self.inspector, method)(**kwargs)
+        except Exception as e:
+            print(f"Warning: {method} failed, falling back to per-table reflection: {str(e)}")
+            return None
+        # 默认schema下的键为 (None, table_name)
+        return {table_name: value for (_, table_name), value in result.items()}
+
+    def _lookup(self, reflected: Optional[Dict[str, Any]], method: str, table_name: str, default):
+        if reflected is not None:
+            return reflected.get(table_name, default)
+        key = (method, table_name)
+        if key not in self._fallback:
+            self._fallback[key] = getattr(self.inspector, method)(table_name)
+        return self._fallback[key]
+
+    def get_table_names(self) -> List[str]:
+        return list(self._table_names)
+
+    def get_view_names(self) -> List[str]:
+        return list(self._view_names)
+
+    def get_columns(self, table_name: str) -> List[Dict[str, Any]]:
+        return self._lookup(self._columns, "get_columns", table_name, [])
+
+    def get_pk_constraint(self, table_name: str) -> Dict[str, Any]:
+        return self._lookup(self._pk_constraints, "get_pk_constraint", table_name, self._EMPTY_PK)
+
+    def get_primary_keys(self, table_name: str) -> List[str]:
+        return self.get_pk_constraint(table_name).get("constrained_columns", [])
+
+    def get_foreign_keys(self, table_name: str) -> List[Dict[str, Any]]:
+        return self._lookup(self._foreign_keys, "get_foreign_keys", table_name, [])
+
+    def get_unique_constraints(self, table_name: str) -> List[Dict[str, Any]]:
+        return self._lookup(self._unique_constraints, "get_unique_constraints", table_name, [])
+
+    def get_indexes(self, table_name: str) -> List[Dict[str, Any]]:
+        return self._lookup(self._indexes, "get_indexes", table_name, [])
+
 
 def is_column_unique_in_table(inspector, table_name: str, column_name: str) -> bool:
     """
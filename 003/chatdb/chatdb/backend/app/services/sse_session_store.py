@@ -0,0 +1,744 @@
+"""
+SSE会话存储
+管理Text2SQL流式会话：每个会话一个有界消息队列（进度消息在积压时合并或丢弃，结果消息施加背压），
+所有会话的过期由一个按截止时间排序的堆驱动的清理任务处理，并可选使用SQLite持久化会话和消息，
+使客户端可以在其他uvicorn worker上恢复会话
+"""
+import asyncio
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 可以合并或丢弃的进度消息类型，其他类型（结果、反馈请求、错误等）不会被丢弃
+PROGRESS_TYPES = {"message", "ping"}
+
+
+class SessionLimitExceeded(Exception):
+    """会话数达到上限且没有可淘汰的空闲会话"""
+
+
+class SessionQueueFull(Exception):
+    """客户端长时间不读取，非进度消息在超时时间内无法入队"""
+
+
+def encode_message(message: Dict[str, Any]) -> str:
+    return json.dumps(message, ensure_ascii=False, default=str)
+
+
+def is_progress(message: Dict[str, Any]) -> bool:
+    return message.get("type", "message") in PROGRESS_TYPES and not message.get("is_final", False)
+
+
+class MemoryBudget:
+    """所有会话队列共享的内存预算"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+
+    def add(self, delta: int) -> None:
+        self.used += delta
+
+    def exceeded(self) -> bool:
+        return self.used > self.limit
+
+
+class QueuedEvent:
+    """队列中的一条消息，合并后覆盖 seq..end_seq 的多条原始消息"""
+
+    __slots__ = ("seq", "end_seq", "message", "data", "progress")
+
+    def __init__(self, seq: int, message: Dict[str, Any]):
+        self.seq = seq
+        self.end_seq = seq
+        self.message = message
+        self.data = encode_message(message)
+        self.progress = is_progress(message)
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def event_type(self) -> str:
+        return self.message.get("type", "message")
+
+
+class SessionQueue:
+    """单个会话的有界出站队列
+
+    队列超过条数或字节上限时：积压过半后同一来源和区域的连续进度消息合并为一条（前端按区域追加内容，
+    合并不改变显示结果）；已满时先丢弃最早的进度消息，仍放不下时进度消息直接丢弃，
+    其他消息等待客户端读取，超时后抛出SessionQueueFull
+    """
+
+    def __init__(self, max_messages: int, max_bytes: int, budget: Optional[MemoryBudget] = None,
+                 put_timeout: float = 30, block: bool = True):
+        """初始化会话队列
+
+        Args:
+            max_messages: 最多积压的消息数
+            max_bytes: 最多积压的字节数
+            budget: 所有会话共享的内存预算，超出时进度消息按队列已满处理
+            put_timeout: 非进度消息等待空间的超时时间（秒）
+            block: 是否对非进度消息施加背压；消息已持久化时为False，直接丢弃最早的消息
+        """
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.budget = budget
+        self.put_timeout = put_timeout
+        self.block = block
+        self.bytes = 0
+        self._events: deque = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self.stats = {"enqueued": 0, "coalesced": 0, "dropped": 0, "blocked": 0}
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def _full(self, size: int, progress: bool) -> bool:
+        if len(self._events) >= self.max_messages or self.bytes + size > self.max_bytes:
+            return True
+        return progress and self.budget is not None and self.budget.exceeded()
+
+    def _account(self, delta: int) -> None:
+        self.bytes += delta
+        if self.budget is not None:
+            self.budget.add(delta)
+
+    def _coalesce(self, seq: int, message: Dict[str, Any]) -> bool:
+        if len(self._events) * 2 < self.max_messages and self.bytes * 2 < self.max_bytes:
+            return False
+        tail = self._events[-1] if self._events else None
+        if (tail is None or not tail.progress or tail.event_type != "message"
+                or message.get("type", "message") != "message"
+                or tail.message.get("source") != message.get("source")
+                or tail.message.get("region") != message.get("region")):
+            return False
+        merged = QueuedEvent(tail.seq, {
+            **tail.message,
+            "content": (tail.message.get("content") or "") + (message.get("content") or ""),
+            "timestamp": message.get("timestamp", tail.message.get("timestamp")),
+        })
+        merged.end_seq = seq
+        self._events[-1] = merged
+        self._account(merged.size - tail.size)
+        self.stats["coalesced"] += 1
+        return True
+
+    def _drop_oldest(self, progress_only: bool) -> bool:
+        for index, event in enumerate(self._events):
+            if event.progress or not progress_only:
+                del self._events[index]
+                self._account(-event.size)
+                self.stats["dropped"] += 1
+                return True
+        return False
+
+    async def put(self, seq: int, message: Dict[str, Any]) -> bool:
+        """消息入队
+
+        Args:
+            seq: 消息序号
+            message: 消息
+
+        Returns:
+            bool: 是否已入队（合并也算入队），进度消息被丢弃时返回False
+        """
+        event = QueuedEvent(seq, message)
+        if event.progress and self._coalesce(seq, message):
+            return True
+        while self._events and self._full(event.size, event.progress):
+            if self._drop_oldest(progress_only=True):
+                continue
+            if event.progress:
+                self.stats["dropped"] += 1
+                return False
+            if not self.block:
+                self._drop_oldest(progress_only=False)
+                continue
+            self.stats["blocked"] += 1
+            self._writable.clear()
+            try:
+                await asyncio.wait_for(self._writable.wait(), self.put_timeout)
+            except asyncio.TimeoutError:
+                raise SessionQueueFull(f"客户端在{self.put_timeout}秒内未读取消息")
+        self._events.append(event)
+        self._account(event.size)
+        self.stats["enqueued"] += 1
+        self._readable.set()
+        return True
+
+    async def get(self, timeout: float) -> Optional[QueuedEvent]:
+        """取出一条消息，超时返回None"""
+        if not self._events:
+            self._readable.clear()
+            try:
+                await asyncio.wait_for(self._readable.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            if not self._events:
+                return None
+        event = self._events.popleft()
+        self._account(-event.size)
+        self._writable.set()
+        return event
+
+    def clear(self) -> None:
+        self._account(-self.bytes)
+        self._events.clear()
+        self._writable.set()
+
+
+class SessionBackend:
+    """进程内会话后端：会话只存在于当前worker，不做持久化"""
+
+    shared = False
+
+    def save(self, session_id: str, info: Dict[str, Any], expires_at: float) -> None:
+        pass
+
+    def renew(self, expirations: List[Tuple[str, float]]) -> None:
+        pass
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return None
+
+    def delete(self, session_id: str) -> None:
+        pass
+
+    def add_listener(self, session_id: str, delta: int) -> int:
+        return 0
+
+    def count_listeners(self, session_id: str) -> int:
+        return 0
+
+    def append_message(self, session_id: str, seq: int, data: str) -> None:
+        pass
+
+    def read_messages(self, session_id: str, after_seq: int, before_seq: Optional[int] = None,
+                      limit: int = 500) -> List[Tuple[int, str]]:
+        return []
+
+    def push_feedback(self, session_id: str, data: str) -> None:
+        pass
+
+    def pop_feedback(self, session_id: str) -> Optional[str]:
+        return None
+
+    def purge_expired(self, now: float) -> int:
+        return 0
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteSessionBackend(SessionBackend):
+    """SQLite会话后端：会话信息、消息日志和用户反馈写入同一个数据库文件，
+    同一主机上的多个worker共享，重启或连接到其他worker后可以按Last-Event-ID恢复"""
+
+    shared = True
+
+    # 按session_id删除会话时需要清理的表
+    SESSION_TABLES = ("sse_session", "sse_message", "sse_feedback", "sse_listener")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sse_session (
+                session_id TEXT PRIMARY KEY, info TEXT NOT NULL, expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_sse_session_expires_at ON sse_session (expires_at);
+            CREATE TABLE IF NOT EXISTS sse_message (
+                session_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            );
+            CREATE TABLE IF NOT EXISTS sse_feedback (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_sse_feedback_session ON sse_feedback (session_id, id);
+            CREATE TABLE IF NOT EXISTS sse_listener (
+                session_id TEXT PRIMARY KEY, listeners INTEGER NOT NULL
+            );
+        """)
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def save(self, session_id: str, info: Dict[str, Any], expires_at: float) -> None:
+        self._execute(
+            "INSERT INTO sse_session (session_id, info, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET info = excluded.info, expires_at = excluded.expires_at",
+            (session_id, encode_message(info), expires_at),
+        )
+
+    def renew(self, expirations: List[Tuple[str, float]]) -> None:
+        """批量更新会话的过期时间"""
+        with self._lock:
+            self._conn.executemany("UPDATE sse_session SET expires_at = ? WHERE session_id = ?",
+                                   [(expires_at, session_id) for session_id, expires_at in expirations])
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute(
+            "SELECT info FROM sse_session WHERE session_id = ? AND expires_at > ?", (session_id, time.time())
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            for table in self.SESSION_TABLES:
+                self._conn.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+
+    def add_listener(self, session_id: str, delta: int) -> int:
+        """调整其他worker上连接到会话的客户端数，返回调整后的数量"""
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO sse_listener (session_id, listeners) VALUES (?, 0)",
+                               (session_id,))
+            self._conn.execute("UPDATE sse_listener SET listeners = MAX(listeners + ?, 0) WHERE session_id = ?",
+                               (delta, session_id))
+            return self._conn.execute("SELECT listeners FROM sse_listener WHERE session_id = ?",
+                                      (session_id,)).fetchone()[0]
+
+    def count_listeners(self, session_id: str) -> int:
+        rows = self._execute("SELECT listeners FROM sse_listener WHERE session_id = ?", (session_id,))
+        return rows[0][0] if rows else 0
+
+    def append_message(self, session_id: str, seq: int, data: str) -> None:
+        self._execute("INSERT OR REPLACE INTO sse_message (session_id, seq, data) VALUES (?, ?, ?)",
+                      (session_id, seq, data))
+
+    def read_messages(self, session_id: str, after_seq: int, before_seq: Optional[int] = None,
+                      limit: int = 500) -> List[Tuple[int, str]]:
+        return self._execute(
+            "SELECT seq, data FROM sse_message WHERE session_id = ? AND seq > ? AND seq < ? ORDER BY seq LIMIT ?",
+            (session_id, after_seq, before_seq if before_seq is not None else 2 ** 62, limit),
+        )
+
+    def push_feedback(self, session_id: str, data: str) -> None:
+        self._execute("INSERT INTO sse_feedback (session_id, data) VALUES (?, ?)", (session_id, data))
+
+    def pop_feedback(self, session_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, data FROM sse_feedback WHERE session_id = ? ORDER BY id LIMIT 1", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("DELETE FROM sse_feedback WHERE id = ?", (row[0],))
+            return row[1]
+
+    def purge_expired(self, now: float) -> int:
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sse_session WHERE expires_at <= ?", (now,)
+            ).fetchall()]
+            for session_id in expired:
+                for table in self.SESSION_TABLES:
+                    self._conn.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+            return len(expired)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SSESession:
+    """当前worker中的一个会话"""
+
+    def __init__(self, session_id: str, info: Dict[str, Any], queue: SessionQueue,
+                 feedback_size: int, expires_at: float):
+        self.session_id = session_id
+        self.info = info
+        self.queue = queue
+        self.feedback: asyncio.Queue = asyncio.Queue(maxsize=feedback_size)
+        self.task: Optional[asyncio.Task] = None
+        self.expires_at = expires_at
+        self.saved_expires_at = expires_at  # 最近一次写入会话后端的过期时间
+        self.next_seq = 1
+
+    @property
+    def listeners(self) -> int:
+        return self.info.get("listeners", 0)
+
+
+class SSESessionStore:
+    """SSE会话存储"""
+
+    def __init__(self, backend: Optional[SessionBackend] = None, ttl: float = None, max_sessions: int = None,
+                 queue_size: int = None, queue_max_bytes: int = None, max_bytes: int = None,
+                 put_timeout: float = None, sweep_interval: float = None):
+        """初始化会话存储
+
+        Args:
+            backend: 会话后端，默认为进程内后端
+            ttl: 会话空闲超时时间（秒），有客户端连接时不会过期
+            max_sessions: 当前worker最多保留的会话数
+            queue_size: 每个会话最多积压的消息数
+            queue_max_bytes: 每个会话最多积压的字节数
+            max_bytes: 所有会话积压消息的总字节数上限
+            put_timeout: 非进度消息等待客户端读取的超时时间（秒）
+            sweep_interval: 清理任务的最长休眠时间（秒）
+        """
+        self.backend = backend or SessionBackend()
+        self.ttl = ttl or settings.SSE_SESSION_TTL
+        self.max_sessions = max_sessions or settings.SSE_MAX_SESSIONS
+        self.queue_size = queue_size or settings.SSE_SESSION_QUEUE_SIZE
+        self.queue_max_bytes = queue_max_bytes or settings.SSE_SESSION_QUEUE_MAX_BYTES
+        self.put_timeout = settings.SSE_QUEUE_PUT_TIMEOUT if put_timeout is None else put_timeout
+        self.sweep_interval = sweep_interval or settings.SSE_SWEEP_INTERVAL
+        self.budget = MemoryBudget(max_bytes or settings.SSE_STORE_MAX_BYTES)
+        self.sessions: Dict[str, SSESession] = {}
+        # (过期时间, 会话ID)，会话续期时不更新堆，弹出时再按会话实际的过期时间重新入堆
+        self._deadlines: List[Tuple[float, str]] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stats = {"created": 0, "expired": 0, "evicted": 0, "removed": 0, "rejected": 0}
+
+    async def _backend_call(self, method: str, *args):
+        if not self.backend.shared:
+            return getattr(self.backend, method)(*args)
+        return await asyncio.to_thread(getattr(self.backend, method), *args)
+
+    # ---- 会话生命周期 ----
+
+    async def create(self, session_id: str, info: Dict[str, Any]) -> SSESession:
+        """创建会话
+
+        Args:
+            session_id: 会话ID
+            info: 会话信息（查询、连接ID、状态等）
+
+        Returns:
+            SSESession: 会话
+        """
+        self._ensure_sweeper()
+        if session_id in self.sessions:
+            await self.remove(session_id)
+        if len(self.sessions) >= self.max_sessions:
+            self._sweep(time.time())
+        if len(self.sessions) >= self.max_sessions and not self._evict_idle():
+            self.stats["rejected"] += 1
+            raise SessionLimitExceeded(f"会话数已达上限 {self.max_sessions}")
+
+        expires_at = time.time() + self.ttl
+        queue = SessionQueue(self.queue_size, self.queue_max_bytes, self.budget,
+                             self.put_timeout, block=not self.backend.shared)
+        session = SSESession(session_id, {**info, "listeners": 0}, queue,
+                             settings.SSE_FEEDBACK_QUEUE_SIZE, expires_at)
+        self.sessions[session_id] = session
+        heapq.heappush(self._deadlines, (expires_at, session_id))
+        self.stats["created"] += 1
+        await self._backend_call("save", session_id, session.info, expires_at)
+        return session
+
+    def get(self, session_id: str) -> Optional[SSESession]:
+        """获取当前worker中的会话"""
+        return self.sessions.get(session_id)
+
+    async def get_info(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """获取会话信息，当前worker没有时从共享后端读取"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            return session.info
+        return await self._backend_call("load", session_id)
+
+    async def exists(self, session_id: str) -> bool:
+        return await self.get_info(session_id) is not None
+
+    def touch(self, session_id: str) -> None:
+        """更新会话的最后活动时间并续期，续期由清理任务写入共享后端"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session.info["last_activity"] = datetime.now().isoformat()
+            session.expires_at = time.time() + self.ttl
+
+    async def update(self, session_id: str, **fields) -> None:
+        """更新会话信息（如状态），共享后端中同步保存"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return
+        session.info.update(fields)
+        self.touch(session_id)
+        await self._backend_call("save", session_id, session.info, session.expires_at)
+        session.saved_expires_at = session.expires_at
+
+    def set_task(self, session_id: str, task: asyncio.Task) -> None:
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session.task = task
+
+    def cancel_task(self, session_id: str) -> bool:
+        """取消会话仍在运行的查询处理任务"""
+        session = self.sessions.get(session_id)
+        task = session.task if session is not None else None
+        if task is None or task.done():
+            return False
+        session.task = None
+        task.cancel()
+        return True
+
+    async def attach(self, session_id: str) -> None:
+        """客户端连接到会话，会话属于其他worker时在共享后端中记录，使会话所在worker知道仍有客户端"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            session.info["listeners"] = session.listeners + 1
+            self.touch(session_id)
+        elif self.backend.shared:
+            await self._backend_call("add_listener", session_id, 1)
+
+    async def detach(self, session_id: str) -> int:
+        """客户端断开，返回会话在当前worker（会话属于其他worker时为共享后端中记录）剩余的客户端数"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            if not self.backend.shared:
+                return 0
+            return await self._backend_call("add_listener", session_id, -1)
+        session.info["listeners"] = max(session.listeners - 1, 0)
+        self.touch(session_id)
+        return session.listeners
+
+    async def remote_listeners(self, session_id: str) -> int:
+        """其他worker上连接到会话的客户端数"""
+        if not self.backend.shared:
+            return 0
+        return await self._backend_call("count_listeners", session_id)
+
+    async def remove(self, session_id: str) -> bool:
+        """删除会话并取消其查询处理任务"""
+        session = self._discard(session_id)
+        await self._backend_call("delete", session_id)
+        if session is not None:
+            self.stats["removed"] += 1
+        return session is not None
+
+    def _discard(self, session_id: str) -> Optional[SSESession]:
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.cancel_task(session_id)
+            session.queue.clear()
+        return session
+
+    def list_sessions(self) -> Dict[str, Dict[str, Any]]:
+        return {session_id: session.info for session_id, session in self.sessions.items()}
+
+    # ---- 消息 ----
+
+    async def publish(self, session_id: str, message: Dict[str, Any]) -> bool:
+        """向会话发送消息
+
+        Args:
+            session_id: 会话ID
+            message: 消息
+
+        Returns:
+            bool: 是否已入队，会话不存在或进度消息因积压被丢弃时返回False
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            return False
+        seq = session.next_seq
+        session.next_seq += 1
+        if self.backend.shared:
+            await self._backend_call("append_message", session_id, seq, encode_message(message))
+        return await session.queue.put(seq, message)
+
+    async def events(self, session_id: str, last_event_id: int = 0,
+                     timeout: float = 0.5) -> AsyncIterator[Optional[Tuple[int, str, str]]]:
+        """按顺序产出会话的消息 (序号, 事件类型, JSON数据)，超时没有消息时产出None
+
+        合并的消息产出其覆盖的最后一个序号，客户端以它作为Last-Event-ID重连时不会重复收到合并进来的内容。
+
+        会话在当前worker中时从队列读取；使用共享后端时先补发last_event_id之后的已持久化消息，
+        并从日志补齐队列中因积压丢弃的消息；会话属于其他worker时轮询消息日志
+        """
+        last_seq = last_event_id or 0
+        session = self.sessions.get(session_id)
+
+        if session is None:
+            while await self.exists(session_id):
+                rows = await self._backend_call("read_messages", session_id, last_seq)
+                for seq, data in rows:
+                    last_seq = seq
+                    yield seq, json.loads(data).get("type", "message"), data
+                if not rows:
+                    yield None
+                    await asyncio.sleep(timeout)
+            return
+
+        while self.sessions.get(session_id) is session:
+            event = await session.queue.get(timeout)
+            if event is None:
+                yield None
+                continue
+            if event.end_seq <= last_seq:
+                continue
+            if self.backend.shared and event.seq > last_seq + 1:
+                for seq, data in await self._backend_call("read_messages", session_id, last_seq, event.seq):
+                    yield seq, json.loads(data).get("type", "message"), data
+            last_seq = event.end_seq
+            self.touch(session_id)
+            yield event.end_seq, event.event_type, event.data
+
+    # ---- 用户反馈 ----
+
+    async def put_feedback(self, session_id: str, feedback: Dict[str, Any]) -> bool:
+        """提交用户反馈，会话属于其他worker时写入共享后端"""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self.touch(session_id)
+            try:
+                session.feedback.put_nowait(feedback)
+            except asyncio.QueueFull:
+                return False
+            return True
+        if not await self.exists(session_id):
+            return False
+        await self._backend_call("push_feedback", session_id, encode_message(feedback))
+        return True
+
+    async def wait_feedback(self, session_id: str, poll_interval: float = 0.5) -> Dict[str, Any]:
+        """等待会话的用户反馈"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        if not self.backend.shared:
+            return await session.feedback.get()
+        while True:
+            try:
+                return await asyncio.wait_for(session.feedback.get(), poll_interval)
+            except asyncio.TimeoutError:
+                data = await self._backend_call("pop_feedback", session_id)
+                if data is not None:
+                    return json.loads(data)
+
+    # ---- 过期清理 ----
+
+    def _ensure_sweeper(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._sweeper is None or self._sweeper.done() or self._sweeper.get_loop() is not loop:
+            self._sweeper = loop.create_task(self._sweep_loop())
+
+    def _sweep(self, now: float) -> int:
+        """移除所有已过期的会话，返回移除数"""
+        expired = 0
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, session_id = heapq.heappop(self._deadlines)
+            session = self.sessions.get(session_id)
+            if session is None:
+                continue
+            if session.listeners > 0:
+                session.expires_at = now + self.ttl
+            if session.expires_at > now:
+                heapq.heappush(self._deadlines, (session.expires_at, session_id))
+                continue
+            logger.info(f"清理过期会话: {session_id}")
+            self._discard(session_id)
+            expired += 1
+        self.stats["expired"] += expired
+        return expired
+
+    def _evict_idle(self) -> bool:
+        """淘汰最久未活动的空闲会话（没有客户端连接且没有运行中的任务）"""
+        idle = [
+            session for session in self.sessions.values()
+            if session.listeners == 0 and (session.task is None or session.task.done())
+        ]
+        if not idle:
+            return False
+        oldest = min(idle, key=lambda session: session.expires_at)
+        self._discard(oldest.session_id)
+        self.stats["evicted"] += 1
+        return True
+
+    def _due_renewals(self, now: float) -> List[Tuple[SSESession, float]]:
+        """需要写入共享后端的续期：已保存的过期时间剩余不到一半TTL的会话，每个会话每半个TTL最多写一次"""
+        renewals = []
+        for session in self.sessions.values():
+            if session.listeners > 0:
+                session.expires_at = max(session.expires_at, now + self.ttl)
+            if session.saved_expires_at - now < self.ttl / 2 and session.expires_at > session.saved_expires_at:
+                renewals.append((session, session.expires_at))
+        return renewals
+
+    async def _renew_saved(self, now: float) -> None:
+        """把当前worker中会话的续期写入共享后端，避免其他worker的purge_expired删除仍在使用的会话"""
+        if not self.backend.shared:
+            return
+        renewals = self._due_renewals(now)
+        if not renewals:
+            return
+        await self._backend_call("renew", [(session.session_id, expires_at) for session, expires_at in renewals])
+        for session, expires_at in renewals:
+            session.saved_expires_at = max(session.saved_expires_at, expires_at)
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            now = time.time()
+            self._sweep(now)
+            try:
+                await self._renew_saved(now)
+                await self._backend_call("purge_expired", now)
+            except Exception as e:
+                logger.warning(f"清理持久化会话失败: {str(e)}")
+            delay = self.sweep_interval
+            if self.backend.shared:
+                # 已保存的过期时间剩余不到一半TTL时续期，至少每1/4个TTL检查一次，保证续期先于过期写入
+                delay = min(delay, self.ttl / 4)
+            if self._deadlines:
+                delay = min(delay, max(self._deadlines[0][0] - time.time(), 0.01))
+            await asyncio.sleep(delay)
+
+    def close(self) -> None:
+        if self._sweeper is not None and not self._sweeper.done():
+            self._sweeper.cancel()
+        for session_id in list(self.sessions):
+            self._discard(session_id)
+        self.backend.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        queue_stats = {"enqueued": 0, "coalesced": 0, "dropped": 0, "blocked": 0}
+        queued = 0
+        for session in self.sessions.values():
+            queued += len(session.queue)
+            for name, value in session.queue.stats.items():
+                queue_stats[name] += value
+        return {
+            **self.stats,
+            "sessions": len(self.sessions),
+            "listeners": sum(session.listeners for session in self.sessions.values()),
+            "queued_messages": queued,
+            "queued_bytes": self.budget.used,
+            "max_bytes": self.budget.limit,
+            "queues": queue_stats,
+            "backend": "sqlite" if self.backend.shared else "memory",
+        }
+
+
+def create_session_backend() -> SessionBackend:
+    """根据配置创建会话后端"""
+    if settings.SSE_SESSION_BACKEND.lower() == "sqlite":
+        path = settings.SSE_SESSION_DB_PATH or os.path.join(tempfile.gettempdir(), "chatdb_sse_sessions.sqlite")
+        return SqliteSessionBackend(path)
+    return SessionBackend()
+
+
+# 全局SSE会话存储
+sse_session_store = SSESessionStore(create_session_backend())
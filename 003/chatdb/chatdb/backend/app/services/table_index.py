@@ -0,0 +1,208 @@
+"""
+表向量索引模块
+为每个连接的表名/列名及其描述构建内存中的向量矩阵，用余弦相似度对候选表做本地预排序
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _humanize(name: str) -> str:
+    return (name or "").replace("_", " ")
+
+
+def build_index_documents(table_rows: Dict[int, Dict[str, Any]],
+                          column_rows: Dict[int, Dict[str, Any]]) -> List[Tuple[int, str]]:
+    """构建索引文档，每张表一条、每个列一条
+
+    Args:
+        table_rows: 表信息，键为表ID，值包含name、description
+        column_rows: 列信息，键为列ID，值包含table_id、name、description
+
+    Returns:
+        List[Tuple[int, str]]: (所属表ID, 文档文本)列表
+    """
+    documents = []
+    for table_id, table in table_rows.items():
+        documents.append((table_id, f"{_humanize(table['name'])} {table.get('description') or ''}".strip()))
+    for column in column_rows.values():
+        table = table_rows.get(column["table_id"])
+        if table is None:
+            continue
+        documents.append((
+            column["table_id"],
+            f"{_humanize(table['name'])} {_humanize(column['name'])} {column.get('description') or ''}".strip()
+        ))
+    return documents
+
+
+class TableVectorIndex:
+    """单个连接的表向量索引"""
+
+    def __init__(self, connection_id: int, documents: List[Tuple[int, str]],
+                 vectors: Dict[str, np.ndarray]):
+        """初始化表向量索引
+
+        Args:
+            connection_id: 数据库连接ID
+            documents: (所属表ID, 文档文本)列表
+            vectors: 文档文本到归一化向量的映射
+        """
+        self.connection_id = connection_id
+        self.vectors = vectors
+        self.table_ids = np.array(sorted({table_id for table_id, _ in documents}), dtype=np.int64)
+        # 每行文档所属表在 table_ids 中的位置
+        self.owners = np.searchsorted(self.table_ids, [table_id for table_id, _ in documents])
+        self.matrix = (
+            np.vstack([vectors[text] for _, text in documents]).astype(np.float32)
+            if documents else np.zeros((0, 0), dtype=np.float32)
+        )
+
+    def __len__(self) -> int:
+        return len(self.table_ids)
+
+    def score_tables(self, query_vector: np.ndarray) -> Dict[int, float]:
+        """计算每张表与查询的相似度（取表及其列文档中的最大余弦相似度）
+
+        Args:
+            query_vector: 归一化的查询向量
+
+        Returns:
+            Dict[int, float]: 表ID到相似度的映射
+        """
+        if not len(self.table_ids):
+            return {}
+        similarities = self.matrix @ query_vector
+        table_scores = np.full(len(self.table_ids), -1.0, dtype=np.float32)
+        np.maximum.at(table_scores, self.owners, similarities)
+        return {int(table_id): float(score) for table_id, score in zip(self.table_ids, table_scores)}
+
+
+class TableIndexManager:
+    """表向量索引管理器，按连接维护索引并在表结构同步时增量重建"""
+
+    def __init__(self, vector_service=None):
+        """初始化索引管理器
+
+        Args:
+            vector_service: 提供 encode_texts(texts) -> np.ndarray 的向量化服务，默认延迟创建VectorService
+        """
+        self._vector_service = vector_service
+        self._indexes: Dict[int, TableVectorIndex] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def vector_service(self):
+        if self._vector_service is None:
+            # 延迟导入，避免未使用索引时加载sentence-transformers
+            from app.services.hybrid_retrieval_service import get_vector_service
+            self._vector_service = get_vector_service()
+        return self._vector_service
+
+    def get(self, connection_id: int) -> Optional[TableVectorIndex]:
+        return self._indexes.get(connection_id)
+
+    def refresh(self, connection_id: int, table_rows: Dict[int, Dict[str, Any]],
+                column_rows: Dict[int, Dict[str, Any]]) -> TableVectorIndex:
+        """根据最新的表结构重建索引，只对新增或变更的文档重新编码
+
+        Args:
+            connection_id: 数据库连接ID
+            table_rows: 表信息，键为表ID
+            column_rows: 列信息，键为列ID
+
+        Returns:
+            TableVectorIndex: 新索引
+        """
+        documents = build_index_documents(table_rows, column_rows)
+        previous = self._indexes.get(connection_id)
+        known = previous.vectors if previous else {}
+
+        vectors = {text: known[text] for _, text in documents if text in known}
+        missing = list(dict.fromkeys(text for _, text in documents if text not in vectors))
+        if missing:
+            encoded = self.vector_service.encode_texts(missing)
+            vectors.update(zip(missing, encoded))
+        logger.info(f"表向量索引已更新: connection_id={connection_id}, "
+                    f"文档数={len(documents)}, 新编码={len(missing)}")
+
+        index = TableVectorIndex(connection_id, documents, vectors)
+        with self._lock:
+            self._indexes[connection_id] = index
+        return index
+
+    def refresh_from_db(self, db: Session, connection_id: int) -> TableVectorIndex:
+        """从MySQL元数据重建索引"""
+        from app.services.schema_service import load_schema_graph_rows
+        table_rows, column_rows, _ = load_schema_graph_rows(db, connection_id)
+        return self.refresh(connection_id, table_rows, column_rows)
+
+    def invalidate(self, connection_id: int) -> None:
+        with self._lock:
+            self._indexes.pop(connection_id, None)
+
+    async def score_tables(self, db: Session, connection_id: int, text: str) -> Optional[Dict[int, float]]:
+        """计算查询文本与连接中每张表的相似度，索引不存在时先构建
+
+        Args:
+            db: 数据库会话，仅在需要构建索引时使用
+            connection_id: 数据库连接ID
+            text: 查询文本
+
+        Returns:
+            Optional[Dict[int, float]]: 表ID到相似度的映射，索引不可用时返回None
+        """
+        if not settings.TABLE_INDEX_ENABLED:
+            return None
+        try:
+            index = self.get(connection_id)
+            if index is None:
+                from app.services.schema_service import load_schema_graph_rows
+                table_rows, column_rows, _ = await asyncio.to_thread(load_schema_graph_rows, db, connection_id)
+                # 编码是CPU密集操作，放到线程中执行以免阻塞事件循环
+                index = await asyncio.to_thread(self.refresh, connection_id, table_rows, column_rows)
+            query_vector = (await asyncio.to_thread(self.vector_service.encode_texts, [text]))[0]
+            return index.score_tables(query_vector)
+        except Exception as e:
+            logger.warning(f"表向量索引不可用，回退到LLM排序: {str(e)}")
+            return None
+
+
+def rank_by_vector_scores(vector_scores: Dict[int, float], top_k: int = None,
+                          min_score: float = None) -> List[Tuple[int, float]]:
+    """按相似度取top-k候选表
+
+    Args:
+        vector_scores: 表ID到相似度的映射
+        top_k: 最多返回的表数
+        min_score: 最低相似度
+
+    Returns:
+        List[Tuple[int, float]]: 按相似度降序的(表ID, 相似度)列表
+    """
+    top_k = top_k or settings.TABLE_INDEX_TOP_K
+    min_score = settings.TABLE_INDEX_MIN_SCORE if min_score is None else min_score
+    ranked = sorted(
+        ((table_id, score) for table_id, score in vector_scores.items() if score >= min_score),
+        key=lambda item: item[1],
+        reverse=True
+    )
+    return ranked[:top_k]
+
+
+def is_ambiguous(ranked: List[Tuple[int, float]], margin: float = None) -> bool:
+    """前两名相似度差距小于阈值时认为需要LLM消歧"""
+    margin = settings.TABLE_INDEX_AMBIGUITY_MARGIN if margin is None else margin
+    return len(ranked) > 1 and ranked[0][1] - ranked[1][1] < margin
+
+
+# 全局表向量索引管理器
+table_index = TableIndexManager()
@@ -7,11 +7,12 @@ from sqlalchemy.orm import Session
 
 from app.models.db_connection import DBConnection
 from app.schemas.query import QueryResponse
-from app.services.db_service import execute_query
+from app.services.db_service import execute_query_bounded
 from app.services.text2sql_utils import (
     retrieve_relevant_schema, get_value_mappings, format_schema_for_prompt,
     process_sql_with_value_mappings, validate_sql, extract_sql_from_llm_response
 )
+from app.services.value_mapping_engine import value_mapping_engine
 from app.core.llms import model_client
 
 
@@ -108,7 +109,7 @@ def process_text2sql_query(db: Session, connection: DBConnection, natural_langua
             )
 
         # 2. 获取值映射
-        value_mappings = get_value_mappings(db, schema_context)
+        value_mappings = get_value_mappings(db, schema_context, connection.id)
 
         # 3. 构建提示
         prompt = construct_prompt(schema_context, natural_language_query, value_mappings)
@@ -120,7 +121,7 @@ def process_text2sql_query(db: Session, connection: DBConnection, natural_langua
         sql = extract_sql_from_llm_response(llm_response)
 
         # 6. 使用值映射处理SQL
-        processed_sql = process_sql_with_value_mappings(sql, value_mappings)
+        processed_sql = process_sql_with_value_mappings(sql, value_mapping_engine.get_mapper(db, connection.id))
 
         # 7. 验证SQL
         if not validate_sql(processed_sql):
@@ -137,7 +138,7 @@ def process_text2sql_query(db: Session, connection: DBConnection, natural_langua
 
         # 8. 执行SQL
         try:
-            results = execute_query(connection, processed_sql)
+            results, result_meta = execute_query_bounded(connection, processed_sql)
 
             return QueryResponse(
                 sql=processed_sql,
@@ -146,7 +147,8 @@ def process_text2sql_query(db: Session, connection: DBConnection, natural_langua
                 context={
                     "schema_context": schema_context,
                     "prompt": prompt,
-                    "llm_response": llm_response
+                    "llm_response": llm_response,
+                    "result_meta": result_meta
                 }
             )
         except Exception as e:
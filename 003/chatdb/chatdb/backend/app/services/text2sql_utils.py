@@ -7,15 +7,20 @@ import json
 import sqlparse
 from typing import Dict, Any, List, Optional, Tuple, Set
 from sqlalchemy.orm import Session
-from neo4j import GraphDatabase
 
 from autogen_core.models import UserMessage
 from app.core.config import settings
 from app.core.llms import model_client
 from app import crud
+from app.core.utils import CacheManager
+from app.db.neo4j_session import get_neo4j_driver
+from app.services.query_executor import query_executor
+from app.services.schema_cache import schema_cache
+from app.services.table_index import table_index, rank_by_vector_scores, is_ambiguous
+from app.services.value_mapping_engine import ValueMapper, value_mapping_engine
 
 # 查询分析缓存，避免重复的LLM调用
-query_analysis_cache = {}
+query_analysis_cache = CacheManager(max_size=settings.SCHEMA_CONTEXT_CACHE_SIZE, ttl=settings.RETRIEVAL_CACHE_TTL)
 
 
 async def analyze_query_with_llm(query: str) -> Dict[str, Any]:
@@ -24,8 +29,9 @@ async def analyze_query_with_llm(query: str) -> Dict[str, Any]:
     返回包含实体、关系和查询意图的结构化分析
     """
     # 检查缓存
-    if query in query_analysis_cache:
-        return query_analysis_cache[query]
+    cached_analysis = query_analysis_cache.get(query)
+    if cached_analysis is not None:
+        return cached_analysis
 
     try:
         # 为LLM准备提示
@@ -63,12 +69,12 @@ async def analyze_query_with_llm(query: str) -> Dict[str, Any]:
             analysis = _create_fallback_analysis(query)
 
         # 缓存结果
-        query_analysis_cache[query] = analysis
+        query_analysis_cache.set(query, analysis)
         return analysis
     except Exception as e:
         # 如果发生任何错误，回退到关键词提取
         analysis = _create_fallback_analysis(query)
-        query_analysis_cache[query] = analysis
+        query_analysis_cache.set(query, analysis)
         return analysis
 
 
@@ -97,11 +103,37 @@ def extract_keywords(query: str) -> List[str]:
 
 
 async def find_relevant_tables_semantic(query: str, query_analysis: Dict[str, Any],
-                                       all_tables: List[Dict[str, Any]]) -> List[Tuple[int, float]]:
+                                       all_tables: List[Dict[str, Any]],
+                                       vector_scores: Optional[Dict[int, float]] = None) -> List[Tuple[int, float]]:
     """
-    使用LLM进行语义匹配找到相关表
+    找到与查询相关的表
+    有向量索引分数时按余弦相似度取top-k，仅在前几名分数接近时调用LLM在候选表中消歧；
+    没有向量分数时对全部表使用LLM排序，关键词匹配作为最后的回退
     返回(table_id, relevance_score)元组列表
     """
+    if vector_scores is not None:
+        ranked = rank_by_vector_scores(vector_scores)
+        if not ranked:
+            return basic_table_matching(query, all_tables)
+        if is_ambiguous(ranked):
+            candidate_ids = {table_id for table_id, _ in ranked}
+            candidates = [t for t in all_tables if t["id"] in candidate_ids]
+            llm_ranked = await rank_tables_with_llm(query, query_analysis, candidates)
+            if llm_ranked:
+                return llm_ranked
+        # 将余弦相似度映射到与LLM排序一致的0-10分
+        return [(table_id, round(score * 10, 2)) for table_id, score in ranked]
+
+    llm_ranked = await rank_tables_with_llm(query, query_analysis, all_tables)
+    return llm_ranked if llm_ranked is not None else basic_table_matching(query, all_tables)
+
+
+async def rank_tables_with_llm(query: str, query_analysis: Dict[str, Any],
+                               all_tables: List[Dict[str, Any]]) -> Optional[List[Tuple[int, float]]]:
+    """
+    使用LLM进行语义匹配对表排序
+    返回(table_id, relevance_score)元组列表，LLM调用或解析失败时返回None
+    """
     try:
         # 为LLM准备表信息
         tables_info = "\n".join([
@@ -158,9 +190,9 @@ async def find_relevant_tables_semantic(query: str, query_analysis: Dict[str, An
 
             return valid_tables
         else:
-            return basic_table_matching(query, all_tables)
+            return None
     except Exception as e:
-        return basic_table_matching(query, all_tables)
+        return None
 
 
 def basic_table_matching(query: str, all_tables: List[Dict[str, Any]]) -> List[Tuple[int, float]]:
@@ -187,6 +219,32 @@ def basic_table_matching(query: str, all_tables: List[Dict[str, Any]]) -> List[T
     return sorted(relevant_tables, key=lambda x: x[1], reverse=True)
 
 
+async def filter_expanded_tables(query: str, query_analysis: Dict[str, Any],
+                                 expanded_tables: List[Tuple[int, str, str]],
+                                 relevance_scores: Dict[int, float],
+                                 vector_scores: Optional[Dict[int, float]] = None) -> Set[Tuple[int, str, str]]:
+    """
+    过滤通过外键扩展得到的表
+    有向量分数时，明显相关的直接保留、明显无关的直接丢弃，只把分数落在阈值附近的表交给LLM判断
+    """
+    if vector_scores is None:
+        return await filter_expanded_tables_with_llm(query, query_analysis, expanded_tables, relevance_scores)
+
+    threshold = settings.TABLE_INDEX_MIN_SCORE
+    margin = settings.TABLE_INDEX_AMBIGUITY_MARGIN
+    kept = set()
+    uncertain = []
+    for table in expanded_tables:
+        score = vector_scores.get(table[0], 0.0)
+        if score >= threshold + margin:
+            kept.add(table)
+        elif score >= threshold - margin:
+            uncertain.append(table)
+    if uncertain:
+        kept |= await filter_expanded_tables_with_llm(query, query_analysis, uncertain, relevance_scores)
+    return kept
+
+
 async def filter_expanded_tables_with_llm(query: str, query_analysis: Dict[str, Any],
                                         expanded_tables: List[Tuple[int, str, str]],
                                         relevance_scores: Dict[int, float]) -> Set[Tuple[int, str, str]]:
@@ -293,52 +351,39 @@ def format_schema_for_prompt(schema_context: Dict[str, Any]) -> str:
     return schema_str
 
 
-def get_value_mappings(db: Session, schema_context: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+def get_value_mappings(db: Session, schema_context: Dict[str, Any],
+                       connection_id: Optional[int] = None) -> Dict[str, Dict[str, str]]:
     """
     获取表结构上下文中列的值映射
-    """
-    mappings = {}
 
-    for column in schema_context["columns"]:
-        column_id = column["id"]
-        column_mappings = crud.value_mapping.get_by_column(db=db, column_id=column_id)
+    指定connection_id时从按连接缓存的值映射匹配器中取，否则用一次IN查询加载
+    """
+    column_ids = [column["id"] for column in schema_context["columns"]]
+    if connection_id is not None:
+        return value_mapping_engine.get_mapper(db, connection_id).mappings_for_columns(column_ids)
 
-        if column_mappings:
-            table_col = f"{column['table_name']}.{column['name']}"
-            mappings[table_col] = {m.nl_term: m.db_value for m in column_mappings}
+    columns_by_id = {column["id"]: column for column in schema_context["columns"]}
+    mappings = {}
+    for mapping in crud.value_mapping.get_by_columns(db=db, column_ids=column_ids):
+        column = columns_by_id[mapping.column_id]
+        table_col = f"{column['table_name']}.{column['name']}"
+        mappings.setdefault(table_col, {})[mapping.nl_term] = mapping.db_value
 
     return mappings
 
 
-def process_sql_with_value_mappings(sql: str, value_mappings: Dict[str, Dict[str, str]]) -> str:
+def process_sql_with_value_mappings(sql: str, value_mappings) -> str:
     """
-    处理SQL查询，将自然语言术语替换为数据库值
+    处理SQL查询，将与映射列比较的字符串字面量中的自然语言术语替换为数据库值
+
+    Args:
+        sql: SQL语句
+        value_mappings: {"表.列": {术语: 值}} 字典，或已编译的ValueMapper
     """
     if not value_mappings:
         return sql
-
-    # 这是一个简化的方法 - 更健壮的实现会使用适当的SQL解析器
-    for column, mappings in value_mappings.items():
-        table, col = column.split('.')
-
-        # 查找类似"table.column = 'value'"或"column = 'value'"的模式
-        for nl_term, db_value in mappings.items():
-            # 尝试匹配带表名的模式
-            pattern1 = rf"({table}\.{col}\s*=\s*['\"])({nl_term})(['\"])"
-            sql = re.sub(pattern1, f"\\1{db_value}\\3", sql, flags=re.IGNORECASE)
-
-            # 尝试匹配不带表名的模式
-            pattern2 = rf"({col}\s*=\s*['\"])({nl_term})(['\"])"
-            sql = re.sub(pattern2, f"\\1{db_value}\\3", sql, flags=re.IGNORECASE)
-
-            # 也处理LIKE模式
-            pattern3 = rf"({table}\.{col}\s+LIKE\s+['\"])%?({nl_term})%?(['\"])"
-            sql = re.sub(pattern3, f"\\1%{db_value}%\\3", sql, flags=re.IGNORECASE)
-
-            pattern4 = rf"({col}\s+LIKE\s+['\"])%?({nl_term})%?(['\"])"
-            sql = re.sub(pattern4, f"\\1%{db_value}%\\3", sql, flags=re.IGNORECASE)
-
-    return sql
+    mapper = value_mappings if isinstance(value_mappings, ValueMapper) else ValueMapper.from_dict(value_mappings)
+    return mapper.rewrite(sql)
 
 
 def validate_sql(sql: str) -> bool:
@@ -393,133 +438,148 @@ def extract_sql_from_llm_response(response: str) -> str:
     return response
 
 
+ENTITY_COLUMNS_QUERY = """
+MATCH (c:Column {connection_id: $connection_id})
+WHERE toLower(c.name) CONTAINS $entity OR toLower(c.description) CONTAINS $entity
+MATCH (t:Table)-[:HAS_COLUMN]->(c)
+RETURN c.id AS id, c.name AS name, c.type AS type, c.description AS description,
+       c.is_pk AS is_pk, c.is_fk AS is_fk, t.id AS table_id, t.name AS table_name
+"""
+
+CONNECTED_TABLES_QUERY = """
+MATCH (t1:Table {connection_id: $connection_id})-[:HAS_COLUMN]->
+      (c1:Column)-[:REFERENCES]->
+      (c2:Column)<-[:HAS_COLUMN]-(t2:Table {connection_id: $connection_id})
+WHERE t1.id IN $table_ids AND NOT t2.id IN $table_ids
+RETURN t2.id AS id, t2.name AS name, t2.description AS description,
+       c1.id AS source_column_id, c1.name AS source_column_name,
+       c2.id AS target_column_id, c2.name AS target_column_name,
+       t1.id AS source_table_id
+"""
+
+
+def find_entity_columns(connection_id: int, entities: List[str]) -> List[Dict[str, Any]]:
+    """在Neo4j中查找名称或描述匹配实体的列（同步调用，应在线程池中执行）"""
+    records = []
+    with get_neo4j_driver().session() as session:
+        for entity in entities:
+            result = session.run(ENTITY_COLUMNS_QUERY, connection_id=connection_id, entity=entity.lower())
+            records.extend(record.data() for record in result)
+    return records
+
+
+def find_connected_tables(connection_id: int, table_ids: List[int]) -> List[Dict[str, Any]]:
+    """在Neo4j中查找通过外键与给定表直接相连的表（同步调用，应在线程池中执行）"""
+    with get_neo4j_driver().session() as session:
+        result = session.run(CONNECTED_TABLES_QUERY, connection_id=connection_id, table_ids=table_ids)
+        return [record.data() for record in result]
+
+
 async def retrieve_relevant_schema(db: Session, connection_id: int, query: str) -> Dict[str, Any]:
     """
     基于自然语言查询检索相关的表结构信息
     使用Neo4j图数据库和LLM找到相关表和列
+    MySQL和Neo4j的同步调用都在查询执行线程池中运行，不阻塞事件循环
     """
     try:
+        # 0. 命中表结构上下文缓存时直接返回，跳过Neo4j和MySQL
+        cached_context = schema_cache.get_context(connection_id, query)
+        if cached_context is not None:
+            return cached_context
+
+        # 记录开始检索时的缓存版本，检索期间若表结构发生变更则不写回缓存
+        cache_generation = schema_cache.generation(connection_id)
+        catalog = await query_executor.run_blocking(schema_cache.get_catalog, db, connection_id)
+
         # 1. 使用LLM分析查询并提取关键实体和意图
         query_analysis = await analyze_query_with_llm(query)
 
-        # 连接到Neo4j
-        driver = GraphDatabase.driver(
-            settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
-        )
-
         # 使用字典按ID跟踪表以防止重复
         relevant_tables_dict = {}
         relevant_columns = set()
         table_relevance_scores = {}
 
-        with driver.session() as session:
-            # 2. 首先，获取此连接的所有表及其描述
-            # 这将用于语义匹配
-            all_tables = session.run(
-                """
-                MATCH (t:Table {connection_id: $connection_id})
-                RETURN t.id AS id, t.name AS name, t.description AS description
-                """,
-                connection_id=connection_id
-            ).data()
-
-            # 3. 使用语义搜索基于查询分析找到相关表
-            relevant_table_ids = await find_relevant_tables_semantic(query, query_analysis, all_tables)
-
-            # 4. 按ID获取表并设置相关性分数
-            for table_id, relevance_score in relevant_table_ids:
-                # 确保table_id是整数类型
-                if not isinstance(table_id, int):
-                    try:
-                        table_id = int(table_id)
-                    except (ValueError, TypeError):
-                        continue
-
-                # 查找表信息
-                table_info = next((t for t in all_tables if t["id"] == table_id), None)
-                if table_info:
-                    # 在字典中存储表，以ID为键
-                    relevant_tables_dict[table_info["id"]] = (
-                        table_info["id"], table_info["name"], table_info["description"]
-                    )
-                    table_relevance_scores[table_info["id"]] = relevance_score
-
-            # 5. 找到与查询相关的列
-            for entity in query_analysis["entities"]:
-                # 搜索匹配实体名称或描述的列
-                result = session.run(
-                    """
-                    MATCH (c:Column {connection_id: $connection_id})
-                    WHERE toLower(c.name) CONTAINS $entity OR toLower(c.description) CONTAINS $entity
-                    MATCH (t:Table)-[:HAS_COLUMN]->(c)
-                    RETURN c.id AS id, c.name AS name, c.type AS type, c.description AS description,
-                           c.is_pk AS is_pk, c.is_fk AS is_fk, t.id AS table_id, t.name AS table_name
-                    """,
-                    connection_id=connection_id,
-                    entity=entity.lower()
+        # 2. 首先，获取此连接的所有表及其描述（来自缓存的表目录）
+        # 这将用于语义匹配
+        all_tables = catalog.tables
+
+        # 3. 使用本地向量索引（必要时辅以LLM）基于查询分析找到相关表
+        vector_scores = await table_index.score_tables(
+            db, connection_id, " ".join([query] + list(query_analysis.get("entities", [])))
+        )
+        relevant_table_ids = await find_relevant_tables_semantic(
+            query, query_analysis, all_tables, vector_scores
+        )
+
+        # 4. 按ID获取表并设置相关性分数
+        for table_id, relevance_score in relevant_table_ids:
+            # 确保table_id是整数类型
+            if not isinstance(table_id, int):
+                try:
+                    table_id = int(table_id)
+                except (ValueError, TypeError):
+                    continue
+
+            # 查找表信息
+            table_info = catalog.tables_by_id.get(table_id)
+            if table_info:
+                # 在字典中存储表，以ID为键
+                relevant_tables_dict[table_info["id"]] = (
+                    table_info["id"], table_info["name"], table_info["description"]
                 )
+                table_relevance_scores[table_info["id"]] = relevance_score
+
+        # 5. 找到与查询相关的列（搜索匹配实体名称或描述的列）
+        entity_records = await query_executor.run_blocking(
+            find_entity_columns, connection_id, list(query_analysis["entities"])
+        )
+        for record in entity_records:
+            relevant_columns.add((
+                record["id"], record["name"], record["type"], record["description"],
+                record["is_pk"], record["is_fk"], record["table_id"], record["table_name"]
+            ))
+            # 添加表或更新（如果已存在且有更好的描述）
+            if record["table_id"] not in relevant_tables_dict or not relevant_tables_dict[record["table_id"]][2]:
+                relevant_tables_dict[record["table_id"]] = (
+                    record["table_id"], record["table_name"], ""
+                )
+            # 为有匹配列的表增加相关性分数
+            table_relevance_scores[record["table_id"]] = table_relevance_scores.get(record["table_id"], 0) + 0.5
+
+        # 6. 如果找到了一些相关表/列，扩展以包含相关表
+        if relevant_tables_dict or relevant_columns:
+            table_ids = list(relevant_tables_dict.keys())
 
-                for record in result:
-                    relevant_columns.add((
-                        record["id"], record["name"], record["type"], record["description"],
-                        record["is_pk"], record["is_fk"], record["table_id"], record["table_name"]
-                    ))
+            # 通过外键找到连接的表（1跳）
+            if table_ids:
+                connected_records = await query_executor.run_blocking(
+                    find_connected_tables, connection_id, table_ids
+                )
+                for record in connected_records:
                     # 添加表或更新（如果已存在且有更好的描述）
-                    if record["table_id"] not in relevant_tables_dict or not relevant_tables_dict[record["table_id"]][2]:
-                        relevant_tables_dict[record["table_id"]] = (
-                            record["table_id"], record["table_name"], ""
+                    if record["id"] not in relevant_tables_dict or (
+                        not relevant_tables_dict[record["id"]][2] and record["description"]
+                    ):
+                        relevant_tables_dict[record["id"]] = (
+                            record["id"], record["name"], record["description"]
                         )
-                    # 为有匹配列的表增加相关性分数
-                    table_relevance_scores[record["table_id"]] = table_relevance_scores.get(record["table_id"], 0) + 0.5
-
-            # 6. 如果找到了一些相关表/列，扩展以包含相关表
-            if relevant_tables_dict or relevant_columns:
-                table_ids = list(relevant_tables_dict.keys())
-
-                # 通过外键找到连接的表（1跳）
-                if table_ids:
-                    result = session.run(
-                        """
-                        MATCH (t1:Table {connection_id: $connection_id})-[:HAS_COLUMN]->
-                              (c1:Column)-[:REFERENCES]->
-                              (c2:Column)<-[:HAS_COLUMN]-(t2:Table {connection_id: $connection_id})
-                        WHERE t1.id IN $table_ids AND NOT t2.id IN $table_ids
-                        RETURN t2.id AS id, t2.name AS name, t2.description AS description,
-                               c1.id AS source_column_id, c1.name AS source_column_name,
-                               c2.id AS target_column_id, c2.name AS target_column_name,
-                               t1.id AS source_table_id
-                        """,
-                        connection_id=connection_id,
-                        table_ids=table_ids
-                    )
-
-                    for record in result:
-                        # 添加表或更新（如果已存在且有更好的描述）
-                        if record["id"] not in relevant_tables_dict or (
-                            not relevant_tables_dict[record["id"]][2] and record["description"]
-                        ):
-                            relevant_tables_dict[record["id"]] = (
-                                record["id"], record["name"], record["description"]
-                            )
-                        # 相关表基于源表的分数获得相关性分数
-                        source_score = table_relevance_scores.get(record["source_table_id"], 0)
-                        table_relevance_scores[record["id"]] = source_score * 0.7  # 相关表分数降低
-
-                # 7. 使用LLM评估扩展表是否真正与查询相关
-                expanded_tables = [t for t in relevant_tables_dict.values() if t[0] not in table_ids]
-                if expanded_tables:
-                    filtered_expanded_tables = await filter_expanded_tables_with_llm(
-                        query, query_analysis, expanded_tables, table_relevance_scores
-                    )
-                    # 移除LLM认为不相关的表
-                    # 只保留相关表
-                    filtered_table_ids = set(table_ids).union({t[0] for t in filtered_expanded_tables})
-                    relevant_tables_dict = {
-                        tid: t for tid, t in relevant_tables_dict.items() if tid in filtered_table_ids
-                    }
-
-        driver.close()
+                    # 相关表基于源表的分数获得相关性分数
+                    source_score = table_relevance_scores.get(record["source_table_id"], 0)
+                    table_relevance_scores[record["id"]] = source_score * 0.7  # 相关表分数降低
+
+            # 7. 评估扩展表是否真正与查询相关（向量分数优先，必要时使用LLM）
+            initial_table_ids = set(table_ids)
+            expanded_tables = [t for t in relevant_tables_dict.values() if t[0] not in initial_table_ids]
+            if expanded_tables:
+                filtered_expanded_tables = await filter_expanded_tables(
+                    query, query_analysis, expanded_tables, table_relevance_scores, vector_scores
+                )
+                # 移除LLM认为不相关的表
+                # 只保留相关表
+                filtered_table_ids = initial_table_ids.union({t[0] for t in filtered_expanded_tables})
+                relevant_tables_dict = {
+                    tid: t for tid, t in relevant_tables_dict.items() if tid in filtered_table_ids
+                }
 
         # 8. 按相关性分数排序表
         sorted_tables = sorted(
@@ -533,88 +593,70 @@ async def retrieve_relevant_schema(db: Session, connection_id: int, query: str)
 
         # 如果没有找到相关表，返回所有表
         if not tables_list:
-            all_tables_from_db = crud.schema_table.get_by_connection(db=db, connection_id=connection_id)
-            tables_list = [
-                {
-                    "id": table.id,
-                    "name": table.table_name,
-                    "description": table.description or ""
-                }
-                for table in all_tables_from_db
-            ]
-
-        columns_list = []
-
-        # 获取表的所有列
-        for table in tables_list:
-            table_columns = crud.schema_column.get_by_table(db=db, table_id=table["id"])
-            for column in table_columns:
-                columns_list.append({
-                    "id": column.id,
-                    "name": column.column_name,
-                    "type": column.data_type,
-                    "description": column.description,
-                    "is_primary_key": column.is_primary_key,
-                    "is_foreign_key": column.is_foreign_key,
-                    "table_id": table["id"],
-                    "table_name": table["name"]
-                })
-
-        # 获取表之间的关系
-        relationships_list = []
-        table_ids = [t["id"] for t in tables_list]
-
-        # 如果返回所有表，则获取所有关系
-        all_tables_count = len(crud.schema_table.get_by_connection(db=db, connection_id=connection_id))
-        if len(tables_list) == all_tables_count:
-            all_relationships = crud.schema_relationship.get_by_connection(db=db, connection_id=connection_id)
-
-            for rel in all_relationships:
-                source_table = next((t for t in tables_list if t["id"] == rel.source_table_id), None)
-                target_table = next((t for t in tables_list if t["id"] == rel.target_table_id), None)
-                source_column = next((c for c in columns_list if c["id"] == rel.source_column_id), None)
-                target_column = next((c for c in columns_list if c["id"] == rel.target_column_id), None)
-
-                if source_table and target_table and source_column and target_column:
-                    relationships_list.append({
-                        "id": rel.id,
-                        "source_table": source_table["name"],
-                        "source_column": source_column["name"],
-                        "target_table": target_table["name"],
-                        "target_column": target_column["name"],
-                        "relationship_type": rel.relationship_type
-                    })
-        else:
-            # 如果只返回相关表，则获取这些表之间的关系
-            for table in tables_list:
-                source_rels = crud.schema_relationship.get_by_source_table(db=db, source_table_id=table["id"])
-                target_rels = crud.schema_relationship.get_by_target_table(db=db, target_table_id=table["id"])
-
-                for rel in source_rels + target_rels:
-                    # 只包含相关表集中的表之间的关系
-                    if rel.source_table_id in table_ids and rel.target_table_id in table_ids:
-                        source_table = next((t for t in tables_list if t["id"] == rel.source_table_id), None)
-                        target_table = next((t for t in tables_list if t["id"] == rel.target_table_id), None)
-                        source_column = next((c for c in columns_list if c["id"] == rel.source_column_id), None)
-                        target_column = next((c for c in columns_list if c["id"] == rel.target_column_id), None)
-
-                        if source_table and target_table and source_column and target_column:
-                            # 确保不重复添加关系
-                            rel_dict = {
-                                "id": rel.id,
-                                "source_table": source_table["name"],
-                                "source_column": source_column["name"],
-                                "target_table": target_table["name"],
-                                "target_column": target_column["name"],
-                                "relationship_type": rel.relationship_type
-                            }
-                            if rel_dict not in relationships_list:
-                                relationships_list.append(rel_dict)
-
-        return {
-            "tables": tables_list,
-            "columns": columns_list,
-            "relationships": relationships_list
-        }
+            tables_list = [dict(table) for table in catalog.tables]
+
+        # 9. 组装列和关系（可能需要从MySQL加载，在线程池中执行）
+        schema_context = await query_executor.run_blocking(assemble_schema_context, db, catalog, tables_list)
+        schema_cache.set_context(connection_id, query, schema_context, cache_generation)
+        return schema_context
     except Exception as e:
         raise Exception(f"检索表结构上下文时出错: {str(e)}")
+
+
+def assemble_schema_context(db: Session, catalog, tables_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    为选中的表组装列和表间关系，得到表结构上下文
+
+    列和关系各用一次批量查询加载（已缓存时不访问数据库），
+    表和列按ID建索引，组装耗时与选中表的列数和关系数成线性
+    """
+    tables_by_id = {table["id"]: table for table in tables_list}
+    table_ids = list(tables_by_id)
+
+    # 获取表的所有列
+    columns_list = []
+    columns_by_id = {}
+    columns_by_table = catalog.get_columns_for_tables(db, table_ids)
+    for table in tables_list:
+        for column in columns_by_table[table["id"]]:
+            column_dict = {**column, "table_name": table["name"]}
+            columns_list.append(column_dict)
+            columns_by_id[column_dict["id"]] = column_dict
+
+    # 获取表之间的关系：返回所有表时直接使用连接的全部关系，否则只取选中表涉及的关系
+    if len(tables_by_id) == len(catalog.tables):
+        relationships = catalog.get_all_relationships(db)
+    else:
+        relationships = (
+            rel for table_rels in catalog.get_relationships_for_tables(db, table_ids).values()
+            for rel in table_rels
+        )
+
+    relationships_list = []
+    seen_relationship_ids = set()
+    for rel in relationships:
+        # 只包含两端都在选中表集中的关系，且不重复添加
+        if rel["id"] in seen_relationship_ids:
+            continue
+        source_table = tables_by_id.get(rel["source_table_id"])
+        target_table = tables_by_id.get(rel["target_table_id"])
+        source_column = columns_by_id.get(rel["source_column_id"])
+        target_column = columns_by_id.get(rel["target_column_id"])
+
+        if source_table and target_table and source_column and target_column:
+            seen_relationship_ids.add(rel["id"])
+            relationships_list.append({
+                "id": rel["id"],
+                "source_table": source_table["name"],
+                "source_column": source_column["name"],
+                "target_table": target_table["name"],
+                "target_column": target_column["name"],
+                "relationship_type": rel["relationship_type"]
+            })
+
+    schema_context = {
+        "tables": tables_list,
+        "columns": columns_list,
+        "relationships": relationships_list
+    }
+    return schema_context
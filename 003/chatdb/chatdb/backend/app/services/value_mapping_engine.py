@@ -0,0 +1,321 @@
+"""
+值映射引擎
+一次查询加载连接的全部值映射，按连接缓存编译好的匹配器，
+通过一次词法扫描只改写与映射列比较的字符串字面量
+"""
+import re
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+from sqlparse import lexer
+from sqlparse import tokens as T
+
+from app import crud
+from app.core.config import settings
+from app.core.utils import CacheManager
+
+# 比较运算符：右侧字面量按完整值匹配，LIKE类运算符保留字面量两端的通配符
+EQUALITY_OPERATORS = {"=", "!=", "<>", "=="}
+LIKE_OPERATORS = {"LIKE", "NOT LIKE", "ILIKE", "NOT ILIKE"}
+
+# 结束FROM子句表列表的关键字
+TABLE_LIST_END = {
+    "WHERE", "ON", "USING", "GROUP BY", "ORDER BY", "HAVING", "LIMIT", "OFFSET",
+    "UNION", "UNION ALL", "EXCEPT", "INTERSECT", "SELECT", "WINDOW", "FETCH",
+}
+
+
+def _unquote(name: str) -> str:
+    return name.strip('`"[]').lower()
+
+
+def _is_string(ttype) -> bool:
+    # MySQL中双引号字符串被词法分析为Symbol，在比较运算符右侧按字符串处理
+    return ttype in T.Literal.String.Single or ttype in T.Literal.String.Symbol
+
+
+def _is_identifier(ttype) -> bool:
+    # status、type、year等列名会被词法分析为关键字
+    return (ttype in T.Name or ttype in T.Literal.String.Symbol
+            or (ttype in T.Keyword and ttype not in T.Keyword.DML))
+
+
+class ColumnMapping:
+    """单个列的值映射，先按原文精确匹配，再按大小写不敏感匹配"""
+
+    def __init__(self):
+        self.exact: Dict[str, str] = {}
+        self.folded: Dict[str, str] = {}
+
+    def add(self, nl_term: str, db_value: str) -> None:
+        self.exact[nl_term] = db_value
+        self.folded.setdefault(nl_term.casefold(), db_value)
+
+    def lookup(self, term: str) -> Optional[str]:
+        value = self.exact.get(term)
+        if value is None:
+            value = self.folded.get(term.casefold())
+        return value
+
+
+class ValueMapper:
+    """编译后的值映射匹配器"""
+
+    def __init__(self, rows: Iterable[Tuple[Optional[int], str, str, str, str]]):
+        """初始化匹配器
+
+        Args:
+            rows: (列ID, 表名, 列名, 自然语言术语, 数据库值) 行
+        """
+        self.mappings: Dict[str, Dict[str, str]] = {}
+        self.column_keys: Dict[int, str] = {}
+        # 列名 -> 表名 -> 列映射，均为小写
+        self._columns: Dict[str, Dict[str, ColumnMapping]] = {}
+        terms = set()
+
+        for column_id, table_name, column_name, nl_term, db_value in rows:
+            key = f"{table_name}.{column_name}"
+            self.mappings.setdefault(key, {})[nl_term] = db_value
+            if column_id is not None:
+                self.column_keys[column_id] = key
+            tables = self._columns.setdefault(column_name.lower(), {})
+            tables.setdefault(table_name.lower(), ColumnMapping()).add(nl_term, db_value)
+            terms.add(nl_term)
+
+        # 所有术语合并成一个交替模式，SQL中不含任何术语时跳过词法扫描
+        self.pattern = re.compile(
+            "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)),
+            re.IGNORECASE,
+        ) if terms else None
+        self.term_count = len(terms)
+
+    @classmethod
+    def from_dict(cls, value_mappings: Dict[str, Dict[str, str]]) -> "ValueMapper":
+        """从 {"表.列": {术语: 值}} 字典构建匹配器"""
+        rows = []
+        for column, mappings in value_mappings.items():
+            table_name, _, column_name = column.rpartition(".")
+            rows.extend((None, table_name, column_name, nl_term, db_value)
+                        for nl_term, db_value in mappings.items())
+        return cls(rows)
+
+    def mappings_for_columns(self, column_ids: Iterable[int]) -> Dict[str, Dict[str, str]]:
+        """获取指定列的值映射，格式为 {"表.列": {术语: 值}}"""
+        result = {}
+        for column_id in column_ids:
+            key = self.column_keys.get(column_id)
+            if key is not None:
+                result[key] = dict(self.mappings[key])
+        return result
+
+    def rewrite(self, sql: str) -> str:
+        """将与映射列比较的字符串字面量中的自然语言术语替换为数据库值
+
+        支持 col = 'x'、col <> 'x'、col LIKE '%x%' 和 col [NOT] IN ('x', 'y')，
+        列可以带表名或别名限定；其他位置的字符串（如SELECT列表、注释）保持不变
+
+        Args:
+            sql: SQL语句
+
+        Returns:
+            str: 改写后的SQL语句
+        """
+        if self.pattern is None or not sql:
+            return sql
+        # 预筛选时还原转义的引号，使包含引号的术语也能匹配
+        if not self.pattern.search(sql.replace("''", "'").replace('""', '"')):
+            return sql
+
+        tokens = list(lexer.tokenize(sql))
+        tables = self._collect_tables(tokens)
+        out: List[str] = []
+        chain: List[str] = []
+        after_dot = False
+        target: Optional[List[ColumnMapping]] = None
+        operator = None
+        state = None
+
+        for ttype, value in tokens:
+            if ttype in T.Whitespace or ttype in T.Text.Whitespace or ttype in T.Comment:
+                out.append(value)
+                continue
+
+            if state == "value":
+                state = None
+                if _is_string(ttype):
+                    out.append(self._replace(target, value, operator in LIKE_OPERATORS))
+                    chain = []
+                    continue
+            elif state == "in_open":
+                state = "in_list" if value == "(" else None
+                if state:
+                    out.append(value)
+                    continue
+            elif state == "in_list":
+                if _is_string(ttype):
+                    out.append(self._replace(target, value, False))
+                    continue
+                if value == ",":
+                    out.append(value)
+                    continue
+                state = None
+
+            out.append(value)
+            normalized = value.upper() if ttype in T.Keyword or ttype in T.Operator.Comparison else value
+
+            if ttype in T.Operator.Comparison:
+                if chain and (normalized in EQUALITY_OPERATORS or normalized in LIKE_OPERATORS):
+                    target = self._resolve(chain, tables)
+                    if target:
+                        state, operator = "value", normalized
+                chain = []
+            elif ttype in T.Keyword and normalized == "IN" and chain:
+                target = self._resolve(chain, tables)
+                if target:
+                    state = "in_open"
+                chain = []
+            elif ttype in T.Keyword and normalized == "NOT" and chain:
+                # col NOT IN (...)
+                continue
+            elif ttype in T.Punctuation and value == "." and chain:
+                after_dot = True
+            elif _is_identifier(ttype):
+                chain = chain + [value] if after_dot else [value]
+                after_dot = False
+            else:
+                chain = []
+                after_dot = False
+
+        return "".join(out)
+
+    def _resolve(self, chain: List[str], tables: Dict[str, str]) -> Optional[List[ColumnMapping]]:
+        """解析列引用对应的列映射，未限定表名且有歧义时返回所有候选"""
+        candidates = self._columns.get(_unquote(chain[-1]))
+        if not candidates:
+            return None
+        if len(chain) > 1:
+            qualifier = _unquote(chain[-2])
+            mapping = candidates.get(tables.get(qualifier, qualifier))
+            return [mapping] if mapping else None
+        referenced = set(tables.values())
+        return [m for t, m in candidates.items() if t in referenced] or list(candidates.values())
+
+    @staticmethod
+    def _replace(target: List[ColumnMapping], literal: str, like: bool) -> str:
+        quote = literal[0]
+        body = literal[1:-1].replace(quote * 2, quote)
+        prefix = suffix = ""
+        term = body
+        if like:
+            stripped = body.lstrip("%")
+            prefix = body[:len(body) - len(stripped)]
+            term = stripped.rstrip("%")
+            suffix = stripped[len(term):]
+        values = {mapping.lookup(term) for mapping in target} - {None}
+        # 多个候选列映射到不同的值时无法确定，保持原样
+        if len(values) != 1:
+            return literal
+        replaced = prefix + values.pop() + suffix
+        return quote + replaced.replace(quote, quote * 2) + quote
+
+    @staticmethod
+    def _collect_tables(tokens: Sequence[Tuple[Any, str]]) -> Dict[str, str]:
+        """收集FROM/JOIN中的表名及别名，返回 {别名或表名: 表名}"""
+        tables: Dict[str, str] = {}
+        in_from = expect_table = expect_alias = after_dot = False
+        table = None
+
+        for ttype, value in tokens:
+            if ttype in T.Whitespace or ttype in T.Text.Whitespace or ttype in T.Comment:
+                continue
+            keyword = value.upper() if ttype in T.Keyword else None
+
+            if expect_table:
+                if ttype in T.Name or ttype in T.Literal.String.Symbol:
+                    if table is None or after_dot:
+                        table = _unquote(value)
+                        after_dot = False
+                        continue
+                elif value == "." and table is not None:
+                    after_dot = True
+                    continue
+                if table is not None:
+                    tables[table] = table
+                    expect_alias = True
+                expect_table = False
+
+            if expect_alias:
+                if keyword == "AS":
+                    continue
+                expect_alias = False
+                if ttype in T.Name or ttype in T.Literal.String.Symbol:
+                    tables[_unquote(value)] = table
+                    continue
+
+            if keyword == "FROM" or (keyword and keyword.endswith("JOIN")):
+                in_from = expect_table = True
+                table = None
+            elif keyword in TABLE_LIST_END:
+                in_from = False
+            elif value == "," and in_from:
+                expect_table = True
+                table = None
+
+        if expect_table and table is not None:
+            tables[table] = table
+        return tables
+
+
+class ValueMappingEngine:
+    """按连接缓存值映射匹配器"""
+
+    def __init__(self, ttl: int = None, max_connections: int = None):
+        """初始化值映射引擎
+
+        Args:
+            ttl: 匹配器缓存生存时间（秒）
+            max_connections: 最多缓存的连接数
+        """
+        self.mappers = CacheManager(
+            max_size=max_connections or settings.SCHEMA_CACHE_MAX_CONNECTIONS,
+            ttl=settings.VALUE_MAPPING_CACHE_TTL if ttl is None else ttl,
+        )
+        self.stats = {"hits": 0, "loads": 0, "invalidations": 0}
+
+    def get_mapper(self, db: Session, connection_id: int) -> ValueMapper:
+        """获取连接的值映射匹配器，未缓存时一次查询加载全部映射
+
+        Args:
+            db: 数据库会话，仅在未缓存时使用
+            connection_id: 数据库连接ID
+
+        Returns:
+            ValueMapper: 值映射匹配器
+        """
+        mapper = self.mappers.get(connection_id)
+        if mapper is not None:
+            self.stats["hits"] += 1
+            return mapper
+        mapper = ValueMapper(crud.value_mapping.get_by_connection(db=db, connection_id=connection_id))
+        self.mappers.set(connection_id, mapper)
+        self.stats["loads"] += 1
+        return mapper
+
+    def rewrite(self, db: Session, connection_id: int, sql: str) -> str:
+        """使用连接的值映射改写SQL"""
+        return self.get_mapper(db, connection_id).rewrite(sql)
+
+    def invalidate(self, connection_id: Optional[int] = None) -> None:
+        """使连接的匹配器失效，connection_id为None时清空所有缓存"""
+        if connection_id is None:
+            self.mappers.clear()
+        else:
+            self.mappers.remove(connection_id)
+        self.stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "connections": len(self.mappers)}
+
+
+# 全局值映射引擎实例
+value_mapping_engine = ValueMappingEngine()
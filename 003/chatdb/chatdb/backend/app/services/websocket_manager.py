@@ -1,21 +1,62 @@
 import asyncio
 import logging
+import time
 import uuid
 import json
 from typing import Dict, List, Optional, Any, Callable, Awaitable
 from datetime import datetime
 from starlette.websockets import WebSocket, WebSocketDisconnect
 
+from app.core.config import settings
+
 # 设置日志记录器
 logger = logging.getLogger(__name__)
 
+
+def encode_message(message: Dict[str, Any]) -> str:
+    """序列化消息（与WebSocket.send_json的格式一致）"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class OutboundChannel:
+    """
+    单个连接的出站通道
+
+    有界队列中存放已序列化的消息，由连接自己的写任务依次发送，
+    慢客户端只会填满自己的队列，不会阻塞其他连接
+    """
+    def __init__(self, max_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record_send(self, latency: float) -> None:
+        self.sent += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "sent": self.sent,
+            "avg_send_latency_ms": round(self.latency_total / self.sent * 1000, 3) if self.sent else 0.0,
+            "max_send_latency_ms": round(self.latency_max * 1000, 3),
+        }
+
+
 class ConnectionManager:
     """
     WebSocket连接管理器
 
-    管理多个WebSocket连接，支持多用户同时访问系统
+    管理多个WebSocket连接，支持多用户同时访问系统。
+    每个连接有一个有界出站队列和写任务，广播只序列化一次并入队而不等待发送；
+    队列溢出的慢客户端会被断开，心跳由一个共享定时任务统一发送
     """
-    def __init__(self):
+    def __init__(self, send_queue_size: int = 256, heartbeat_interval: float = 60,
+                 session_timeout: float = 7200, close_timeout: float = 5):
         # 活跃连接字典 {connection_id: {"websocket": WebSocket, "user_id": str, "created_at": datetime, "last_activity": datetime}}
         self.active_connections: Dict[str, Dict[str, Any]] = {}
 
@@ -32,13 +73,20 @@ class ConnectionManager:
         self.connection_counter = 0
 
         # 会话超时（秒）
-        self.session_timeout = 7200  # 2小时
+        self.session_timeout = session_timeout
 
         # 心跳间隔（秒）
-        self.heartbeat_interval = 60
+        self.heartbeat_interval = heartbeat_interval
+
+        # 关闭连接的超时时间（秒）
+        self.close_timeout = close_timeout
 
-        # 心跳任务 {connection_id: Task}
-        self.heartbeat_tasks: Dict[str, asyncio.Task] = {}
+        # 出站通道 {connection_id: OutboundChannel}
+        self.send_queue_size = send_queue_size
+        self.outbound: Dict[str, OutboundChannel] = {}
+
+        # 共享心跳任务（所有连接一个）
+        self.heartbeat_task: Optional[asyncio.Task] = None
 
         # 监控统计
         self.stats = {
@@ -46,6 +94,8 @@ class ConnectionManager:
             "active_connections": 0,
             "messages_sent": 0,
             "messages_received": 0,
+            "messages_enqueued": 0,
+            "slow_consumers_disconnected": 0,
             "errors": 0
         }
 
@@ -97,10 +147,11 @@ class ConnectionManager:
         self.stats["total_connections"] += 1
         self.stats["active_connections"] = len(self.active_connections)
 
-        # 启动心跳任务
-        self.heartbeat_tasks[connection_id] = asyncio.create_task(
-            self._heartbeat_task(connection_id)
-        )
+        # 启动出站写任务和共享心跳任务
+        channel = OutboundChannel(self.send_queue_size)
+        self.outbound[connection_id] = channel
+        channel.writer = asyncio.create_task(self._writer_task(connection_id, websocket, channel))
+        self._ensure_heartbeat()
 
         # 发送欢迎消息
         await self.send_message(connection_id, {
@@ -124,25 +175,24 @@ class ConnectionManager:
             logger.warning(f"尝试关闭不存在的连接: {connection_id}")
             return
 
-        # 获取连接信息
-        connection_info = self.active_connections[connection_id]
+        # 获取连接信息，先从活跃连接中移除，避免并发的断开重复执行
+        connection_info = self.active_connections.pop(connection_id)
         user_id = connection_info["user_id"]
         websocket = connection_info["websocket"]
 
-        # 关闭WebSocket连接
+        # 停止出站写任务（从写任务内部断开时不取消自身）
+        channel = self.outbound.pop(connection_id, None)
+        if channel is not None and channel.writer is not None and channel.writer is not asyncio.current_task():
+            channel.writer.cancel()
+
+        # 关闭WebSocket连接（慢客户端可能无法及时完成关闭握手）
         try:
-            await websocket.close()
+            await asyncio.wait_for(websocket.close(), self.close_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"关闭WebSocket连接超时: {connection_id}")
         except Exception as e:
             logger.error(f"关闭WebSocket连接时出错: {str(e)}")
 
-        # 停止心跳任务
-        if connection_id in self.heartbeat_tasks:
-            self.heartbeat_tasks[connection_id].cancel()
-            del self.heartbeat_tasks[connection_id]
-
-        # 从活跃连接中移除
-        del self.active_connections[connection_id]
-
         # 从用户连接映射中移除
         if user_id in self.user_connections:
             self.user_connections[user_id].remove(connection_id)
@@ -170,6 +220,11 @@ class ConnectionManager:
         for connection_id in connection_ids:
             await self.disconnect(connection_id)
 
+        # 停止共享心跳任务
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+
         logger.info("所有WebSocket连接已关闭")
 
     async def disconnect_user(self, user_id: str) -> None:
@@ -191,58 +246,97 @@ class ConnectionManager:
 
     async def send_message(self, connection_id: str, message: Dict[str, Any]) -> bool:
         """
-        向指定连接发送消息
+        向指定连接发送消息（序列化后放入连接的出站队列，由写任务发送）
 
         Args:
             connection_id: 连接ID
             message: 消息内容
 
         Returns:
-            bool: 是否发送成功
+            bool: 是否已入队
         """
         if connection_id not in self.active_connections:
             logger.warning(f"尝试向不存在的连接发送消息: {connection_id}")
             return False
 
-        websocket = self.active_connections[connection_id]["websocket"]
+        # 添加时间戳
+        if "timestamp" not in message:
+            message["timestamp"] = datetime.now().isoformat()
 
-        try:
-            # 添加时间戳
-            if "timestamp" not in message:
-                message["timestamp"] = datetime.now().isoformat()
+        return self._enqueue(connection_id, encode_message(message))
 
-            # 发送消息
-            await websocket.send_json(message)
+    def _enqueue(self, connection_id: str, text: str) -> bool:
+        """
+        将已序列化的消息放入连接的出站队列，不等待发送；队列已满时断开该慢客户端
 
-            # 更新最后活动时间
-            self.active_connections[connection_id]["last_activity"] = datetime.now()
+        Args:
+            connection_id: 连接ID
+            text: 已序列化的消息
 
-            # 更新统计信息
-            self.stats["messages_sent"] += 1
+        Returns:
+            bool: 是否已入队
+        """
+        channel = self.outbound.get(connection_id)
+        if channel is None:
+            return False
+        try:
+            channel.queue.put_nowait((text, time.monotonic()))
+        except asyncio.QueueFull:
+            logger.warning(f"连接出站队列已满，断开慢客户端: {connection_id}")
+            self.stats["slow_consumers_disconnected"] += 1
+            # 清空队列释放内存，并让写任务不再发送积压消息
+            self.outbound.pop(connection_id, None)
+            asyncio.create_task(self._disconnect_channel(connection_id, channel))
+            return False
+        self.stats["messages_enqueued"] += 1
+        return True
 
-            return True
+    async def _disconnect_channel(self, connection_id: str, channel: OutboundChannel) -> None:
+        if channel.writer is not None:
+            channel.writer.cancel()
+        await self.disconnect(connection_id)
+
+    async def _writer_task(self, connection_id: str, websocket: WebSocket, channel: OutboundChannel) -> None:
+        """
+        连接的出站写任务，依次发送队列中的消息并记录发送延迟（入队到发送完成）
+
+        Args:
+            connection_id: 连接ID
+            websocket: WebSocket连接
+            channel: 出站通道
+        """
+        try:
+            while True:
+                text, enqueued_at = await channel.queue.get()
+                await websocket.send_text(text)
+                channel.record_send(time.monotonic() - enqueued_at)
+                self.stats["messages_sent"] += 1
+
+                # 更新最后活动时间
+                connection_info = self.active_connections.get(connection_id)
+                if connection_info is not None:
+                    connection_info["last_activity"] = datetime.now()
+        except asyncio.CancelledError:
+            pass
         except WebSocketDisconnect:
             logger.info(f"发送消息时检测到连接已断开: {connection_id}")
             await self.disconnect(connection_id)
-            return False
         except Exception as e:
             logger.error(f"发送消息时出错: {str(e)}")
             self.stats["errors"] += 1
-            return False
+            await self.disconnect(connection_id)
 
     async def broadcast(self, message: Dict[str, Any], exclude: Optional[List[str]] = None) -> None:
         """
-        广播消息给所有连接
+        广播消息给所有连接（只序列化一次，放入各连接的出站队列后立即返回）
 
         Args:
             message: 消息内容
             exclude: 排除的连接ID列表
         """
-        exclude = exclude or []
+        exclude = set(exclude or [])
         connection_ids = [cid for cid in self.active_connections.keys() if cid not in exclude]
-
-        for connection_id in connection_ids:
-            await self.send_message(connection_id, message)
+        self._fan_out(connection_ids, message)
 
         logger.info(f"广播消息已发送给 {len(connection_ids)} 个连接")
 
@@ -258,12 +352,18 @@ class ConnectionManager:
             logger.warning(f"尝试向不存在用户广播消息: {user_id}")
             return
 
-        connection_ids = self.user_connections[user_id]
-        for connection_id in connection_ids:
-            await self.send_message(connection_id, message)
+        connection_ids = list(self.user_connections[user_id])
+        self._fan_out(connection_ids, message)
 
         logger.info(f"广播消息已发送给用户 {user_id} 的 {len(connection_ids)} 个连接")
 
+    def _fan_out(self, connection_ids: List[str], message: Dict[str, Any]) -> int:
+        """序列化一次后放入多个连接的出站队列，返回成功入队的连接数"""
+        if "timestamp" not in message:
+            message["timestamp"] = datetime.now().isoformat()
+        text = encode_message(message)
+        return sum(1 for connection_id in connection_ids if self._enqueue(connection_id, text))
+
     async def receive_message(self, connection_id: str) -> Optional[Dict[str, Any]]:
         """
         从指定连接接收消息
@@ -411,35 +511,37 @@ class ConnectionManager:
             # 确保连接被关闭
             await self.disconnect(connection_id)
 
-    async def _heartbeat_task(self, connection_id: str) -> None:
-        """
-        心跳任务，定期检查连接是否活跃
+    def _ensure_heartbeat(self) -> None:
+        """启动共享心跳任务（没有运行时）"""
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            self.heartbeat_task = asyncio.create_task(self._heartbeat_loop())
 
-        Args:
-            connection_id: 连接ID
+    async def _heartbeat_loop(self) -> None:
+        """
+        共享心跳任务：定期关闭超时的连接，并向其余连接发送同一条心跳消息，没有连接时退出
         """
         try:
-            while connection_id in self.active_connections:
+            while self.active_connections:
                 # 等待心跳间隔
                 await asyncio.sleep(self.heartbeat_interval)
 
-                # 检查连接是否超时
-                if connection_id in self.active_connections:
-                    last_activity = self.active_connections[connection_id]["last_activity"]
-                    now = datetime.now()
-                    elapsed = (now - last_activity).total_seconds()
+                now = datetime.now()
+                alive = []
+                for connection_id, connection_info in list(self.active_connections.items()):
+                    elapsed = (now - connection_info["last_activity"]).total_seconds()
 
                     # 如果超过会话超时时间，则关闭连接
                     if elapsed > self.session_timeout:
                         logger.info(f"连接超时，准备关闭: {connection_id}, 最后活动: {elapsed}秒前")
                         await self.disconnect(connection_id)
-                        break
-
-                    # 发送心跳消息
-                    await self.send_message(connection_id, {
-                        "type": "heartbeat",
-                        "timestamp": now.isoformat()
-                    })
+                    else:
+                        alive.append(connection_id)
+
+                # 发送心跳消息
+                self._fan_out(alive, {
+                    "type": "heartbeat",
+                    "timestamp": now.isoformat()
+                })
         except asyncio.CancelledError:
             # 任务被取消，正常退出
             pass
@@ -447,10 +549,6 @@ class ConnectionManager:
             logger.error(f"心跳任务出错: {str(e)}")
             self.stats["errors"] += 1
 
-            # 确保连接被关闭
-            if connection_id in self.active_connections:
-                await self.disconnect(connection_id)
-
     def get_connection_info(self, connection_id: str) -> Optional[Dict[str, Any]]:
         """
         获取连接信息
@@ -468,6 +566,11 @@ class ConnectionManager:
         connection_info = dict(self.active_connections[connection_id])
         connection_info.pop("websocket", None)
 
+        # 出站队列深度和发送延迟
+        channel = self.outbound.get(connection_id)
+        if channel is not None:
+            connection_info.update(channel.get_stats())
+
         # 转换datetime为ISO格式字符串
         for key in ["created_at", "last_activity"]:
             if key in connection_info and isinstance(connection_info[key], datetime):
@@ -497,6 +600,11 @@ class ConnectionManager:
         # 复制统计信息
         stats = dict(self.stats)
 
+        # 每个连接的出站队列深度和发送延迟
+        stats["connections"] = {
+            connection_id: channel.get_stats() for connection_id, channel in self.outbound.items()
+        }
+
         # 添加当前时间
         stats["timestamp"] = datetime.now().isoformat()
 
@@ -511,10 +619,17 @@ class ConnectionManager:
             "active_connections": len(self.active_connections),
             "messages_sent": 0,
             "messages_received": 0,
+            "messages_enqueued": 0,
+            "slow_consumers_disconnected": 0,
             "errors": 0
         }
 
         logger.info("统计信息已重置")
 
 # 创建全局连接管理器实例
-manager = ConnectionManager()
+manager = ConnectionManager(
+    send_queue_size=settings.WS_SEND_QUEUE_SIZE,
+    heartbeat_interval=settings.WS_HEARTBEAT_INTERVAL,
+    session_timeout=settings.WS_SESSION_TIMEOUT,
+    close_timeout=settings.WS_CLOSE_TIMEOUT,
+)
@@ -0,0 +1,201 @@
+# 混合检索延迟基准
+#
+# 用带固定往返延迟的替身Milvus集合和Neo4j驱动运行HybridRetrievalEngine.hybrid_retrieve，
+# 比较重构前（同步驱动在async方法中直接调用，阻塞事件循环）与重构后（异步Neo4j驱动、
+# Milvus检索放入线程）在单请求和并发请求下的p50/p99延迟。
+# 替身只模拟网络等待，不包含查询本身的执行开销，结果适合做前后对比。
+#
+# 用法: python -m benchmarks.bench_hybrid_retrieval --milvus-ms 20 --neo4j-ms 30 --concurrency 1 8 32
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Dict, List
+
+from app.services.hybrid_retrieval_service import (
+    PATTERN_SEARCH_QUERY, STRUCTURAL_SEARCH_QUERY, EnhancedNeo4jService, FusionRanker,
+    HybridRetrievalEngine, MilvusService, RetrievalResult,
+)
+
+SCHEMA_CONTEXT = {"tables": [{"name": f"table_{index}"} for index in range(5)]}
+QUESTION = "统计每个部门的员工总数"
+
+
+def qa_node(index: int) -> Dict[str, Any]:
+    return {
+        "id": f"qa_{index}", "question": f"question {index}", "sql": "SELECT 1",
+        "connection_id": 1, "difficulty_level": 2, "query_type": "AGGREGATE",
+        "success_rate": 0.9, "verified": True, "created_at": "2024-01-01T00:00:00",
+    }
+
+
+def graph_records(query: str, top_k: int) -> List[Dict[str, Any]]:
+    """按查询返回固定的替身记录"""
+    if query == STRUCTURAL_SEARCH_QUERY:
+        return [{"qa": qa_node(index), "table_overlap": 2, "used_tables": ["table_0", "table_1"]}
+                for index in range(top_k)]
+    if query == PATTERN_SEARCH_QUERY:
+        return [{"qa": qa_node(index), "usage_count": 10} for index in range(top_k)]
+    return []
+
+
+class FakeVectorService:
+    async def embed_question(self, question: str) -> List[float]:
+        return [0.0] * 8
+
+
+class FakeHit:
+    def __init__(self, index: int):
+        self.entity = qa_node(index)
+        self.score = 0.9
+
+
+class FakeCollection:
+    """同步阻塞的Milvus集合替身"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def search(self, data, anns_field, param, limit, expr, output_fields):
+        time.sleep(self.latency)
+        return [[FakeHit(index) for index in range(limit)]]
+
+
+# ----- 异步驱动替身（重构后） -----
+
+class FakeAsyncResult:
+    def __init__(self, records):
+        self.records = records
+
+    async def data(self):
+        return self.records
+
+
+class FakeAsyncTx:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def run(self, query, **params):
+        await asyncio.sleep(self.latency)
+        return FakeAsyncResult(graph_records(query, params.get("top_k", 20)))
+
+
+class FakeAsyncSession:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute_read(self, work):
+        return await work(FakeAsyncTx(self.latency))
+
+
+class FakeAsyncDriver:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def session(self):
+        return FakeAsyncSession(self.latency)
+
+
+# ----- 重构前的同步实现 -----
+
+class LegacyMilvusService(MilvusService):
+    """在事件循环上直接调用同步检索"""
+
+    async def search_similar(self, query_vector, top_k=5, connection_id=None, verified_only=False):
+        results = self.collection.search(data=[query_vector], anns_field="embedding",
+                                         param=self.search_params, limit=top_k, expr=None,
+                                         output_fields=[])
+        return self._format_search_results(results[0])
+
+
+class LegacyNeo4jService(EnhancedNeo4jService):
+    """与重构前相同，在async方法中同步等待Neo4j往返"""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def _blocking_read(self, query: str, **params) -> List[Dict[str, Any]]:
+        time.sleep(self.latency)
+        return graph_records(query, params["top_k"])
+
+    async def structural_search(self, schema_context, connection_id, top_k=20, timeout=None):
+        table_names = [table.get("name") for table in schema_context.get("tables", [])]
+        records = self._blocking_read(STRUCTURAL_SEARCH_QUERY, top_k=top_k)
+        return [RetrievalResult(qa_pair=self._build_qa_pair_from_record(record["qa"], record["used_tables"]),
+                                structural_score=record["table_overlap"] / max(len(table_names), 1))
+                for record in records]
+
+    async def pattern_search(self, query_type, difficulty_level, connection_id, top_k=20, timeout=None):
+        records = self._blocking_read(PATTERN_SEARCH_QUERY, top_k=top_k)
+        return [RetrievalResult(qa_pair=self._build_qa_pair_from_record(record["qa"]),
+                                pattern_score=min(1.0, record["usage_count"] / 100.0))
+                for record in records]
+
+
+def build_engine(legacy: bool, milvus_latency: float, neo4j_latency: float) -> HybridRetrievalEngine:
+    engine = HybridRetrievalEngine.__new__(HybridRetrievalEngine)
+    engine.vector_service = FakeVectorService()
+    engine.milvus_service = LegacyMilvusService() if legacy else MilvusService()
+    engine.milvus_service.collection = FakeCollection(milvus_latency)
+    engine.milvus_service._initialized = True
+    if legacy:
+        engine.neo4j_service = LegacyNeo4jService(neo4j_latency)
+    else:
+        engine.neo4j_service = EnhancedNeo4jService()
+        engine.neo4j_service.driver = FakeAsyncDriver(neo4j_latency)
+    engine.neo4j_service._initialized = True
+    engine.fusion_ranker = FusionRanker()
+    engine._initialized = True
+    return engine
+
+
+async def measure(engine: HybridRetrievalEngine, concurrency: int, rounds: int) -> Dict[str, float]:
+    """每轮并发发起concurrency个检索，记录每个请求的延迟"""
+    latencies: List[float] = []
+
+    async def one() -> None:
+        started = time.perf_counter()
+        results = await engine.hybrid_retrieve(QUESTION, SCHEMA_CONTEXT, connection_id=1)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if not results:
+            raise AssertionError("hybrid_retrieve returned no results")
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "qps": len(latencies) / wall,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="混合检索延迟基准（重构前后对比）")
+    parser.add_argument("--milvus-ms", type=float, default=20.0, help="替身Milvus检索往返延迟")
+    parser.add_argument("--neo4j-ms", type=float, default=30.0, help="替身Neo4j查询往返延迟")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    milvus_latency, neo4j_latency = args.milvus_ms / 1000, args.neo4j_ms / 1000
+    print(f"{'mode':>7} {'conc':>5} {'p50 ms':>9} {'p99 ms':>9} {'qps':>8}")
+    for concurrency in args.concurrency:
+        for mode in ("before", "after"):
+            engine = build_engine(mode == "before", milvus_latency, neo4j_latency)
+            stats = asyncio.run(measure(engine, concurrency, args.rounds))
+            print(f"{mode:>7} {concurrency:5d} {stats['p50']:9.1f} {stats['p99']:9.1f} {stats['qps']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# 表结构上下文组装微基准
+#
+# 在内存SQLite中生成有N张表的合成元数据（每表8列、约2个外键），
+# 比较旧的线性扫描组装和按ID索引的批量组装在选中部分表和返回全部表两种情况下的耗时与SQL查询数
+#
+# 用法: python -m benchmarks.bench_schema_assembly --tables 100 1000 10000
+
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import crud
+from app.db.base import Base
+from app.models.db_connection import DBConnection
+from app.models.schema_column import SchemaColumn
+from app.models.schema_relationship import SchemaRelationship
+from app.models.schema_table import SchemaTable
+from app.services.schema_cache import SchemaCatalog
+from app.services.text2sql_utils import assemble_schema_context
+
+COLUMNS_PER_TABLE = 8
+FOREIGN_KEYS_PER_TABLE = 2
+SELECTED_TABLES = 20
+# 旧实现在返回全部表时为O(R·(T+C))，超过该表数时跳过
+LEGACY_ALL_TABLES_LIMIT = 1000
+
+
+def build_schema(session, table_count: int, seed: int = 42) -> None:
+    """生成合成表结构元数据"""
+    rng = random.Random(seed)
+    session.execute(insert(DBConnection), [{
+        "id": 1, "name": "bench", "db_type": "sqlite", "host": "", "port": 0,
+        "username": "", "password_encrypted": "", "database_name": "bench",
+    }])
+    tables, columns, relationships = [], [], []
+    for table_id in range(1, table_count + 1):
+        tables.append({"id": table_id, "connection_id": 1, "table_name": f"table_{table_id}",
+                       "description": f"synthetic table {table_id}"})
+        for index in range(COLUMNS_PER_TABLE):
+            columns.append({
+                "id": (table_id - 1) * COLUMNS_PER_TABLE + index + 1, "table_id": table_id,
+                "column_name": "id" if index == 0 else f"col_{index}", "data_type": "INT",
+                "is_primary_key": index == 0, "is_foreign_key": 0 < index <= FOREIGN_KEYS_PER_TABLE,
+            })
+        if table_id > 1:
+            for index in range(1, FOREIGN_KEYS_PER_TABLE + 1):
+                target_id = rng.randint(1, table_id - 1)
+                relationships.append({
+                    "id": len(relationships) + 1, "connection_id": 1,
+                    "source_table_id": table_id,
+                    "source_column_id": (table_id - 1) * COLUMNS_PER_TABLE + index + 1,
+                    "target_table_id": target_id,
+                    "target_column_id": (target_id - 1) * COLUMNS_PER_TABLE + 1,
+                    "relationship_type": "N-to-1",
+                })
+    session.execute(insert(SchemaTable), tables)
+    session.execute(insert(SchemaColumn), columns)
+    if relationships:
+        session.execute(insert(SchemaRelationship), relationships)
+    session.commit()
+
+
+def legacy_assemble_schema_context(db, connection_id: int, tables_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """重构前的组装实现：逐表查询、next()线性扫描、列表去重"""
+    columns_list = []
+    for table in tables_list:
+        for column in crud.schema_column.get_by_table(db=db, table_id=table["id"], limit=None):
+            columns_list.append({"id": column.id, "name": column.column_name, "table_name": table["name"]})
+
+    relationships_list = []
+    table_ids = [t["id"] for t in tables_list]
+    all_tables = crud.schema_table.get_by_connection(db=db, connection_id=connection_id, limit=None)
+    if len(tables_list) == len(all_tables):
+        rels = crud.schema_relationship.get_by_connection(db=db, connection_id=connection_id, limit=None)
+    else:
+        rels = []
+        for table in tables_list:
+            rels += crud.schema_relationship.get_by_source_table(db=db, source_table_id=table["id"])
+            rels += crud.schema_relationship.get_by_target_table(db=db, target_table_id=table["id"])
+    for rel in rels:
+        if rel.source_table_id in table_ids and rel.target_table_id in table_ids:
+            source_table = next((t for t in tables_list if t["id"] == rel.source_table_id), None)
+            target_table = next((t for t in tables_list if t["id"] == rel.target_table_id), None)
+            source_column = next((c for c in columns_list if c["id"] == rel.source_column_id), None)
+            target_column = next((c for c in columns_list if c["id"] == rel.target_column_id), None)
+            if source_table and target_table and source_column and target_column:
+                rel_dict = {
+                    "id": rel.id, "source_table": source_table["name"], "source_column": source_column["name"],
+                    "target_table": target_table["name"], "target_column": target_column["name"],
+                    "relationship_type": rel.relationship_type,
+                }
+                if rel_dict not in relationships_list:
+                    relationships_list.append(rel_dict)
+    return {"tables": tables_list, "columns": columns_list, "relationships": relationships_list}
+
+
+def measure(engine, func, *args) -> Dict[str, Any]:
+    """执行一次并记录耗时、SQL查询数和得到的关系数"""
+    queries = []
+
+    def count(*_):
+        queries.append(1)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        started = time.perf_counter()
+        context = func(*args)
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return {"ms": elapsed * 1000, "queries": len(queries), "relationships": len(context["relationships"])}
+
+
+def run(table_count: int) -> List[Dict[str, Any]]:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    build_schema(session, table_count)
+
+    catalog = SchemaCatalog.load(session, 1)
+    rng = random.Random(table_count)
+    scenarios = {
+        "selected": [dict(t) for t in rng.sample(catalog.tables, min(SELECTED_TABLES, table_count))],
+        "all": [dict(t) for t in catalog.tables],
+    }
+
+    results = []
+    for scenario, tables_list in scenarios.items():
+        cold_catalog = SchemaCatalog(1, catalog.tables)
+        cold = measure(engine, assemble_schema_context, session, cold_catalog, tables_list)
+        warm = measure(engine, assemble_schema_context, session, cold_catalog, tables_list)
+        if scenario == "all" and table_count > LEGACY_ALL_TABLES_LIMIT:
+            legacy = None
+        else:
+            legacy = measure(engine, legacy_assemble_schema_context, session, 1, tables_list)
+        results.append({"tables": table_count, "scenario": scenario, "cold": cold, "warm": warm, "legacy": legacy})
+    session.close()
+    engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="表结构上下文组装微基准")
+    parser.add_argument("--tables", type=int, nargs="+", default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    print(f"{'tables':>7} {'scenario':>9} {'rels':>6} {'cold ms':>9} {'cold q':>7} "
+          f"{'warm ms':>9} {'warm q':>7} {'legacy ms':>10} {'legacy q':>9}")
+    for table_count in args.tables:
+        for row in run(table_count):
+            legacy = row["legacy"]
+            legacy_ms = f"{legacy['ms']:10.1f}" if legacy else f"{'skipped':>10}"
+            legacy_q = f"{legacy['queries']:9d}" if legacy else f"{'-':>9}"
+            if legacy and legacy["relationships"] != row["cold"]["relationships"]:
+                raise AssertionError(f"relationship count mismatch at {table_count} tables ({row['scenario']})")
+            print(f"{row['tables']:7d} {row['scenario']:>9} {row['cold']['relationships']:6d} "
+                  f"{row['cold']['ms']:9.1f} {row['cold']['queries']:7d} "
+                  f"{row['warm']['ms']:9.1f} {row['warm']['queries']:7d} {legacy_ms} {legacy_q}")
+
+
+if __name__ == "__main__":
+    main()
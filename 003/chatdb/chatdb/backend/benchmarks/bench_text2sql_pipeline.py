@@ -0,0 +1,643 @@
+# text2sql流水线端到端基准
+#
+# 通过AgentOrchestrator.process_query驱动完整的智能体运行时：
+# - 生成可配置规模的SQLite数仓（订单主题的核心表加带外键的填充表），
+#   并用discover_schema/save_discovered_schema把表结构写入独立的SQLite元数据库
+# - 用ReplayModelClient回放录制的LLM响应（可配置首字延迟和输出速度）
+# - 表结构图、问答对图、Milvus和向量模型都替换为内存替身（benchmarks/pipeline_standins.py）
+#
+# 对每个阶段（表结构检索、查询分析、SQL生成、SQL解释、SQL执行、可视化）统计
+# 墙钟时间、排队等待（消息发布到处理开始）、各类数据库往返次数、LLM调用与token数和峰值内存，
+# 结果以JSON写出；指定 --baseline 时与上次结果比较，阶段p50超过容差即以非零状态退出。
+# 每个问题的第一次运行前清空进程内缓存（cold），之后的重复运行使用已有缓存（warm）。
+#
+# 用法: python -m benchmarks.bench_text2sql_pipeline --tables 200 --rows 100000 --repeat 3 \
+#           --output results.json --baseline previous.json
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from unittest import mock
+
+from autogen_core import ClosureContext, MessageContext, SingleThreadedAgentRuntime
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.agents import base as agents_base
+from app.agents import factory as agents_factory
+from app.agents import schema_retriever as agents_schema_retriever
+from app.agents.base import BaseAgent, StreamResponseCollector
+from app.agents.types import TopicTypes
+from app.core.config import settings
+from app.db.base import Base
+from app.models.db_connection import DBConnection
+from app.schemas.text2sql import ResponseMessage
+from app.services import agent_orchestrator, hybrid_retrieval_service, schema_service, text2sql_utils
+from app.services.agent_orchestrator import AgentOrchestrator
+from app.services.hybrid_retrieval_service import (
+    EnhancedNeo4jService, FusionRanker, HybridRetrievalEngine, MilvusService, extract_tables_from_sql,
+)
+from app.services.result_cache import query_result_cache
+from app.services.schema_cache import schema_cache
+from app.services.schema_service import discover_schema, load_schema_graph_rows, reflect_catalog, save_discovered_schema
+from app.services.table_index import table_index
+from app.services.value_mapping_engine import value_mapping_engine
+from benchmarks.pipeline_standins import (
+    HashingVectorService, InMemoryCollection, InMemoryGraphDriver, InMemoryQAGraphDriver, Recordings,
+    ReplayModelClient,
+)
+
+CONNECTION_ID = 1
+
+# 智能体类型（即订阅的主题类型）到阶段名，按流水线顺序排列
+STAGES = {
+    TopicTypes.SCHEMA_RETRIEVER.value: "schema_retrieval",
+    TopicTypes.QUERY_ANALYZER.value: "analysis",
+    TopicTypes.SQL_GENERATOR.value: "sql_generation",
+    TopicTypes.SQL_EXPLAINER.value: "explanation",
+    TopicTypes.SQL_EXECUTOR.value: "execution",
+    TopicTypes.VISUALIZATION_RECOMMENDER.value: "visualization",
+}
+ROUND_TRIP_KINDS = ["metadata_db", "warehouse_db", "neo4j", "milvus"]
+
+# 内置问题集：SQL针对generate_warehouse生成的核心表
+QUESTIONS = [
+    {
+        "question": "统计每个城市的客户数量",
+        "entities": ["customers", "city"],
+        "sql": "SELECT city, COUNT(*) AS customer_count\nFROM customers\nGROUP BY city\n"
+               "ORDER BY customer_count DESC",
+        "chart": {"type": "bar", "config": {"title": "各城市客户数量", "xAxis": "city", "yAxis": "customer_count"}},
+    },
+    {
+        "question": "查询销售额最高的10个产品",
+        "entities": ["products", "order_items", "price"],
+        "sql": "SELECT p.name, SUM(oi.quantity * oi.unit_price) AS revenue\nFROM order_items oi\n"
+               "JOIN products p ON p.id = oi.product_id\nGROUP BY p.id, p.name\nORDER BY revenue DESC\nLIMIT 10",
+        "chart": {"type": "bar", "config": {"title": "产品销售额Top10", "xAxis": "name", "yAxis": "revenue"}},
+    },
+    {
+        "question": "每个月的订单数量趋势",
+        "entities": ["orders", "order_date"],
+        "sql": "SELECT strftime('%Y-%m', order_date) AS month, COUNT(*) AS order_count\nFROM orders\n"
+               "GROUP BY month\nORDER BY month",
+        "chart": {"type": "line", "config": {"title": "月度订单趋势", "xAxis": "month", "yAxis": "order_count"}},
+    },
+    {
+        "question": "各产品类别的平均价格",
+        "entities": ["products", "category", "price"],
+        "sql": "SELECT category, AVG(price) AS avg_price\nFROM products\nGROUP BY category\nORDER BY avg_price DESC",
+        "chart": {"type": "bar", "config": {"title": "类别平均价格", "xAxis": "category", "yAxis": "avg_price"}},
+    },
+    {
+        "question": "列出最近20个已完成订单及客户名称",
+        "entities": ["orders", "customers", "status"],
+        "sql": "SELECT o.id, c.name, o.order_date\nFROM orders o\nJOIN customers c ON c.id = o.customer_id\n"
+               "WHERE o.status = 'completed'\nORDER BY o.order_date DESC\nLIMIT 20",
+        "chart": {"type": "table", "config": {}},
+    },
+]
+
+CITIES = ["北京", "上海", "广州", "深圳", "杭州", "成都", "武汉", "西安"]
+CATEGORIES = ["electronics", "books", "clothing", "food", "toys", "sports"]
+STATUSES = ["completed", "pending", "cancelled", "shipped"]
+
+
+# ===== 数仓生成 =====
+
+def generate_warehouse(path: str, tables: int = 50, rows: int = 20000, seed: int = 42) -> Dict[str, int]:
+    """生成SQLite数仓
+
+    核心表customers/products/orders/order_items的行数按rows缩放（order_items为rows行），
+    其余tables-4张填充表各带一个指向前面某张表的外键，用于放大表结构检索的规模
+
+    Returns:
+        Dict[str, int]: 表名到行数
+    """
+    rng = random.Random(seed)
+    counts = {
+        "customers": max(10, rows // 10),
+        "products": max(10, rows // 50),
+        "orders": max(10, rows // 3),
+        "order_items": max(10, rows),
+    }
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript("""
+            CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, city TEXT, created_at TEXT);
+            CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, category TEXT, price REAL);
+            CREATE TABLE orders (
+                id INTEGER PRIMARY KEY, customer_id INTEGER REFERENCES customers(id),
+                order_date TEXT, status TEXT);
+            CREATE TABLE order_items (
+                id INTEGER PRIMARY KEY, order_id INTEGER REFERENCES orders(id),
+                product_id INTEGER REFERENCES products(id), quantity INTEGER, unit_price REAL);
+        """)
+        conn.executemany("INSERT INTO customers VALUES (?, ?, ?, ?)", [
+            (i, f"customer_{i}", rng.choice(CITIES), f"2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+            for i in range(1, counts["customers"] + 1)
+        ])
+        conn.executemany("INSERT INTO products VALUES (?, ?, ?, ?)", [
+            (i, f"product_{i}", rng.choice(CATEGORIES), round(rng.uniform(1, 500), 2))
+            for i in range(1, counts["products"] + 1)
+        ])
+        conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?)", [
+            (i, rng.randint(1, counts["customers"]),
+             f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", rng.choice(STATUSES))
+            for i in range(1, counts["orders"] + 1)
+        ])
+        conn.executemany("INSERT INTO order_items VALUES (?, ?, ?, ?, ?)", [
+            (i, rng.randint(1, counts["orders"]), rng.randint(1, counts["products"]),
+             rng.randint(1, 5), round(rng.uniform(1, 500), 2))
+            for i in range(1, counts["order_items"] + 1)
+        ])
+
+        names = list(counts)
+        filler_rows = max(1, rows // 100)
+        for index in range(max(0, tables - len(names))):
+            name = f"dim_{index}"
+            parent = rng.choice(names)
+            conn.execute(
+                f"CREATE TABLE {name} (id INTEGER PRIMARY KEY, label TEXT, amount REAL, "
+                f"{parent}_id INTEGER REFERENCES {parent}(id))"
+            )
+            conn.executemany(f"INSERT INTO {name} VALUES (?, ?, ?, ?)", [
+                (i, f"{name}_{i}", rng.random(), rng.randint(1, counts[parent]))
+                for i in range(1, filler_rows + 1)
+            ])
+            counts[name] = filler_rows
+            names.append(name)
+        conn.commit()
+    finally:
+        conn.close()
+    return counts
+
+
+def load_metadata(metadata_url: str, warehouse_path: str) -> sessionmaker:
+    """创建元数据库，登记数仓连接，并用表结构发现流程写入表、列和关系"""
+    engine = create_engine(metadata_url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = session_factory()
+    try:
+        connection = DBConnection(
+            id=CONNECTION_ID, name="bench", db_type="sqlite", host="", port=0,
+            username="", password_encrypted="", database_name=warehouse_path,
+        )
+        db.add(connection)
+        db.commit()
+        inspector = reflect_catalog(connection)
+        # 表结构图由内存替身根据元数据库构建，不同步到Neo4j（同步流程会打开SessionLocal指向的MySQL）
+        with mock.patch.object(schema_service, "sync_schema_to_graph_db", lambda *args, **kwargs: True):
+            save_discovered_schema(db, CONNECTION_ID, discover_schema(connection, inspector), inspector)
+    finally:
+        db.close()
+    return session_factory
+
+
+# ===== 录制响应 =====
+
+def default_recordings() -> Recordings:
+    """为内置问题集生成录制响应"""
+    questions = []
+    for item in QUESTIONS:
+        tables = extract_tables_from_sql(item["sql"])
+        analysis = (
+            f"## SQL 命令分析报告\n\n### 1. 查询意图分析\n用户希望{item['question']}。\n\n"
+            f"### 2. 涉及的数据实体\n**主要表：**\n"
+            + "".join(f"- {table} - 提供查询所需的数据\n" for table in tables)
+            + "\n### 3. 表关系与连接\n按外键关联相关表。\n\n"
+            "### 4. 查询条件分析\n**筛选条件：** 见SQL框架\n**分组要求：** 按维度字段分组\n"
+            "**排序要求：** 按指标降序\n\n"
+            f"### 5. SQL结构框架\n```sql\n{item['sql']}\n```\n\n### 6. 潜在问题与建议\n无明显歧义。\n"
+        )
+        explanation = (
+            f"这条SQL用于{item['question']}。\n"
+            + "".join(f"- 从 `{table}` 表读取数据\n" for table in tables)
+            + "- 按需要的维度分组并计算指标，最后排序输出。\n"
+        )
+        questions.append({
+            "question": item["question"],
+            "responses": {
+                "schema_analysis": json.dumps({
+                    "entities": item["entities"], "relationships": [], "query_intent": item["question"],
+                    "likely_aggregations": [], "time_related": False, "comparison_related": False,
+                }, ensure_ascii=False),
+                "analysis": analysis,
+                "sql": f"```sql\n{item['sql']}\n```",
+                "explanation": explanation,
+                "visualization": json.dumps(item["chart"], ensure_ascii=False),
+            },
+        })
+    return Recordings(questions)
+
+
+def seed_qa_pairs(recordings: Recordings, count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """根据录制问题生成问答对语料（带改写的变体），用于语义、结构和模式检索"""
+    rng = random.Random(seed)
+    prefixes = ["", "请", "帮我", "我想知道", "能否"]
+    qa_pairs = []
+    for index in range(count):
+        item = recordings.questions[index % len(recordings.questions)]
+        sql = item["responses"]["sql"].replace("```sql", "").replace("```", "").strip()
+        qa_pairs.append({
+            "id": f"qa_{index}",
+            "question": f"{rng.choice(prefixes)}{item['question']}" if index >= len(recordings.questions)
+            else item["question"],
+            "sql": sql,
+            "connection_id": CONNECTION_ID,
+            "difficulty_level": 2 if "JOIN" in sql.upper() else 1,
+            "query_type": "JOIN" if "JOIN" in sql.upper() else "AGGREGATE",
+            "success_rate": round(rng.uniform(0.5, 1.0), 2),
+            "verified": rng.random() < 0.5,
+            "created_at": "2024-01-01T00:00:00",
+            "used_tables": extract_tables_from_sql(sql),
+        })
+    return qa_pairs
+
+
+# ===== 阶段统计 =====
+
+def _empty_stage() -> Dict[str, Any]:
+    return {
+        "wall_ms": 0.0, "queue_wait_ms": 0.0,
+        "db_round_trips": {kind: 0 for kind in ROUND_TRIP_KINDS},
+        "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "peak_memory_kb": 0.0,
+    }
+
+
+class StageRecorder:
+    """记录一次流水线运行中各阶段的耗时、排队等待、往返次数和峰值内存
+
+    流水线各阶段按消息链依次执行，因此用“当前活动阶段”归属线程池中发生的数据库往返
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.reset()
+
+    def reset(self) -> None:
+        """清空上一次运行的记录（插桩补丁持有同一个记录器，每次运行前原地清空）"""
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.active: Optional[str] = None
+        self._published: Dict[int, float] = {}
+        self._started: Dict[str, float] = {}
+        self._memory_base: Dict[str, int] = {}
+
+    def _stage(self, name: Optional[str]) -> Dict[str, Any]:
+        return self.stages.setdefault(name or "orchestration", _empty_stage())
+
+    def on_publish(self, message: Any) -> None:
+        self._published[id(message)] = time.perf_counter()
+
+    def begin(self, stage: str, message: Any) -> None:
+        now = time.perf_counter()
+        published = self._published.pop(id(message), None)
+        if published is not None:
+            self._stage(stage)["queue_wait_ms"] += (now - published) * 1000
+        self._started[stage] = now
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._memory_base[stage] = tracemalloc.get_traced_memory()[0]
+        self.active = stage
+
+    def end(self, stage: str) -> None:
+        data = self._stage(stage)
+        data["wall_ms"] += (time.perf_counter() - self._started.pop(stage)) * 1000
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1] - self._memory_base.pop(stage, 0)
+            data["peak_memory_kb"] = max(data["peak_memory_kb"], peak / 1024)
+        if self.active == stage:
+            self.active = None
+
+    def count_round_trip(self, kind: str) -> None:
+        self._stage(self.active)["db_round_trips"][kind] += 1
+
+    def count_llm_call(self, llm_stage: str, prompt_tokens: int, completion_tokens: int) -> None:
+        data = self._stage(self.active)
+        data["llm_calls"] += 1
+        data["prompt_tokens"] += prompt_tokens
+        data["completion_tokens"] += completion_tokens
+
+
+# ===== 基准环境 =====
+
+class PipelineBench:
+    """搭建基准环境：数仓、元数据库、替身和插桩补丁"""
+
+    def __init__(self, workdir: str, tables: int, rows: int, recordings: Recordings,
+                 qa_pairs: int = 200, llm_ttft: float = 0.0, llm_tokens_per_second: float = 0.0,
+                 graph_latency: float = 0.0, milvus_latency: float = 0.0,
+                 hybrid: bool = True, trace_memory: bool = True):
+        self.workdir = workdir
+        self.tables = tables
+        self.rows = rows
+        self.recordings = recordings
+        self.qa_pairs = qa_pairs
+        self.llm_ttft = llm_ttft
+        self.llm_tokens_per_second = llm_tokens_per_second
+        self.graph_latency = graph_latency
+        self.milvus_latency = milvus_latency
+        self.hybrid = hybrid
+        self.trace_memory = trace_memory
+        self.recorder = StageRecorder(trace_memory)
+        self.warehouse_counts: Dict[str, int] = {}
+        self._stack = ExitStack()
+
+    def __enter__(self) -> "PipelineBench":
+        warehouse_path = os.path.join(self.workdir, "warehouse.sqlite")
+        self.warehouse_counts = generate_warehouse(warehouse_path, self.tables, self.rows)
+        session_factory = load_metadata(f"sqlite:///{os.path.join(self.workdir, 'metadata.sqlite')}",
+                                        warehouse_path)
+        event.listen(session_factory.kw["bind"], "before_cursor_execute",
+                     lambda *_: self.recorder.count_round_trip("metadata_db"))
+
+        db = session_factory()
+        try:
+            graph_tables, graph_columns, graph_references = load_schema_graph_rows(db, CONNECTION_ID)
+        finally:
+            db.close()
+
+        recorder = self.recorder
+        vector_service = HashingVectorService()
+        model_client = ReplayModelClient(self.recordings, ttft=self.llm_ttft,
+                                         tokens_per_second=self.llm_tokens_per_second,
+                                         on_call=recorder.count_llm_call)
+        graph_driver = InMemoryGraphDriver(graph_tables, graph_columns, graph_references,
+                                           latency=self.graph_latency, on_call=recorder.count_round_trip)
+        hybrid_engine = self._build_hybrid_engine(vector_service)
+
+        stack = self._stack
+        # 设置
+        stack.enter_context(mock.patch.object(settings, "HYBRID_RETRIEVAL_ENABLED", self.hybrid))
+        stack.enter_context(mock.patch.object(settings, "AUTO_LEARNING_ENABLED", False))
+        # 元数据库与替身
+        for module in (agent_orchestrator, agents_schema_retriever):
+            stack.enter_context(mock.patch.object(module, "SessionLocal", session_factory))
+        for module in (agents_factory, agents_base, text2sql_utils):
+            stack.enter_context(mock.patch.object(module, "model_client", model_client))
+        stack.enter_context(mock.patch.object(text2sql_utils, "get_neo4j_driver", lambda: graph_driver))
+        stack.enter_context(mock.patch.object(hybrid_retrieval_service, "_vector_service", vector_service))
+        stack.enter_context(mock.patch.object(hybrid_retrieval_service, "_hybrid_engine", hybrid_engine))
+        stack.enter_context(mock.patch.object(table_index, "_vector_service", vector_service))
+        # 插桩：数仓语句、消息发布和智能体消息处理
+        real_connect = sqlite3.connect
+
+        def traced_connect(*args, **kwargs):
+            conn = real_connect(*args, **kwargs)
+            conn.set_trace_callback(lambda _: recorder.count_round_trip("warehouse_db"))
+            return conn
+
+        stack.enter_context(mock.patch.object(sqlite3, "connect", traced_connect))
+
+        real_publish = SingleThreadedAgentRuntime.publish_message
+
+        async def traced_publish(runtime, message, *args, **kwargs):
+            recorder.on_publish(message)
+            return await real_publish(runtime, message, *args, **kwargs)
+
+        stack.enter_context(mock.patch.object(SingleThreadedAgentRuntime, "publish_message", traced_publish))
+
+        real_on_message_impl = BaseAgent.on_message_impl
+
+        async def traced_on_message_impl(agent, message, ctx):
+            stage = STAGES.get(agent.id.type)
+            if stage is None:
+                return await real_on_message_impl(agent, message, ctx)
+            recorder.begin(stage, message)
+            try:
+                return await real_on_message_impl(agent, message, ctx)
+            finally:
+                recorder.end(stage)
+
+        stack.enter_context(mock.patch.object(BaseAgent, "on_message_impl", traced_on_message_impl))
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            stack.callback(tracemalloc.stop)
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self._stack.close()
+        return False
+
+    def _build_hybrid_engine(self, vector_service: HashingVectorService) -> HybridRetrievalEngine:
+        """用内存替身组装混合检索引擎，并写入问答对语料"""
+        qa_pairs = seed_qa_pairs(self.recordings, self.qa_pairs)
+        collection = InMemoryCollection(latency=self.milvus_latency, on_call=self.recorder.count_round_trip)
+        vectors = vector_service.encode_texts([qa["question"] for qa in qa_pairs])
+        collection.insert([[qa[field] for qa in qa_pairs] for field in InMemoryCollection.FIELDS]
+                          + [list(vectors)])
+
+        engine = HybridRetrievalEngine.__new__(HybridRetrievalEngine)
+        engine.vector_service = vector_service
+        engine.milvus_service = MilvusService()
+        engine.milvus_service.collection = collection
+        engine.milvus_service._initialized = True
+        engine.neo4j_service = EnhancedNeo4jService()
+        engine.neo4j_service.driver = InMemoryQAGraphDriver(
+            qa_pairs, latency=self.graph_latency, on_call=self.recorder.count_round_trip
+        )
+        engine.neo4j_service._initialized = True
+        engine.fusion_ranker = FusionRanker()
+        engine._initialized = True
+        return engine
+
+    @staticmethod
+    def reset_caches() -> None:
+        """清空进程内的表结构、查询分析、值映射、表向量和查询结果缓存"""
+        schema_cache.invalidate(CONNECTION_ID)
+        query_result_cache.invalidate(CONNECTION_ID)
+        value_mapping_engine.invalidate(CONNECTION_ID)
+        table_index.invalidate(CONNECTION_ID)
+        text2sql_utils.query_analysis_cache.clear()
+
+    async def run_question(self, question: str) -> Dict[str, Any]:
+        """运行一次完整流水线，返回各阶段统计和输出摘要"""
+        recorder = self.recorder
+        recorder.reset()
+        outcome: Dict[str, Any] = {"sql": None, "rows": None, "visualization": None, "errors": []}
+
+        # ClosureAgent按类型注解识别消息类型，参数必须带注解
+        async def callback(ctx: ClosureContext, message: ResponseMessage, message_ctx: MessageContext) -> None:
+            result = message.result or {}
+            if "sql" in result:
+                outcome["sql"] = result["sql"]
+            if "results" in result:
+                outcome["rows"] = len(result["results"])
+            if "visualization_type" in result:
+                outcome["visualization"] = result["visualization_type"]
+            if message.content.startswith("错误") or message.content.startswith("处理查询时发生错误"):
+                outcome["errors"].append(message.content)
+
+        collector = StreamResponseCollector()
+        collector.set_callback(callback)
+        started = time.perf_counter()
+        await AgentOrchestrator().process_query(question, collector, connection_id=CONNECTION_ID)
+        return {
+            "question": question,
+            "total_ms": (time.perf_counter() - started) * 1000,
+            **outcome,
+            "stages": {stage: recorder.stages[stage] for stage in list(STAGES.values()) + ["orchestration"]
+                       if stage in recorder.stages},
+        }
+
+
+# ===== 汇总与回归比较 =====
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """按cold/warm分组，汇总每个阶段和总耗时的分位数与均值"""
+    summary: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for phase in ("cold", "warm"):
+        phase_runs = [run for run in runs if run["cold"] == (phase == "cold")]
+        if not phase_runs:
+            continue
+        stages: Dict[str, Dict[str, float]] = {}
+        for stage in list(STAGES.values()) + ["orchestration"]:
+            samples = [run["stages"][stage] for run in phase_runs if stage in run["stages"]]
+            if not samples:
+                continue
+            walls = [sample["wall_ms"] for sample in samples]
+            stages[stage] = {
+                "wall_ms_p50": statistics.median(walls),
+                "wall_ms_p95": _percentile(walls, 0.95),
+                "queue_wait_ms_p50": statistics.median(sample["queue_wait_ms"] for sample in samples),
+                "db_round_trips_mean": statistics.mean(
+                    sum(sample["db_round_trips"].values()) for sample in samples
+                ),
+                "llm_calls_mean": statistics.mean(sample["llm_calls"] for sample in samples),
+                "prompt_tokens_mean": statistics.mean(sample["prompt_tokens"] for sample in samples),
+                "peak_memory_kb_max": max(sample["peak_memory_kb"] for sample in samples),
+            }
+        totals = [run["total_ms"] for run in phase_runs]
+        stages["total"] = {"wall_ms_p50": statistics.median(totals), "wall_ms_p95": _percentile(totals, 0.95)}
+        summary[phase] = stages
+    return summary
+
+
+def compare_with_baseline(summary: Dict[str, Any], baseline: Dict[str, Any],
+                          tolerance: float = 0.2, min_delta_ms: float = 5.0) -> List[str]:
+    """比较两次结果的阶段p50墙钟时间和平均往返次数，返回回归描述列表
+
+    p50增长超过tolerance比例且绝对增量超过min_delta_ms、或平均往返次数增加时视为回归
+    """
+    regressions = []
+    for phase, stages in summary.items():
+        for stage, metrics in stages.items():
+            previous = baseline.get(phase, {}).get(stage)
+            if not previous:
+                continue
+            before, after = previous["wall_ms_p50"], metrics["wall_ms_p50"]
+            if after > before * (1 + tolerance) and after - before > min_delta_ms:
+                regressions.append(f"{phase}/{stage}: p50 {before:.1f}ms -> {after:.1f}ms")
+            if "db_round_trips_mean" in metrics and \
+                    metrics["db_round_trips_mean"] > previous.get("db_round_trips_mean", float("inf")):
+                regressions.append(f"{phase}/{stage}: round trips {previous['db_round_trips_mean']:.1f} -> "
+                                   f"{metrics['db_round_trips_mean']:.1f}")
+    return regressions
+
+
+async def run_benchmark(bench: PipelineBench, questions: List[str], repeat: int) -> List[Dict[str, Any]]:
+    runs = []
+    for question in questions:
+        bench.reset_caches()
+        for iteration in range(repeat):
+            run = await bench.run_question(question)
+            run.update({"iteration": iteration, "cold": iteration == 0})
+            runs.append(run)
+    return runs
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print(f"{'phase':>5} {'stage':>17} {'p50 ms':>9} {'p95 ms':>9} {'queue ms':>9} "
+          f"{'trips':>7} {'llm':>5} {'peak KB':>9}")
+    for phase, stages in summary.items():
+        for stage, metrics in stages.items():
+            print(f"{phase:>5} {stage:>17} {metrics['wall_ms_p50']:9.1f} {metrics['wall_ms_p95']:9.1f} "
+                  f"{metrics.get('queue_wait_ms_p50', 0.0):9.2f} {metrics.get('db_round_trips_mean', 0.0):7.1f} "
+                  f"{metrics.get('llm_calls_mean', 0.0):5.1f} {metrics.get('peak_memory_kb_max', 0.0):9.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="text2sql流水线端到端基准")
+    parser.add_argument("--tables", type=int, default=50, help="数仓表数（含4张核心表）")
+    parser.add_argument("--rows", type=int, default=20000, help="order_items行数，其余表按比例缩放")
+    parser.add_argument("--qa-pairs", type=int, default=200, help="问答对语料规模")
+    parser.add_argument("--repeat", type=int, default=3, help="每个问题的运行次数，第一次为cold")
+    parser.add_argument("--recordings", help="录制响应JSON，默认使用内置问题集")
+    parser.add_argument("--dump-recordings", help="把内置录制响应写入该文件后退出")
+    parser.add_argument("--llm-ttft-ms", type=float, default=200.0, help="LLM首字延迟")
+    parser.add_argument("--llm-tokens-per-s", type=float, default=400.0, help="LLM输出速度，0表示瞬时")
+    parser.add_argument("--graph-ms", type=float, default=2.0, help="替身Neo4j往返延迟")
+    parser.add_argument("--milvus-ms", type=float, default=2.0, help="替身Milvus往返延迟")
+    parser.add_argument("--plain", action="store_true", help="使用不带混合检索的SQL生成智能体")
+    parser.add_argument("--no-memory", action="store_true", help="不用tracemalloc统计峰值内存（减少插桩开销）")
+    parser.add_argument("--output", help="结果JSON路径")
+    parser.add_argument("--baseline", help="上次的结果JSON，出现回归时以状态1退出")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="p50允许的相对增长")
+    args = parser.parse_args()
+
+    if args.dump_recordings:
+        default_recordings().dump(args.dump_recordings)
+        return
+    recordings = Recordings.load(args.recordings) if args.recordings else default_recordings()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with PipelineBench(
+            workdir, args.tables, args.rows, recordings, qa_pairs=args.qa_pairs,
+            llm_ttft=args.llm_ttft_ms / 1000, llm_tokens_per_second=args.llm_tokens_per_s,
+            graph_latency=args.graph_ms / 1000, milvus_latency=args.milvus_ms / 1000,
+            hybrid=not args.plain, trace_memory=not args.no_memory,
+        ) as bench:
+            runs = asyncio.run(run_benchmark(bench, [item["question"] for item in recordings.questions],
+                                             args.repeat))
+            warehouse = {"tables": len(bench.warehouse_counts), "rows": sum(bench.warehouse_counts.values())}
+
+    summary = summarize(runs)
+    print_summary(summary)
+    failed = [run for run in runs if run["errors"] or run["rows"] is None]
+    for run in failed:
+        print(f"run failed: {run['question']} (iteration {run['iteration']}): {run['errors']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {
+                    "created_at": datetime.now().isoformat(),
+                    "python": sys.version.split()[0],
+                    "platform": platform.platform(),
+                    "args": vars(args),
+                    "warehouse": warehouse,
+                },
+                "summary": summary,
+                "runs": runs,
+            }, f, ensure_ascii=False, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_with_baseline(summary, json.load(f)["summary"], args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
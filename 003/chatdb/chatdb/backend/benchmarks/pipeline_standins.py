@@ -0,0 +1,409 @@
+# text2sql流水线基准使用的替身组件
+#
+# - ReplayModelClient: 按提示内容识别阶段和问题，回放录制的LLM响应，可配置首字延迟和输出速度
+# - InMemoryGraphDriver / InMemoryQAGraphDriver: 在内存中回答表结构检索和问答对检索用到的Cypher
+# - InMemoryCollection: 用NumPy暴力检索模拟Milvus集合
+# - HashingVectorService: 基于字符n-gram哈希的确定性向量化服务，不需要下载模型
+#
+# 每个替身都通过on_call回调报告一次往返，便于基准按阶段统计
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from autogen_core.models import ChatCompletionClient, CreateResult, ModelInfo, RequestUsage
+
+from app.services.hybrid_retrieval_service import PATTERN_SEARCH_QUERY, STRUCTURAL_SEARCH_QUERY
+from app.services.text2sql_utils import CONNECTED_TABLES_QUERY, ENTITY_COLUMNS_QUERY
+
+# 按提示中的特征文本识别LLM调用所属的阶段（按顺序匹配）
+PROMPT_MARKERS: List[Tuple[str, str]] = [
+    ("为自然语言查询找到相关表", "table_ranking"),
+    ("确定相关表是否真正与查询相关", "table_filter"),
+    ("帮助分析自然语言查询", "schema_analysis"),
+    ("数据库查询分析专家", "analysis"),
+    ("SQL转换专家", "sql"),
+    ("SQL解释专家", "explanation"),
+    ("数据可视化专家", "visualization"),
+]
+
+# 录制中缺少某阶段响应时使用的默认值
+DEFAULT_RESPONSES = {
+    "table_ranking": "[]",
+    "table_filter": "[]",
+    "schema_analysis": '{"entities": [], "relationships": [], "query_intent": ""}',
+    "visualization": '{"type": "table", "config": {}}',
+}
+
+Callback = Optional[Callable[..., None]]
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数（约4个字符一个token）"""
+    return max(1, len(text) // 4)
+
+
+def message_text(messages: Iterable[Any]) -> str:
+    """拼接LLM消息中的全部文本内容"""
+    parts = []
+    for message in messages:
+        content = getattr(message, "content", "")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(item for item in content if isinstance(item, str))
+    return "\n".join(parts)
+
+
+class Recordings:
+    """按问题组织的录制响应
+
+    格式: {"questions": [{"question": "...", "responses": {"analysis": "...", "sql": "...", ...}}]}
+    """
+
+    def __init__(self, questions: List[Dict[str, Any]]):
+        self.questions = questions
+
+    @classmethod
+    def load(cls, path: str) -> "Recordings":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["questions"])
+
+    def dump(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"questions": self.questions}, f, ensure_ascii=False, indent=2)
+
+    def respond(self, prompt: str) -> Tuple[str, str]:
+        """返回(阶段, 响应文本)"""
+        stage = next((name for marker, name in PROMPT_MARKERS if marker in prompt), "unknown")
+        # 提示词中的相关示例可能包含其他问题，用户问题总在示例之后，取结束位置最靠后的问题；
+        # 结束位置相同时取较长的，避免一个问题是另一个问题的子串时匹配错误
+        matches = [(prompt.rfind(item["question"]) + len(item["question"]), len(item["question"]), index)
+                   for index, item in enumerate(self.questions)
+                   if item["question"] in prompt and stage in item["responses"]]
+        if matches:
+            return stage, self.questions[max(matches)[2]]["responses"][stage]
+        return stage, DEFAULT_RESPONSES.get(stage, "")
+
+
+class ReplayModelClient(ChatCompletionClient):
+    """回放录制响应的模型客户端
+
+    create在首字延迟加输出时间后返回完整响应；create_stream先等待首字延迟，
+    再按输出速度分块产出文本，最后产出CreateResult
+    """
+
+    def __init__(self, recordings: Recordings, ttft: float = 0.0, tokens_per_second: float = 0.0,
+                 chunk_tokens: int = 16, on_call: Callback = None):
+        self.recordings = recordings
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = chunk_tokens
+        self.on_call = on_call
+        self._last_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self._total_usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    def _output_delay(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _prepare(self, messages) -> Tuple[str, RequestUsage]:
+        prompt = message_text(messages)
+        stage, text = self.recordings.respond(prompt)
+        usage = RequestUsage(prompt_tokens=estimate_tokens(prompt), completion_tokens=estimate_tokens(text))
+        self._last_usage = usage
+        self._total_usage = RequestUsage(
+            prompt_tokens=self._total_usage.prompt_tokens + usage.prompt_tokens,
+            completion_tokens=self._total_usage.completion_tokens + usage.completion_tokens,
+        )
+        if self.on_call:
+            self.on_call(stage, usage.prompt_tokens, usage.completion_tokens)
+        return text, usage
+
+    async def create(self, messages, **kwargs) -> CreateResult:
+        text, usage = self._prepare(messages)
+        await asyncio.sleep(self.ttft + self._output_delay(usage.completion_tokens))
+        return CreateResult(finish_reason="stop", content=text, usage=usage, cached=False)
+
+    def create_stream(self, messages, **kwargs):
+        return self._stream(messages)
+
+    async def _stream(self, messages):
+        text, usage = self._prepare(messages)
+        await asyncio.sleep(self.ttft)
+        chunk_chars = self.chunk_tokens * 4
+        for start in range(0, len(text), chunk_chars):
+            chunk = text[start:start + chunk_chars]
+            await asyncio.sleep(self._output_delay(estimate_tokens(chunk)))
+            yield chunk
+        yield CreateResult(finish_reason="stop", content=text, usage=usage, cached=False)
+
+    async def close(self) -> None:
+        pass
+
+    def actual_usage(self) -> RequestUsage:
+        return self._last_usage
+
+    def total_usage(self) -> RequestUsage:
+        return self._total_usage
+
+    def count_tokens(self, messages, **kwargs) -> int:
+        return estimate_tokens(message_text(messages))
+
+    def remaining_tokens(self, messages, **kwargs) -> int:
+        return 128000 - self.count_tokens(messages)
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return {
+            "vision": False,
+            "function_calling": False,
+            "json_output": True,
+            "family": "unknown",
+            "structured_output": False,
+            "multiple_system_messages": True,
+        }
+
+    @property
+    def capabilities(self) -> ModelInfo:
+        return self.model_info
+
+
+# ===== 表结构图替身（同步驱动，供text2sql_utils使用） =====
+
+class GraphRecord:
+    def __init__(self, values: Dict[str, Any]):
+        self._values = values
+
+    def data(self) -> Dict[str, Any]:
+        return dict(self._values)
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+
+class InMemoryGraphSession:
+    def __init__(self, driver: "InMemoryGraphDriver"):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query: str, **params) -> List[GraphRecord]:
+        return [GraphRecord(row) for row in self.driver.execute(query, params)]
+
+
+class InMemoryGraphDriver:
+    """按load_schema_graph_rows的行构建的表结构图，回答实体列和外键相连表查询"""
+
+    def __init__(self, tables: Dict[int, Dict[str, Any]], columns: Dict[int, Dict[str, Any]],
+                 references: Dict[Tuple[int, int], Dict[str, Any]], latency: float = 0.0,
+                 on_call: Callback = None):
+        self.tables = tables
+        self.columns = columns
+        self.references = list(references.values())
+        self.latency = latency
+        self.on_call = on_call
+
+    def session(self, **kwargs) -> InMemoryGraphSession:
+        return InMemoryGraphSession(self)
+
+    def execute(self, query: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if self.on_call:
+            self.on_call("neo4j")
+        if self.latency:
+            time.sleep(self.latency)
+        connection_id = params.get("connection_id")
+        if query == ENTITY_COLUMNS_QUERY:
+            entity = params["entity"]
+            return [
+                {"id": column["id"], "name": column["name"], "type": column["type"],
+                 "description": column["description"], "is_pk": column["is_pk"], "is_fk": column["is_fk"],
+                 "table_id": column["table_id"], "table_name": self.tables[column["table_id"]]["name"]}
+                for column in self.columns.values()
+                if column["connection_id"] == connection_id
+                and (entity in column["name"].lower() or entity in column["description"].lower())
+            ]
+        if query == CONNECTED_TABLES_QUERY:
+            table_ids = set(params["table_ids"])
+            rows = []
+            for reference in self.references:
+                source = self.columns[reference["source_column_id"]]
+                target = self.columns[reference["target_column_id"]]
+                if source["table_id"] in table_ids and target["table_id"] not in table_ids:
+                    table = self.tables[target["table_id"]]
+                    rows.append({
+                        "id": table["id"], "name": table["name"], "description": table["description"],
+                        "source_column_id": source["id"], "source_column_name": source["name"],
+                        "target_column_id": target["id"], "target_column_name": target["name"],
+                        "source_table_id": source["table_id"],
+                    })
+            return rows
+        return []
+
+
+# ===== 问答对图替身（异步驱动，供EnhancedNeo4jService使用） =====
+
+class AsyncGraphResult:
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+
+    async def data(self) -> List[Dict[str, Any]]:
+        return self.rows
+
+    async def consume(self) -> None:
+        pass
+
+
+class AsyncGraphTx:
+    def __init__(self, driver: "InMemoryQAGraphDriver"):
+        self.driver = driver
+
+    async def run(self, query: str, **params) -> AsyncGraphResult:
+        if self.driver.on_call:
+            self.driver.on_call("neo4j")
+        if self.driver.latency:
+            await asyncio.sleep(self.driver.latency)
+        return AsyncGraphResult(self.driver.execute(query, params))
+
+
+class AsyncGraphSession:
+    def __init__(self, driver: "InMemoryQAGraphDriver"):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute_read(self, work):
+        return await work(AsyncGraphTx(self.driver))
+
+    async def execute_write(self, work):
+        return await work(AsyncGraphTx(self.driver))
+
+
+class InMemoryQAGraphDriver:
+    """回答结构检索和模式检索的问答对图，写入语句被忽略"""
+
+    def __init__(self, qa_pairs: List[Dict[str, Any]], latency: float = 0.0, on_call: Callback = None):
+        self.qa_pairs = qa_pairs
+        self.latency = latency
+        self.on_call = on_call
+
+    def session(self, **kwargs) -> AsyncGraphSession:
+        return AsyncGraphSession(self)
+
+    def execute(self, query: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        connection_id = params.get("connection_id")
+        candidates = [qa for qa in self.qa_pairs if qa["connection_id"] == connection_id]
+        if query == STRUCTURAL_SEARCH_QUERY:
+            table_names = set(params["table_names"])
+            rows = []
+            for qa in candidates:
+                used = [name for name in qa["used_tables"] if name in table_names]
+                if used:
+                    rows.append({"qa": qa, "table_overlap": len(used), "used_tables": used})
+            rows.sort(key=lambda row: (row["table_overlap"], row["qa"]["success_rate"]), reverse=True)
+            return rows[:params["top_k"]]
+        if query == PATTERN_SEARCH_QUERY:
+            usage: Dict[Tuple[str, int], int] = {}
+            for qa in self.qa_pairs:
+                key = (qa["query_type"], qa["difficulty_level"])
+                usage[key] = usage.get(key, 0) + 1
+            rows = [
+                {"qa": qa, "usage_count": usage[(qa["query_type"], qa["difficulty_level"])]}
+                for qa in candidates
+                if qa["query_type"] == params["query_type"]
+                and qa["difficulty_level"] <= params["difficulty_level"] + 1
+            ]
+            rows.sort(key=lambda row: (row["qa"]["success_rate"], row["usage_count"]), reverse=True)
+            return rows[:params["top_k"]]
+        return []
+
+
+# ===== Milvus集合替身 =====
+
+class InMemoryHit:
+    def __init__(self, entity: Dict[str, Any], score: float):
+        self.entity = entity
+        self.score = score
+
+
+class InMemoryCollection:
+    """以内积暴力检索模拟Milvus集合，支持connection_id和verified过滤表达式"""
+
+    FIELDS = ["id", "question", "sql", "connection_id", "difficulty_level", "query_type",
+              "success_rate", "verified"]
+
+    def __init__(self, latency: float = 0.0, on_call: Callback = None):
+        self.rows: List[Dict[str, Any]] = []
+        self.vectors: List[np.ndarray] = []
+        self.latency = latency
+        self.on_call = on_call
+
+    def insert(self, data: List[List[Any]]) -> None:
+        for values in zip(*data):
+            self.rows.append(dict(zip(self.FIELDS, values[:-1])))
+            self.vectors.append(np.asarray(values[-1], dtype=np.float32))
+
+    def flush(self) -> None:
+        pass
+
+    def search(self, data, anns_field, param, limit, expr=None, output_fields=None):
+        if self.on_call:
+            self.on_call("milvus")
+        if self.latency:
+            time.sleep(self.latency)
+        connection_match = re.search(r"connection_id == (\d+)", expr or "")
+        verified_only = "verified == true" in (expr or "")
+        candidates = [
+            index for index, row in enumerate(self.rows)
+            if (not connection_match or row["connection_id"] == int(connection_match.group(1)))
+            and (not verified_only or row["verified"])
+        ]
+        if not candidates:
+            return [[]]
+        scores = np.stack([self.vectors[index] for index in candidates]) @ np.asarray(data[0], dtype=np.float32)
+        order = np.argsort(-scores)[:limit]
+        return [[InMemoryHit(self.rows[candidates[i]], float(scores[i])) for i in order]]
+
+
+# ===== 向量化服务替身 =====
+
+class HashingVectorService:
+    """字符n-gram哈希向量，确定性且无需加载模型；接口与VectorService一致"""
+
+    def __init__(self, dimension: int = 256, ngram: int = 2):
+        self.dimension = dimension
+        self.ngram = ngram
+
+    async def initialize(self) -> None:
+        pass
+
+    def _encode(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        text = text.strip().lower()
+        for start in range(max(1, len(text) - self.ngram + 1)):
+            gram = text[start:start + self.ngram]
+            bucket = int.from_bytes(hashlib.md5(gram.encode("utf-8")).digest()[:4], "little")
+            vector[bucket % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        return np.stack([self._encode(text) for text in texts]) if texts else \
+            np.zeros((0, self.dimension), dtype=np.float32)
+
+    async def embed_question(self, question: str) -> List[float]:
+        return self._encode(question).tolist()
+
+    async def batch_embed(self, questions: List[str]) -> List[List[float]]:
+        return self.encode_texts(questions).tolist()
@@ -0,0 +1,431 @@
+# 问答对向量检索的索引调优工具
+#
+# 生成可配置规模的合成问答向量语料（按连接分布不均、按主题聚簇），以NumPy暴力检索结果为基准，
+# 在IVF_FLAT/IVF_SQ8/HNSW及多组nprobe/ef参数下测量recall@k和p50/p99延迟，
+# 并比较“单索引+connection_id过滤”与“connection_id分区键”两种布局。
+#
+# 默认使用进程内的NumPy替身索引（无需Milvus），其延迟只适合做相对比较；
+# 指定 --milvus-uri 时在真实Milvus（或milvus-lite文件）上建集合测量。
+# 满足 --target-recall 且p99最低的配置可用 --write-env 写入 .env 中的 MILVUS_* 配置。
+#
+# 用法: python -m benchmarks.tune_milvus_index --pairs 10000 --connections 50 --dim 128
+#       python -m benchmarks.tune_milvus_index --milvus-uri http://localhost:19530 --write-env .env
+
+import argparse
+import heapq
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_NLISTS = [64, 256]
+DEFAULT_NPROBES = [8, 16, 32, 64]
+DEFAULT_HNSW_M = 16
+DEFAULT_HNSW_EF_CONSTRUCTION = 128
+DEFAULT_EFS = [16, 32, 64, 128]
+
+
+# ===== 合成语料 =====
+
+def generate_corpus(pairs: int, connections: int, dim: int, queries: int, topics: int = 64,
+                    seed: int = 42) -> Dict[str, np.ndarray]:
+    """生成合成问答向量语料和查询
+
+    每个连接的问答数按Zipf分布，向量围绕主题中心聚簇；查询是语料向量加噪声后的近邻问题
+
+    Args:
+        pairs: 问答对总数
+        connections: 连接数
+        dim: 向量维度
+        queries: 查询数
+        topics: 主题（簇）数
+        seed: 随机种子
+
+    Returns:
+        Dict[str, np.ndarray]: vectors、connection_ids、queries、query_connection_ids
+    """
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, connections + 1) ** 0.8
+    connection_ids = rng.choice(np.arange(1, connections + 1), size=pairs, p=weights / weights.sum())
+
+    centers = _normalize(rng.standard_normal((topics, dim)).astype(np.float32))
+    # 每个连接偏好少数几个主题
+    topic_of = (rng.integers(0, topics, size=pairs) + connection_ids * 7) % topics
+    vectors = _normalize(centers[topic_of] + 0.35 * rng.standard_normal((pairs, dim)).astype(np.float32))
+
+    picked = rng.integers(0, pairs, size=queries)
+    query_vectors = _normalize(vectors[picked] + 0.25 * rng.standard_normal((queries, dim)).astype(np.float32))
+    return {
+        "vectors": vectors,
+        "connection_ids": connection_ids.astype(np.int64),
+        "queries": query_vectors,
+        "query_connection_ids": connection_ids[picked].astype(np.int64),
+    }
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def _top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    if len(ids) > k:
+        part = np.argpartition(-scores, k)[:k]
+        ids, scores = ids[part], scores[part]
+    return ids[np.argsort(-scores)]
+
+
+def ground_truth(corpus: Dict[str, np.ndarray], k: int) -> List[np.ndarray]:
+    """NumPy暴力检索：每个查询在其连接的全部问答中按余弦相似度取top-k"""
+    members = _group_by_connection(corpus["connection_ids"])
+    result = []
+    for query, connection_id in zip(corpus["queries"], corpus["query_connection_ids"]):
+        ids = members[connection_id]
+        result.append(_top_k(ids, corpus["vectors"][ids] @ query, k))
+    return result
+
+
+def _group_by_connection(connection_ids: np.ndarray) -> Dict[int, np.ndarray]:
+    order = np.argsort(connection_ids, kind="stable")
+    keys, starts = np.unique(connection_ids[order], return_index=True)
+    return {int(key): ids for key, ids in zip(keys, np.split(order, starts[1:]))}
+
+
+# ===== 进程内替身索引 =====
+
+class IVFIndex:
+    """IVF_FLAT/IVF_SQ8替身：k-means粗量化，SQ8把向量按维度量化为8位后计算近似得分"""
+
+    def __init__(self, vectors: np.ndarray, ids: np.ndarray, connection_ids: np.ndarray,
+                 nlist: int, sq8: bool = False, seed: int = 42):
+        nlist = max(1, min(nlist, len(vectors)))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)]
+        for _ in range(10):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            counts = np.bincount(assign, minlength=nlist)
+            centroids = np.where(counts[:, None] > 0, _normalize(sums + 1e-12), centroids)
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+
+        self.centroids = centroids
+        if sq8:
+            low, high = vectors.min(axis=0), vectors.max(axis=0)
+            scale = np.where(high > low, (high - low) / 255.0, 1.0)
+            codes = np.round((vectors - low) / scale).astype(np.uint8)
+            stored = codes.astype(np.float32) * scale + low
+        else:
+            stored = vectors
+        self.lists = []
+        for list_id in range(nlist):
+            members = np.flatnonzero(assign == list_id)
+            self.lists.append((ids[members], connection_ids[members], stored[members]))
+
+    def search(self, query: np.ndarray, k: int, connection_id: int, nprobe: int) -> np.ndarray:
+        probes = np.argsort(-(self.centroids @ query))[:nprobe]
+        candidate_ids, candidate_scores = [], []
+        for list_id in probes:
+            ids, connections, stored = self.lists[list_id]
+            mask = connections == connection_id
+            if mask.any():
+                candidate_ids.append(ids[mask])
+                candidate_scores.append(stored[mask] @ query)
+        if not candidate_ids:
+            return np.empty(0, dtype=np.int64)
+        return _top_k(np.concatenate(candidate_ids), np.concatenate(candidate_scores), k)
+
+
+class HNSWIndex:
+    """HNSW替身：只构建HNSW的第0层（可导航小世界图），过滤条件不影响遍历，只决定能否进入结果"""
+
+    def __init__(self, vectors: np.ndarray, ids: np.ndarray, connection_ids: np.ndarray,
+                 m: int, ef_construction: int):
+        self.vectors = vectors
+        self.ids = ids
+        self.connection_ids = connection_ids
+        self.max_degree = 2 * m
+        self.neighbors: List[np.ndarray] = [np.empty(0, dtype=np.int64) for _ in range(len(vectors))]
+        for node in range(1, len(vectors)):
+            found = self._beam_search(vectors[node], ef_construction, limit=node)
+            linked = np.array([n for _, n in found[:m]], dtype=np.int64)
+            self.neighbors[node] = linked
+            for other in linked:
+                self._link(other, node)
+
+    def _link(self, node: int, new: int) -> None:
+        neighbors = np.append(self.neighbors[node], new)
+        if len(neighbors) > self.max_degree:
+            scores = self.vectors[neighbors] @ self.vectors[node]
+            neighbors = neighbors[np.argsort(-scores)[:self.max_degree]]
+        self.neighbors[node] = neighbors
+
+    def _beam_search(self, query: np.ndarray, ef: int, limit: Optional[int] = None) -> List[Tuple[float, int]]:
+        entry = 0
+        visited = {entry}
+        score = float(self.vectors[entry] @ query)
+        candidates = [(-score, entry)]
+        best = [(score, entry)]
+        while candidates:
+            negative, node = heapq.heappop(candidates)
+            if len(best) >= ef and -negative < best[0][0]:
+                break
+            neighbors = [n for n in self.neighbors[node].tolist()
+                         if n not in visited and (limit is None or n < limit)]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            for neighbor, neighbor_score in zip(neighbors, (self.vectors[neighbors] @ query).tolist()):
+                if len(best) < ef or neighbor_score > best[0][0]:
+                    heapq.heappush(candidates, (-neighbor_score, neighbor))
+                    heapq.heappush(best, (neighbor_score, neighbor))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+        return sorted(best, reverse=True)
+
+    def search(self, query: np.ndarray, k: int, connection_id: int, ef: int) -> np.ndarray:
+        found = self._beam_search(query, max(ef, k))
+        hits = [node for _, node in found if self.connection_ids[node] == connection_id]
+        return self.ids[hits[:k]]
+
+
+class LocalBackend:
+    """进程内替身后端，分区键布局按connection_id哈希到分区后每个分区单独建索引"""
+
+    name = "local"
+
+    def __init__(self, corpus: Dict[str, np.ndarray]):
+        self.corpus = corpus
+
+    def build(self, index_type: str, build_params: Dict[str, Any], partition_key: bool,
+              num_partitions: int) -> Dict[int, Any]:
+        vectors, connection_ids = self.corpus["vectors"], self.corpus["connection_ids"]
+        keys = connection_ids % num_partitions if partition_key else np.zeros(len(vectors), dtype=np.int64)
+        indexes = {}
+        for key, members in _group_by_connection(keys).items():
+            args = (vectors[members], members, connection_ids[members])
+            if index_type == "HNSW":
+                indexes[key] = HNSWIndex(*args, m=build_params["M"], ef_construction=build_params["efConstruction"])
+            else:
+                indexes[key] = IVFIndex(*args, nlist=build_params["nlist"], sq8=index_type == "IVF_SQ8")
+        return indexes
+
+    def search(self, indexes: Dict[int, Any], query: np.ndarray, connection_id: int, k: int,
+               search_params: Dict[str, Any], partition_key: bool, num_partitions: int) -> np.ndarray:
+        index = indexes.get(connection_id % num_partitions if partition_key else 0)
+        if index is None:
+            return np.empty(0, dtype=np.int64)
+        return index.search(query, k, connection_id, **search_params)
+
+    def drop(self, indexes: Dict[int, Any]) -> None:
+        indexes.clear()
+
+
+class MilvusBackend:
+    """真实Milvus后端，每种索引配置建一个临时集合，测完删除"""
+
+    name = "milvus"
+
+    def __init__(self, corpus: Dict[str, np.ndarray], uri: str):
+        from pymilvus import connections
+
+        self.corpus = corpus
+        self.alias = f"tune-{uuid.uuid4().hex[:8]}"
+        connections.connect(self.alias, uri=uri)
+
+    def build(self, index_type: str, build_params: Dict[str, Any], partition_key: bool,
+              num_partitions: int):
+        from pymilvus import Collection
+
+        from app.services.hybrid_retrieval_service import MilvusService
+
+        vectors, connection_ids = self.corpus["vectors"], self.corpus["connection_ids"]
+        schema = MilvusService.build_schema(vectors.shape[1], partition_key=partition_key)
+        kwargs = {"num_partitions": num_partitions} if partition_key else {}
+        collection = Collection(f"qa_tune_{uuid.uuid4().hex[:8]}", schema, using=self.alias, **kwargs)
+        try:
+            for start in range(0, len(vectors), 5000):
+                end = min(start + 5000, len(vectors))
+                count = end - start
+                collection.insert([
+                    [str(i) for i in range(start, end)], [""] * count, [""] * count,
+                    connection_ids[start:end].tolist(), [1] * count, ["SELECT"] * count,
+                    [1.0] * count, [True] * count, vectors[start:end].tolist(),
+                ])
+            collection.flush()
+            collection.create_index("embedding", {
+                "metric_type": "COSINE", "index_type": index_type, "params": build_params,
+            })
+            collection.load()
+        except Exception:
+            collection.drop()
+            raise
+        return collection
+
+    def search(self, collection, query: np.ndarray, connection_id: int, k: int,
+               search_params: Dict[str, Any], partition_key: bool, num_partitions: int) -> np.ndarray:
+        results = collection.search(
+            data=[query.tolist()], anns_field="embedding",
+            param={"metric_type": "COSINE", "params": search_params},
+            limit=k, expr=f"connection_id == {int(connection_id)}",
+        )
+        return np.array([int(hit.id) for hit in results[0]], dtype=np.int64)
+
+    def drop(self, collection) -> None:
+        collection.drop()
+
+
+# ===== 调优 =====
+
+def parameter_grid(nlists: List[int], nprobes: List[int], hnsw_m: int, ef_construction: int,
+                   efs: List[int], index_types: List[str]) -> List[Tuple[str, Dict[str, Any], List[Dict[str, Any]]]]:
+    """生成 (索引类型, 建索引参数, 检索参数列表) 网格"""
+    grid = []
+    for index_type in index_types:
+        if index_type == "HNSW":
+            grid.append((index_type, {"M": hnsw_m, "efConstruction": ef_construction},
+                         [{"ef": ef} for ef in efs]))
+        else:
+            for nlist in nlists:
+                grid.append((index_type, {"nlist": nlist},
+                             [{"nprobe": nprobe} for nprobe in nprobes if nprobe <= nlist]))
+    return grid
+
+
+def measure(backend, corpus: Dict[str, np.ndarray], truth: List[np.ndarray], k: int,
+            grid, layouts: List[bool], num_partitions: int) -> List[Dict[str, Any]]:
+    """对每个布局和参数组合测量recall@k和延迟"""
+    results = []
+    for partition_key in layouts:
+        for index_type, build_params, search_grid in grid:
+            started = time.perf_counter()
+            try:
+                handle = backend.build(index_type, build_params, partition_key, num_partitions)
+            except Exception as e:
+                print(f"  跳过 {index_type} {build_params}: {e}")
+                continue
+            build_seconds = time.perf_counter() - started
+            try:
+                for search_params in search_grid:
+                    latencies, recalls = [], []
+                    for query, connection_id, expected in zip(
+                            corpus["queries"], corpus["query_connection_ids"], truth):
+                        started = time.perf_counter()
+                        found = backend.search(handle, query, int(connection_id), k, search_params,
+                                               partition_key, num_partitions)
+                        latencies.append(time.perf_counter() - started)
+                        if len(expected):
+                            recalls.append(len(np.intersect1d(found, expected)) / len(expected))
+                    results.append({
+                        "layout": "partition_key" if partition_key else "filter",
+                        "index_type": index_type,
+                        "index_params": build_params,
+                        "search_params": search_params,
+                        "recall": float(np.mean(recalls)),
+                        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+                        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+                        "build_s": build_seconds,
+                    })
+                    row = results[-1]
+                    print(f"  {row['layout']:<13} {index_type:<8} {json.dumps(build_params):<32} "
+                          f"{json.dumps(search_params):<16} recall@{k}={row['recall']:.3f} "
+                          f"p50={row['p50_ms']:.2f}ms p99={row['p99_ms']:.2f}ms build={build_seconds:.1f}s")
+            finally:
+                backend.drop(handle)
+    return results
+
+
+def choose_config(results: List[Dict[str, Any]], target_recall: float) -> Optional[Dict[str, Any]]:
+    """选择满足目标召回率且p99最低的配置；都不满足时选召回率最高的"""
+    if not results:
+        return None
+    qualified = [row for row in results if row["recall"] >= target_recall]
+    if qualified:
+        return min(qualified, key=lambda row: (row["p99_ms"], -row["recall"]))
+    return max(results, key=lambda row: (row["recall"], -row["p99_ms"]))
+
+
+def settings_for(config: Dict[str, Any]) -> Dict[str, str]:
+    """将选中的配置转换为 MILVUS_* 配置项"""
+    return {
+        "MILVUS_PARTITION_KEY_ENABLED": "true" if config["layout"] == "partition_key" else "false",
+        "MILVUS_INDEX_TYPE": config["index_type"],
+        "MILVUS_INDEX_PARAMS": json.dumps(config["index_params"]),
+        "MILVUS_SEARCH_PARAMS": json.dumps(config["search_params"]),
+    }
+
+
+def update_env_file(path: str, values: Dict[str, str]) -> None:
+    """在.env文件中原地更新配置项，不存在的追加到末尾，其余内容保持不变"""
+    lines = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    remaining = dict(values)
+    for i, line in enumerate(lines):
+        key = line.split("=", 1)[0].strip()
+        if key in remaining and not line.lstrip().startswith("#"):
+            lines[i] = f"{key}='{remaining.pop(key)}'"
+    if remaining:
+        if lines:
+            lines.append("")
+        lines.append("# ===== Milvus索引调优结果 =====")
+        lines.extend(f"{key}='{value}'" for key, value in remaining.items())
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="问答对向量检索的索引调优工具")
+    parser.add_argument("--pairs", type=int, default=10000)
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--index-types", nargs="+", default=["IVF_FLAT", "IVF_SQ8", "HNSW"])
+    parser.add_argument("--nlist", type=int, nargs="+", default=DEFAULT_NLISTS)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=DEFAULT_NPROBES)
+    parser.add_argument("--hnsw-m", type=int, default=DEFAULT_HNSW_M)
+    parser.add_argument("--ef-construction", type=int, default=DEFAULT_HNSW_EF_CONSTRUCTION)
+    parser.add_argument("--ef", type=int, nargs="+", default=DEFAULT_EFS)
+    parser.add_argument("--layouts", nargs="+", choices=["filter", "partition_key"],
+                        default=["filter", "partition_key"])
+    parser.add_argument("--num-partitions", type=int, default=None,
+                        help="分区键布局的分区数，默认取配置 MILVUS_NUM_PARTITIONS")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--milvus-uri", default=None, help="Milvus地址或milvus-lite文件，不指定时使用进程内替身")
+    parser.add_argument("--write-env", default=None, help="将选中的参数写入该.env文件")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.num_partitions is None:
+        from app.core.config import settings
+        args.num_partitions = settings.MILVUS_NUM_PARTITIONS
+
+    print(f"生成语料: {args.pairs} 个问答对, {args.connections} 个连接, 维度 {args.dim}, {args.queries} 个查询")
+    corpus = generate_corpus(args.pairs, args.connections, args.dim, args.queries, seed=args.seed)
+    truth = ground_truth(corpus, args.k)
+
+    backend = MilvusBackend(corpus, args.milvus_uri) if args.milvus_uri else LocalBackend(corpus)
+    grid = parameter_grid(args.nlist, args.nprobe, args.hnsw_m, args.ef_construction, args.ef, args.index_types)
+    layouts = [layout == "partition_key" for layout in args.layouts]
+    print(f"后端: {backend.name}")
+    results = measure(backend, corpus, truth, args.k, grid, layouts, args.num_partitions)
+
+    chosen = choose_config(results, args.target_recall)
+    if chosen is None:
+        print("没有可用的测量结果")
+        return
+    values = settings_for(chosen)
+    print(f"\n选中配置 (recall@{args.k}={chosen['recall']:.3f}, p99={chosen['p99_ms']:.2f}ms):")
+    for key, value in values.items():
+        print(f"  {key}={value}")
+    if args.write_env:
+        update_env_file(args.write_env, values)
+        print(f"已写入 {args.write_env}")
+
+
+if __name__ == "__main__":
+    main()
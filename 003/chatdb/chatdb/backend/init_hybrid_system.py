@@ -45,11 +45,11 @@ async def init_hybrid_system():
     finally:
         # 清理资源
         if 'hybrid_engine' in locals():
-            hybrid_engine.close()
+            await hybrid_engine.close()
 
 async def create_neo4j_indexes(neo4j_service: EnhancedNeo4jService):
     """创建Neo4j索引和约束"""
-    with neo4j_service.driver.session() as session:
+    async with neo4j_service.driver.session() as session:
         try:
             # 创建唯一约束
             constraints = [
@@ -60,7 +60,7 @@ async def create_neo4j_indexes(neo4j_service: EnhancedNeo4jService):
             
             for constraint in constraints:
                 try:
-                    session.run(constraint)
+                    await (await session.run(constraint)).consume()
                     logger.info(f"创建约束成功: {constraint}")
                 except Exception as e:
                     logger.warning(f"约束可能已存在: {str(e)}")
@@ -77,7 +77,7 @@ async def create_neo4j_indexes(neo4j_service: EnhancedNeo4jService):
             
             for index in indexes:
                 try:
-                    session.run(index)
+                    await (await session.run(index)).consume()
                     logger.info(f"创建索引成功: {index}")
                 except Exception as e:
                     logger.warning(f"索引可能已存在: {str(e)}")
@@ -211,9 +211,9 @@ async def health_check(hybrid_engine: HybridRetrievalEngine):
         logger.info(f"✅ Milvus服务正常，返回结果数: {len(test_results)}")
         
         # 测试Neo4j连接
-        with hybrid_engine.neo4j_service.driver.session() as session:
-            result = session.run("MATCH (qa:QAPair) RETURN count(qa) as count")
-            count = result.single()["count"]
+        async with hybrid_engine.neo4j_service.driver.session() as session:
+            result = await session.run("MATCH (qa:QAPair) RETURN count(qa) as count")
+            count = (await result.single())["count"]
             logger.info(f"✅ Neo4j服务正常，问答对数量: {count}")
         
         # 测试混合检索
@@ -246,10 +246,10 @@ async def cleanup_system():
         await milvus_service.initialize(vector_service.dimension)
         
         # 清理Neo4j数据
-        with neo4j_service.driver.session() as session:
-            session.run("MATCH (qa:QAPair) DETACH DELETE qa")
-            session.run("MATCH (p:QueryPattern) DETACH DELETE p")
-            session.run("MATCH (e:Entity) DETACH DELETE e")
+        async with neo4j_service.driver.session() as session:
+            await (await session.run("MATCH (qa:QAPair) DETACH DELETE qa")).consume()
+            await (await session.run("MATCH (p:QueryPattern) DETACH DELETE p")).consume()
+            await (await session.run("MATCH (e:Entity) DETACH DELETE e")).consume()
             logger.info("✅ Neo4j数据清理完成")
         
         # 清理Milvus数据
@@ -264,7 +264,7 @@ async def cleanup_system():
         raise
     finally:
         if 'neo4j_service' in locals():
-            neo4j_service.close()
+            await neo4j_service.close()
 
 if __name__ == "__main__":
     import sys
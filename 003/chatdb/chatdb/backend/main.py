@@ -1,15 +1,18 @@
+import asyncio
 import uvicorn
 import logging
 import sys
 import os
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 # 添加当前目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app.api.api_v1.api import api_router
 from app.core.config import settings
+from app.core.tracing import pipeline_tracer
 
 # 注释掉过度的日志过滤，保持正常日志显示
 # 这样我们可以看到完整的连接信息来诊断问题
@@ -32,6 +35,39 @@ app.add_middleware(
 # Include API router
 app.include_router(api_router, prefix="/api")
 
+
+@app.on_event("startup")
+async def warm_up_embedding_model():
+    """在后台线程中预加载向量模型，避免首个请求等待模型加载"""
+    if not (settings.HYBRID_RETRIEVAL_ENABLED or settings.TABLE_INDEX_ENABLED):
+        return
+
+    async def load():
+        try:
+            from app.services.hybrid_retrieval_service import get_vector_service
+            await get_vector_service().initialize()
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"向量模型预加载失败: {str(e)}")
+
+    app.state.embedding_warmup = asyncio.create_task(load())
+
+
+@app.on_event("shutdown")
+async def close_shared_drivers():
+    """关闭进程内共享的Neo4j驱动、查询执行线程池和SSE会话存储"""
+    from app.db.neo4j_session import close_async_neo4j_driver, close_neo4j_driver
+    close_neo4j_driver()
+    await close_async_neo4j_driver()
+    from app.services.query_executor import query_executor
+    query_executor.shutdown()
+    from app.services.sse_session_store import sse_session_store
+    sse_session_store.close()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """以Prometheus文本格式导出各阶段耗时直方图、LLM token数和查询返回行数"""
+    return PlainTextResponse(pipeline_tracer.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # 添加对前端开发服务器请求的处理，避免404日志
 @app.get("/__webpack_hmr")
 async def webpack_hmr():
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.api.api_v1.endpoints import text2sql_sse
+from app.services.answer_cache import SemanticAnswerCache
+from app.services.hybrid_retrieval_service import HybridRetrievalEngine
+
+
+def candidate(score, verified=True, sql="SELECT 1", qa_id="qa_1"):
+    return {"id": qa_id, "question": "上月销售额", "sql": sql, "connection_id": 1, "difficulty_level": 1,
+            "query_type": "SELECT", "success_rate": 0.0, "verified": verified, "similarity_score": score}
+
+
+class FakeVectorService:
+    async def embed_question(self, question):
+        return [0.1, 0.2]
+
+
+class FakeMilvusService:
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    async def search_similar(self, query_vector, top_k=5, connection_id=None, verified_only=False):
+        self.calls.append((connection_id, verified_only))
+        return self.results
+
+
+def make_engine(results):
+    engine = HybridRetrievalEngine.__new__(HybridRetrievalEngine)
+    engine.vector_service = FakeVectorService()
+    engine.milvus_service = FakeMilvusService(results)
+    engine._initialized = True
+    return engine
+
+
+class TestFindVerifiedAnswer(unittest.TestCase):
+    def test_returns_best_verified_pair_above_threshold(self):
+        engine = make_engine([candidate(0.99, verified=False, qa_id="qa_0"), candidate(0.97), candidate(0.96)])
+        found = asyncio.run(engine.find_verified_answer("上个月的销售额", 1, threshold=0.95))
+        self.assertEqual(found["id"], "qa_1")
+        self.assertEqual(engine.milvus_service.calls, [(1, True)])
+
+    def test_below_threshold_is_a_miss(self):
+        engine = make_engine([candidate(0.90)])
+        self.assertIsNone(asyncio.run(engine.find_verified_answer("q", 1, threshold=0.95)))
+
+
+class TestSemanticAnswerCache(unittest.TestCase):
+    def test_warms_up_in_background_then_hits(self):
+        engine = make_engine([candidate(0.98)])
+
+        async def run():
+            cache = SemanticAnswerCache(engine_getter=AsyncMock(return_value=engine), timeout=1)
+            first = await cache.lookup("q", 1)
+            await asyncio.sleep(0)
+            second = await cache.lookup("q", 1)
+            bypassed = await cache.lookup("q", 1, bypass=True)
+            return cache, first, second, bypassed
+
+        cache, first, second, bypassed = asyncio.run(run())
+        self.assertIsNone(first)
+        self.assertEqual(second, {"qa_id": "qa_1", "question": "上月销售额", "sql": "SELECT 1", "similarity": 0.98})
+        self.assertIsNone(bypassed)
+        self.assertEqual((cache.stats["warming"], cache.stats["hits"], cache.stats["bypassed"]), (1, 1, 1))
+
+    def test_slow_lookup_counts_as_miss(self):
+        engine = make_engine([])
+
+        async def slow(*args):
+            await asyncio.sleep(1)
+
+        engine.find_verified_answer = slow
+        cache = SemanticAnswerCache(timeout=0.01)
+        cache._engine = engine
+        self.assertIsNone(asyncio.run(cache.lookup("q", 1)))
+        self.assertEqual(cache.stats["errors"], 1)
+
+
+class TestProcessQueryShortCircuit(unittest.TestCase):
+    def test_cache_hit_skips_upstream_stages(self):
+        hit = {"qa_id": "qa_1", "question": "上月销售额", "sql": "SELECT 1", "similarity": 0.98}
+        store = text2sql_sse.sse_session_store
+
+        async def run():
+            await store.create("s-cache", {"status": "initializing"})
+            with patch.object(text2sql_sse.answer_cache, "lookup", AsyncMock(return_value=hit)) as lookup, \
+                    patch.object(text2sql_sse.AgentOrchestrator, "process_query",
+                                 AsyncMock(return_value=None)) as process:
+                await text2sql_sse.process_query_task("上个月的销售额", "s-cache", 1)
+            events = []
+            async for event in store.events("s-cache", 0, timeout=0.01):
+                if event is None:
+                    break
+                events.append(json.loads(event[2]))
+            await store.remove("s-cache")
+            return lookup, process, events
+
+        lookup, process, events = asyncio.run(run())
+        lookup.assert_awaited_once_with("上个月的销售额", 1, bypass=False)
+        self.assertEqual(process.await_args.kwargs["cached_answer"], hit)
+        types = [event["type"] for event in events]
+        self.assertIn("cache_hit", types)
+        skipped = {event["region"] for event in events if event["type"] == "stage_skipped"}
+        self.assertEqual(skipped, {"analysis", "sql", "explanation"})
+        sql_results = [event for event in events if event["type"] == "result" and event["region"] == "sql"]
+        self.assertEqual(sql_results[0]["content"], "SELECT 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
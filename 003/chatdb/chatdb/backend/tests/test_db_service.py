@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from app.services import db_service
+from app.services.db_service import EngineRegistry, execute_query, engine_registry, invalidate_db_engine
+
+
+def make_connection(connection_id, database_name, password="secret"):
+    return SimpleNamespace(
+        id=connection_id,
+        name=f"conn-{connection_id}",
+        db_type="sqlite",
+        host="",
+        port=0,
+        username="",
+        password_encrypted=password,
+        database_name=database_name,
+    )
+
+
+class TestEngineRegistry(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        self.registry = EngineRegistry()
+
+    def tearDown(self):
+        self.registry.dispose_all()
+        os.remove(self.db_path)
+
+    def test_engine_is_reused_for_same_connection(self):
+        connection = make_connection(1, self.db_path)
+        first = self.registry.get(connection)
+        second = self.registry.get(connection)
+        self.assertIs(first, second)
+        self.assertEqual(len(self.registry), 1)
+
+    def test_changed_credentials_replace_engine(self):
+        first = self.registry.get(make_connection(1, self.db_path, password="old"))
+        second = self.registry.get(make_connection(1, self.db_path, password="new"))
+        self.assertIsNot(first, second)
+        self.assertEqual(len(self.registry), 1)
+
+    def test_invalidate_drops_engine(self):
+        connection = make_connection(1, self.db_path)
+        first = self.registry.get(connection)
+        self.assertTrue(self.registry.invalidate(1))
+        self.assertFalse(self.registry.invalidate(1))
+        self.assertIsNot(first, self.registry.get(connection))
+
+    def test_unsaved_connection_engine_is_disposed_after_use(self):
+        connection = make_connection(None, self.db_path)
+        created = []
+
+        def create_engine(*args):
+            engine = mock.MagicMock(wraps=original(*args))
+            created.append(engine)
+            return engine
+
+        original = db_service._create_db_engine
+        with mock.patch.object(db_service, "_create_db_engine", create_engine):
+            self.assertTrue(db_service.test_db_connection(connection))
+            self.assertEqual(execute_query(connection, "SELECT 1 AS one"), [{"one": 1}])
+
+        self.assertEqual(len(engine_registry), 0)
+        self.assertEqual(len(created), 2)
+        for engine in created:
+            engine.dispose.assert_called_once()
+
+    def test_unsaved_connection_is_not_cached(self):
+        connection = make_connection(None, self.db_path)
+        first = self.registry.get(connection)
+        second = self.registry.get(connection)
+        self.assertIsNot(first, second)
+        self.assertEqual(len(self.registry), 0)
+        first.dispose()
+        second.dispose()
+
+    def test_execute_query_uses_global_registry(self):
+        connection = make_connection(987654, self.db_path)
+        try:
+            self.assertEqual(execute_query(connection, "SELECT 1 AS one"), [{"one": 1}])
+            engine = engine_registry.get(connection)
+            self.assertEqual(execute_query(connection, "SELECT 2 AS two"), [{"two": 2}])
+            self.assertIs(engine, engine_registry.get(connection))
+        finally:
+            invalidate_db_engine(987654)
+
+
+if __name__ == "__main__":
+    unittest.main()
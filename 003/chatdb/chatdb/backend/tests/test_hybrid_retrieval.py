@@ -0,0 +1,111 @@
+import asyncio
+import time
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from app.db import neo4j_session
+from benchmarks.bench_hybrid_retrieval import QUESTION, SCHEMA_CONTEXT, build_engine
+
+
+def retrieve(engine):
+    started = time.perf_counter()
+    results = asyncio.run(engine.hybrid_retrieve(QUESTION, SCHEMA_CONTEXT, connection_id=1))
+    return results, time.perf_counter() - started
+
+
+class TestHybridRetrieval(unittest.TestCase):
+    def test_semantic_structural_and_pattern_search_overlap(self):
+        results, elapsed = retrieve(build_engine(False, milvus_latency=0.1, neo4j_latency=0.1))
+
+        self.assertEqual(len(results), 5)
+        # 三路检索各需约100ms，串行至少300ms
+        self.assertLess(elapsed, 0.25)
+
+    def test_blocking_drivers_serialize_retrieval(self):
+        _, elapsed = retrieve(build_engine(True, milvus_latency=0.1, neo4j_latency=0.1))
+
+        self.assertGreaterEqual(elapsed, 0.3)
+
+    def test_slow_graph_query_times_out_without_blocking_semantic_results(self):
+        engine = build_engine(False, milvus_latency=0.01, neo4j_latency=2.0)
+        engine.neo4j_service.query_timeout = 0.05
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(engine.neo4j_service.structural_search(SCHEMA_CONTEXT, 1))
+        results, elapsed = retrieve(engine)
+
+        self.assertLess(elapsed, 0.5)
+        self.assertTrue(results)
+        self.assertTrue(all(result.structural_score == 0 for result in results))
+
+    def test_pattern_search_reads_usage_count_and_created_at(self):
+        engine = build_engine(False, milvus_latency=0, neo4j_latency=0)
+
+        results = asyncio.run(engine.neo4j_service.pattern_search("AGGREGATE", 2, 1, top_k=3))
+
+        self.assertEqual(len(results), 3)
+        self.assertAlmostEqual(results[0].pattern_score, 0.1)
+        self.assertEqual(results[0].qa_pair.created_at, datetime(2024, 1, 1))
+
+
+
+class FakeAsyncResult:
+    async def consume(self):
+        pass
+
+
+class FakeAsyncSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def run(self, statement):
+        self.driver.statements.append(statement)
+        return FakeAsyncResult()
+
+
+class FakeAsyncDriver:
+    def __init__(self):
+        self.statements = []
+        self.closed = False
+
+    def session(self):
+        return FakeAsyncSession(self)
+
+    async def close(self):
+        self.closed = True
+
+
+class TestAsyncNeo4jDriver(unittest.TestCase):
+    def test_schema_is_created_again_on_the_driver_opened_after_close(self):
+        drivers = []
+
+        def driver(*args, **kwargs):
+            drivers.append(FakeAsyncDriver())
+            return drivers[-1]
+
+        async def run():
+            await neo4j_session.ensure_neo4j_schema_async()
+            await neo4j_session.close_async_neo4j_driver()
+            await neo4j_session.ensure_neo4j_schema_async()
+            await neo4j_session.close_async_neo4j_driver()
+
+        with mock.patch.object(neo4j_session.AsyncGraphDatabase, "driver", driver), \
+                mock.patch.object(neo4j_session, "_async_driver", None), \
+                mock.patch.object(neo4j_session, "_schema_ready", False):
+            asyncio.run(run())
+
+        self.assertEqual(len(drivers), 2)
+        for fake in drivers:
+            self.assertEqual(fake.statements, neo4j_session.SCHEMA_STATEMENTS)
+            self.assertTrue(fake.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from app.services.hybrid_retrieval_service import MilvusService
+from benchmarks.tune_milvus_index import (
+    LocalBackend, choose_config, generate_corpus, ground_truth, measure, parameter_grid, update_env_file,
+)
+
+
+class TestMilvusSchema(unittest.TestCase):
+    def test_connection_id_is_partition_key(self):
+        self.assertEqual(MilvusService.build_schema(8, partition_key=True).partition_key_field.name,
+                         "connection_id")
+        self.assertIsNone(MilvusService.build_schema(8, partition_key=False).partition_key_field)
+
+
+class TestIndexTuning(unittest.TestCase):
+    def setUp(self):
+        self.corpus = generate_corpus(pairs=600, connections=5, dim=16, queries=20, topics=8)
+        self.truth = ground_truth(self.corpus, k=5)
+
+    def test_exhaustive_settings_reach_full_recall(self):
+        grid = parameter_grid([4], [4], hnsw_m=8, ef_construction=64, efs=[600],
+                              index_types=["IVF_FLAT", "IVF_SQ8", "HNSW"])
+        results = measure(LocalBackend(self.corpus), self.corpus, self.truth, 5, grid,
+                          layouts=[False, True], num_partitions=2)
+        self.assertEqual(len(results), 6)
+        for row in results:
+            if row["index_type"] != "IVF_SQ8":
+                self.assertEqual(row["recall"], 1.0, row)
+
+    def test_ground_truth_stays_within_connection(self):
+        for expected, connection_id in zip(self.truth, self.corpus["query_connection_ids"]):
+            self.assertTrue(np.all(self.corpus["connection_ids"][expected] == connection_id))
+
+    def test_choose_lowest_p99_meeting_target(self):
+        rows = [
+            {"recall": 0.99, "p99_ms": 3.0},
+            {"recall": 0.96, "p99_ms": 1.0},
+            {"recall": 0.80, "p99_ms": 0.1},
+        ]
+        self.assertIs(choose_config(rows, 0.95), rows[1])
+        self.assertIs(choose_config(rows, 0.999), rows[0])
+
+    def test_update_env_file_keeps_other_lines(self):
+        fd, path = tempfile.mkstemp(suffix=".env")
+        os.close(fd)
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("# comment\nMILVUS_HOST=localhost\nMILVUS_INDEX_TYPE=IVF_FLAT\n")
+            update_env_file(path, {"MILVUS_INDEX_TYPE": "HNSW", "MILVUS_SEARCH_PARAMS": '{"ef": 64}'})
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        finally:
+            os.remove(path)
+        self.assertEqual(lines[:3], ["# comment", "MILVUS_HOST=localhost", "MILVUS_INDEX_TYPE='HNSW'"])
+        self.assertEqual(lines[-1], "MILVUS_SEARCH_PARAMS='{\"ef\": 64}'")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from autogen_core.models import UserMessage
+
+from benchmarks.bench_text2sql_pipeline import (
+    QUESTIONS, PipelineBench, compare_with_baseline, default_recordings, generate_warehouse, summarize,
+)
+from benchmarks.pipeline_standins import ReplayModelClient
+
+
+class TestWarehouseAndRecordings(unittest.TestCase):
+    def test_recorded_sql_runs_against_generated_warehouse(self):
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "warehouse.sqlite")
+            counts = generate_warehouse(path, tables=10, rows=500)
+            self.assertEqual(len(counts), 10)
+
+            conn = sqlite3.connect(path)
+            try:
+                for item in QUESTIONS:
+                    self.assertTrue(conn.execute(item["sql"]).fetchall(), item["question"])
+            finally:
+                conn.close()
+
+    def test_replay_client_routes_prompt_to_recorded_stage(self):
+        calls = []
+        client = ReplayModelClient(default_recordings(), on_call=lambda *args: calls.append(args))
+        prompt = f"你是一名SQL转换专家。\n用户问题: {QUESTIONS[1]['question']}"
+
+        result = asyncio.run(client.create([UserMessage(content=prompt, source="user")]))
+
+        self.assertIn(QUESTIONS[1]["sql"], result.content)
+        self.assertEqual(calls[0][0], "sql")
+        self.assertEqual(client.total_usage().completion_tokens, result.usage.completion_tokens)
+
+    def test_replay_client_ignores_questions_in_retrieved_examples(self):
+        client = ReplayModelClient(default_recordings())
+        prompt = (f"你是一名SQL转换专家。\n### 示例 1\n**问题**: {QUESTIONS[4]['question']}\n"
+                  f"**用户查询：**\n{QUESTIONS[0]['question']}")
+
+        result = asyncio.run(client.create([UserMessage(content=prompt, source="user")]))
+
+        self.assertIn(QUESTIONS[0]["sql"], result.content)
+
+
+class TestBaselineComparison(unittest.TestCase):
+    @staticmethod
+    def run_sample(wall_ms, cold=False, round_trips=3):
+        stage = {"wall_ms": wall_ms, "queue_wait_ms": 0.1,
+                 "db_round_trips": {"metadata_db": round_trips, "warehouse_db": 0, "neo4j": 0, "milvus": 0},
+                 "llm_calls": 1, "prompt_tokens": 100, "completion_tokens": 20, "peak_memory_kb": 10.0}
+        return {"cold": cold, "total_ms": wall_ms, "stages": {"analysis": stage}}
+
+    def test_slower_stage_and_extra_round_trips_are_reported(self):
+        baseline = summarize([self.run_sample(100.0), self.run_sample(110.0)])
+        current = summarize([self.run_sample(150.0, round_trips=5), self.run_sample(160.0, round_trips=5)])
+
+        regressions = compare_with_baseline(current, baseline, tolerance=0.2)
+
+        self.assertTrue(any("warm/analysis: p50" in item for item in regressions))
+        self.assertTrue(any("round trips" in item for item in regressions))
+        self.assertEqual(compare_with_baseline(baseline, baseline), [])
+
+
+class TestPipelineRun(unittest.TestCase):
+    def test_pipeline_produces_rows_and_per_stage_metrics(self):
+        recordings = default_recordings()
+        with tempfile.TemporaryDirectory() as workdir:
+            with PipelineBench(workdir, tables=8, rows=300, recordings=recordings, qa_pairs=20,
+                               trace_memory=False) as bench:
+                bench.reset_caches()
+                run = asyncio.run(bench.run_question(QUESTIONS[0]["question"]))
+
+        self.assertEqual(run["errors"], [])
+        self.assertIn(QUESTIONS[0]["sql"], run["sql"])
+        self.assertTrue(run["rows"])
+        for stage in ("schema_retrieval", "analysis", "sql_generation", "execution"):
+            self.assertIn(stage, run["stages"])
+        self.assertGreater(run["stages"]["schema_retrieval"]["db_round_trips"]["metadata_db"], 0)
+        self.assertGreater(run["stages"]["execution"]["db_round_trips"]["warehouse_db"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
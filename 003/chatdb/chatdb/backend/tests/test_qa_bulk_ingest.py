@@ -0,0 +1,170 @@
+import asyncio
+import unittest
+from datetime import datetime
+
+from app.services.hybrid_retrieval_service import (
+    BULK_DELETE_QA_PAIRS, EnhancedNeo4jService, HybridRetrievalEngine, MilvusService, QAPairWithContext
+)
+
+
+def make_qa(index, question=None, sql="SELECT * FROM users", tables=("users",), entities=("user",)):
+    return QAPairWithContext(
+        id=f"qa_{index}", question=question if question is not None else f"question {index}",
+        sql=sql, connection_id=1, difficulty_level=1, query_type="SELECT", success_rate=0.0,
+        verified=False, created_at=datetime(2024, 1, 1), used_tables=list(tables), used_columns=[],
+        query_pattern="SELECT", mentioned_entities=list(entities),
+    )
+
+
+class FakeVectorService:
+    def __init__(self):
+        self.calls = []
+
+    async def batch_embed(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.inserts = []
+        self.flushes = 0
+
+    def insert(self, data):
+        if any("bad-milvus" in question for question in data[1]):
+            raise ValueError("rejected")
+        self.inserts.append(data)
+
+    def flush(self):
+        self.flushes += 1
+
+
+class TxLog(list):
+    def __init__(self, fail_delete):
+        super().__init__()
+        self.fail_delete = fail_delete
+
+
+class FakeTx:
+    def __init__(self, log):
+        self.log = log
+
+    async def run(self, query, rows):
+        if any("bad-neo4j" in row.get("question", "") for row in rows):
+            raise ValueError("constraint violated")
+        if query == BULK_DELETE_QA_PAIRS and any(row["id"] in self.log.fail_delete for row in rows):
+            raise ValueError("connection lost")
+        self.log.append((query, rows))
+        return self
+
+    async def consume(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute_write(self, work):
+        # 模拟事务：失败时不保留任何写入
+        log = TxLog(self.driver.fail_delete)
+        await work(FakeTx(log))
+        self.driver.transactions.append(log)
+
+
+class FakeDriver:
+    def __init__(self):
+        self.transactions = []
+        self.fail_delete = set()
+
+    def session(self):
+        return FakeSession(self)
+
+
+def make_engine():
+    engine = HybridRetrievalEngine.__new__(HybridRetrievalEngine)
+    engine.vector_service = FakeVectorService()
+    engine.milvus_service = MilvusService()
+    engine.milvus_service.collection = FakeCollection()
+    engine.milvus_service._initialized = True
+    engine.neo4j_service = EnhancedNeo4jService()
+    engine.neo4j_service.driver = FakeDriver()
+    engine.neo4j_service._initialized = True
+    engine._initialized = True
+    return engine
+
+
+class TestBulkQAIngestion(unittest.TestCase):
+    def test_batches_embed_once_and_flush_per_batch(self):
+        engine = make_engine()
+        qa_pairs = [make_qa(i) for i in range(5)]
+
+        result = asyncio.run(engine.bulk_store_qa_pairs(qa_pairs, batch_size=2))
+
+        self.assertEqual(result, {"stored": [f"qa_{i}" for i in range(5)], "errors": []})
+        self.assertEqual(len(engine.vector_service.calls), 1)
+        self.assertEqual(len(engine.vector_service.calls[0]), 5)
+        collection = engine.milvus_service.collection
+        self.assertEqual([len(data[0]) for data in collection.inserts], [2, 2, 1])
+        self.assertEqual(collection.flushes, 3)
+        transactions = engine.neo4j_service.driver.transactions
+        self.assertEqual(len(transactions), 3)
+        self.assertEqual([len(rows) for _, rows in transactions[0]], [2, 2, 2])
+        self.assertEqual(transactions[0][0][1][0]["pattern_id"], "pattern_SELECT_1")
+
+    def test_bad_rows_are_reported_without_aborting(self):
+        engine = make_engine()
+        qa_pairs = [
+            make_qa(0),
+            make_qa(1, question="bad-neo4j"),
+            make_qa(2, question=""),
+            make_qa(3, question="bad-milvus"),
+            make_qa(4),
+        ]
+
+        result = asyncio.run(engine.bulk_store_qa_pairs(qa_pairs, batch_size=10))
+
+        self.assertEqual(result["stored"], ["qa_0", "qa_4"])
+        self.assertEqual([error["index"] for error in result["errors"]], [1, 2, 3])
+        self.assertIn("Neo4j", result["errors"][0]["error"])
+        self.assertIn("Milvus", result["errors"][2]["error"])
+        # 空问题在写入前就被拒绝，不参与向量化
+        self.assertNotIn("", engine.vector_service.calls[0])
+        # Milvus拒绝的行从Neo4j中删除
+        transactions = engine.neo4j_service.driver.transactions
+        deletes = [rows for log in transactions for query, rows in log if query == BULK_DELETE_QA_PAIRS]
+        self.assertEqual(deletes, [[{"id": "qa_3"}]])
+
+    def test_rows_rejected_by_milvus_are_removed_from_neo4j(self):
+        engine = make_engine()
+        qa_pairs = [make_qa(0, question="bad-milvus a"), make_qa(1), make_qa(2, question="bad-milvus b")]
+
+        result = asyncio.run(engine.bulk_store_qa_pairs(qa_pairs, batch_size=1))
+
+        self.assertEqual(result["stored"], ["qa_1"])
+        transactions = engine.neo4j_service.driver.transactions
+        deletes = [rows for log in transactions for query, rows in log if query == BULK_DELETE_QA_PAIRS]
+        self.assertEqual(deletes, [[{"id": "qa_0"}], [{"id": "qa_2"}]])
+        self.assertEqual(len(transactions), 5)
+
+    def test_failed_cleanup_is_reported(self):
+        engine = make_engine()
+        engine.neo4j_service.driver.fail_delete.add("qa_1")
+        qa_pairs = [make_qa(0), make_qa(1, question="bad-milvus")]
+
+        result = asyncio.run(engine.bulk_store_qa_pairs(qa_pairs, batch_size=10))
+
+        self.assertEqual(result["stored"], ["qa_0"])
+        self.assertEqual(len(result["errors"]), 1)
+        self.assertIn("Milvus写入失败", result["errors"][0]["error"])
+        self.assertIn("清理Neo4j中的记录失败", result["errors"][0]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from app.agents.sql_executor import SqlExecutorAgent
+from app.core.config import settings
+from app.db.dbaccess import DBAccess
+from app.db.result_stream import ResultStream
+from app.services.query_executor import QueryExecutor
+
+# Recursive CTE that keeps SQLite busy long enough to be interrupted
+SLOW_SQL = """
+WITH RECURSIVE counter(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM counter)
+SELECT max(n) FROM counter
+"""
+
+# Every page of this query keeps SQLite busy for a while
+MANY_ROWS_SQL = """
+WITH RECURSIVE counter(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM counter LIMIT 200000)
+SELECT n FROM counter
+"""
+
+
+class TestQueryExecutor(unittest.TestCase):
+    def test_per_connection_limit(self):
+        executor = QueryExecutor(max_workers=8, per_connection_limit=2)
+        lock = threading.Lock()
+        running = {"now": 0, "peak": 0}
+
+        def work():
+            with lock:
+                running["now"] += 1
+                running["peak"] = max(running["peak"], running["now"])
+            time.sleep(0.05)
+            with lock:
+                running["now"] -= 1
+
+        async def run():
+            await asyncio.gather(*(executor.run("conn-1", work) for _ in range(6)))
+
+        asyncio.run(run())
+        self.assertEqual(running["peak"], 2)
+        executor.shutdown()
+
+    def test_blocking_call_does_not_stall_event_loop(self):
+        executor = QueryExecutor(max_workers=2, per_connection_limit=1)
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(executor.run("conn-1", time.sleep, 0.2), ticker())
+
+        asyncio.run(run())
+        self.assertEqual(len(ticks), 5)
+        self.assertLess(ticks[-1] - ticks[0], 0.15)
+        executor.shutdown()
+
+    def test_timeout_interrupts_statement(self):
+        fd, path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        db_access = DBAccess()
+        db_access.statement_timeout = 0
+        db_access.connect_to_sqlite(path)
+        executor = QueryExecutor(max_workers=2, per_connection_limit=1)
+
+        async def run():
+            await executor.run("conn-1", db_access.run_sql, SLOW_SQL, timeout=0.2, on_cancel=db_access.cancel)
+
+        with self.assertRaises(TimeoutError):
+            asyncio.run(run())
+        self.assertEqual(executor.stats["timed_out"], 1)
+        executor.shutdown()
+
+    def test_sqlite_statement_timeout(self):
+        fd, path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        db_access = DBAccess()
+        db_access.statement_timeout = 0.2
+        db_access.connect_to_sqlite(path)
+
+        started = time.monotonic()
+        with self.assertRaises(Exception):
+            db_access.run_sql(SLOW_SQL)
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_sqlite_timeout_applies_to_each_page(self):
+        fd, path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        db_access = DBAccess()
+        db_access.statement_timeout = 0.3
+        db_access.connect_to_sqlite(path)
+
+        stream = db_access.stream_sql(MANY_ROWS_SQL, fetch_size=50000, max_rows=200000, spill=False)
+        pages = []
+        for page in stream:
+            pages.append(len(page))
+            time.sleep(0.4)  # slow consumer: longer than the timeout between pages
+
+        self.assertEqual(pages, [50000] * 4)
+
+
+class TestSqlExecutorStreamCleanup(unittest.TestCase):
+    def test_stream_is_closed_after_timeout_once_fetch_returns(self):
+        events = []
+        release = threading.Event()
+
+        def fetchmany(size):
+            events.append("fetch")
+            release.wait(5)
+            events.append("fetch returned")
+            return [(1,)]
+
+        class SlowAccess:
+            def stream_sql(self, sql):
+                return ResultStream(["n"], fetchmany, close=lambda: events.append("close"), spill=False)
+
+            def cancel(self):
+                # the driver returns some time after being interrupted
+                events.append("cancel")
+                threading.Timer(0.3, release.set).start()
+
+        agent = SqlExecutorAgent.__new__(SqlExecutorAgent)
+        agent.db_access = SlowAccess()
+
+        with mock.patch.object(settings, "QUERY_STATEMENT_TIMEOUT", 0.2):
+            rows, error, meta = asyncio.run(agent._execute_sql("SELECT n FROM slow", connection_id="cleanup"))
+
+        self.assertEqual(rows, [])
+        self.assertIn("SQL执行错误", error)
+        self.assertEqual(events, ["fetch", "cancel", "fetch returned", "close"])
+
+    def test_shared_default_connection_runs_one_statement_at_a_time(self):
+        lock = threading.Lock()
+        running = {"now": 0, "peak": 0}
+
+        def fetchmany(size):
+            with lock:
+                running["now"] += 1
+                running["peak"] = max(running["peak"], running["now"])
+            time.sleep(0.05)
+            with lock:
+                running["now"] -= 1
+            return []
+
+        class SharedAccess:
+            def stream_sql(self, sql):
+                return ResultStream(["n"], fetchmany, spill=False)
+
+            def cancel(self):
+                pass
+
+        agent = SqlExecutorAgent.__new__(SqlExecutorAgent)
+        agent.db_access = SharedAccess()
+
+        async def run():
+            return await asyncio.gather(*(agent._execute_sql(f"SELECT {i} AS n") for i in range(4)))
+
+        results = asyncio.run(run())
+        self.assertEqual([error for _, error, _ in results], [None] * 4)
+        self.assertEqual(running["peak"], 1)
+
+    def test_results_without_connection_id_are_not_cached(self):
+        executed = []
+
+        class DefaultAccess:
+            def stream_sql(self, sql):
+                executed.append(sql)
+                pages = iter([[(1,)], []])
+                return ResultStream(["n"], lambda size: next(pages), spill=False)
+
+            def cancel(self):
+                pass
+
+        agent = SqlExecutorAgent.__new__(SqlExecutorAgent)
+        agent.db_access = DefaultAccess()
+
+        async def run():
+            first = await agent._execute_sql("SELECT 1 AS n FROM uncached_default")
+            agent.db_access = DefaultAccess()
+            second = await agent._execute_sql("SELECT 1 AS n FROM uncached_default")
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual(len(executed), 2)
+        self.assertEqual(second[0], [{"n": 1}])
+        self.assertEqual((first[2]["cache"], second[2]["cache"]), ("bypass", "bypass"))
+
+
+if __name__ == "__main__":
+    unittest.main()
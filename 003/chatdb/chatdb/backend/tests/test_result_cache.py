@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app.core.utils import CacheManager
+from app.services.db_service import execute_query_bounded, invalidate_db_engine
+from app.services.result_cache import QueryResultCache, fingerprint_sql
+from tests.test_db_service import make_connection
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_formatting_differences_share_a_fingerprint(self):
+        first = fingerprint_sql("select *\n  from users -- all users\n where id = 1;")
+        second = fingerprint_sql("SELECT * FROM users WHERE id = 1")
+        self.assertEqual(first.key, second.key)
+        self.assertEqual(first.tables, {"users"})
+
+    def test_literals_are_part_of_the_key(self):
+        first = fingerprint_sql("SELECT * FROM users WHERE name = 'Bob'")
+        second = fingerprint_sql("SELECT * FROM users WHERE name = 'Al'")
+        self.assertEqual(first.template_id, second.template_id)
+        self.assertNotEqual(first.key, second.key)
+
+    def test_tables_from_joins_and_lists(self):
+        fingerprint = fingerprint_sql(
+            "SELECT * FROM sales.orders o JOIN `Users` u ON u.id = o.user_id, items i WHERE o.id > 3"
+        )
+        self.assertEqual(fingerprint.tables, {"orders", "users", "items"})
+
+    def test_uncacheable_statements(self):
+        for sql in ["SELECT NOW()", "SELECT * FROM t FOR UPDATE", "UPDATE t SET a = 1",
+                    "SELECT 1; SELECT 2", "SELECT * FROM t WHERE r < RAND()"]:
+            self.assertIsNone(fingerprint_sql(sql), sql)
+
+
+class TestQueryResultCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = QueryResultCache(ttl=60, max_bytes=1000, max_entries=10, max_entry_bytes=600, enabled=True)
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get(1, "SELECT * FROM users"))
+        self.assertTrue(self.cache.set(1, "SELECT * FROM users", [{"id": 1}], {"byte_count": 10}))
+        rows, meta = self.cache.get(1, "select * from users")
+        self.assertEqual(rows, [{"id": 1}])
+        self.assertEqual(meta["cache"], "hit")
+        self.assertIsNone(self.cache.get(2, "SELECT * FROM users"))
+        self.assertEqual(self.cache.get_stats()["hits"], 1)
+        self.assertEqual(self.cache.get_stats()["misses"], 2)
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        for i in range(3):
+            self.cache.set(1, f"SELECT * FROM t{i}", [{"i": i}], {"byte_count": 400})
+        self.assertIsNone(self.cache.get(1, "SELECT * FROM t0"))
+        self.assertIsNotNone(self.cache.get(1, "SELECT * FROM t2"))
+        self.assertLessEqual(self.cache.results.total_bytes, 1000)
+        self.assertFalse(self.cache.set(1, "SELECT * FROM big", [], {"byte_count": 700}))
+
+    def test_invalidate_tables(self):
+        self.cache.set(1, "SELECT * FROM users", [], {"byte_count": 1})
+        self.cache.set(1, "SELECT * FROM orders JOIN users ON 1 = 1", [], {"byte_count": 1})
+        self.cache.set(1, "SELECT * FROM items", [], {"byte_count": 1})
+        self.assertEqual(self.cache.invalidate_tables(1, ["Users"]), 2)
+        self.assertIsNotNone(self.cache.get(1, "SELECT * FROM items"))
+
+
+class TestCacheManagerBytes(unittest.TestCase):
+    def test_replacing_a_value_updates_byte_total(self):
+        cache = CacheManager(max_size=10, ttl=60, max_bytes=100, sizeof=len)
+        cache.set("a", "x" * 40)
+        cache.set("a", "x" * 10)
+        cache.remove("a")
+        self.assertEqual(cache.total_bytes, 0)
+
+
+class TestExecuteQueryCache(unittest.TestCase):
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+        conn.execute("INSERT INTO users VALUES (1)")
+        conn.commit()
+        conn.close()
+        self.connection = make_connection(424242, self.db_path)
+        self.cache = QueryResultCache(ttl=60, enabled=True)
+        patcher = patch("app.services.result_cache.query_result_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        invalidate_db_engine(424242)
+        os.remove(self.db_path)
+
+    def test_second_run_is_served_from_cache(self):
+        rows, meta = execute_query_bounded(self.connection, "SELECT id FROM users")
+        self.assertEqual((rows, meta["cache"]), ([{"id": 1}], "miss"))
+
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO users VALUES (2)")
+        conn.commit()
+        conn.close()
+
+        rows, meta = execute_query_bounded(self.connection, "select id  from users")
+        self.assertEqual((rows, meta["cache"]), ([{"id": 1}], "hit"))
+
+        self.cache.invalidate_tables(424242, ["users"])
+        rows, meta = execute_query_bounded(self.connection, "SELECT id FROM users")
+        self.assertEqual(len(rows), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
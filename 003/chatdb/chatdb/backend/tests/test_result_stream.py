@@ -0,0 +1,233 @@
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+from app.db.dbaccess import DBAccess
+from app.db.result_stream import ResultSpillStore, ResultStream
+
+
+class TestResultStream(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE facts (id INTEGER PRIMARY KEY, label TEXT)")
+        conn.executemany("INSERT INTO facts (label) VALUES (?)", [(f"row-{i}",) for i in range(25)])
+        conn.commit()
+        conn.close()
+        self.db_access = DBAccess()
+        self.db_access.connect_to_sqlite(self.path)
+        self.spill_dir = tempfile.TemporaryDirectory()
+        self.spill_store = ResultSpillStore(directory=self.spill_dir.name, ttl=60)
+
+    def tearDown(self):
+        self.spill_dir.cleanup()
+        os.remove(self.path)
+
+    def test_pages_are_fetched_in_chunks(self):
+        stream = self.db_access.stream_sql("SELECT * FROM facts", fetch_size=10, max_rows=100, spill=False)
+        pages = [len(page) for page in stream]
+        self.assertEqual(pages, [10, 10, 5])
+        self.assertEqual(stream.rows[0], {"id": 1, "label": "row-0"})
+        self.assertFalse(stream.meta["truncated"])
+
+    def test_row_cap_truncates(self):
+        stream = self.db_access.stream_sql("SELECT * FROM facts", fetch_size=10, max_rows=12, spill=False)
+        rows = stream.read_all()
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(stream.meta["truncated_reason"], "max_rows")
+        self.assertIsNone(stream.meta["spill_id"])
+
+    def test_byte_cap_truncates(self):
+        stream = self.db_access.stream_sql("SELECT * FROM facts", max_rows=100, max_bytes=300, spill=False)
+        rows = stream.read_all()
+        self.assertLess(len(rows), 25)
+        self.assertLessEqual(stream.meta["byte_count"], 300)
+        self.assertEqual(stream.meta["truncated_reason"], "max_bytes")
+
+    def test_truncated_result_is_spilled_in_full(self):
+        stream = self.db_access.stream_sql(
+            "SELECT * FROM facts", fetch_size=10, max_rows=5, spill=True, spill_store=self.spill_store
+        )
+        self.assertEqual(len(stream.read_all()), 5)
+        meta = stream.meta
+        self.assertEqual(meta["spilled_rows"], 25)
+        self.assertTrue(meta["spill_complete"])
+
+        path, _ = self.spill_store.get(meta["spill_id"])
+        if path.endswith(".jsonl.gz"):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                spilled = [json.loads(line) for line in f]
+            self.assertEqual(spilled[-1], {"id": 25, "label": "row-24"})
+
+    def test_dataframe_fallback_for_drivers_without_cursor(self):
+        self.db_access.open_cursor = None
+        stream = self.db_access.stream_sql("SELECT * FROM facts", fetch_size=10, max_rows=7, spill=False)
+        self.assertEqual(len(stream.read_all()), 7)
+        self.assertTrue(stream.meta["truncated"])
+
+    def test_close_is_called_once(self):
+        calls = []
+        stream = ResultStream(["a"], lambda size: [], close=lambda: calls.append(1))
+        stream.read_all()
+        stream.close()
+        self.assertEqual(calls, [1])
+
+
+class FakePostgresCursor:
+    itersize = 2
+
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+        self.description = None
+        self.rows = []
+
+    def execute(self, sql):
+        self.conn.executed.append((self.name, sql))
+        self.description = [("id",), ("label",)]
+        self.rows = [(i, f"row-{i}") for i in range(5)]
+
+    def fetchmany(self, size):
+        page, self.rows = self.rows[:size], self.rows[size:]
+        return page
+
+    def fetchall(self):
+        raise AssertionError("fetchall() must not be used when streaming")
+
+    def close(self):
+        self.conn.closed_cursors += 1
+
+
+class FakePostgresConnection:
+    def __init__(self):
+        self.executed = []
+        self.closed_cursors = 0
+        self.closed = False
+
+    def cursor(self, name=None):
+        return FakePostgresCursor(self, name)
+
+    def close(self):
+        self.closed = True
+
+
+class TestPostgresStreaming(unittest.TestCase):
+    def test_postgres_streams_through_a_named_cursor(self):
+        connections = []
+
+        def connect(**kwargs):
+            connections.append(FakePostgresConnection())
+            return connections[-1]
+
+        psycopg2 = types.ModuleType("psycopg2")
+        psycopg2.connect = connect
+        psycopg2.Error = psycopg2.InterfaceError = type("Error", (Exception,), {})
+        psycopg2.extras = types.ModuleType("psycopg2.extras")
+        with mock.patch.dict(sys.modules, {"psycopg2": psycopg2, "psycopg2.extras": psycopg2.extras}):
+            db_access = DBAccess()
+            db_access.connect_to_postgres(host="db", dbname="warehouse", user="u", password="p", port=5432)
+            stream = db_access.stream_sql("SELECT * FROM facts", fetch_size=2, max_rows=100, spill=False)
+            pages = [len(page) for page in stream]
+
+        self.assertEqual(pages, [2, 2, 1])
+        self.assertEqual(stream.rows[0], {"id": 0, "label": "row-0"})
+        stream_conn = connections[-1]
+        self.assertTrue(stream_conn.executed[0][0])  # named (server-side) cursor
+        self.assertEqual(stream_conn.closed_cursors, 1)
+        self.assertTrue(stream_conn.closed)
+
+
+
+class FakeMysqlCursor:
+    """Unbuffered cursor: close() reads the rows that were not fetched, like SSCursor"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self.rows = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql):
+        self.conn.executed.append(sql)
+        self.description = [("id",)]
+        self.rows = iter({"id": i} for i in range(self.conn.total_rows))
+
+    def fetchmany(self, size):
+        page = [row for _, row in zip(range(size), self.rows)]
+        self.conn.fetched += len(page)
+        return page
+
+    def close(self):
+        self.conn.fetched += sum(1 for _ in self.rows)
+
+
+class FakeMysqlConnection:
+    def __init__(self, total_rows=0):
+        self.total_rows = total_rows
+        self.executed = []
+        self.fetched = 0
+        self.closed = False
+
+    def ping(self, reconnect=False):
+        self.closed = False
+
+    def cursor(self, cursorclass=None):
+        return FakeMysqlCursor(self)
+
+    def thread_id(self):
+        return 42
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class TestMysqlStreaming(unittest.TestCase):
+    def stream(self, total_rows, max_rows):
+        connections = []
+
+        def connect(**kwargs):
+            connections.append(FakeMysqlConnection(total_rows))
+            return connections[-1]
+
+        with mock.patch("pymysql.connect", connect):
+            db_access = DBAccess()
+            db_access.connect_to_mysql(host="db", dbname="warehouse", user="u", password="p", port=3306)
+            stream = db_access.stream_sql("SELECT * FROM facts", fetch_size=10, max_rows=max_rows, spill=False)
+            stream.read_all()
+        return stream, connections
+
+    def test_truncated_stream_kills_query_instead_of_draining(self):
+        stream, connections = self.stream(total_rows=10000, max_rows=15)
+
+        self.assertTrue(stream.truncated)
+        conn = connections[0]
+        self.assertEqual(conn.fetched, 20)
+        self.assertTrue(conn.closed)
+        self.assertEqual([killer.executed for killer in connections[1:]], [["KILL QUERY 42"]])
+
+    def test_exhausted_stream_keeps_connection(self):
+        stream, connections = self.stream(total_rows=25, max_rows=100)
+
+        self.assertFalse(stream.truncated)
+        self.assertEqual(len(connections), 1)
+        self.assertEqual(connections[0].fetched, 25)
+        self.assertFalse(connections[0].closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
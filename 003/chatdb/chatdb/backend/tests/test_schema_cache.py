@@ -0,0 +1,134 @@
+import time
+import unittest
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.utils import CacheManager
+from app.db.base import Base
+from app.models.db_connection import DBConnection
+from app.models.schema_column import SchemaColumn
+from app.models.schema_relationship import SchemaRelationship
+from app.models.schema_table import SchemaTable
+from app.services.schema_cache import SchemaCatalog, SchemaContextCache
+from app.services.text2sql_utils import assemble_schema_context
+
+
+class TestCacheManager(unittest.TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = CacheManager(max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_expired_entry_is_dropped(self):
+        cache = CacheManager(max_size=2, ttl=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_remove_where(self):
+        cache = CacheManager(max_size=10, ttl=60)
+        cache.set((1, "x"), 1)
+        cache.set((1, "y"), 2)
+        cache.set((2, "x"), 3)
+        self.assertEqual(cache.remove_where(lambda key: key[0] == 1), 2)
+        self.assertEqual(cache.get((2, "x")), 3)
+
+
+class TestSchemaContextCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = SchemaContextCache(ttl=60, max_catalogs=4, max_contexts=16)
+        self.context = {"tables": [{"id": 1, "name": "users", "description": ""}], "columns": [], "relationships": []}
+
+    def test_context_hit_ignores_case_and_whitespace(self):
+        self.cache.set_context(1, "How many  users?", self.context)
+        cached = self.cache.get_context(1, "  how many users? ")
+        self.assertEqual(cached, self.context)
+        cached["tables"].clear()
+        self.assertEqual(len(self.cache.get_context(1, "how many users?")["tables"]), 1)
+
+    def test_invalidate_only_drops_that_connection(self):
+        self.cache.set_context(1, "q", self.context)
+        self.cache.set_context(2, "q", self.context)
+        self.cache.catalogs.set(1, SchemaCatalog(1, self.context["tables"]))
+        self.cache.invalidate(1)
+        self.assertIsNone(self.cache.get_context(1, "q"))
+        self.assertIsNone(self.cache.catalogs.get(1))
+        self.assertIsNotNone(self.cache.get_context(2, "q"))
+
+    def test_stale_generation_is_not_stored(self):
+        generation = self.cache.generation(1)
+        self.cache.invalidate(1)
+        self.cache.set_context(1, "q", self.context, generation)
+        self.assertIsNone(self.cache.get_context(1, "q"))
+
+    def test_disabled_when_ttl_is_zero(self):
+        cache = SchemaContextCache(ttl=0)
+        cache.set_context(1, "q", self.context)
+        self.assertIsNone(cache.get_context(1, "q"))
+
+
+class TestAssembleSchemaContext(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.db.execute(insert(DBConnection), [{
+            "id": 1, "name": "c", "db_type": "sqlite", "host": "", "port": 0,
+            "username": "", "password_encrypted": "", "database_name": "c",
+        }])
+        self.db.execute(insert(SchemaTable), [
+            {"id": i, "connection_id": 1, "table_name": name}
+            for i, name in [(1, "users"), (2, "orders"), (3, "items")]
+        ])
+        self.db.execute(insert(SchemaColumn), [
+            {"id": 1, "table_id": 1, "column_name": "id", "data_type": "INT"},
+            {"id": 2, "table_id": 2, "column_name": "id", "data_type": "INT"},
+            {"id": 3, "table_id": 2, "column_name": "user_id", "data_type": "INT"},
+            {"id": 4, "table_id": 3, "column_name": "order_id", "data_type": "INT"},
+        ])
+        self.db.execute(insert(SchemaRelationship), [
+            {"id": 1, "connection_id": 1, "source_table_id": 2, "source_column_id": 3,
+             "target_table_id": 1, "target_column_id": 1, "relationship_type": "N-to-1"},
+            {"id": 2, "connection_id": 1, "source_table_id": 3, "source_column_id": 4,
+             "target_table_id": 2, "target_column_id": 2, "relationship_type": "N-to-1"},
+        ])
+        self.db.commit()
+        self.catalog = SchemaCatalog.load(self.db, 1)
+        self.queries = []
+        event.listen(self.engine, "before_cursor_execute", lambda *args: self.queries.append(args[2]))
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+
+    def test_selected_tables_use_one_query_each_for_columns_and_relationships(self):
+        tables = [{"id": 1, "name": "users", "description": ""}, {"id": 2, "name": "orders", "description": ""}]
+        context = assemble_schema_context(self.db, self.catalog, tables)
+        self.assertEqual(len(self.queries), 2)
+        self.assertEqual([c["id"] for c in context["columns"]], [1, 2, 3])
+        self.assertEqual(context["relationships"], [{
+            "id": 1, "source_table": "orders", "source_column": "user_id",
+            "target_table": "users", "target_column": "id", "relationship_type": "N-to-1",
+        }])
+
+        # Columns and relationships are now cached on the catalog
+        assemble_schema_context(self.db, self.catalog, tables)
+        self.assertEqual(len(self.queries), 2)
+
+    def test_all_tables_use_connection_relationships(self):
+        tables = [dict(t) for t in self.catalog.tables]
+        context = assemble_schema_context(self.db, self.catalog, tables)
+        self.assertEqual([r["id"] for r in context["relationships"]], [1, 2])
+        self.assertEqual(self.catalog.get_relationships_for_tables(self.db, [2])[2][0]["id"], 1)
+        self.assertEqual(len(self.queries), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base, DBConnection, SchemaColumn, SchemaRelationship, SchemaTable, ValueMapping
+from app.services.db_service import invalidate_db_engine
+from app.services.schema_service import discover_schema, reflect_catalog, save_discovered_schema
+
+
+class TestSaveDiscoveredSchema(unittest.TestCase):
+    def setUp(self):
+        fd, self.target_path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+        target = sqlite3.connect(self.target_path)
+        target.executescript("""
+            CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT UNIQUE);
+            CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id), total REAL);
+        """)
+        target.close()
+
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        self.connection = DBConnection(
+            name="target", db_type="sqlite", host="", port=0, username="",
+            password_encrypted="", database_name=self.target_path,
+        )
+        self.db.add(self.connection)
+        self.db.commit()
+        self.connection_id = self.connection.id
+
+        sync_patcher = patch("app.services.schema_service.sync_schema_to_graph_db")
+        self.sync = sync_patcher.start()
+        self.addCleanup(sync_patcher.stop)
+
+    def tearDown(self):
+        self.db.close()
+        invalidate_db_engine(self.connection_id)
+        os.remove(self.target_path)
+
+    def discover_and_save(self):
+        catalog = reflect_catalog(self.connection)
+        schema_info = discover_schema(self.connection, inspector=catalog)
+        return save_discovered_schema(self.db, self.connection_id, schema_info, inspector=catalog)
+
+    def test_first_save_creates_tables_columns_and_relationships(self):
+        tables_data, relationships_data = self.discover_and_save()
+
+        self.assertEqual({t["table_name"] for t in tables_data}, {"users", "orders"})
+        self.assertEqual(self.db.query(SchemaColumn).count(), 5)
+        self.assertEqual(len(relationships_data), 1)
+        rel = relationships_data[0]
+        self.assertEqual((rel["source_table"], rel["source_column"]), ("orders", "user_id"))
+        self.assertEqual((rel["target_table"], rel["target_column"]), ("users", "id"))
+        self.assertEqual(rel["relationship_type"], "N-to-1")
+        self.sync.assert_called_once_with(self.connection_id)
+
+    def test_resave_keeps_ids_and_prunes_dropped_objects(self):
+        tables_data, relationships_data = self.discover_and_save()
+        users_id = next(t["id"] for t in tables_data if t["table_name"] == "users")
+        user_id_column = self.db.query(SchemaColumn).filter_by(column_name="user_id").one()
+        self.db.add(ValueMapping(column_id=user_id_column.id, nl_term="me", db_value="1"))
+        self.db.commit()
+
+        target = sqlite3.connect(self.target_path)
+        target.executescript("""
+            DROP TABLE orders;
+            CREATE TABLE orders (id INTEGER PRIMARY KEY, total REAL);
+        """)
+        target.close()
+
+        tables_data, relationships_data = self.discover_and_save()
+
+        self.assertEqual(next(t["id"] for t in tables_data if t["table_name"] == "users"), users_id)
+        self.assertEqual(relationships_data, [])
+        self.assertEqual(self.db.query(SchemaRelationship).count(), 0)
+        self.assertEqual(self.db.query(ValueMapping).count(), 0)
+        self.assertEqual(self.db.query(SchemaColumn).count(), 4)
+        self.assertEqual(self.db.query(SchemaTable).count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
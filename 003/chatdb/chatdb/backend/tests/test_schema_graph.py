@@ -0,0 +1,92 @@
+import unittest
+
+from app.services.schema_graph import (
+    InvalidCursor, SchemaGraph, StaleCursor, decode_cursor, encode_cursor,
+)
+
+
+def make_schema():
+    # two star-shaped groups joined by one edge, plus two tables without relationships
+    tables = [{"id": i, "name": f"t{i:02d}", "description": ""} for i in range(1, 15)]
+    relationships = []
+    for hub, leaves in ((1, range(2, 7)), (7, range(8, 13))):
+        for leaf in leaves:
+            relationships.append({"id": len(relationships) + 1, "source_table_id": leaf, "target_table_id": hub})
+    relationships.append({"id": len(relationships) + 1, "source_table_id": 6, "target_table_id": 7})
+    relationships.append({"id": len(relationships) + 1, "source_table_id": 2, "target_table_id": 1})
+    return tables, relationships
+
+
+class TestSchemaGraph(unittest.TestCase):
+    def setUp(self):
+        self.tables, self.relationships = make_schema()
+        self.graph = SchemaGraph(1, self.tables, self.relationships)
+
+    def test_clusters_and_layout(self):
+        sizes = sorted(cluster["size"] for cluster in self.graph.clusters)
+        self.assertEqual(sum(sizes), 14)
+        isolated = [cluster for cluster in self.graph.clusters if cluster["isolated"]]
+        self.assertEqual(isolated[0]["table_ids"], [13, 14])
+        self.assertEqual(len(self.graph.positions), 14)
+        self.assertEqual(len(set(self.graph.positions.values())), 14)
+
+    def test_pages_deliver_every_node_and_edge_once(self):
+        nodes, edges, offset = [], [], 0
+        while offset is not None:
+            page = self.graph.overview_page(offset, 4)
+            nodes.extend(node["id"] for node in page["nodes"])
+            delivered = set(nodes)
+            for edge in page["edges"]:
+                self.assertIn(edge["source"], delivered)
+                self.assertIn(edge["target"], delivered)
+            edges.extend(edge["id"] for edge in page["edges"])
+            offset = page["next_offset"]
+        self.assertEqual(len(nodes), len(set(nodes)), 14)
+        # the duplicate 2 -> 1 relationship is merged into one weighted edge
+        self.assertEqual(len(edges), len(set(edges)), 11)
+
+    def test_cluster_page(self):
+        cluster = next(c for c in self.graph.clusters if 1 in c["table_ids"])
+        page = self.graph.overview_page(0, 100, cluster_id=cluster["id"])
+        self.assertEqual({node["data"]["id"] for node in page["nodes"]}, set(cluster["table_ids"]))
+        members = {f"table-{tid}" for tid in cluster["table_ids"]}
+        for edge in page["edges"]:
+            self.assertIn(edge["source"], members)
+            self.assertIn(edge["target"], members)
+        self.assertIsNone(page["next_offset"])
+
+    def test_ego_network_hops_and_limit(self):
+        one_hop, truncated = self.graph.ego_network(1, hops=1, max_nodes=100)
+        self.assertEqual(set(one_hop), {1, 2, 3, 4, 5, 6})
+        self.assertFalse(truncated)
+        two_hops, _ = self.graph.ego_network(1, hops=2, max_nodes=100)
+        self.assertIn(7, two_hops)
+        capped, truncated = self.graph.ego_network(1, hops=2, max_nodes=3)
+        self.assertEqual(len(capped), 3)
+        self.assertTrue(truncated)
+        # the neighbour with two foreign keys is expanded first
+        self.assertEqual(capped[1], 2)
+
+    def test_cluster_summaries(self):
+        summaries = self.graph.cluster_summaries()
+        self.assertEqual(len(summaries["clusters"]), len(self.graph.clusters))
+        self.assertTrue(summaries["edges"])
+
+    def test_version_changes_with_schema(self):
+        self.assertEqual(SchemaGraph(1, self.tables, self.relationships).version, self.graph.version)
+        changed = SchemaGraph(1, self.tables, self.relationships[:-1])
+        self.assertNotEqual(changed.version, self.graph.version)
+
+
+class TestCursor(unittest.TestCase):
+    def test_round_trip_and_stale_version(self):
+        cursor = encode_cursor("v1", 500)
+        self.assertEqual(decode_cursor(cursor, "v1"), 500)
+        with self.assertRaises(StaleCursor):
+            decode_cursor(cursor, "v2")
+        with self.assertRaises(InvalidCursor):
+            decode_cursor("not a cursor", "v1")
+
+
+if __name__ == "__main__":
+    unittest.main()
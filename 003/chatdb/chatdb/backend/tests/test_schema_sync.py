@@ -0,0 +1,64 @@
+import unittest
+
+from app.services.schema_service import diff_graph_rows, run_batched_write, SYNC_UPSERT_TABLES
+
+
+class FakeResult:
+    def consume(self):
+        return None
+
+
+class FakeTransaction:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def run(self, statement, **params):
+        self.calls.append((statement, params["rows"]))
+        return FakeResult()
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+        self.transactions = 0
+
+    def execute_write(self, fn, *args):
+        self.transactions += 1
+        return fn(FakeTransaction(self.calls), *args)
+
+
+class TestGraphDiff(unittest.TestCase):
+    def test_only_changed_and_missing_rows_are_written(self):
+        desired = {
+            1: {"id": 1, "name": "users", "description": ""},
+            2: {"id": 2, "name": "orders", "description": "orders placed"},
+            3: {"id": 3, "name": "items", "description": ""},
+        }
+        current = {
+            1: {"id": 1, "name": "users", "description": ""},
+            2: {"id": 2, "name": "orders", "description": ""},
+            4: {"id": 4, "name": "legacy", "description": ""},
+        }
+        upserts, deletes = diff_graph_rows(desired, current)
+        self.assertEqual([row["id"] for row in upserts], [2, 3])
+        self.assertEqual(deletes, [4])
+
+    def test_in_sync_graph_produces_no_writes(self):
+        rows = {(1, 2): {"source_column_id": 1, "target_column_id": 2, "type": "1-to-N"}}
+        self.assertEqual(diff_graph_rows(rows, dict(rows)), ([], []))
+
+
+class TestBatchedWrite(unittest.TestCase):
+    def test_rows_are_sent_in_batches_with_progress(self):
+        session = FakeSession()
+        progress = []
+        rows = [{"id": i} for i in range(5)]
+        run_batched_write(session, SYNC_UPSERT_TABLES, rows, 2, "upsert_tables",
+                          lambda stage, done, total: progress.append((stage, done, total)))
+        self.assertEqual(session.transactions, 3)
+        self.assertEqual([len(batch) for _, batch in session.calls], [2, 2, 1])
+        self.assertEqual(progress[-1], ("upsert_tables", 5, 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from app.api.api_v1.endpoints import text2sql_sse
+from app.services.sse_session_store import (
+    SessionLimitExceeded, SessionQueue, SessionQueueFull, SqliteSessionBackend, SSESessionStore,
+)
+
+
+def progress(content, region="analysis"):
+    return {"type": "message", "source": "agent", "region": region, "content": content, "is_final": False}
+
+
+def result(content):
+    return {"type": "result", "source": "agent", "region": "data", "content": content, "is_final": True}
+
+
+async def drain(store, session_id, last_event_id=0):
+    events = []
+    async for event in store.events(session_id, last_event_id, timeout=0.01):
+        if event is None:
+            break
+        events.append(event)
+    return events
+
+
+class TestSessionQueue(unittest.TestCase):
+    def test_progress_messages_are_coalesced_then_dropped(self):
+        async def run():
+            queue = SessionQueue(max_messages=4, max_bytes=10 ** 6, put_timeout=0.05)
+            await queue.put(1, progress("a"))
+            await queue.put(2, progress("b"))
+            await queue.put(3, progress("c"))  # half full: appended to the previous message
+            await queue.put(4, progress("x", region="sql"))
+            await queue.put(5, result("r1"))
+            await queue.put(6, result("r2"))  # full: drops "a", the oldest progress message
+            events = [await queue.get(0.01) for _ in range(len(queue))]
+            return queue, events
+
+        queue, events = asyncio.run(run())
+        self.assertEqual(queue.stats["coalesced"], 1)
+        self.assertEqual(queue.stats["dropped"], 1)
+        self.assertEqual([json.loads(e.data)["content"] for e in events], ["bc", "x", "r1", "r2"])
+
+    def test_coalesced_event_keeps_sequence_range(self):
+        async def run():
+            queue = SessionQueue(max_messages=2, max_bytes=10 ** 6)
+            await queue.put(1, progress("a"))
+            await queue.put(2, progress("b"))
+            return await queue.get(0.01)
+
+        event = asyncio.run(run())
+        self.assertEqual((event.seq, event.end_seq, event.message["content"]), (1, 2, "ab"))
+
+    def test_results_wait_for_reader_then_time_out(self):
+        async def run():
+            queue = SessionQueue(max_messages=1, max_bytes=10 ** 6, put_timeout=0.05)
+            await queue.put(1, result("r1"))
+
+            async def reader():
+                await asyncio.sleep(0.01)
+                return await queue.get(0.01)
+
+            first, _ = await asyncio.gather(reader(), queue.put(2, result("r2")))
+            with self.assertRaises(SessionQueueFull):
+                await queue.put(3, result("r3"))
+            return first
+
+        self.assertEqual(asyncio.run(run()).seq, 1)
+
+
+class TestSSESessionStore(unittest.TestCase):
+    def test_idle_sessions_expire_from_one_sweeper(self):
+        async def run():
+            store = SSESessionStore(ttl=0.05, sweep_interval=0.01)
+            for i in range(50):
+                await store.create(f"s{i}", {"status": "initializing"})
+            await store.attach("s0")
+            await asyncio.sleep(0.2)
+            remaining = set(store.sessions)
+            store.close()
+            return store, remaining
+
+        store, remaining = asyncio.run(run())
+        self.assertEqual(remaining, {"s0"})
+        self.assertEqual(store.stats["expired"], 49)
+
+    def test_session_limit_evicts_idle_sessions(self):
+        async def run():
+            store = SSESessionStore(max_sessions=2)
+            await store.create("a", {})
+            await store.create("b", {})
+            await store.attach("b")
+            await store.create("c", {})
+            await store.attach("c")
+            with self.assertRaises(SessionLimitExceeded):
+                await store.create("d", {})
+            sessions = set(store.sessions)
+            store.close()
+            return sessions
+
+        self.assertEqual(asyncio.run(run()), {"b", "c"})
+
+    def test_coalesced_event_id_covers_merged_messages(self):
+        async def run():
+            store = SSESessionStore(queue_size=2)
+            await store.create("s", {})
+            for content in ("a", "b"):
+                await store.publish("s", progress(content))
+            events = await drain(store, "s")
+            await store.publish("s", result("r"))
+            resumed = await drain(store, "s", last_event_id=events[-1][0])
+            store.close()
+            return events, resumed
+
+        events, resumed = asyncio.run(run())
+        # 以合并消息的ID重连时不再收到已合并的 "b"
+        self.assertEqual([(seq, json.loads(data)["content"]) for seq, _, data in events], [(2, "ab")])
+        self.assertEqual([(seq, json.loads(data)["content"]) for seq, _, data in resumed], [(3, "r")])
+
+    def test_memory_budget_is_released(self):
+        async def run():
+            store = SSESessionStore()
+            await store.create("a", {})
+            await store.publish("a", result("x" * 100))
+            used = store.budget.used
+            await store.remove("a")
+            store.close()
+            return used, store.budget.used
+
+        used, after = asyncio.run(run())
+        self.assertGreater(used, 100)
+        self.assertEqual(after, 0)
+
+
+class TestSqliteSessionBackend(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(fd)
+
+    def tearDown(self):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def test_other_worker_resumes_from_last_event_id(self):
+        async def run():
+            owner = SSESessionStore(SqliteSessionBackend(self.path))
+            other = SSESessionStore(SqliteSessionBackend(self.path))
+            await owner.create("s", {"status": "processing"})
+            for content in ("a", "b", "c"):
+                await owner.publish("s", result(content))
+
+            resumed = []
+            async for event in other.events("s", last_event_id=1, timeout=0.01):
+                if event is None:
+                    break
+                resumed.append(event)
+
+            self.assertTrue(await other.put_feedback("s", {"content": "ok"}))
+            feedback = await asyncio.wait_for(owner.wait_feedback("s", poll_interval=0.01), 1)
+            info = await other.get_info("s")
+            owner.close()
+            other.close()
+            return resumed, feedback, info
+
+        resumed, feedback, info = asyncio.run(run())
+        self.assertEqual([(seq, json.loads(data)["content"]) for seq, _, data in resumed], [(2, "b"), (3, "c")])
+        self.assertEqual(feedback["content"], "ok")
+        self.assertEqual(info["status"], "processing")
+
+    def test_clients_resumed_on_other_worker_keep_query_running(self):
+        async def run():
+            owner = SSESessionStore(SqliteSessionBackend(self.path))
+            other = SSESessionStore(SqliteSessionBackend(self.path))
+            await owner.create("s", {"status": "processing"})
+            task = asyncio.ensure_future(asyncio.sleep(10))
+            owner.set_task("s", task)
+            await owner.attach("s")
+            await other.attach("s")
+            remote = await owner.remote_listeners("s")
+
+            with patch.object(text2sql_sse, "sse_session_store", owner):
+                self.assertEqual(await owner.detach("s"), 0)
+                grace = asyncio.ensure_future(text2sql_sse.cancel_abandoned_query("s", grace=0.02))
+                await asyncio.sleep(0.1)
+                running = not task.done()
+                self.assertEqual(await other.detach("s"), 0)
+                await asyncio.wait_for(grace, 1)
+            owner.close()
+            other.close()
+            return remote, running, task.cancelled()
+
+        remote, running, cancelled = asyncio.run(run())
+        self.assertEqual(remote, 1)
+        self.assertTrue(running)
+        self.assertTrue(cancelled)
+
+    def test_local_reader_fills_gaps_from_log(self):
+        async def run():
+            store = SSESessionStore(SqliteSessionBackend(self.path), queue_size=2)
+            await store.create("s", {})
+            for content in ("a", "b", "c", "d"):
+                await store.publish("s", result(content))
+            events = await drain(store, "s")
+            store.close()
+            return events
+
+        events = asyncio.run(run())
+        self.assertEqual([json.loads(data)["content"] for _, _, data in events], ["a", "b", "c", "d"])
+
+    def test_renewals_reach_backend_before_other_worker_purges(self):
+        renewals = []
+
+        class CountingBackend(SqliteSessionBackend):
+            def renew(self, expirations):
+                renewals.append(expirations)
+                super().renew(expirations)
+
+        async def run():
+            owner = SSESessionStore(CountingBackend(self.path), ttl=0.4, sweep_interval=10)
+            other = SqliteSessionBackend(self.path)
+            await owner.create("active", {})
+            await owner.create("listening", {})
+            await owner.create("idle", {})
+            await owner.attach("listening")
+            touches = 0
+            for _ in range(60):
+                owner.touch("active")
+                touches += 1
+                other.purge_expired(time.time())
+                await asyncio.sleep(0.02)
+            sessions = {session_id: other.load(session_id) is not None
+                        for session_id in ("active", "listening", "idle")}
+            owner.close()
+            other.close()
+            return sessions, touches
+
+        sessions, touches = asyncio.run(run())
+        self.assertEqual(sessions, {"active": True, "listening": True, "idle": False})
+        # 续期按半个TTL节流批量写入，而不是每次touch都写
+        self.assertLess(len(renewals), touches / 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
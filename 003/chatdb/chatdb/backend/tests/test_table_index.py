@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+
+from app.services.table_index import TableIndexManager, is_ambiguous, rank_by_vector_scores
+from app.services.text2sql_utils import find_relevant_tables_semantic
+
+
+class BagOfWordsEncoder:
+    """Deterministic stand-in for the sentence-transformer: one dimension per known word."""
+
+    VOCABULARY = ["user", "users", "email", "order", "orders", "total", "product", "products", "price"]
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode_texts(self, texts):
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), len(self.VOCABULARY)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                if word in self.VOCABULARY:
+                    vectors[row, self.VOCABULARY.index(word)] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+TABLES = {
+    1: {"id": 1, "name": "users", "description": ""},
+    2: {"id": 2, "name": "orders", "description": ""},
+    3: {"id": 3, "name": "products", "description": ""},
+}
+COLUMNS = {
+    10: {"id": 10, "table_id": 1, "name": "email", "description": ""},
+    20: {"id": 20, "table_id": 2, "name": "total", "description": ""},
+    30: {"id": 30, "table_id": 3, "name": "price", "description": ""},
+}
+
+
+class TestTableIndex(unittest.TestCase):
+    def setUp(self):
+        self.encoder = BagOfWordsEncoder()
+        self.manager = TableIndexManager(vector_service=self.encoder)
+
+    def test_columns_contribute_to_table_score(self):
+        index = self.manager.refresh(1, TABLES, COLUMNS)
+        scores = index.score_tables(self.encoder.encode_texts(["price"])[0])
+        self.assertEqual(max(scores, key=scores.get), 3)
+
+    def test_refresh_only_encodes_changed_documents(self):
+        self.manager.refresh(1, TABLES, COLUMNS)
+        self.encoder.encoded.clear()
+        tables = dict(TABLES)
+        tables[2] = {"id": 2, "name": "orders", "description": "order total"}
+        self.manager.refresh(1, tables, COLUMNS)
+        self.assertEqual(self.encoder.encoded, ["orders order total"])
+
+    def test_rank_and_ambiguity(self):
+        ranked = rank_by_vector_scores({1: 0.9, 2: 0.2, 3: 0.88}, top_k=5, min_score=0.3)
+        self.assertEqual([table_id for table_id, _ in ranked], [1, 3])
+        self.assertTrue(is_ambiguous(ranked, margin=0.05))
+        self.assertFalse(is_ambiguous(ranked, margin=0.01))
+
+
+class TestFindRelevantTables(unittest.TestCase):
+    all_tables = [{"id": i, "name": t["name"], "description": ""} for i, t in TABLES.items()]
+
+    def test_clear_winner_skips_llm(self):
+        with patch("app.services.text2sql_utils.rank_tables_with_llm", new=AsyncMock()) as llm:
+            ranked = asyncio.run(find_relevant_tables_semantic(
+                "users", {"entities": []}, self.all_tables, {1: 0.9, 2: 0.4, 3: 0.1}
+            ))
+        llm.assert_not_called()
+        self.assertEqual(ranked[0], (1, 9.0))
+
+    def test_close_scores_ask_llm_about_candidates_only(self):
+        llm = AsyncMock(return_value=[(2, 8.0)])
+        with patch("app.services.text2sql_utils.rank_tables_with_llm", new=llm):
+            ranked = asyncio.run(find_relevant_tables_semantic(
+                "orders", {"entities": []}, self.all_tables, {1: 0.61, 2: 0.6, 3: 0.1}
+            ))
+        self.assertEqual(ranked, [(2, 8.0)])
+        candidates = llm.call_args.args[2]
+        self.assertEqual({t["id"] for t in candidates}, {1, 2})
+
+    def test_no_vector_match_falls_back_to_keywords(self):
+        ranked = asyncio.run(find_relevant_tables_semantic(
+            "show orders", {"entities": []}, self.all_tables, {1: 0.0, 2: 0.1, 3: 0.0}
+        ))
+        self.assertEqual(ranked[0][0], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+
+from autogen_core.models import CreateResult, RequestUsage
+
+from app.core.tracing import SPAN_AGENT, PipelineTracer, RollingHistogram, TracedChatCompletionClient
+
+
+class FakeModelClient:
+    async def create(self, messages, **kwargs):
+        await asyncio.sleep(0.01)
+        return CreateResult(finish_reason="stop", content="SELECT 1",
+                            usage=RequestUsage(prompt_tokens=120, completion_tokens=8), cached=False)
+
+    def create_stream(self, messages, **kwargs):
+        async def stream():
+            yield "SELECT "
+            yield "1"
+            yield CreateResult(finish_reason="stop", content="SELECT 1",
+                               usage=RequestUsage(prompt_tokens=40, completion_tokens=3), cached=False)
+        return stream()
+
+
+class TestRollingHistogram(unittest.TestCase):
+    def test_quantiles_interpolate_within_bucket_and_expire_with_window(self):
+        histogram = RollingHistogram(buckets=(0.1, 0.5, 1.0), window=60, slots=6)
+        for value in [0.05] * 50 + [0.8] * 50:
+            histogram.observe(value, now=1000)
+
+        self.assertAlmostEqual(histogram.quantile(0.5, now=1000), 0.1)
+        self.assertAlmostEqual(histogram.quantile(0.95, now=1000), 0.95)
+        self.assertIsNone(histogram.quantile(0.5, now=1100))
+        # 累计计数不随窗口过期
+        self.assertEqual(histogram.total_count, 100)
+
+
+class TestPipelineTracer(unittest.TestCase):
+    def setUp(self):
+        self.tracer = PipelineTracer(max_sessions=2)
+        self.client = TracedChatCompletionClient(FakeModelClient(), self.tracer)
+
+    def run_stage(self, session_id, stage="sql_generator", rows=None):
+        async def handler():
+            with self.tracer.span(SPAN_AGENT, stage):
+                await self.client.create([])
+                async for _ in self.client.create_stream([]):
+                    pass
+                self.tracer.annotate(rows=rows)
+
+        async def run():
+            with self.tracer.session(session_id, 3):
+                # 与智能体运行时一样，处理任务在会话上下文中创建
+                await asyncio.create_task(handler())
+
+        asyncio.run(run())
+
+    def test_llm_spans_are_attributed_to_enclosing_stage_and_session(self):
+        self.run_stage("s1", rows=42)
+
+        timeline = self.tracer.timeline("s1")
+
+        self.assertEqual([entry["kind"] for entry in timeline], ["agent", "llm", "llm"])
+        self.assertTrue(all(entry["stage"] == "sql_generator" for entry in timeline))
+        self.assertEqual(timeline[0]["prompt_tokens"], 160)
+        self.assertEqual(timeline[0]["rows"], 42)
+        self.assertIn("first_token_ms", timeline[2])
+        self.assertGreaterEqual(timeline[1]["duration_ms"], 10)
+
+    def test_timelines_are_popped_and_bounded(self):
+        for session_id in ("s1", "s2", "s3"):
+            self.run_stage(session_id)
+
+        self.assertEqual(self.tracer.timeline("s1"), [])
+        self.assertTrue(self.tracer.timeline("s3", pop=True))
+        self.assertEqual(self.tracer.timeline("s3"), [])
+
+    def test_prometheus_output(self):
+        self.run_stage("s1", stage="sql_executor", rows=5)
+
+        text = self.tracer.render_prometheus()
+
+        self.assertIn('chatdb_stage_duration_seconds_count{kind="agent",stage="sql_executor"} 1', text)
+        self.assertIn('chatdb_stage_duration_seconds_bucket{kind="llm",stage="sql_executor",le="+Inf"} 2', text)
+        self.assertIn('chatdb_llm_tokens_total{stage="sql_executor",type="prompt"} 160', text)
+        self.assertIn('chatdb_db_rows_total{stage="sql_executor"} 5', text)
+        self.assertIn('chatdb_stage_duration_window_seconds{kind="agent",stage="sql_executor",quantile="0.5"}', text)
+
+    def test_exception_is_counted_and_reraised(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span(SPAN_AGENT, "query_analyzer"):
+                raise ValueError("boom")
+
+        self.assertIn('chatdb_stage_errors_total{kind="agent",stage="query_analyzer"} 1',
+                      self.tracer.render_prometheus())
+
+
+if __name__ == "__main__":
+    unittest.main()
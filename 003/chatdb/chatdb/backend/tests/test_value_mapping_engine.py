@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import patch
+
+from app.services.value_mapping_engine import ValueMapper, ValueMappingEngine
+
+ROWS = [
+    (1, "customers", "customer_name", "中石化", "中国石化"),
+    (1, "customers", "customer_name", "中石油", "中国石油"),
+    (2, "orders", "status", "已发货", "shipped"),
+    (3, "suppliers", "status", "已发货", "dispatched"),
+    (4, "customers", "region", "o'hare", "O'Hare"),
+]
+
+
+class TestValueMapper(unittest.TestCase):
+    def setUp(self):
+        self.mapper = ValueMapper(ROWS)
+
+    def test_rewrites_only_literals_compared_to_mapped_columns(self):
+        sql = "SELECT '中石化' AS label FROM customers WHERE customer_name = '中石化' -- 中石化"
+        self.assertEqual(
+            self.mapper.rewrite(sql),
+            "SELECT '中石化' AS label FROM customers WHERE customer_name = '中国石化' -- 中石化",
+        )
+
+    def test_alias_like_and_in_list(self):
+        sql = ("SELECT * FROM customers AS c JOIN orders o ON o.customer_id = c.id "
+               "WHERE c.customer_name LIKE '%中石油%' AND o.status NOT IN ('已发货', 'x')")
+        self.assertEqual(
+            self.mapper.rewrite(sql),
+            "SELECT * FROM customers AS c JOIN orders o ON o.customer_id = c.id "
+            "WHERE c.customer_name LIKE '%中国石油%' AND o.status NOT IN ('shipped', 'x')",
+        )
+
+    def test_unqualified_column_uses_tables_in_query(self):
+        self.assertEqual(self.mapper.rewrite("SELECT * FROM orders WHERE status = '已发货'"),
+                         "SELECT * FROM orders WHERE status = 'shipped'")
+        # Both tables map the term to different values, so the literal is left alone
+        sql = "SELECT * FROM orders, suppliers WHERE status = '已发货'"
+        self.assertEqual(self.mapper.rewrite(sql), sql)
+
+    def test_quotes_are_escaped(self):
+        self.assertEqual(self.mapper.rewrite("SELECT * FROM customers WHERE region = 'O''HARE'"),
+                         "SELECT * FROM customers WHERE region = 'O''Hare'")
+
+    def test_partial_terms_are_not_replaced(self):
+        sql = "SELECT * FROM customers WHERE customer_name = '中石化集团'"
+        self.assertEqual(self.mapper.rewrite(sql), sql)
+
+    def test_mappings_for_columns(self):
+        self.assertEqual(self.mapper.mappings_for_columns([2, 99]), {"orders.status": {"已发货": "shipped"}})
+
+
+class TestValueMappingEngine(unittest.TestCase):
+    def test_mapper_is_loaded_once_per_connection_until_invalidated(self):
+        engine = ValueMappingEngine(ttl=60, max_connections=4)
+        with patch("app.services.value_mapping_engine.crud.value_mapping.get_by_connection",
+                   return_value=ROWS) as load:
+            sql = "SELECT * FROM customers WHERE customer_name = '中石化'"
+            for _ in range(3):
+                self.assertIn("'中国石化'", engine.rewrite(None, 7, sql))
+            self.assertEqual(load.call_count, 1)
+            engine.invalidate(7)
+            engine.rewrite(None, 7, sql)
+            self.assertEqual(load.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
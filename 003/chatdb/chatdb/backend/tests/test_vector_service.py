@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import unittest
+
+import numpy as np
+
+from app.services.hybrid_retrieval_service import VectorService
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+        self.threads = set()
+
+    def encode(self, texts, normalize_embeddings=False):
+        self.calls.append(list(texts))
+        self.threads.add(threading.current_thread().name)
+        return np.array([[float(len(text)), 1.0] for text in texts])
+
+
+def make_service(**kwargs):
+    service = VectorService(model_name="fake", **kwargs)
+    service.model = FakeModel()
+    service.dimension = 2
+    service._initialized = True
+    return service
+
+
+class TestVectorService(unittest.TestCase):
+    def test_concurrent_requests_are_merged_into_one_batch(self):
+        service = make_service(batch_window_ms=20)
+
+        async def run():
+            return await asyncio.gather(
+                service.embed_question("How many users?"),
+                service.embed_question("  how many USERS? "),
+                service.embed_question("total sales"),
+            )
+
+        first, second, third = asyncio.run(run())
+        self.assertEqual(first, second)
+        self.assertEqual(third, [11.0, 1.0])
+        self.assertEqual(service.model.calls, [["how many users?", "total sales"]])
+        self.assertNotIn(threading.main_thread().name, service.model.threads)
+        service.close()
+
+    def test_cached_question_is_not_encoded_again(self):
+        service = make_service(batch_window_ms=1)
+
+        async def run():
+            await service.embed_question("total sales")
+            return await service.embed_question("Total Sales")
+
+        self.assertEqual(asyncio.run(run()), [11.0, 1.0])
+        self.assertEqual(len(service.model.calls), 1)
+        self.assertEqual(service.stats["cache_hits"], 1)
+        service.close()
+
+    def test_full_batch_flushes_without_waiting_for_window(self):
+        service = make_service(batch_window_ms=10_000, max_batch_size=2)
+
+        async def run():
+            return await asyncio.wait_for(
+                asyncio.gather(service.embed_question("a"), service.embed_question("bb")), timeout=2
+            )
+
+        self.assertEqual(asyncio.run(run()), [[1.0, 1.0], [2.0, 1.0]])
+        service.close()
+
+    def test_batch_embed_chunks_and_keeps_order(self):
+        service = make_service(max_batch_size=2)
+        vectors = asyncio.run(service.batch_embed(["a", "bb", "ccc", "a"]))
+        self.assertEqual([v[0] for v in vectors], [1.0, 2.0, 3.0, 1.0])
+        self.assertEqual(service.model.calls, [["a", "bb"], ["ccc"]])
+        service.close()
+
+    def test_pending_batch_task_is_kept_until_done(self):
+        service = make_service(batch_window_ms=1)
+
+        async def run():
+            request = asyncio.ensure_future(service.embed_question("total sales"))
+            await asyncio.sleep(0.05)
+            return await request
+
+        self.assertEqual(asyncio.run(run()), [11.0, 1.0])
+        self.assertEqual(service._flush_tasks, set())
+        service.close()
+
+    def test_table_index_encoding_shares_the_embedding_thread(self):
+        service = make_service(batch_window_ms=1)
+
+        async def run():
+            return await asyncio.gather(
+                service.embed_question("total sales"),
+                asyncio.to_thread(service.encode_texts, ["orders", "users"]),
+            )
+
+        _, encoded = asyncio.run(run())
+        self.assertEqual(encoded.shape, (2, 2))
+        self.assertEqual(len(service.model.threads), 1)
+        self.assertTrue(next(iter(service.model.threads)).startswith("embedding"))
+        service.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
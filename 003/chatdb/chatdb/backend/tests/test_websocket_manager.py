@@ -0,0 +1,87 @@
+import asyncio
+import json
+import unittest
+
+from app.services.websocket_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    client = None
+    headers = {}
+
+    def __init__(self, blocked=False):
+        self.sent = []
+        self.closed = False
+        self.unblock = asyncio.Event()
+        if not blocked:
+            self.unblock.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await self.unblock.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self):
+        self.closed = True
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestConnectionManager(unittest.TestCase):
+    def test_slow_client_does_not_block_others_and_is_disconnected_on_overflow(self):
+        async def run():
+            manager = ConnectionManager(send_queue_size=4, heartbeat_interval=60)
+            fast, slow = FakeWebSocket(), FakeWebSocket(blocked=True)
+            fast_id = await manager.connect(fast, "viewer")
+            slow_id = await manager.connect(slow, "viewer")
+            await settle()
+
+            for i in range(3):
+                await manager.broadcast({"type": "update", "n": i})
+            await settle()
+            depth = manager.get_stats()["connections"][slow_id]["queue_depth"]
+            self.assertEqual([m["n"] for m in fast.sent if m["type"] == "update"], [0, 1, 2])
+
+            for i in range(3, 6):
+                await manager.broadcast({"type": "update", "n": i})
+            await settle()
+            stats = manager.get_stats()
+            await manager.disconnect_all()
+            return fast_id, slow_id, depth, stats, slow
+
+        fast_id, slow_id, depth, stats, slow = asyncio.run(run())
+        # the welcome message is in flight; three updates wait in the blocked client's queue
+        self.assertEqual(depth, 3)
+        self.assertTrue(slow.closed)
+        self.assertEqual(stats["slow_consumers_disconnected"], 1)
+        self.assertNotIn(slow_id, stats["connections"])
+        self.assertEqual(stats["connections"][fast_id]["sent"], 7)
+        self.assertIn("avg_send_latency_ms", stats["connections"][fast_id])
+
+    def test_one_shared_heartbeat_timer(self):
+        async def run():
+            manager = ConnectionManager(heartbeat_interval=0.01)
+            sockets = [FakeWebSocket() for _ in range(10)]
+            for websocket in sockets:
+                await manager.connect(websocket)
+            task = manager.heartbeat_task
+            await asyncio.sleep(0.05)
+            running = [t for t in asyncio.all_tasks() if t.get_coro().__name__ == "_heartbeat_loop"]
+            await manager.disconnect_all()
+            await asyncio.sleep(0)
+            return task, running, sockets
+
+        task, running, sockets = asyncio.run(run())
+        self.assertEqual(running, [task])
+        self.assertTrue(task.done())
+        for websocket in sockets:
+            self.assertTrue(any(m["type"] == "heartbeat" for m in websocket.sent))
+
+
+if __name__ == "__main__":
+    unittest.main()